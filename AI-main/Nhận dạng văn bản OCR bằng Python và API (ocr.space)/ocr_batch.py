@@ -0,0 +1,333 @@
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.parser import BytesParser
+from email.policy import HTTP
+import cv2
+import numpy as np
+
+# OCR for folders of images (ocr_with_api.py does one image per call)
+#   backend : anything with recognize(jpeg_bytes, name) -> text
+#             OcrSpaceBackend (ocr.space API, one requests.Session per worker thread = connection reuse)
+#             TesseractBackend (local, pytesseract)
+#             LocalServer (stand-in ocr.space server for tests, use with OcrSpaceBackend(url=server.url))
+#   regions : each image can be split into a grid or into text blocks, one request per region
+#   cache   : results keyed on the sha1 of the encoded region (+ backend), kept in a jsonl file
+#   workers : bounded thread pool, at most 2 x workers images in memory at a time
+
+IMAGE_TYPES = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+
+class OcrError(Exception):
+    pass
+
+
+# Backends
+class OcrSpaceBackend:
+
+    def __init__(self, api_key="helloworld", language="eng", url="https://api.ocr.space/parse/image", timeout=60):
+        self.api_key = api_key
+        self.language = language
+        self.url = url
+        self.timeout = timeout
+        self.name = f"ocrspace:{language}"
+        self.local = threading.local()
+
+    def session(self):
+        # one session per thread: keep-alive connections are reused between calls
+        if not hasattr(self.local, "session"):
+            import requests
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def recognize(self, jpeg_bytes, name="image.jpg"):
+        result = self.session().post(self.url,
+                                     files={name: io.BytesIO(jpeg_bytes)},
+                                     data={"apikey": self.api_key,
+                                           "language": self.language},
+                                     timeout=self.timeout)
+        result = json.loads(result.content.decode())
+        if result.get("IsErroredOnProcessing") or not result.get("ParsedResults"):
+            raise OcrError(result.get("ErrorMessage") or "no result")
+        return result["ParsedResults"][0].get("ParsedText", "")
+
+
+class TesseractBackend:
+
+    def __init__(self, language="eng"):
+        import pytesseract
+        self.pytesseract = pytesseract
+        self.language = language
+        self.name = f"tesseract:{language}"
+
+    def recognize(self, jpeg_bytes, name="image.jpg"):
+        img = cv2.imdecode(np.frombuffer(jpeg_bytes, np.uint8), cv2.IMREAD_COLOR)
+        return self.pytesseract.image_to_string(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), lang=self.language)
+
+
+class LocalServer:
+
+    # Stand-in for the ocr.space endpoint (same form fields, same JSON), on 127.0.0.1.
+    # "Recognizes" an image as its size and mean value, after delay seconds (network + OCR time).
+
+    def __init__(self, port=0, delay=0.2):
+        self.delay = delay
+        self.requests = 0
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                form = BytesParser(policy=HTTP).parsebytes(
+                    b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body)
+                image = None
+                for part in form.iter_parts():
+                    if part.get_filename():
+                        image = part.get_payload(decode=True)
+                server.requests += 1
+                time.sleep(server.delay)
+                img = cv2.imdecode(np.frombuffer(image or b"", np.uint8), cv2.IMREAD_GRAYSCALE)
+                if img is None:
+                    result = {"IsErroredOnProcessing": True, "ErrorMessage": ["no image"]}
+                else:
+                    text = f"{img.shape[1]}x{img.shape[0]} {img.mean():.1f}"
+                    result = {"IsErroredOnProcessing": False, "ParsedResults": [{"ParsedText": text}]}
+                data = json.dumps(result).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/parse/image"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# Regions
+def grid_regions(img, rows=1, cols=1, overlap=20):
+    # (x, y, w, h) of a rows x cols grid, cells overlap by a few pixels so no line is cut in half
+    height, width = img.shape[:2]
+    boxes = []
+    for r in range(rows):
+        for c in range(cols):
+            x1, x2 = max(0, c * width // cols - overlap), min(width, (c + 1) * width // cols + overlap)
+            y1, y2 = max(0, r * height // rows - overlap), min(height, (r + 1) * height // rows + overlap)
+            boxes.append((x1, y1, x2 - x1, y2 - y1))
+    return boxes
+
+
+def block_regions(img, min_area=0.001, kernel=(25, 15)):
+    # text blocks: dark/light text edges joined with a wide closing, top to bottom, left to right
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    bw = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, kernel))
+    contours, _ = cv2.findContours(bw, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [cv2.boundingRect(c) for c in contours]
+    boxes = [b for b in boxes if b[2] * b[3] >= min_area * img.shape[0] * img.shape[1]]
+    return sorted(boxes, key=lambda b: (b[1] // 20, b[0])) or [(0, 0, img.shape[1], img.shape[0])]
+
+
+# Cache
+class OcrCache:
+
+    def __init__(self, path="ocr_cache.jsonl"):
+        self.path = path
+        self.items = {}
+        self.lock = threading.Lock()
+        if path and os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        item = json.loads(line)
+                        self.items[item["key"]] = item["text"]
+
+    @staticmethod
+    def key(jpeg_bytes, backend_name):
+        return hashlib.sha1(backend_name.encode() + b"\0" + jpeg_bytes).hexdigest()
+
+    def get(self, key):
+        return self.items.get(key)
+
+    def put(self, key, text):
+        with self.lock:
+            self.items[key] = text
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"key": key, "text": text}, ensure_ascii=False) + "\n")
+
+
+# Batch
+class OcrBatch:
+
+    def __init__(self, backend, workers=4, cache=None, grid=(1, 1), blocks=False, quality=90, retries=2):
+        self.backend = backend
+        self.workers = workers
+        self.cache = cache
+        self.grid = grid            # (rows, cols)
+        self.blocks = blocks        # True: split into text blocks instead of a grid
+        self.quality = quality      # JPEG quality (like cv2.imencode(".jpg", roi, [1, 90]))
+        self.retries = retries
+
+        self.pages = 0
+        self.regions = 0
+        self.requests = 0
+        self.hits = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+        self.pending = {}           # key -> Event, same region already being sent by another worker
+
+    def recognize(self, jpeg_bytes, name):
+        key = OcrCache.key(jpeg_bytes, self.backend.name)
+        if self.cache is not None:
+            with self.lock:
+                text = self.cache.get(key)
+                waiting = self.pending.get(key) if text is None else None
+                if text is None and waiting is None:
+                    self.pending[key] = threading.Event()
+            if waiting is not None:
+                waiting.wait()
+                text = self.cache.get(key)
+            if text is not None:
+                with self.lock:
+                    self.hits += 1
+                return text
+            if waiting is not None:  # the other request failed, try ourselves
+                return self.recognize(jpeg_bytes, name)
+        try:
+            text = self.send(jpeg_bytes, name, key)
+        finally:
+            if self.cache is not None:
+                with self.lock:
+                    self.pending.pop(key).set()
+        return text
+
+    def send(self, jpeg_bytes, name, key):
+        for attempt in range(self.retries + 1):
+            try:
+                with self.lock:
+                    self.requests += 1
+                text = self.backend.recognize(jpeg_bytes, name)
+                break
+            except Exception as error:
+                if attempt == self.retries:
+                    with self.lock:
+                        self.errors += 1
+                    return f"[OCR error: {error}]"
+                time.sleep(0.5 * (attempt + 1))
+        if self.cache is not None:
+            self.cache.put(key, text)
+        return text
+
+    def process_image(self, img, name="image.jpg"):
+        # text of one image (regions joined top to bottom)
+        boxes = block_regions(img) if self.blocks else grid_regions(img, *self.grid)
+        texts = []
+        for x, y, w, h in boxes:
+            _, compressedimage = cv2.imencode(".jpg", img[y:y + h, x:x + w], [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            texts.append(self.recognize(compressedimage.tobytes(), name).strip())
+        with self.lock:
+            self.pages += 1
+            self.regions += len(boxes)
+        return "\n".join(t for t in texts if t)
+
+    def process_file(self, path):
+        img = cv2.imread(path)
+        if img is None:
+            return f"[cannot read {path}]"
+        return self.process_image(img, os.path.basename(path))
+
+    def process_files(self, paths):
+        # {path: text}; only 2 x workers images are queued (and decoded) at a time
+        t1 = time.perf_counter()
+        results = {}
+        window = threading.BoundedSemaphore(2 * self.workers)
+
+        def run(path):
+            try:
+                return self.process_file(path)
+            finally:
+                window.release()
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = []
+            for path in paths:
+                window.acquire()
+                futures.append((path, pool.submit(run, path)))
+            for path, future in futures:
+                results[path] = future.result()
+        self.seconds += time.perf_counter() - t1
+        return results
+
+    def process_folder(self, folder):
+        paths = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_TYPES))
+        return self.process_files(paths)
+
+    def report(self):
+        print(f"Pages: {self.pages}, regions: {self.regions}, requests: {self.requests}, "
+              f"cache hits: {self.hits}, errors: {self.errors}")
+        if self.seconds > 0:
+            print(f"{self.seconds:.2f}s, {60 * self.pages / self.seconds:.1f} pages per minute")
+
+
+def benchmark(folder, pages=40, delay=0.2):
+    # local stand-in server: 1 worker vs a pool, then the same pages again from the cache
+    import tempfile
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_TYPES))
+    paths = (files * pages)[:pages]
+    server = LocalServer(delay=delay).start()
+    cache_file = os.path.join(tempfile.mkdtemp(), "ocr_cache.jsonl")
+    for workers, cached in ((1, False), (8, False), (8, True), (8, True)):
+        connections = server.connections
+        cache = OcrCache(cache_file) if cached else None  # second run reloads the file written by the first
+        batch = OcrBatch(OcrSpaceBackend(url=server.url), workers=workers, cache=cache)
+        batch.process_files(paths)
+        print(f"workers {workers}, cache {'on' if cache else 'off'}, "
+              f"connections opened: {server.connections - connections}")
+        batch.report()
+    server.stop()
+    os.remove(cache_file)
+
+
+if __name__ == "__main__":
+    # python ocr_batch.py <folder> [workers] [local]   (local = stand-in server instead of ocr.space)
+    # python ocr_batch.py benchmark [folder]
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark(sys.argv[2] if len(sys.argv) > 2 else ".")
+    else:
+        folder = sys.argv[1] if len(sys.argv) > 1 else "."
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+        server = LocalServer().start() if "local" in sys.argv[3:] else None
+        backend = OcrSpaceBackend(url=server.url) if server else OcrSpaceBackend()
+        batch = OcrBatch(backend, workers=workers, cache=OcrCache("ocr_cache.jsonl"))
+        for path, text in batch.process_folder(folder).items():
+            print(f"== {path}\n{text}")
+        batch.report()
+        if server:
+            server.stop()
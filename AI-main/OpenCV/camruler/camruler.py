@@ -14,6 +14,8 @@ import cv2
 # local clayton libs
 import frame_capture
 import frame_draw
+import frame_calibrate
+import frame_measure
 
 #-------------------------------
 # default settings
@@ -120,72 +122,43 @@ pixel_base = 10
 # should be measured in unit_suffix 
 cal_range = 72
 
-# initial calibration values table {pixels:scale}
-# this is based on the frame size and the cal_range
-cal = dict([(x,cal_range/dm) for x in range(0,int(dm)+1,pixel_base)])
+# lookup table ('radial' or 'full' frame map, see frame_calibrate.py)
+cal_mode = 'radial'
+
+# calibration step
+cal_base = 5
+
+# calibration table {pixels:scale} compiled to a lookup table
+# the initial table is based on the frame size and the cal_range
+calibrate = frame_calibrate.CAL()
+calibrate.width = width
+calibrate.height = height
+calibrate.pixel_base = pixel_base
+calibrate.cal_range = cal_range
+calibrate.cal_base = cal_base
+calibrate.mode = cal_mode
+calibrate.reset()
 
 # calibration loop values
 # inside of main loop below
-cal_base = 5
 cal_last = None
 
 # calibration update
-def cal_update(x,y,unit_distance):
-
-    # basics
-    pixel_distance = hypot(x,y)
-    scale = abs(unit_distance/pixel_distance)
-    target = baseround(abs(pixel_distance),pixel_base)
-
-    # low-high values in distance
-    low  = target*scale - (cal_base/2)
-    high = target*scale + (cal_base/2)
-
-    # get low start point in pixels
-    start = target
-    if unit_distance <= cal_base:
-        start = 0
-    else:
-        while start*scale > low:
-            start -= pixel_base
-
-    # get high stop point in pixels
-    stop = target
-    if unit_distance >= baseround(cal_range,pixel_base):
-        high = max(cal.keys())
-    else:
-        while stop*scale < high:
-            stop += pixel_base
-
-    # set scale
-    for x in range(start,stop+1,pixel_base):
-        cal[x] = scale
-        print(f'CAL: {x} {scale}')
+cal_update = calibrate.update
 
 # read local calibration data
 calfile = 'camruler_cal.csv'
-if os.path.isfile(calfile):
-    with open(calfile) as f:
-        for line in f:
-            line = line.strip()
-            if line and line[0] in ('d',):
-                axis,pixels,scale = [_.strip() for _ in line.split(',',2)]
-                if axis == 'd':
-                    print(f'LOAD: {pixels} {scale}')
-                    cal[int(pixels)] = float(scale)
-
-# convert pixels to units
-def conv(x,y):
-
-    d = distance(0,0,x,y)
+calibrate.load(calfile)
 
-    scale = cal[baseround(d,pixel_base)]
+# convert pixels to units (one point, or arrays of points)
+conv = calibrate.conv
+conv_many = calibrate.conv_many
 
-    return x*scale,y*scale
-
-# round to a given base
-def baseround(x,base=1):
-    return int(base * round(float(x)/base))
+# auto mode contour measure (uses the calibration)
+# the frame is normalized in the main loop
+measure = frame_measure.MEASURE()
+measure.calibrate = calibrate
+measure.normalize = False
 
 # distance formula 2D
 def distance(x1,y1,x2,y2):
@@ -472,12 +445,7 @@ while 1:
         else:
             key_flags_clear()
             cal_last == None
-            with open(calfile,'w') as f:
-                data = list(cal.items())
-                data.sort()
-                for key,value in data:
-                    f.write(f'd,{key},{value}\n')
-                f.close()
+            calibrate.save(calfile)
             caltext = f'CONFIG: Complete.'
 
         # add caltext
@@ -501,52 +469,20 @@ while 1:
         text.append(f'THRESHOLD: {auto_threshold}')
         text.append(f'GAUSS BLUR: {auto_blur}')
         
-        # gray frame
-        frame1 = cv2.cvtColor(frame0,cv2.COLOR_BGR2GRAY)
-
-        # blur frame
-        frame1 = cv2.GaussianBlur(frame1,(auto_blur,auto_blur),0)
-
-        # threshold frame n out of 255 (85 = 33%)
-        frame1 = cv2.threshold(frame1,auto_threshold,255,cv2.THRESH_BINARY)[1]
-
-        # invert
-        frame1 = ~frame1
+        # measure contours (gray, blur, threshold, invert, contours, boxes)
+        measure.auto_percent = auto_percent
+        measure.auto_threshold = auto_threshold
+        measure.auto_blur = auto_blur
+        data = measure.measure(frame0)
 
-        # find contours on thresholded image
-        contours,nada = cv2.findContours(frame1,cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_SIMPLE)
-        
-        # small crosshairs (after getting frame1)
+        # small crosshairs (after measuring)
         draw.crosshairs(frame0,5,weight=2,color='green')    
     
         # loop over the contours
-        for c in contours:
+        for x1,y1,x2,y2,xlen,ylen,alen,carea in zip(*[data[c].tolist() for c in ('x1','y1','x2','y2','xlen','ylen','alen','area')]):
 
             # contour data (from top left)
-            x1,y1,w,h = cv2.boundingRect(c)
-            x2,y2 = x1+w,y1+h
-            x3,y3 = x1+(w/2),y1+(h/2)
-
-            # percent area
-            percent = 100*w*h/area
-            
-            # if the contour is too small, ignore it
-            if percent < auto_percent:
-                    continue
-
-            # if the contour is too large, ignore it
-            elif percent > 60:
-                    continue
-
-            # convert to center, then distance
-            x1c,y1c = conv(x1-(cx),y1-(cy))
-            x2c,y2c = conv(x2-(cx),y2-(cy))
-            xlen = abs(x1c-x2c)
-            ylen = abs(y1c-y2c)
-            alen = 0
-            if max(xlen,ylen) > 0 and min(xlen,ylen)/max(xlen,ylen) >= 0.95:
-                alen = (xlen+ylen)/2              
-            carea = xlen*ylen
+            x3,y3 = x1+((x2-x1)/2),y1+((y2-y1)/2)
 
             # plot
             draw.rect(frame0,x1,y1,x2,y2,weight=2,color='red')
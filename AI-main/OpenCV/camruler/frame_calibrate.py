@@ -0,0 +1,195 @@
+import os
+from math import hypot
+
+import numpy as np
+
+# ------------------------------
+# Pixel to Unit Calibration
+# ------------------------------
+
+class CAL:
+
+    # The calibration table is {pixels:scale}, one scale (units per
+    # pixel) every pixel_base pixels of distance from the frame center
+    # (the "d" lines in camruler_cal.csv).
+
+    # compile() turns the table into a dense float32 lookup table with
+    # linear interpolation between the table points:
+    # mode = 'radial': one scale per pixel of distance (small, default)
+    # mode = 'full'  : unit x and y for every pixel in the frame (no hypot
+    #                  at all, 8 bytes per pixel)
+
+    # conv(x,y) converts one point, conv_many(x,y) converts arrays of points
+    # in one numpy call (x,y are pixels from center, like conv).
+    # Any change to the table (update, load) recompiles on next use.
+
+    # ------------------------------
+    # User Variables
+    # ------------------------------
+
+    # frame
+    width = 640
+    height = 480
+
+    # calibrate every N pixels
+    pixel_base = 10
+
+    # maximum field of view from center to farthest edge (in units)
+    cal_range = 72
+
+    # calibration step (in units)
+    cal_base = 5
+
+    # lookup table type ('radial' or 'full')
+    mode = 'radial'
+
+    # ------------------------------
+    # System Variables
+    # ------------------------------
+
+    cal = None # {pixels:scale}
+    lut = None # radial: scale per pixel of distance
+    lut_list = None
+    map_x = None # full: unit x per pixel
+    map_y = None # full: unit y per pixel
+    compiled = False
+
+    # ------------------------------
+    # Functions
+    # ------------------------------
+
+    # initial table (based on the frame size and the cal_range)
+    def reset(self):
+
+        self.cx = int(self.width/2)
+        self.cy = int(self.height/2)
+        self.dm = hypot(self.cx,self.cy) # max pixel distance
+        self.cal = dict([(x,self.cal_range/self.dm) for x in range(0,int(self.dm)+1,self.pixel_base)])
+        self.compiled = False
+
+    # read calibration data
+    def load(self,calfile):
+
+        if os.path.isfile(calfile):
+            with open(calfile) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and line[0] in ('d',):
+                        axis,pixels,scale = [_.strip() for _ in line.split(',',2)]
+                        if axis == 'd':
+                            print(f'LOAD: {pixels} {scale}')
+                            self.cal[int(pixels)] = float(scale)
+        self.compiled = False
+
+    # write calibration data
+    def save(self,calfile):
+
+        with open(calfile,'w') as f:
+            data = list(self.cal.items())
+            data.sort()
+            for key,value in data:
+                f.write(f'd,{key},{value}\n')
+
+    # calibration update (x,y from center is unit_distance from center)
+    def update(self,x,y,unit_distance):
+
+        # basics
+        pixel_distance = hypot(x,y)
+        scale = abs(unit_distance/pixel_distance)
+        target = baseround(abs(pixel_distance),self.pixel_base)
+
+        # low-high values in distance
+        low  = target*scale - (self.cal_base/2)
+        high = target*scale + (self.cal_base/2)
+
+        # get low start point in pixels
+        start = target
+        if unit_distance <= self.cal_base:
+            start = 0
+        else:
+            while start*scale > low:
+                start -= self.pixel_base
+
+        # get high stop point in pixels
+        stop = target
+        if unit_distance >= baseround(self.cal_range,self.pixel_base):
+            high = max(self.cal.keys())
+        else:
+            while stop*scale < high:
+                stop += self.pixel_base
+
+        # set scale
+        for x in range(start,stop+1,self.pixel_base):
+            self.cal[x] = scale
+            print(f'CAL: {x} {scale}')
+
+        self.compiled = False
+
+    # build the lookup table
+    def compile(self):
+
+        # table points, interpolated to every pixel of distance
+        # (one extra pixel so interpolation at dm has a right side)
+        points = sorted(self.cal.items())
+        px = np.array([p for p,s in points],np.float64)
+        ps = np.array([s for p,s in points],np.float64)
+        self.lut = np.interp(np.arange(int(self.dm)+2),px,ps).astype(np.float32)
+        self.lut_list = self.lut.tolist() # for conv (faster than numpy scalars)
+
+        # full frame map of unit x,y (pixels from top left)
+        if self.mode == 'full':
+            x = np.arange(self.width+1,dtype=np.float32)-self.cx
+            y = np.arange(self.height+1,dtype=np.float32)-self.cy
+            scale = self.radial(*np.meshgrid(x,y))
+            self.map_x = x[None,:]*scale
+            self.map_y = y[:,None]*scale
+        else:
+            self.map_x,self.map_y = None,None
+
+        self.compiled = True
+
+    # scale for distances (lut interpolation)
+    def radial(self,x,y):
+
+        d = np.minimum(np.hypot(x,y),len(self.lut)-1.001)
+        i = d.astype(np.int32)
+        f = d-i
+        return self.lut[i]*(1-f) + self.lut[i+1]*f
+
+    # convert pixels to units (one point)
+    def conv(self,x,y):
+
+        if not self.compiled:
+            self.compile()
+
+        d = min(hypot(x,y),len(self.lut)-1.001)
+        i = int(d)
+        f = d-i
+        scale = self.lut_list[i]*(1-f) + self.lut_list[i+1]*f
+
+        return x*scale,y*scale
+
+    # convert pixels to units (arrays of points, pixels from center)
+    def conv_many(self,x,y):
+
+        if not self.compiled:
+            self.compile()
+
+        x = np.asarray(x,np.float32)
+        y = np.asarray(y,np.float32)
+
+        # full map (integer pixels inside the frame)
+        if self.map_x is not None:
+            col = np.rint(x).astype(np.int32)+self.cx
+            row = np.rint(y).astype(np.int32)+self.cy
+            inside = (col >= 0) & (col <= self.width) & (row >= 0) & (row <= self.height)
+            if np.all(inside):
+                return self.map_x[row,col],self.map_y[row,col]
+
+        # radial
+        scale = self.radial(x,y)
+        return x*scale,y*scale
+
+# round to a given base
+def baseround(x,base=1):
+    return int(base * round(float(x)/base))
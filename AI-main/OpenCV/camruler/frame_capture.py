@@ -1,5 +1,5 @@
 import time
-import threading,queue
+import threading,collections
 import numpy as np
 import cv2
 
@@ -9,9 +9,15 @@ import cv2
 
 class Camera_Thread:
 
-    # IMPORTANT: a queue is much more efficient than a deque
+    # IMPORTANT: a queue is much more efficient than a polled deque
     # the queue version runs at 35% of 1 processor
     # the deque version ran at 108% of 1 processor
+    # so the ring below never polls, both sides wait on a threading.Condition
+
+    # Frames are read into a preallocated ring of buffers using
+    # camera.read(image=buffer), so there is no new array per frame.
+    # A frame from next() is a view of one ring buffer. It is held
+    # (the camera won't read into it) until the next call to next().
 
     # ------------------------------
     # User Instructions
@@ -24,6 +30,7 @@ class Camera_Thread:
     # Set the number of frames to keep in the buffer (default is 4).
     # Set buffer_all variable: True = no frame loss, for reading files, don't read another frame until buffer allows
     #                          False = allows frame loss, for reading camera, just keep most recent frame reads
+    # Set frame_readonly variable: True = next() frames are read-only views
 
     # Start camera thread using self.start().
 
@@ -32,6 +39,8 @@ class Camera_Thread:
     #    If not black, the default frame value is None.
     #    If timeout, wait up to timeout seconds for a frame to load into the buffer.
     #    If no frame is in the buffer, return the default frame value.
+    #    If stamped, return (frame,sequence number,read time) (None,None for the default frame).
+    #    Copy the frame if it is needed after the next call to next().
 
     # Stop the camera using self.stop()
 
@@ -50,6 +59,7 @@ class Camera_Thread:
     # buffer setup
     buffer_length = 5
     buffer_all = False
+    frame_readonly = False
 
     # ------------------------------
     # System Variables
@@ -59,8 +69,12 @@ class Camera_Thread:
     camera = None
     camera_init = 0.5
 
-    # buffer
-    buffer = None
+    # buffer (ring of frames)
+    buffer = None # array of frames
+    buffer_free = None # ring indexes to read into
+    buffer_ready = None # (index,sequence,time) read but not returned
+    buffer_held = None # ring index returned by next()
+    buffer_lock = None
 
     # control states
     frame_grab_run = False
@@ -69,6 +83,8 @@ class Camera_Thread:
     # counts and amounts
     frame_count = 0
     frames_returned = 0
+    frames_dropped = 0
+    frame_allocations = 0 # reads that did not use the ring
     current_frame_rate = 0
     loop_start_time = 0
 
@@ -78,13 +94,6 @@ class Camera_Thread:
 
     def start(self):
 
-        # buffer
-        if self.buffer_all:
-            self.buffer = queue.Queue(self.buffer_length)
-        else:
-            # last frame only
-            self.buffer = queue.Queue(1)
-
         # camera setup
         self.camera = cv2.VideoCapture(self.camera_source)
         self.camera.set(3,self.camera_width)
@@ -103,6 +112,10 @@ class Camera_Thread:
         # black frame (filler)
         self.black_frame = np.zeros((self.camera_height,self.camera_width,3),np.uint8)
 
+        # buffer
+        self.buffer_lock = threading.Condition()
+        self.buffer_setup((self.camera_height,self.camera_width,3))
+
         # set run state
         self.frame_grab_run = True
         
@@ -110,6 +123,19 @@ class Camera_Thread:
         self.thread = threading.Thread(target=self.loop)
         self.thread.start()
 
+    def buffer_setup(self,shape):
+
+        # same frames as the queue: buffer_length ready (or one being read),
+        # the last one if frames can be lost, plus one held by next()
+        if self.buffer_all:
+            size = self.buffer_length + 1
+        else:
+            size = 3
+        self.buffer = np.zeros((size,)+tuple(shape),np.uint8)
+        self.buffer_free = collections.deque(range(size))
+        self.buffer_ready = collections.deque()
+        self.buffer_held = None
+
     def stop(self):
 
         # set loop kill state
@@ -127,15 +153,18 @@ class Camera_Thread:
                 pass
         self.camera = None
 
-        # drop buffer
-        self.buffer = None
+        # drop buffer (frames already returned stay valid)
+        if self.buffer_lock:
+            with self.buffer_lock:
+                self.buffer = None
+                self.buffer_ready = None
+                self.buffer_lock.notify_all()
 
     def loop(self):
 
-        # load start frame
-        frame = self.black_frame
-        if not self.buffer.full():
-            self.buffer.put(frame,False)
+        # load start frame (black)
+        with self.buffer_lock:
+            self.buffer_ready.append((self.buffer_free.popleft(),0,time.time()))
 
         # status
         self.frame_grab_on = True
@@ -152,38 +181,54 @@ class Camera_Thread:
             if not self.frame_grab_run:
                 break
 
-            # true buffered mode (for files, no loss)
-            if self.buffer_all:
-
-                # buffer is full, pause and loop
-                if self.buffer.full():
-                    time.sleep(1/self.camera_frame_rate)
-
-                # or load buffer with next frame
+            # get a buffer to read into
+            with self.buffer_lock:
+
+                # true buffered mode (for files, no loss)
+                # buffer is full, wait for next()
+                if self.buffer_all:
+                    if not self.buffer_free:
+                        self.buffer_lock.wait(1/self.camera_frame_rate)
+                        continue
+                    index = self.buffer_free.popleft()
+
+                # false buffered mode (for camera, loss allowed)
+                # reuse the oldest frame not returned
+                elif self.buffer_free:
+                    index = self.buffer_free.popleft()
                 else:
-                    
-                    grabbed,frame = self.camera.read()
+                    index = self.buffer_ready.popleft()[0]
+                    self.frames_dropped += 1
 
-                    if not grabbed:
-                        break
+                frame = self.buffer[index]
 
-                    self.buffer.put(frame,False)
-                    self.frame_count += 1
-                    fc += 1
-
-            # false buffered mode (for camera, loss allowed)
-            else:
-
-                grabbed,frame = self.camera.read()
-                if not grabbed:
-                    break
+            # read into the buffer
+            grabbed,image = self.camera.read(image=frame)
+            if not grabbed:
+                break
 
-                # open a spot in the buffer
-                if self.buffer.full():
-                    self.buffer.get()
+            # camera made a new array (other size or type)
+            if not np.shares_memory(image,frame):
+                self.frame_allocations += 1
+                if image.shape != frame.shape:
+                    with self.buffer_lock:
+                        self.buffer_setup(image.shape)
+                        index = self.buffer_free.popleft()
+                        frame = self.buffer[index]
+                frame[...] = image
+
+            # frame is ready
+            with self.buffer_lock:
+
+                # loss allowed, keep the most recent frame only
+                if not self.buffer_all:
+                    while self.buffer_ready:
+                        self.buffer_free.append(self.buffer_ready.popleft()[0])
+                        self.frames_dropped += 1
 
-                self.buffer.put(frame,False)
                 self.frame_count += 1
+                self.buffer_ready.append((index,self.frame_count,time.time()))
+                self.buffer_lock.notify_all()
                 fc += 1
 
             # update frame read rate
@@ -197,7 +242,7 @@ class Camera_Thread:
         self.frame_grab_on = False
         self.stop()
 
-    def next(self,black=True,wait=0):
+    def next(self,black=True,wait=0,stamped=False):
 
         # black frame default
         if black:
@@ -207,14 +252,28 @@ class Camera_Thread:
         else:
             frame = None
 
+        sequence,read_time = None,None
+
         # get from buffer (fail if empty)
-        try:
-            frame = self.buffer.get(timeout=wait)
-            self.frames_returned += 1
-        except queue.Empty:
-            #print('Queue Empty!')
-            #print(traceback.format_exc())
-            pass
+        if self.buffer_lock:
+            with self.buffer_lock:
+                if wait and not self.buffer_ready:
+                    self.buffer_lock.wait_for(lambda: self.buffer_ready or self.buffer is None,wait)
+                if self.buffer_ready:
+
+                    # hold this one, free the last one
+                    index,sequence,read_time = self.buffer_ready.popleft()
+                    if self.buffer_held is not None:
+                        self.buffer_free.append(self.buffer_held)
+                    self.buffer_held = index
+                    self.buffer_lock.notify_all()
+
+                    frame = self.buffer[index]
+                    if self.frame_readonly:
+                        frame.flags.writeable = False
+                    self.frames_returned += 1
 
         # done
+        if stamped:
+            return frame,sequence,read_time
         return frame
@@ -0,0 +1,301 @@
+#-------------------------------
+# imports
+#-------------------------------
+
+# builtins
+import os,time,argparse
+import multiprocessing
+
+# must be installed using pip
+# python3 -m pip install opencv-python
+import numpy as np
+import cv2
+
+# local clayton libs
+import frame_calibrate
+
+#-------------------------------
+# auto measure
+#-------------------------------
+
+class MEASURE:
+
+    # The camruler AUTO mode pipeline without the window: normalize,
+    # gray, blur, threshold, invert, external contours, then bounding
+    # boxes in units (using a frame_calibrate.CAL).
+
+    # measure(frame) returns columns (dict of arrays), one row per contour:
+    # x1,y1,x2,y2 (pixels from top left), xlen,ylen,alen,area (units)
+    # alen is the average of xlen and ylen if they are within 5% (else 0)
+
+    # ------------------------------
+    # User Variables
+    # ------------------------------
+
+    # auto measure
+    auto_percent = 0.2 # min percent of frame area
+    auto_max_percent = 60 # max percent of frame area
+    auto_threshold = 127
+    auto_blur = 5
+
+    # normalization
+    normalize = True
+    norm_alpha = 0
+    norm_beta = 255
+
+    # rotate 180
+    rotate = False
+
+    # calibration (frame_calibrate.CAL)
+    calibrate = None
+
+    # ------------------------------
+    # Functions
+    # ------------------------------
+
+    # frame before measuring (as shown by camruler)
+    def prepare(self,frame):
+
+        if self.normalize:
+            cv2.normalize(frame,frame,self.norm_alpha,self.norm_beta,cv2.NORM_MINMAX)
+        if self.rotate:
+            frame = cv2.rotate(frame,cv2.ROTATE_180)
+        return frame
+
+    # bounding boxes of contours (x,y,w,h array)
+    def boxes(self,frame):
+
+        # gray frame
+        frame1 = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+
+        # blur frame
+        frame1 = cv2.GaussianBlur(frame1,(self.auto_blur,self.auto_blur),0)
+
+        # threshold frame n out of 255 (85 = 33%)
+        frame1 = cv2.threshold(frame1,self.auto_threshold,255,cv2.THRESH_BINARY)[1]
+
+        # invert
+        frame1 = ~frame1
+
+        # find contours on thresholded image
+        contours,nada = cv2.findContours(frame1,cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_SIMPLE)
+
+        # contour boxes (from top left)
+        boxes = np.array([cv2.boundingRect(c) for c in contours],np.int32).reshape(-1,4)
+
+        # percent area, ignore contours too small or too large
+        percents = 100*boxes[:,2]*boxes[:,3]/(frame.shape[0]*frame.shape[1])
+        return boxes[(percents >= self.auto_percent) & (percents <= self.auto_max_percent)]
+
+    # measure contours (columns)
+    def measure(self,frame):
+
+        boxes = self.boxes(frame)
+        cx,cy = self.calibrate.cx,self.calibrate.cy
+        n = len(boxes)
+
+        # convert all corners to center, then distance (one call)
+        x1,y1 = boxes[:,0],boxes[:,1]
+        x2,y2 = x1+boxes[:,2],y1+boxes[:,3]
+        ux,uy = self.calibrate.conv_many(np.concatenate((x1,x2))-cx,np.concatenate((y1,y2))-cy)
+        xlen = np.abs(ux[:n]-ux[n:])
+        ylen = np.abs(uy[:n]-uy[n:])
+
+        # average if square (within 5%)
+        low,high = np.minimum(xlen,ylen),np.maximum(xlen,ylen)
+        square = (high > 0) & (low >= 0.95*high)
+        alen = np.where(square,(xlen+ylen)/2,0)
+
+        return {'x1':x1,'y1':y1,'x2':x2,'y2':y2,
+                'xlen':xlen,'ylen':ylen,'alen':alen,'area':xlen*ylen}
+
+#-------------------------------
+# headless batch measure
+#-------------------------------
+
+# measure_stream(source) runs MEASURE over a video file or a folder of
+# images with a pool of worker processes and writes one row per contour
+# per frame to a CSV file (or Parquet, if the output ends in .parquet
+# and pyarrow is installed).
+
+# a video is split into frame ranges (each worker opens the file and
+# seeks to its range), a folder is split into lists of files
+
+image_types = ('.jpg','.jpeg','.png','.bmp','.tif','.tiff')
+
+columns = ('frame','contour','x1','y1','x2','y2','xlen','ylen','alen','area')
+
+def source_frames(source):
+
+    # folder of images: (sorted files, frame shape)
+    if os.path.isdir(source):
+        files = sorted(os.path.join(source,f) for f in os.listdir(source) if f.lower().endswith(image_types))
+        if not files:
+            return [],None
+        return files,cv2.imread(files[0]).shape
+
+    # video file: (frame count, frame shape)
+    camera = cv2.VideoCapture(source)
+    count = int(camera.get(cv2.CAP_PROP_FRAME_COUNT))
+    grabbed,frame = camera.read()
+    camera.release()
+    if not grabbed:
+        return 0,None
+    return count,frame.shape
+
+def measure_frames(frames):
+
+    # (frame number,frame) from a video range or a list of files
+    kind,items,start,length = frames
+    if kind == 'files':
+        for n,file in enumerate(items,start):
+            frame = cv2.imread(file)
+            if frame is not None:
+                yield n,frame
+    else:
+        camera = cv2.VideoCapture(items)
+        stop = start + length
+        if start:
+            camera.set(cv2.CAP_PROP_POS_FRAMES,start)
+        frame = None
+        for n in range(start,stop):
+            grabbed,frame = camera.read(image=frame)
+            if not grabbed:
+                break
+            yield n,frame
+        camera.release()
+
+def measure_worker(task):
+
+    # one chunk in a worker process
+    measure,frames = task
+    t1 = time.perf_counter()
+    parts = []
+    count = 0
+    for n,frame in measure_frames(frames):
+        data = measure.measure(measure.prepare(frame))
+        rows = len(data['x1'])
+        data['frame'] = np.full(rows,n,np.int32)
+        data['contour'] = np.arange(rows,dtype=np.int32)
+        parts.append(data)
+        count += 1
+    seconds = time.perf_counter()-t1
+
+    # columns for the chunk
+    if parts:
+        data = {c:np.concatenate([p[c] for p in parts]) for c in columns}
+    else:
+        data = {c:np.zeros(0) for c in columns}
+    return data,os.getpid(),count,seconds
+
+def write_csv(output,data):
+
+    with open(output,'w') as f:
+        f.write(','.join(columns)+'\n')
+        for row in zip(*[data[c].tolist() for c in columns]):
+            f.write('{},{},{},{},{},{},{:.4f},{:.4f},{:.4f},{:.4f}\n'.format(*row))
+
+def write_parquet(output,data):
+
+    # optional: python3 -m pip install pyarrow
+    import pyarrow
+    import pyarrow.parquet
+    pyarrow.parquet.write_table(pyarrow.table({c:data[c] for c in columns}),output)
+
+def measure_stream(source,output=None,workers=None,measure=None,calfile='camruler_cal.csv',chunk=50):
+
+    # source frames
+    items,shape = source_frames(source)
+    if shape is None:
+        print('MEASURE: no frames in',source)
+        return None
+    height,width = shape[:2]
+
+    # calibration for this frame size
+    if measure is None:
+        measure = MEASURE()
+    if measure.calibrate is None:
+        measure.calibrate = frame_calibrate.CAL()
+        measure.calibrate.width = width
+        measure.calibrate.height = height
+        measure.calibrate.reset()
+        measure.calibrate.load(calfile)
+    measure.calibrate.compile()
+
+    # chunks (frame ranges or file lists)
+    if type(items) == list:
+        tasks = [(measure,('files',items[i:i+chunk],i,chunk)) for i in range(0,len(items),chunk)]
+        total = len(items)
+    else:
+        tasks = [(measure,('video',source,i,chunk)) for i in range(0,items,chunk)]
+        total = items
+    workers = min(workers or os.cpu_count(),len(tasks))
+    print(f'MEASURE: {source} {total} frames {width}x{height}, {len(tasks)} chunks, {workers} workers')
+
+    # run
+    t1 = time.perf_counter()
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(measure_worker,tasks,1)
+    else:
+        results = [measure_worker(task) for task in tasks]
+    seconds = time.perf_counter()-t1
+
+    # join chunks (in frame order)
+    data = {c:np.concatenate([r[0][c] for r in results]) for c in columns}
+    frames = sum(r[2] for r in results)
+
+    # per worker rate
+    rates = {}
+    for r in results:
+        count,busy = rates.get(r[1],(0,0))
+        rates[r[1]] = (count+r[2],busy+r[3])
+    for n,(pid,(count,busy)) in enumerate(sorted(rates.items())):
+        print(f'WORKER {n}: {count} frames {busy:.2f}s {count/max(busy,1e-9):.1f} FPS')
+    print(f'MEASURE: {frames} frames {len(data["frame"])} contours {seconds:.2f}s {frames/max(seconds,1e-9):.1f} FPS')
+
+    # output
+    if output:
+        if output.lower().endswith('.parquet'):
+            write_parquet(output,data)
+        else:
+            write_csv(output,data)
+        print('SAVED:',output)
+
+    return data
+
+#-------------------------------
+# command line
+#-------------------------------
+
+# example "python3 frame_measure.py parts.mp4 parts.csv --workers 4"
+# example "python3 frame_measure.py images/ parts.parquet --threshold 100"
+
+def main():
+
+    parser = argparse.ArgumentParser(description='camruler auto measure over a video file or image folder')
+    parser.add_argument('source',help='video file or folder of images')
+    parser.add_argument('output',nargs='?',default=None,help='.csv or .parquet file')
+    parser.add_argument('--workers',type=int,default=None,help='worker processes (default all cpus)')
+    parser.add_argument('--chunk',type=int,default=50,help='frames per task')
+    parser.add_argument('--cal',default='camruler_cal.csv',help='calibration file')
+    parser.add_argument('--percent',type=float,default=MEASURE.auto_percent,help='min percent of frame area')
+    parser.add_argument('--threshold',type=int,default=MEASURE.auto_threshold)
+    parser.add_argument('--blur',type=int,default=MEASURE.auto_blur)
+    parser.add_argument('--rotate',action='store_true',help='rotate 180')
+    args = parser.parse_args()
+
+    measure = MEASURE()
+    measure.auto_percent = args.percent
+    measure.auto_threshold = args.threshold
+    measure.auto_blur = args.blur | 1
+    measure.rotate = args.rotate
+
+    measure_stream(args.source,args.output,args.workers,measure,args.cal,args.chunk)
+
+if __name__ == '__main__':
+    main()
+
+#-------------------------------
+# end
+#-------------------------------
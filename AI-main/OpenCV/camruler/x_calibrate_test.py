@@ -0,0 +1,102 @@
+#-------------------------------
+# imports
+#-------------------------------
+
+import time
+from math import hypot
+
+import numpy as np
+
+import frame_calibrate
+
+#-------------------------------
+# calibration lookup test
+#-------------------------------
+
+# Pixel to unit conversion for auto-measure at 1080p:
+# the old dict lookup (hypot + baseround per point) vs frame_calibrate.CAL
+# conv (one point) and conv_many (all contour corners in one call),
+# radial and full frame tables. No camera needed.
+
+# usage:
+# python3 x_calibrate_test.py
+
+width,height = 1920,1080
+contours = 500
+frames = 50
+
+#-------------------------------
+# old conversion (camruler.py before frame_calibrate)
+#-------------------------------
+
+def baseround(x,base=1):
+    return int(base * round(float(x)/base))
+
+def old_conv(cal,x,y):
+    scale = cal[baseround(hypot(x,y),10)]
+    return x*scale,y*scale
+
+#-------------------------------
+# run
+#-------------------------------
+
+def main():
+
+    # a calibrated table (lens scale changes with distance)
+    calibrate = frame_calibrate.CAL()
+    calibrate.width,calibrate.height = width,height
+    calibrate.reset()
+    for pixels in calibrate.cal:
+        calibrate.cal[pixels] = (72/calibrate.dm)*(1+0.2*(pixels/calibrate.dm)**2)
+    cal = dict(calibrate.cal)
+    cx,cy = calibrate.cx,calibrate.cy
+
+    # contour boxes
+    rng = np.random.default_rng(1)
+    x1 = rng.integers(0,width-100,contours)
+    y1 = rng.integers(0,height-100,contours)
+    x2 = x1 + rng.integers(5,100,contours)
+    y2 = y1 + rng.integers(5,100,contours)
+    xs = np.concatenate((x1,x2))-cx
+    ys = np.concatenate((y1,y2))-cy
+
+    print(f'{contours} CONTOURS x {frames} FRAMES ({width}x{height})')
+
+    # old
+    t1 = time.perf_counter()
+    for f in range(frames):
+        old = [old_conv(cal,x,y) for x,y in zip(xs.tolist(),ys.tolist())]
+    told = (time.perf_counter()-t1)/frames
+    old = np.array(old)
+    print(f'  dict conv     : {told*1000:7.3f} ms/frame')
+
+    for mode in ('radial','full'):
+        calibrate.mode = mode
+        t1 = time.perf_counter()
+        calibrate.compile()
+        tc = time.perf_counter()-t1
+
+        # one point at a time
+        t1 = time.perf_counter()
+        for f in range(frames):
+            one = [calibrate.conv(x,y) for x,y in zip(xs.tolist(),ys.tolist())]
+        tone = (time.perf_counter()-t1)/frames
+
+        # all at once
+        t1 = time.perf_counter()
+        for f in range(frames):
+            ux,uy = calibrate.conv_many(xs,ys)
+        tmany = (time.perf_counter()-t1)/frames
+
+        # difference from the old step table (interpolation)
+        diff = np.max(np.abs(np.stack((ux,uy),axis=1)-old))
+        same = np.max(np.abs(np.stack((ux,uy),axis=1)-np.array(one)))
+        print(f'  {mode:<6} conv   : {tone*1000:7.3f} ms/frame')
+        print(f'  {mode:<6} many   : {tmany*1000:7.3f} ms/frame ({told/tmany:.0f}x) compile {tc*1000:.1f} ms, max diff old {diff:.4f} units, conv {same:.6f}')
+
+#-------------------------------
+# testing
+#-------------------------------
+
+if __name__ == '__main__':
+    main()
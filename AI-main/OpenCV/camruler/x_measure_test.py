@@ -0,0 +1,91 @@
+#-------------------------------
+# imports
+#-------------------------------
+
+import os,shutil,tempfile
+
+import numpy as np
+import cv2
+
+import frame_measure
+
+#-------------------------------
+# headless measure test
+#-------------------------------
+
+# frame_measure.measure_stream over a made-up inspection video and the
+# same frames as an image folder: dark parts of known pixel size on a
+# light background, measured with 1 worker and with 2 workers.
+# The default calibration is used (cal_range units across dm pixels),
+# so every part should measure (pixel size)*scale.
+
+# usage:
+# python3 x_measure_test.py
+
+width,height = 1920,1080
+frames = 300
+parts = 40
+
+#-------------------------------
+# source
+#-------------------------------
+
+def make_frames():
+
+    rng = np.random.default_rng(1)
+    for n in range(frames):
+        frame = np.full((height,width,3),220,np.uint8)
+        for p in range(parts):
+            x = 20 + (p%8)*235 + (n%20)
+            y = 20 + (p//8)*210
+            cv2.rectangle(frame,(x,y),(x+80+p*3,y+100+p),(30,30,30),-1)
+        frame += rng.integers(0,8,(height,width,3),dtype=np.uint8)
+        yield frame
+
+def make_sources(folder):
+
+    video = os.path.join(folder,'parts.avi')
+    images = os.path.join(folder,'parts')
+    os.mkdir(images)
+    writer = cv2.VideoWriter(video,cv2.VideoWriter_fourcc(*"MJPG"),30,(width,height))
+    for n,frame in enumerate(make_frames()):
+        writer.write(frame)
+        if n < 60:
+            cv2.imwrite(os.path.join(images,f'{n:05d}.png'),frame)
+    writer.release()
+    return video,images
+
+#-------------------------------
+# run
+#-------------------------------
+
+def main():
+
+    folder = tempfile.mkdtemp()
+    video,images = make_sources(folder)
+    scale = 72/np.hypot(width//2,height//2)
+
+    for source in (video,images):
+        for workers in (1,2):
+            output = os.path.join(folder,'parts.csv')
+            data = frame_measure.measure_stream(source,output,workers,calfile='')
+
+            # every part in every frame, sizes match
+            counts = np.bincount(data['frame'])
+            xpix = np.rint(data['xlen']/scale).astype(int)
+            ypix = np.rint(data['ylen']/scale).astype(int)
+            expected = sorted((80+p*3+1,100+p+1) for p in range(parts))
+            sizes_ok = all(sorted(zip(xpix[data['frame'] == n],ypix[data['frame'] == n])) == expected for n in range(0,len(counts),17))
+            with open(output) as f:
+                rows = sum(1 for line in f)-1
+            print('  CHECK: parts/frame {}-{} sizes {} csv rows {}'.format(counts.min(),counts.max(),'ok' if sizes_ok else 'WRONG',rows))
+            print()
+
+    shutil.rmtree(folder)
+
+#-------------------------------
+# testing
+#-------------------------------
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,7 @@
 
 import time
 import threading
-import queue
+import collections
 import math
 import numpy as np
 import cv2
@@ -21,9 +21,15 @@ import cv2
 
 class Camera_Thread:
 
-    # IMPORTANT: a queue is much more efficient than a deque
+    # IMPORTANT: a queue is much more efficient than a polled deque
     # the queue version runs at 35% of 1 processor
     # the deque version ran at 108% of 1 processor
+    # so the ring below never polls, both sides wait on a threading.Condition
+
+    # Frames are read into a preallocated ring of buffers using
+    # camera.read(image=buffer), so there is no new array per frame.
+    # A frame from next() is a view of one ring buffer. It is held
+    # (the camera won't read into it) until the next call to next().
 
     # ------------------------------
     # User Instructions
@@ -36,6 +42,7 @@ class Camera_Thread:
     # Set the number of frames to keep in the buffer (default is 4).
     # Set buffer_all variable: True = no frame loss, for reading files, don't read another frame until buffer allows
     #                          False = allows frame loss, for reading camera, just keep most recent frame reads
+    # Set frame_readonly variable: True = next() frames are read-only views
 
     # Start camera thread using self.start().
 
@@ -44,6 +51,8 @@ class Camera_Thread:
     #    If not black, the default frame value is None.
     #    If timeout, wait up to timeout seconds for a frame to load into the buffer.
     #    If no frame is in the buffer, return the default frame value.
+    #    If stamped, return (frame,sequence number,read time) (None,None for the default frame).
+    #    Copy the frame if it is needed after the next call to next().
 
     # Stop the camera using self.stop()
 
@@ -61,6 +70,7 @@ class Camera_Thread:
     # buffer setup
     buffer_length = 5
     buffer_all = False
+    frame_readonly = False
 
     # ------------------------------
     # System Variables
@@ -70,8 +80,12 @@ class Camera_Thread:
     camera = None
     camera_init = 0.5
 
-    # buffer
-    buffer = None
+    # buffer (ring of frames)
+    buffer = None # array of frames
+    buffer_free = None # ring indexes to read into
+    buffer_ready = None # (index,sequence,time) read but not returned
+    buffer_held = None # ring index returned by next()
+    buffer_lock = None
 
     # control states
     frame_grab_run = False
@@ -80,6 +94,8 @@ class Camera_Thread:
     # counts and amounts
     frame_count = 0
     frames_returned = 0
+    frames_dropped = 0
+    frame_allocations = 0 # reads that did not use the ring
     current_frame_rate = 0
     loop_start_time = 0
 
@@ -89,13 +105,6 @@ class Camera_Thread:
 
     def start(self):
 
-        # buffer
-        if self.buffer_all:
-            self.buffer = queue.Queue(self.buffer_length)
-        else:
-            # last frame only
-            self.buffer = queue.Queue(1)
-
         # camera setup
         self.camera = cv2.VideoCapture(self.camera_source)
         self.camera.set(3,self.camera_width)
@@ -114,6 +123,10 @@ class Camera_Thread:
         # black frame (filler)
         self.black_frame = np.zeros((self.camera_height,self.camera_width,3),np.uint8)
 
+        # buffer
+        self.buffer_lock = threading.Condition()
+        self.buffer_setup((self.camera_height,self.camera_width,3))
+
         # set run state
         self.frame_grab_run = True
         
@@ -121,6 +134,19 @@ class Camera_Thread:
         self.thread = threading.Thread(target=self.loop)
         self.thread.start()
 
+    def buffer_setup(self,shape):
+
+        # same frames as the queue: buffer_length ready (or one being read),
+        # the last one if frames can be lost, plus one held by next()
+        if self.buffer_all:
+            size = self.buffer_length + 1
+        else:
+            size = 3
+        self.buffer = np.zeros((size,)+tuple(shape),np.uint8)
+        self.buffer_free = collections.deque(range(size))
+        self.buffer_ready = collections.deque()
+        self.buffer_held = None
+
     def stop(self):
 
         # set loop kill state
@@ -138,15 +164,18 @@ class Camera_Thread:
                 pass
         self.camera = None
 
-        # drop buffer
-        self.buffer = None
+        # drop buffer (frames already returned stay valid)
+        if self.buffer_lock:
+            with self.buffer_lock:
+                self.buffer = None
+                self.buffer_ready = None
+                self.buffer_lock.notify_all()
 
     def loop(self):
 
-        # load start frame
-        frame = self.black_frame
-        if not self.buffer.full():
-            self.buffer.put(frame,False)
+        # load start frame (black)
+        with self.buffer_lock:
+            self.buffer_ready.append((self.buffer_free.popleft(),0,time.time()))
 
         # status
         self.frame_grab_on = True
@@ -163,41 +192,404 @@ class Camera_Thread:
             if not self.frame_grab_run:
                 break
 
-            # true buffered mode (for files, no loss)
-            if self.buffer_all:
+            # get a buffer to read into
+            with self.buffer_lock:
+
+                # true buffered mode (for files, no loss)
+                # buffer is full, wait for next()
+                if self.buffer_all:
+                    if not self.buffer_free:
+                        self.buffer_lock.wait(1/self.camera_frame_rate)
+                        continue
+                    index = self.buffer_free.popleft()
+
+                # false buffered mode (for camera, loss allowed)
+                # reuse the oldest frame not returned
+                elif self.buffer_free:
+                    index = self.buffer_free.popleft()
+                else:
+                    index = self.buffer_ready.popleft()[0]
+                    self.frames_dropped += 1
 
-                # buffer is full, pause and loop
-                if self.buffer.full():
-                    time.sleep(1/self.camera_frame_rate)
+                frame = self.buffer[index]
 
-                # or load buffer with next frame
-                else:
-                    
-                    grabbed,frame = self.camera.read()
+            # read into the buffer
+            grabbed,image = self.camera.read(image=frame)
+            if not grabbed:
+                break
+
+            # camera made a new array (other size or type)
+            if not np.shares_memory(image,frame):
+                self.frame_allocations += 1
+                if image.shape != frame.shape:
+                    with self.buffer_lock:
+                        self.buffer_setup(image.shape)
+                        index = self.buffer_free.popleft()
+                        frame = self.buffer[index]
+                frame[...] = image
+
+            # frame is ready
+            with self.buffer_lock:
+
+                # loss allowed, keep the most recent frame only
+                if not self.buffer_all:
+                    while self.buffer_ready:
+                        self.buffer_free.append(self.buffer_ready.popleft()[0])
+                        self.frames_dropped += 1
+
+                self.frame_count += 1
+                self.buffer_ready.append((index,self.frame_count,time.time()))
+                self.buffer_lock.notify_all()
+                fc += 1
+
+            # update frame read rate
+            if fc >= 10:
+                self.current_frame_rate = round(fc/(time.time()-t1),2)
+                fc = 0
+                t1 = time.time()
+
+        # shut down
+        self.loop_start_time = 0
+        self.frame_grab_on = False
+        self.stop()
+
+    def next(self,black=True,wait=0,stamped=False):
+
+        # black frame default
+        if black:
+            frame = self.black_frame
+
+        # no frame default
+        else:
+            frame = None
+
+        sequence,read_time = None,None
+
+        # get from buffer (fail if empty)
+        if self.buffer_lock:
+            with self.buffer_lock:
+                if wait and not self.buffer_ready:
+                    self.buffer_lock.wait_for(lambda: self.buffer_ready or self.buffer is None,wait)
+                if self.buffer_ready:
+
+                    # hold this one, free the last one
+                    index,sequence,read_time = self.buffer_ready.popleft()
+                    if self.buffer_held is not None:
+                        self.buffer_free.append(self.buffer_held)
+                    self.buffer_held = index
+                    self.buffer_lock.notify_all()
+
+                    frame = self.buffer[index]
+                    if self.frame_readonly:
+                        frame.flags.writeable = False
+                    self.frames_returned += 1
+
+        # done
+        if stamped:
+            return frame,sequence,read_time
+        return frame
+
+# ------------------------------
+# Camera Group
+# ------------------------------
+
+class Camera_Group:
+
+    # Reads two or more cameras in one thread and returns time-matched
+    # frame sets, for stereo work (two Camera_Threads are not in step,
+    # so left and right frames can be a frame period apart).
+
+    # Each pass grab()s every camera back to back (a fast latch, no
+    # decode), timestamps each grab, then retrieve()s each one into a
+    # preallocated ring of frame sets (same ring as Camera_Thread).
+    # If the grab times are more than max_skew apart, the camera that
+    # is behind is grabbed again (up to max_regrabs times). A set that
+    # is still too far apart is handled by skew_policy.
+
+    # ------------------------------
+    # User Instructions
+    # ------------------------------
+
+    # Using the user variables (see below):
+    # Set the camera sources list (default is cameras 0 and 1).
+    # Set the camera pixel width and height (default is 640x480).
+    # Set the target (max) frame rate (default is 30).
+    # Set max_skew: seconds allowed between the frames in a set (None = 1/2 frame period).
+    # Set skew_policy: 'drop' = skip sets over max_skew
+    #                  'keep' = return them anyway (counted as over)
+    # Set timestamps: 'clock' = time.time() after each grab (cameras)
+    #                 'stream' = CAP_PROP_POS_MSEC of the grabbed frame (files)
+    #                 'auto' = 'stream' for file names, else 'clock'
+    # Set camera_offsets: seconds added to each camera's timestamps (None = 0 for all),
+    #                     for files that did not start recording at the same time.
+    # Set buffer_length, buffer_all and frame_readonly as for Camera_Thread.
+
+    # Start the cameras using self.start().
+
+    # Get the next set using self.next(black=True,wait=1).
+    #    Returns a tuple of frames, one per camera source.
+    #    If black, the default frames are black frames, else None.
+    #    If stamped, return (frames,sequence number,timestamps).
+    #    Copy the frames if they are needed after the next call to next().
+
+    # Get the skew distribution using self.skew_report() (or print it with self.report()).
+
+    # Stop the cameras using self.stop()
+
+    # ------------------------------
+    # User Variables
+    # ------------------------------
 
-                    if not grabbed:
-                        break
+    # camera setup
+    camera_sources = [0,1]
+    camera_width = 640
+    camera_height = 480
+    camera_frame_rate = 30
+    camera_fourcc = cv2.VideoWriter_fourcc(*"MJPG")
+
+    # time matching
+    max_skew = None
+    max_regrabs = 2
+    skew_policy = 'drop'
+    timestamps = 'auto'
+    camera_offsets = None
+
+    # buffer setup
+    buffer_length = 5
+    buffer_all = False
+    frame_readonly = False
 
-                    self.buffer.put(frame,False)
-                    self.frame_count += 1
-                    fc += 1
+    # ------------------------------
+    # System Variables
+    # ------------------------------
 
-            # false buffered mode (for camera, loss allowed)
+    # cameras
+    cameras = None
+    camera_init = 0.5
+
+    # buffer (ring of frame sets)
+    buffer = None # list of frame arrays, one per camera
+    buffer_free = None # ring indexes to read into
+    buffer_ready = None # (index,sequence,timestamps) read but not returned
+    buffer_held = None # ring index returned by next()
+    buffer_lock = None
+
+    # control states
+    frame_grab_run = False
+    frame_grab_on = False
+
+    # counts and amounts
+    frame_count = 0
+    frames_returned = 0
+    frames_dropped = 0
+    frame_allocations = 0
+    current_frame_rate = 0
+    loop_start_time = 0
+
+    # skew
+    skews = None # recent set skews (seconds)
+    skew_history = 1000
+    skew_over = 0 # sets over max_skew
+    skew_dropped = 0 # sets dropped by skew_policy
+    regrabs = 0 # extra grabs to catch up
+
+    # ------------------------------
+    # Functions
+    # ------------------------------
+
+    def start(self):
+
+        # camera setup
+        self.cameras = []
+        for source in self.camera_sources:
+            camera = cv2.VideoCapture(source)
+            camera.set(3,self.camera_width)
+            camera.set(4,self.camera_height)
+            camera.set(5,self.camera_frame_rate)
+            camera.set(6,self.camera_fourcc)
+            self.cameras.append(camera)
+        time.sleep(self.camera_init)
+
+        # camera image vars (the first camera sets the frame rate)
+        self.camera_shapes = [(int(camera.get(4)),int(camera.get(3)),3) for camera in self.cameras]
+        self.camera_frame_rate = int(self.cameras[0].get(5)) or self.camera_frame_rate
+        if self.max_skew is None:
+            self.max_skew = 0.5/self.camera_frame_rate
+
+        # timestamp source per camera
+        self.camera_stream_times = []
+        for source in self.camera_sources:
+            if self.timestamps == 'auto':
+                self.camera_stream_times.append(type(source) == str)
             else:
+                self.camera_stream_times.append(self.timestamps == 'stream')
+        self.camera_offsets = list(self.camera_offsets or [0]*len(self.cameras))
+
+        # black frames (filler)
+        self.black_frames = tuple(np.zeros(shape,np.uint8) for shape in self.camera_shapes)
+
+        # buffer
+        self.buffer_lock = threading.Condition()
+        self.buffer_setup(self.camera_shapes)
+        self.skews = collections.deque(maxlen=self.skew_history)
+
+        # set run state
+        self.frame_grab_run = True
+
+        # start thread
+        self.thread = threading.Thread(target=self.loop)
+        self.thread.start()
+
+    def buffer_setup(self,shapes):
+
+        # same sizes as Camera_Thread, one array per camera
+        if self.buffer_all:
+            size = self.buffer_length + 1
+        else:
+            size = 3
+        self.buffer = [np.zeros((size,)+tuple(shape),np.uint8) for shape in shapes]
+        self.buffer_free = collections.deque(range(size))
+        self.buffer_ready = collections.deque()
+        self.buffer_held = None
+
+    def stop(self):
 
-                grabbed,frame = self.camera.read()
+        # set loop kill state
+        self.frame_grab_run = False
+
+        # let loop stop
+        while self.frame_grab_on:
+            time.sleep(0.1)
+
+        # stop cameras if not already stopped
+        for camera in self.cameras or []:
+            try:
+                camera.release()
+            except:
+                pass
+        self.cameras = None
+
+        # drop buffer (frames already returned stay valid)
+        if self.buffer_lock:
+            with self.buffer_lock:
+                self.buffer = None
+                self.buffer_ready = None
+                self.buffer_lock.notify_all()
+
+    def grab(self,n):
+
+        # grab one camera, return its timestamp (None if no frame)
+        camera = self.cameras[n]
+        if not camera.grab():
+            return None
+        if self.camera_stream_times[n]:
+            return camera.get(cv2.CAP_PROP_POS_MSEC)/1000 + self.camera_offsets[n]
+        return time.time() + self.camera_offsets[n]
+
+    def grab_set(self):
+
+        # grab all back to back
+        times = [self.grab(n) for n in range(len(self.cameras))]
+        if None in times:
+            return None
+
+        # catch up the camera that is behind
+        regrabs = 0
+        while max(times)-min(times) > self.max_skew and regrabs < self.max_regrabs:
+            n = times.index(min(times))
+            times[n] = self.grab(n)
+            if times[n] is None:
+                return None
+            regrabs += 1
+        self.regrabs += regrabs
+
+        return times
+
+    def loop(self):
+
+        # load start frames (black)
+        with self.buffer_lock:
+            self.buffer_ready.append((self.buffer_free.popleft(),0,None))
+
+        # status
+        self.frame_grab_on = True
+        self.loop_start_time = time.time()
+
+        # frame rate
+        fc = 0
+        t1 = time.time()
+
+        # loop
+        while 1:
+
+            # external shut down
+            if not self.frame_grab_run:
+                break
+
+            # true buffered mode (for files, no loss)
+            # buffer is full, wait for next()
+            if self.buffer_all:
+                with self.buffer_lock:
+                    if not self.buffer_free:
+                        self.buffer_lock.wait(1/self.camera_frame_rate)
+                        continue
+
+            # grab a time-matched set
+            times = self.grab_set()
+            if times is None:
+                break
+            skew = max(times)-min(times)
+            self.skews.append(skew)
+            if skew > self.max_skew:
+                self.skew_over += 1
+                if self.skew_policy == 'drop':
+                    self.skew_dropped += 1
+                    continue
+
+            # get a buffer to read into
+            with self.buffer_lock:
+                if self.buffer_free:
+                    index = self.buffer_free.popleft()
+                else:
+                    index = self.buffer_ready.popleft()[0]
+                    self.frames_dropped += 1
+
+            # retrieve into the buffer
+            for n,camera in enumerate(self.cameras):
+                frame = self.buffer[n][index]
+                grabbed,image = camera.retrieve(image=frame)
                 if not grabbed:
                     break
 
-                # open a spot in the buffer
-                if self.buffer.full():
-                    self.buffer.get()
+                # camera made a new array (other size or type)
+                if not np.shares_memory(image,frame):
+                    self.frame_allocations += 1
+                    if image.shape != frame.shape:
+                        with self.buffer_lock:
+                            self.camera_shapes[n] = image.shape
+                            self.buffer[n] = np.zeros((len(self.buffer[n]),)+image.shape,np.uint8)
+                            frame = self.buffer[n][index]
+                    frame[...] = image
+            else:
+                grabbed = True
+            if not grabbed:
+                break
+
+            # set is ready
+            with self.buffer_lock:
+
+                # loss allowed, keep the most recent set only
+                if not self.buffer_all:
+                    while self.buffer_ready:
+                        self.buffer_free.append(self.buffer_ready.popleft()[0])
+                        self.frames_dropped += 1
 
-                self.buffer.put(frame,False)
                 self.frame_count += 1
+                self.buffer_ready.append((index,self.frame_count,tuple(times)))
+                self.buffer_lock.notify_all()
                 fc += 1
 
-            # update frame read rate
+            # update set read rate
             if fc >= 10:
                 self.current_frame_rate = round(fc/(time.time()-t1),2)
                 fc = 0
@@ -208,28 +600,61 @@ class Camera_Thread:
         self.frame_grab_on = False
         self.stop()
 
-    def next(self,black=True,wait=0):
+    def next(self,black=True,wait=0,stamped=False):
 
-        # black frame default
+        # black frames default
         if black:
-            frame = self.black_frame
+            frames = self.black_frames
 
         # no frame default
         else:
-            frame = None
+            frames = (None,)*len(self.camera_sources)
+
+        sequence,times = None,None
 
         # get from buffer (fail if empty)
-        try:
-            frame = self.buffer.get(timeout=wait)
-            self.frames_returned += 1
-        except queue.Empty:
-            #print('Queue Empty!')
-            #import traceback
-            #print(traceback.format_exc())
-            pass
+        if self.buffer_lock:
+            with self.buffer_lock:
+                if wait and not self.buffer_ready:
+                    self.buffer_lock.wait_for(lambda: self.buffer_ready or self.buffer is None,wait)
+                if self.buffer_ready:
+
+                    # hold this set, free the last one
+                    index,sequence,times = self.buffer_ready.popleft()
+                    if self.buffer_held is not None:
+                        self.buffer_free.append(self.buffer_held)
+                    self.buffer_held = index
+                    self.buffer_lock.notify_all()
+
+                    frames = tuple(buffer[index] for buffer in self.buffer)
+                    if self.frame_readonly:
+                        for frame in frames:
+                            frame.flags.writeable = False
+                    self.frames_returned += 1
 
         # done
-        return frame
+        if stamped:
+            return frames,sequence,times
+        return frames
+
+    def skew_report(self):
+
+        # skew distribution of recent sets (milliseconds)
+        skews = np.array(self.skews or [0])*1000
+        return {'sets':len(self.skews or []),
+                'mean':float(np.mean(skews)),
+                'p50':float(np.percentile(skews,50)),
+                'p95':float(np.percentile(skews,95)),
+                'max':float(np.max(skews)),
+                'over':self.skew_over,
+                'dropped':self.skew_dropped,
+                'regrabs':self.regrabs,
+                }
+
+    def report(self):
+
+        r = self.skew_report()
+        print('SKEW ms: mean {mean:.1f} p50 {p50:.1f} p95 {p95:.1f} max {max:.1f} (sets {sets}, over {over}, dropped {dropped}, regrabs {regrabs})'.format(**r))
 
 # ------------------------------
 # Motion Detection
@@ -237,17 +662,49 @@ class Camera_Thread:
 
 class Frame_Motion:
 
+    # Motion targets from frame differences. The steps are:
+    # gray, pyramid (optional downscale), blur, background delta,
+    # threshold, dilation, contours, then targets at full resolution.
+
+    # All images between steps are preallocated buffers (reused while
+    # the frame size and settings stay the same). Set timing = True for
+    # the seconds spent in each step (see timing_report).
+
     # ------------------------------
     # User Instructions
     # ------------------------------
 
+    # Using the user variables (see below):
+    # Set pyramid_levels: detect on a frame halved this many times (0 = full resolution).
+    #    The blur and dilation sizes are given at full resolution and are scaled down.
+    #    Targets, boxes and contours are returned and drawn at full resolution.
+    # Set background: 'last' = difference from the last frame (default)
+    #                 'average' = difference from a running average (background_alpha = update rate)
+    #                 'mog2' = OpenCV MOG2 background subtractor (background_history, background_variance)
+    #                 A subclass can add its own by overriding background_delta().
+    # Set roi_mask: full resolution uint8 array, motion only where mask > 0 (None = whole frame).
+
+    # Get targets using self.targets(frame).
+
     # ------------------------------
     # User Variables
     # ------------------------------
 
+    # detection pyramid
+    pyramid_levels = 0
+
     # blur (must be positive and odd)
     gaussian_blur = 15
 
+    # background model
+    background = 'last'
+    background_alpha = 0.05
+    background_history = 500
+    background_variance = 16
+
+    # region of interest
+    roi_mask = None
+
     # threshold
     threshold = 15
 
@@ -286,47 +743,167 @@ class Frame_Motion:
     targets_pline = -1 # border width
     targets_color = (0,0,255) # BGR color
 
+    # stage timing
+    timing = False
+
     # ------------------------------
     # System Variables
     # ------------------------------
 
     last_frame = None
 
+    # buffers (detection size)
+    buffers = None
+    buffers_key = None
+    model = None # running average or MOG2
+
+    # stage timing {stage:seconds}
+    stage_times = None
+    stage_frames = 0
+
     # ------------------------------
     # Functions
     # ------------------------------
 
+    def setup(self,shape):
+
+        # detection size
+        height,width = shape[:2]
+        scale = 2**self.pyramid_levels
+        levels = [(height,width)]
+        for n in range(self.pyramid_levels):
+            h,w = levels[-1]
+            levels.append(((h+1)//2,(w+1)//2))
+        h,w = levels[-1]
+
+        # buffers
+        self.buffers = {'gray':np.empty((height,width),np.uint8),
+                        'levels':[np.empty(hw,np.uint8) for hw in levels[1:]],
+                        'blur':np.empty((h,w),np.uint8),
+                        'last':np.empty((h,w),np.uint8),
+                        'delta':np.empty((h,w),np.uint8),
+                        'mask':np.empty((h,w),np.uint8),
+                        }
+        self.last_frame = None
+        self.model = None
+
+        # sizes at detection scale
+        blur = max(1,int(self.gaussian_blur/scale)) | 1
+        self.detect_blur = (blur,blur)
+        dilation = max(1,round(self.dilation_kernel.shape[0]/scale))
+        self.detect_kernel = np.ones((dilation,dilation),np.uint8)
+        self.detect_scale = scale
+
+        # roi at detection scale
+        self.detect_roi = None
+        if self.roi_mask is not None:
+            self.detect_roi = cv2.resize(self.roi_mask,(w,h),interpolation=cv2.INTER_NEAREST)
+
+        self.buffers_key = self.settings_key(shape)
+
+    def settings_key(self,shape):
+        return (shape[:2],self.pyramid_levels,self.gaussian_blur,self.dilation_kernel.shape,self.background,id(self.roi_mask))
+
+    def stage(self,name,t1):
+
+        # add the time since t1 to a stage, return now
+        t2 = time.perf_counter()
+        self.stage_times[name] = self.stage_times.get(name,0) + t2-t1
+        return t2
+
+    def timing_report(self):
+
+        # milliseconds per frame for each stage
+        frames = max(1,self.stage_frames)
+        times = {name:1000*seconds/frames for name,seconds in (self.stage_times or {}).items()}
+        times['total'] = sum(times.values())
+        return times
+
+    def background_delta(self,blurred,delta):
+
+        # difference from the last frame
+        if self.background == 'last':
+            if self.last_frame is None:
+                return None
+            cv2.absdiff(self.last_frame,blurred,dst=delta)
+            return delta
+
+        # difference from a running average
+        elif self.background == 'average':
+            if self.model is None:
+                self.model = blurred.astype(np.float32)
+                return None
+            cv2.absdiff(cv2.convertScaleAbs(self.model),blurred,dst=delta)
+            cv2.accumulateWeighted(blurred,self.model,self.background_alpha)
+            return delta
+
+        # MOG2 foreground (already a 0/255 mask)
+        elif self.background == 'mog2':
+            if self.model is None:
+                self.model = cv2.createBackgroundSubtractorMOG2(self.background_history,self.background_variance,False)
+            self.model.apply(blurred,delta)
+            return delta
+
+        raise ValueError('unknown background: {}'.format(self.background))
+
     def targets(self,frame):
 
-        # frame dimensions
-        width,height,depth = np.shape(frame)
-        area = width*height
+        # buffers for this frame size and settings
+        if self.buffers is None or self.buffers_key != self.settings_key(frame.shape):
+            self.setup(frame.shape)
+        buffers = self.buffers
+        if self.timing:
+            if self.stage_times is None:
+                self.stage_times = {}
+            self.stage_frames += 1
+        t1 = time.perf_counter()
+        stage = self.stage if self.timing else lambda name,t1: t1
 
         # grayscale
-        frame2 = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+        frame2 = cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY,dst=buffers['gray'])
+        t1 = stage('gray',t1)
+
+        # pyramid
+        for level in buffers['levels']:
+            frame2 = cv2.pyrDown(frame2,dst=level,dstsize=level.shape[::-1])
+        t1 = stage('pyramid',t1)
 
         # blur
-        frame2 = cv2.GaussianBlur(frame2,(self.gaussian_blur,self.gaussian_blur),0)
+        frame2 = cv2.GaussianBlur(frame2,self.detect_blur,0,dst=buffers['blur'])
+        t1 = stage('blur',t1)
 
-        # initialize compare frame
-        if self.last_frame is None:
+        # delta (None = no background yet)
+        frame3 = self.background_delta(frame2,buffers['delta'])
+        t1 = stage('delta',t1)
+
+        # keep this frame (swap buffers, no copy)
+        if self.background == 'last':
             self.last_frame = frame2
+            buffers['blur'],buffers['last'] = buffers['last'],buffers['blur']
+        if frame3 is None:
             return []
 
-        # delta
-        frame3 = cv2.absdiff(self.last_frame,frame2)
+        # threshold (mog2 is already a mask)
+        if self.background != 'mog2':
+            cv2.threshold(frame3,self.threshold,255,cv2.THRESH_BINARY,dst=frame3)
 
-        # threshold
-        frame3 = cv2.threshold(frame3,self.threshold,255,cv2.THRESH_BINARY)[1]
+        # region of interest
+        if self.detect_roi is not None:
+            cv2.bitwise_and(frame3,self.detect_roi,dst=frame3)
+        t1 = stage('threshold',t1)
 
         # dilation
-        frame3 = cv2.dilate(frame3,self.dilation_kernel,iterations=self.dilation_iterations)
+        frame3 = cv2.dilate(frame3,self.detect_kernel,dst=buffers['mask'],iterations=self.dilation_iterations)
+        t1 = stage('dilate',t1)
 
         # get contours
         # older opencv: frame3,contours,hierarchy = cv2.findContours(frame3,cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_SIMPLE)
         contours,hierarchy = cv2.findContours(frame3,cv2.RETR_EXTERNAL,cv2.CHAIN_APPROX_SIMPLE)
+        t1 = stage('contours',t1)
 
-        # targets
+        # targets (percent size at detection scale, positions at full scale)
+        area = frame3.shape[0]*frame3.shape[1]
+        scale = self.detect_scale
         targets = []
         for c in contours:
                     
@@ -340,27 +917,27 @@ class Frame_Motion:
                 p = 100*ca/area
                 if (p >= self.contour_min_area) and (p <= self.contour_max_area):
                     M = cv2.moments(c)#;print( M )
-                    tx = int(M['m10']/M['m00'])
-                    ty = int(M['m01']/M['m00'])
-                    targets.append((p,tx,ty,bx,by,bw,bh,c))
+                    tx = int(scale*M['m10']/M['m00'])
+                    ty = int(scale*M['m01']/M['m00'])
+                    targets.append((p,tx,ty,bx*scale,by*scale,bw*scale,bh*scale,c))
 
             # target on contour box
             else:
                 p = 100*ba/area
                 if (p >= self.contour_min_area) and (p <= self.contour_max_area):
-                    tx = bx+int(bw/2)
-                    ty = by+int(bh/2)
-                    targets.append((p,tx,ty,bx,by,bw,bh,c))
+                    tx = int(scale*(bx+bw/2))
+                    ty = int(scale*(by+bh/2))
+                    targets.append((p,tx,ty,bx*scale,by*scale,bw*scale,bh*scale,c))
 
-        # select targets
-        targets.sort()
-        targets.reverse()
+        # select targets (largest first, sort on size only)
+        targets.sort(key=lambda target: target[0],reverse=True)
         targets = targets[:self.targets_max]
+        t1 = stage('select',t1)
 
         # add contours to frame
         if self.contour_draw:
             for size,x,y,bx,by,bw,bh,c in targets:
-                cv2.drawContours(frame,[c],0,self.contour_color,self.contour_line)
+                cv2.drawContours(frame,[c*scale],0,self.contour_color,self.contour_line)
                 cv2.circle(frame,(x,y),self.contour_point,self.contour_color,self.contour_pline)
 
         # add contour boxes to frame
@@ -373,9 +950,7 @@ class Frame_Motion:
         if self.targets_draw:
             for size,x,y,bx,by,bw,bh,c in targets:
                 cv2.circle(frame,(x,y),self.targets_point,self.targets_color,self.targets_pline)
-
-        # reset last frame
-        self.last_frame = frame2
+        t1 = stage('draw',t1)
 
         # return target x,y
         if self.target_return_box:
@@ -423,6 +998,11 @@ class Frame_Angles:
     # This is the reverse of angles_from_center.
     # If degrees is True, input x,y should be in degrees, otherwise radians.
 
+    # Use pairs(pdistance,ltargets,rtargets,center=False) to triangulate many targets at once.
+    # Every left/right pair is located in one numpy call, then pairs are chosen on
+    # the same epipolar line (pair_epipolar degrees) and similar size (pair_size percent).
+    # The _many functions are array versions of angles_from_center, intersection and location.
+
     # Use frame_add_crosshairs(frame) to add crosshairs to a frame.
     # Use frame_add_degrees(frame) to add 10 degree lines to a frame (matches target).
     # Use frame_make_target(openfile=True) to make an SVG image target and open it (matches frame with degrees).
@@ -436,6 +1016,10 @@ class Frame_Angles:
 
     angle_width = 60
     angle_height = None
+
+    # target pairs (see pairs)
+    pair_epipolar = 2 # max y angle difference (degrees)
+    pair_size = 2 # max size difference (percent of frame)
     
     # ------------------------------
     # System Variables
@@ -619,6 +1203,120 @@ class Frame_Angles:
         # done
         return X,Y,Z,D
     
+    # ------------------------------
+    # Array Functions (many targets)
+    # ------------------------------
+
+    def angles_from_center_many(self,x,y,top_left=True,degrees=True):
+
+        # angles_from_center for arrays of x,y (returns arrays)
+
+        x = np.asarray(x,np.float64)
+        y = np.asarray(y,np.float64)
+
+        if top_left:
+            x = x - self.x_origin
+            y = self.y_origin - y
+
+        xrad = np.arctan(x/self.x_adjacent)
+        yrad = np.arctan(y/self.y_adjacent)
+
+        if not degrees:
+            return xrad,yrad
+
+        return np.degrees(xrad),np.degrees(yrad)
+
+    def intersection_many(self,pdistance,langle,rangle,degrees=False):
+
+        # intersection for arrays of angles (broadcast, returns X,Y arrays)
+        # same as intersection: Y = pdistance/(tan(langle)-tan(rangle)), X = Y*tan(langle)
+
+        langle = np.asarray(langle,np.float64)
+        rangle = np.asarray(rangle,np.float64)
+
+        if degrees:
+            langle = np.radians(langle)
+            rangle = np.radians(rangle)
+
+        ltan = np.tan(langle)
+        rtan = np.tan(rangle)
+
+        with np.errstate(divide='ignore',invalid='ignore'):
+            Y = pdistance / (ltan - rtan)
+        X = Y*ltan
+
+        return X,Y
+
+    def location_many(self,pdistance,lcameras,rcameras,center=False,degrees=True):
+
+        # location for arrays of (Xangle,Yangle) pairs (broadcast)
+        # lcameras and rcameras are (...,2) arrays, returns (...,4) array of X,Y,Z,D
+
+        lcameras = np.asarray(lcameras,np.float64)
+        rcameras = np.asarray(rcameras,np.float64)
+
+        lxangle,lyangle = lcameras[...,0],lcameras[...,1]
+        rxangle,ryangle = rcameras[...,0],rcameras[...,1]
+
+        yangle = (lyangle+ryangle)/2
+
+        if degrees:
+            lxangle = np.radians(lxangle)
+            rxangle = np.radians(rxangle)
+            yangle  = np.radians( yangle)
+
+        X,Z = self.intersection_many(pdistance,lxangle,rxangle,degrees=False)
+
+        Y = np.tan(yangle) * np.hypot(X,Z)
+
+        if center:
+            X = X - pdistance/2
+
+        D = np.sqrt(X**2+Y**2+Z**2)
+
+        return np.stack((X,Y,Z,D),axis=-1)
+
+    def pairs(self,pdistance,ltargets,rtargets,center=False):
+
+        # triangulate every left/right target pair at once, then pair them up
+        # ltargets,rtargets = lists of (x,y) or (x,y,percent_frame_size) from top left
+        # (Frame_Motion.targets with target_return_size = True)
+
+        # a pair must be:
+        #   in front of the cameras (positive distance from the baseline)
+        #   on the same epipolar line (y angles within pair_epipolar degrees)
+        #   a similar size (within pair_size percent of frame, if sizes are given)
+        # best pairs (smallest y angle + size difference) are taken first,
+        # each target is used once
+
+        # returns [(X,Y,Z,D,left index,right index),...] best first
+
+        if not len(ltargets) or not len(rtargets):
+            return []
+
+        ltargets = np.asarray(ltargets,np.float64)
+        rtargets = np.asarray(rtargets,np.float64)
+
+        # angles (degrees)
+        lx,ly = self.angles_from_center_many(ltargets[:,0],ltargets[:,1],top_left=True,degrees=True)
+        rx,ry = self.angles_from_center_many(rtargets[:,0],rtargets[:,1],top_left=True,degrees=True)
+
+        # all pairs (left rows, right columns)
+        lcameras = np.stack(np.broadcast_arrays(lx[:,None],ly[:,None]),axis=-1)
+        rcameras = np.stack(np.broadcast_arrays(rx[None,:],ry[None,:]),axis=-1)
+        locations = self.location_many(pdistance,lcameras,rcameras,center=center,degrees=True)
+
+        # pair cost and limits
+        ydiff = np.abs(ly[:,None]-ry[None,:])
+        cost = ydiff/self.pair_epipolar
+        valid = (lx[:,None] > rx[None,:]) & (ydiff <= self.pair_epipolar)
+        if ltargets.shape[1] > 2 and rtargets.shape[1] > 2:
+            sdiff = np.abs(ltargets[:,2][:,None]-rtargets[:,2][None,:])
+            cost = cost + sdiff/self.pair_size
+            valid &= sdiff <= self.pair_size
+
+        return [tuple(locations[l,r].tolist())+(l,r) for l,r in match(cost,valid)]
+
     # ------------------------------
     # Tertiary Functions
     # ------------------------------
@@ -713,6 +1411,194 @@ class Frame_Angles:
             import webbrowser
             webbrowser.open(os.path.abspath(outfilename))
 
+# ------------------------------
+# Target Tracking
+# ------------------------------
+
+class Target_Tracker:
+
+    # Tracks many targets in 3D (X,Y,Z from Frame_Angles.pairs) with a
+    # constant velocity Kalman filter per target. All tracks are
+    # predicted and updated together as numpy arrays.
+
+    # ------------------------------
+    # User Instructions
+    # ------------------------------
+
+    # Using the user variables (see below):
+    # Set frame_rate (time step when update is not given a time).
+    # Set process_noise (how fast a target can change speed, units/second**2).
+    # Set measure_noise (location error, units, or (X,Y,Z) errors, Z is distance from the baseline).
+    # Set gate (chi-square distance, 3 degrees of freedom, 11.3 = 99%).
+    # Set min_hits (updates before a track is returned) and max_misses (frames before it is dropped).
+
+    # Use self.update(locations,t=None,data=None) once per frame.
+    #    locations = [(X,Y,Z),...] for this frame (can be empty)
+    #    t = frame time in seconds (None = 1/frame_rate after the last update)
+    #    data = list of anything, one per location, kept with the track it updates
+    #    Returns confirmed tracks, oldest first:
+    #    [(id,X,Y,Z,D,vX,vY,vZ,data),...]
+
+    # ------------------------------
+    # User Variables
+    # ------------------------------
+
+    frame_rate = 30
+    process_noise = 100
+    measure_noise = (0.5,0.5,2) # distance (Z) error is the largest
+    gate = 11.3
+    min_hits = 3
+    max_misses = 5
+    start_speed = 100 # velocity uncertainty of a new track (units/second)
+
+    # ------------------------------
+    # System Variables
+    # ------------------------------
+
+    state = None # (tracks,6) X,Y,Z,vX,vY,vZ
+    covariance = None # (tracks,6,6)
+    ids = None
+    hits = None
+    misses = None
+    data = None
+    next_id = 1
+    last_time = None
+
+    # ------------------------------
+    # Functions
+    # ------------------------------
+
+    def __init__(self):
+
+        self.state = np.zeros((0,6))
+        self.covariance = np.zeros((0,6,6))
+        self.ids = np.zeros(0,np.int64)
+        self.hits = np.zeros(0,np.int64)
+        self.misses = np.zeros(0,np.int64)
+        self.data = []
+
+        # measure X,Y,Z of X,Y,Z,vX,vY,vZ
+        self.H = np.eye(3,6)
+
+    def predict(self,dt):
+
+        # x = F x, P = F P F' + Q (all tracks)
+        F = np.eye(6)
+        F[:3,3:] = np.eye(3)*dt
+
+        # white acceleration noise
+        q = self.process_noise**2
+        Q = np.zeros((6,6))
+        Q[:3,:3] = np.eye(3)*q*dt**4/4
+        Q[:3,3:] = Q[3:,:3] = np.eye(3)*q*dt**3/2
+        Q[3:,3:] = np.eye(3)*q*dt**2
+
+        self.state = self.state @ F.T
+        self.covariance = F @ self.covariance @ F.T + Q
+
+    def update(self,locations,t=None,data=None):
+
+        locations = np.asarray(locations,np.float64).reshape(-1,3)
+        if data is None:
+            data = [None]*len(locations)
+
+        # time step
+        if t is None or self.last_time is None:
+            dt = 1/self.frame_rate
+        else:
+            dt = max(t-self.last_time,1e-6)
+        if t is not None:
+            self.last_time = t
+        self.predict(dt)
+
+        # innovation covariance S = H P H' + R, distance of every location to every track
+        R = np.diag(np.broadcast_to(np.asarray(self.measure_noise,np.float64)**2,3))
+        S = self.covariance[:,:3,:3] + R
+        Si = np.linalg.inv(S)
+        y = locations[None,:,:] - self.state[:,None,:3]
+        d2 = np.einsum('tki,tij,tkj->tk',y,Si,y)
+
+        # pair tracks and locations (closest first)
+        matched = match(d2,d2 <= self.gate)
+        tracks = np.array([m[0] for m in matched],np.int64)
+        found = np.array([m[1] for m in matched],np.int64)
+
+        # Kalman update (matched tracks)
+        if len(tracks):
+            P = self.covariance[tracks]
+            K = P[:,:,:3] @ Si[tracks]
+            self.state[tracks] += np.einsum('tij,tj->ti',K,y[tracks,found])
+            self.covariance[tracks] = P - K @ P[:,:3,:]
+            for n,k in zip(tracks,found):
+                self.data[n] = data[k]
+
+        # hits and misses
+        missed = np.ones(len(self.ids),bool)
+        missed[tracks] = False
+        self.hits[tracks] += 1
+        self.misses[tracks] = 0
+        self.misses[missed] += 1
+
+        # drop lost tracks
+        keep = self.misses <= self.max_misses
+        if not np.all(keep):
+            self.state = self.state[keep]
+            self.covariance = self.covariance[keep]
+            self.ids = self.ids[keep]
+            self.hits = self.hits[keep]
+            self.misses = self.misses[keep]
+            self.data = [d for d,k in zip(self.data,keep) if k]
+
+        # new tracks (locations not used)
+        new = np.ones(len(locations),bool)
+        new[found] = False
+        new = np.flatnonzero(new)
+        if len(new):
+            P = np.zeros((len(new),6,6))
+            P[:,:3,:3] = R
+            P[:,3:,3:] = np.eye(3)*self.start_speed**2
+            self.state = np.concatenate((self.state,np.hstack((locations[new],np.zeros((len(new),3))))))
+            self.covariance = np.concatenate((self.covariance,P))
+            self.ids = np.concatenate((self.ids,np.arange(self.next_id,self.next_id+len(new))))
+            self.hits = np.concatenate((self.hits,np.ones(len(new),np.int64)))
+            self.misses = np.concatenate((self.misses,np.zeros(len(new),np.int64)))
+            self.data += [data[k] for k in new]
+            self.next_id += len(new)
+
+        return self.tracks()
+
+    def tracks(self):
+
+        # confirmed tracks (seen this frame or coasting), oldest first
+        tracks = []
+        for n in np.flatnonzero(self.hits >= self.min_hits):
+            X,Y,Z,vX,vY,vZ = self.state[n].tolist()
+            D = math.sqrt(X**2+Y**2+Z**2)
+            tracks.append((int(self.ids[n]),X,Y,Z,D,vX,vY,vZ,self.data[n]))
+        tracks.sort(key=lambda track: track[0])
+        return tracks
+
+# ------------------------------
+# Matching
+# ------------------------------
+
+def match(cost,valid):
+
+    # greedy one-to-one pairs of rows and columns, lowest cost first
+    # returns [(row,column),...] for valid entries only
+
+    rows,columns = np.nonzero(valid)
+    order = np.argsort(cost[rows,columns],kind='stable')
+    used_rows,used_columns = set(),set()
+    pairs = []
+    for r,c in zip(rows[order].tolist(),columns[order].tolist()):
+        if r in used_rows or c in used_columns:
+            continue
+        used_rows.add(r)
+        used_columns.add(c)
+        pairs.append((r,c))
+    return pairs
+
 # ------------------------------
 # end
 # ------------------------------
@@ -41,29 +41,20 @@ def run():
         frame_rate = 20
         camera_separation = 5 + 15/16
 
-        # left camera 1
-        ct1 = tt.Camera_Thread()
-        ct1.camera_source = left_camera_source
-        ct1.camera_width = pixel_width
-        ct1.camera_height = pixel_height
-        ct1.camera_frame_rate = frame_rate
-
-        # right camera 2
-        ct2 = tt.Camera_Thread()
-        ct2.camera_source = right_camera_source
-        ct2.camera_width = pixel_width
-        ct2.camera_height = pixel_height
-        ct2.camera_frame_rate = frame_rate
+        # left and right cameras, time-matched frame pairs
+        cg = tt.Camera_Group()
+        cg.camera_sources = [left_camera_source,right_camera_source]
+        cg.camera_width = pixel_width
+        cg.camera_height = pixel_height
+        cg.camera_frame_rate = frame_rate
+        cg.max_skew = 0.5/frame_rate # seconds between left and right frames
 
         # camera coding
-        #ct1.camera_fourcc = cv2.VideoWriter_fourcc(*"YUYV")
-        #ct2.camera_fourcc = cv2.VideoWriter_fourcc(*"YUYV")
-        ct1.camera_fourcc = cv2.VideoWriter_fourcc(*"MJPG")
-        ct2.camera_fourcc = cv2.VideoWriter_fourcc(*"MJPG")
+        #cg.camera_fourcc = cv2.VideoWriter_fourcc(*"YUYV")
+        cg.camera_fourcc = cv2.VideoWriter_fourcc(*"MJPG")
 
         # start cameras
-        ct1.start()
-        ct2.start()
+        cg.start()
 
         # ------------------------------
         # set up angles 
@@ -81,7 +72,7 @@ def run():
         # using default detect values
         targeter1 = tt.Frame_Motion()
         targeter1.contour_min_area = 1
-        targeter1.targets_max = 1
+        targeter1.targets_max = 4
         targeter1.target_on_contour = True # False = use box size
         targeter1.target_return_box = False # (x,y,bx,by,bw,bh)
         targeter1.target_return_size = True # (x,y,%frame)
@@ -93,7 +84,7 @@ def run():
         # using default detect values
         targeter2 = tt.Frame_Motion()
         targeter2.contour_min_area = 1
-        targeter2.targets_max = 1
+        targeter2.targets_max = 4
         targeter2.target_on_contour = True # False = use box size
         targeter2.target_return_box = False # (x,y,bx,by,bw,bh)
         targeter2.target_return_size = True # (x,y,%frame)
@@ -112,80 +103,50 @@ def run():
         # targeting loop 
         # ------------------------------
 
-        # variables
-        maxsd = 2 # maximum size difference of targets, percent of frame
-        klen  = 3 # length of target queues, positive target frames required to reset set X,Y,Z,D
+        # target pairs
+        angler.pair_epipolar = 2 # maximum y angle difference of targets, degrees
+        angler.pair_size = 2 # maximum size difference of targets, percent of frame
 
-        # target queues
-        x1k,y1k,x2k,y2k = [],[],[],[]
-        x1m,y1m,x2m,y2m = 0,0,0,0
+        # target tracks (Kalman filter per target)
+        tracker = tt.Target_Tracker()
+        tracker.frame_rate = frame_rate
+        tracker.min_hits = 3 # positive target frames required to set X,Y,Z,D
 
         # last positive target
         # from camera baseline midpoint
         X,Y,Z,D = 0,0,0,0
+        tracks = []
 
         # loop
         while 1:
 
             # get frames
-            frame1 = ct1.next(black=True,wait=1)
-            frame2 = ct2.next(black=True,wait=1)
+            (frame1,frame2),sequence,times = cg.next(black=True,wait=1,stamped=True)
 
             # motion detection targets
             targets1 = targeter1.targets(frame1)
             targets2 = targeter2.targets(frame2)
 
-            # check 1: motion in both frames
-            if not (targets1 and targets2):
-                x1k,y1k,x2k,y2k = [],[],[],[] # reset
-            else:
-
-                # split
-                x1,y1,s1 = targets1[0]
-                x2,y2,s2 = targets2[0]
-
-                # check 2: similar size
-                #if 100*(abs(s1-s2)/max(s1,s2)) > minsd:
-                if abs(s1-s2) > maxsd:
-                    x1k,y1k,x2k,y2k = [],[],[],[] # reset
-                else:
-
-                    # update queues
-                    x1k.append(x1)
-                    y1k.append(y1)
-                    x2k.append(x2)
-                    y2k.append(y2)
-
-                    # check 3: queues full
-                    if len(x1k) >= klen:
-
-                        # trim
-                        x1k = x1k[-klen:]
-                        y1k = y1k[-klen:]
-                        x2k = x2k[-klen:]
-                        y2k = y2k[-klen:]
-
-                        # mean values
-                        x1m = sum(x1k)/klen
-                        y1m = sum(y1k)/klen
-                        x2m = sum(x2k)/klen
-                        y2m = sum(y2k)/klen
-                                
-                        # get angles from camera centers
-                        xlangle,ylangle = angler.angles_from_center(x1m,y1m,top_left=True,degrees=True)
-                        xrangle,yrangle = angler.angles_from_center(x2m,y2m,top_left=True,degrees=True)
-                        
-                        # triangulate
-                        X,Y,Z,D = angler.location(camera_separation,(xlangle,ylangle),(xrangle,yrangle),center=True,degrees=True)
-        
+            # triangulate all target pairs (same epipolar line, similar size)
+            pairs = angler.pairs(camera_separation,targets1,targets2,center=True)
+
+            # track (keep the target pixels with each track)
+            if sequence:
+                tracks = tracker.update([p[:3] for p in pairs],
+                                        t=times[0],
+                                        data=[targets1[l][:2]+targets2[r][:2] for X1,Y1,Z1,D1,l,r in pairs])
+
+            # oldest track
+            if tracks:
+                X,Y,Z,D = tracks[0][1:5]
+
             # display camera centers
             angler.frame_add_crosshairs(frame1)
             angler.frame_add_crosshairs(frame2)
 
             # display coordinate data
-            fps1 = int(ct1.current_frame_rate)
-            fps2 = int(ct2.current_frame_rate)
-            text = 'X: {:3.1f}\nY: {:3.1f}\nZ: {:3.1f}\nD: {:3.1f}\nFPS: {}/{}'.format(X,Y,Z,D,fps1,fps2)
+            fps = int(cg.current_frame_rate)
+            text = 'X: {:3.1f}\nY: {:3.1f}\nZ: {:3.1f}\nD: {:3.1f}\nFPS: {}'.format(X,Y,Z,D,fps)
             lineloc = 0
             lineheight = 30
             for t in text.split('\n'):
@@ -201,8 +162,9 @@ def run():
                             cv2.LINE_AA, #
                             False) #
 
-            # display current target
-            if x1k:
+            # display current targets
+            for track in tracks:
+                x1m,y1m,x2m,y2m = track[-1]
                 targeter1.frame_add_crosshairs(frame1,x1m,y1m,48)            
                 targeter2.frame_add_crosshairs(frame2,x2m,y2m,48)            
 
@@ -231,15 +193,10 @@ def run():
     # close all
     # ------------------------------
 
-    # close camera1
-    try:
-        ct1.stop()
-    except:
-        pass
-
-    # close camera2
+    # close cameras
     try:
-        ct2.stop()
+        cg.report()
+        cg.stop()
     except:
         pass
 
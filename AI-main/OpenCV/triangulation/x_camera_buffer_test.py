@@ -0,0 +1,166 @@
+# ------------------------------
+# Notice
+# ------------------------------
+
+# Copyright 2018 Clayton Darwin claytondarwin@gmail.com
+
+# ------------------------------
+# Imports
+# ------------------------------
+
+import os
+import sys
+import time
+import queue
+import tempfile
+import threading
+
+import numpy as np
+import cv2
+
+import targeting_tools as tt
+
+# ------------------------------
+# Camera_Thread buffer test
+# ------------------------------
+
+# Frame allocations per second and consumer latency at 1080p30,
+# Camera_Thread (ring of buffers) vs the old queue of new arrays.
+# The source is a video file (made here if not given), the consumer
+# takes frames at 30 FPS like a display loop.
+
+# usage:
+# python3 x_camera_buffer_test.py [video_file]
+
+width,height,fps = 1920,1080,30
+seconds = 5
+
+# ------------------------------
+# Video File
+# ------------------------------
+
+def make_video(file):
+
+    # moving box on noise (something for MJPG to decode)
+    writer = cv2.VideoWriter(file,cv2.VideoWriter_fourcc(*"MJPG"),fps,(width,height))
+    noise = np.random.default_rng(1).integers(0,64,(height,width,3),dtype=np.uint8)
+    for n in range(fps*seconds):
+        frame = noise.copy()
+        x = (n*20) % (width-200)
+        cv2.rectangle(frame,(x,400),(x+200,600),(0,255,0),-1)
+        writer.write(frame)
+    writer.release()
+
+# ------------------------------
+# Old Camera_Thread (queue of new arrays)
+# ------------------------------
+
+class Queue_Camera_Thread(tt.Camera_Thread):
+
+    # the queue version before the ring: every read() makes a new array
+    # lossy mode drops with get() then put()
+
+    def start(self):
+        self.buffer = queue.Queue(self.buffer_length if self.buffer_all else 1)
+        self.camera = cv2.VideoCapture(self.camera_source)
+        self.black_frame = np.zeros((height,width,3),np.uint8)
+        self.camera_frame_rate = fps
+        self.frame_grab_run = True
+        self.thread = threading.Thread(target=self.loop)
+        self.thread.start()
+
+    def loop(self):
+        self.frame_grab_on = True
+        while self.frame_grab_run:
+            if self.buffer_all and self.buffer.full():
+                time.sleep(1/self.camera_frame_rate)
+                continue
+            grabbed,frame = self.camera.read()
+            if not grabbed:
+                break
+            self.frame_allocations += 1
+            if not self.buffer_all and self.buffer.full():
+                try:
+                    self.buffer.get(False)
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+            self.frame_count += 1
+            self.buffer.put((frame,self.frame_count,time.time()))
+        self.frame_grab_on = False
+        self.camera.release()
+
+    def next(self,black=True,wait=0,stamped=False):
+        try:
+            frame,sequence,read_time = self.buffer.get(timeout=wait)
+            self.frames_returned += 1
+        except queue.Empty:
+            frame,sequence,read_time = self.black_frame,None,None
+        return frame,sequence,read_time
+
+# ------------------------------
+# Run
+# ------------------------------
+
+def run(camera_class,file,buffer_all):
+
+    camera = camera_class()
+    camera.camera_source = file
+    camera.camera_init = 0
+    camera.buffer_all = buffer_all
+    camera.frame_allocations = 0
+    camera.start()
+
+    # consumer at fps
+    latencies = []
+    t1 = time.time()
+    next_at = t1
+    while camera.frame_grab_on or time.time()-t1 < 1:
+        frame,sequence,read_time = camera.next(wait=1,stamped=True)
+        if sequence:
+            latencies.append(time.time()-read_time)
+            frame.sum(axis=(0,1)) # use the frame
+        elif not camera.frame_grab_on:
+            break
+        next_at += 1/fps
+        time.sleep(max(0,next_at-time.time()))
+    t2 = time.time()
+
+    camera.frame_grab_run = False
+    while camera.frame_grab_on:
+        time.sleep(0.01)
+
+    latencies = np.array(latencies or [0])*1000
+    return {'read':camera.frame_count,
+            'used':camera.frames_returned,
+            'dropped':camera.frames_dropped,
+            'allocs/s':camera.frame_allocations/(t2-t1),
+            'MB/s':camera.frame_allocations*width*height*3/(t2-t1)/1e6,
+            'latency ms':np.mean(latencies),
+            'p95 ms':np.percentile(latencies,95),
+            }
+
+def main():
+
+    if len(sys.argv) > 1:
+        file,made = sys.argv[1],False
+    else:
+        file,made = os.path.join(tempfile.gettempdir(),'x_camera_buffer_test.avi'),True
+        print('MAKING VIDEO:',file)
+        make_video(file)
+
+    for buffer_all in (False,True):
+        print('BUFFER_ALL:',buffer_all)
+        for name,camera_class in (('queue',Queue_Camera_Thread),('ring',tt.Camera_Thread)):
+            r = run(camera_class,file,buffer_all)
+            print('  {:<6}'.format(name),' '.join('{}: {:.1f}'.format(k.upper(),v) for k,v in r.items()))
+
+    if made:
+        os.remove(file)
+
+# ------------------------------
+# Testing
+# ------------------------------
+
+if __name__ == '__main__':
+    main()
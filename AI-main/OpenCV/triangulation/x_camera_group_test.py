@@ -0,0 +1,152 @@
+# ------------------------------
+# Notice
+# ------------------------------
+
+# Copyright 2018 Clayton Darwin claytondarwin@gmail.com
+
+# ------------------------------
+# Imports
+# ------------------------------
+
+import os
+import tempfile
+
+import numpy as np
+import cv2
+
+import targeting_tools as tt
+
+# ------------------------------
+# Camera_Group skew test
+# ------------------------------
+
+# Left/right frame skew (scene time between the paired frames) for
+# two independent Camera_Threads vs a Camera_Group, offline.
+# Two video files are made of the same scene: left at 30 FPS, right
+# at 25 FPS starting 0.1 seconds later. Each frame has its scene time
+# written in a strip of black/white blocks, so skew is read from the
+# frames themselves, not from the code being tested.
+
+# usage:
+# python3 x_camera_group_test.py
+
+width,height = 640,480
+seconds = 4
+bits = 16
+block = width//bits
+
+cameras = (('left',30,0.0),('right',25,0.1)) # name,fps,start (scene seconds)
+
+# ------------------------------
+# Video Files
+# ------------------------------
+
+def make_video(file,fps,start):
+
+    writer = cv2.VideoWriter(file,cv2.VideoWriter_fourcc(*"MJPG"),fps,(width,height))
+    for n in range(fps*seconds):
+        ms = int(round((start+n/fps)*1000))
+        frame = np.zeros((height,width,3),np.uint8)
+        for b in range(bits):
+            if ms >> b & 1:
+                frame[:40,b*block:(b+1)*block] = 255
+        x = int(ms*0.15) % (width-100)
+        cv2.rectangle(frame,(x,200),(x+100,300),(0,255,0),-1)
+        writer.write(frame)
+    writer.release()
+
+def scene_ms(frame):
+
+    # read the time strip back
+    levels = frame[5:35].reshape(30,bits,block,3).mean(axis=(0,2,3))
+    return sum(1 << b for b in range(bits) if levels[b] > 127)
+
+# ------------------------------
+# Run
+# ------------------------------
+
+def skews(pairs):
+
+    skew = np.array([abs(scene_ms(f1)-scene_ms(f2)) for f1,f2 in pairs] or [0])
+    return {'pairs':len(pairs),
+            'mean':np.mean(skew),
+            'p50':np.percentile(skew,50),
+            'p95':np.percentile(skew,95),
+            'max':np.max(skew),
+            }
+
+def run_threads(files):
+
+    # two Camera_Threads, paired with next() then next()
+    threads = []
+    for file in files:
+        ct = tt.Camera_Thread()
+        ct.camera_source = file
+        ct.camera_init = 0
+        ct.buffer_all = True
+        ct.start()
+        threads.append(ct)
+
+    pairs = []
+    while 1:
+        f1,s1,t1 = threads[0].next(black=False,wait=1,stamped=True)
+        f2,s2,t2 = threads[1].next(black=False,wait=1,stamped=True)
+        if f1 is None or f2 is None:
+            break
+        if s1 and s2:
+            pairs.append((f1.copy(),f2.copy()))
+
+    for ct in threads:
+        ct.stop()
+    return skews(pairs),None
+
+def run_group(files,policy):
+
+    cg = tt.Camera_Group()
+    cg.camera_sources = files
+    cg.camera_init = 0
+    cg.camera_offsets = [start for name,fps,start in cameras]
+    cg.skew_policy = policy
+    cg.buffer_all = True
+    cg.start()
+
+    pairs = []
+    while 1:
+        frames,sequence,times = cg.next(black=False,wait=1,stamped=True)
+        if frames[0] is None:
+            break
+        if sequence:
+            pairs.append(tuple(frame.copy() for frame in frames))
+
+    report = cg.skew_report()
+    cg.stop()
+    return skews(pairs),report
+
+def main():
+
+    files = []
+    for name,fps,start in cameras:
+        file = os.path.join(tempfile.gettempdir(),'x_camera_group_test_{}.avi'.format(name))
+        print('MAKING VIDEO:',file,'{} FPS, start {}s'.format(fps,start))
+        make_video(file,fps,start)
+        files.append(file)
+
+    print('SCENE SKEW (ms, read from the frames):')
+    for name,run in (('threads',run_threads),
+                     ('group keep',lambda files: run_group(files,'keep')),
+                     ('group drop',lambda files: run_group(files,'drop')),
+                     ):
+        r,report = run(files)
+        print('  {:<11}'.format(name),' '.join('{}: {:.1f}'.format(k.upper(),v) for k,v in r.items()))
+        if report:
+            print('  {:<11}'.format(''),'GROUP:',' '.join('{}: {:.1f}'.format(k.upper(),v) for k,v in report.items()))
+
+    for file in files:
+        os.remove(file)
+
+# ------------------------------
+# Testing
+# ------------------------------
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# ------------------------------
+# Notice
+# ------------------------------
+
+# Copyright 2018 Clayton Darwin claytondarwin@gmail.com
+
+# ------------------------------
+# Imports
+# ------------------------------
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+import cv2
+
+import targeting_tools as tt
+
+# ------------------------------
+# Frame_Motion benchmark
+# ------------------------------
+
+# Frame_Motion.targets() settings on recorded clips: milliseconds per
+# frame for each step, and how far the targets are from the object
+# (pixels, nearest target). For recorded clips the object is taken to
+# be at the targets found at full resolution with the default settings.
+# Without clips, a 1080p clip is made here (a ball moving over a noisy
+# background, with a lamp flicker every 2 seconds).
+# Targets down to 0.1% of the frame area are kept.
+
+# usage:
+# python3 x_motion_benchmark.py [clip1.avi clip2.mp4 ...]
+
+width,height,fps = 1920,1080,30
+seconds = 4
+
+# (name,settings)
+configs = [('full last',{}),
+           ('level 1 last',{'pyramid_levels':1}),
+           ('level 2 last',{'pyramid_levels':2}),
+           ('level 2 average',{'pyramid_levels':2,'background':'average'}),
+           ('level 2 mog2',{'pyramid_levels':2,'background':'mog2'}),
+           ('level 2 roi',{'pyramid_levels':2,'roi':True}),
+           ]
+
+# ------------------------------
+# Clip
+# ------------------------------
+
+def make_clip(file):
+
+    rng = np.random.default_rng(1)
+    writer = cv2.VideoWriter(file,cv2.VideoWriter_fourcc(*"MJPG"),fps,(width,height))
+    background = rng.integers(40,90,(height,width,3),dtype=np.uint8)
+    centers = []
+    for n in range(fps*seconds):
+        frame = background.copy()
+        if n % (2*fps) == fps:
+            frame += 12 # flicker
+        frame += rng.integers(0,6,(height,width,3),dtype=np.uint8)
+        x = 200 + (n*25) % (width-400)
+        cv2.circle(frame,(x,540),80,(0,220,0),-1)
+        centers.append([(x,540)])
+        writer.write(frame)
+    writer.release()
+    return centers
+
+def read_clip(file):
+
+    frames = []
+    camera = cv2.VideoCapture(file)
+    while 1:
+        grabbed,frame = camera.read()
+        if not grabbed:
+            break
+        frames.append(frame)
+    camera.release()
+    return frames
+
+# ------------------------------
+# Run
+# ------------------------------
+
+def run(frames,settings):
+
+    targeter = tt.Frame_Motion()
+    targeter.contour_draw = False
+    targeter.contour_box_draw = False
+    targeter.targets_draw = False
+    targeter.contour_min_area = 0.1
+    targeter.timing = True
+    for key,value in settings.items():
+        if key == 'roi':
+            mask = np.zeros(frames[0].shape[:2],np.uint8)
+            mask[:,:frames[0].shape[1]*3//4] = 255 # right quarter ignored
+            targeter.roi_mask = mask
+        else:
+            setattr(targeter,key,value)
+
+    found = []
+    t1 = time.perf_counter()
+    for frame in frames:
+        targets = targeter.targets(frame)
+        found.append(targets)
+    seconds = time.perf_counter()-t1
+
+    return found,targeter.timing_report(),len(frames)/seconds
+
+def main():
+
+    clips = sys.argv[1:]
+    made = None
+    if not clips:
+        made = os.path.join(tempfile.gettempdir(),'x_motion_benchmark.avi')
+        print('MAKING CLIP:',made)
+        truth = make_clip(made)
+        clips = [made]
+
+    for clip in clips:
+        frames = read_clip(clip)
+        print('CLIP: {} {} frames {}x{}'.format(clip,len(frames),frames[0].shape[1],frames[0].shape[0]))
+
+        reference = truth if clip == made else None
+        for name,settings in configs:
+            found,times,rate = run(frames,settings)
+            if reference is None:
+                reference = found
+
+            # distance from the object (frames with targets)
+            errors = [min(np.hypot(a[0]-b[0],a[1]-b[1]) for a in targets)
+                      for targets,ref in zip(found,reference) if targets for b in ref]
+            error = np.mean(errors) if errors else 0
+            hits = sum(1 for f in found if f)
+
+            print('  {:<16} FPS: {:>6.1f} TARGETS: {:>4} ERROR: {:>5.1f}px '.format(name,rate,hits,error)
+                  + ' '.join('{}: {:.2f}'.format(k.upper(),v) for k,v in times.items()))
+
+    if made:
+        os.remove(made)
+
+# ------------------------------
+# Testing
+# ------------------------------
+
+if __name__ == '__main__':
+    main()
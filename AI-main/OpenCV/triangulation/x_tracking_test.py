@@ -0,0 +1,173 @@
+# ------------------------------
+# Notice
+# ------------------------------
+
+# Copyright 2018 Clayton Darwin claytondarwin@gmail.com
+
+# ------------------------------
+# Imports
+# ------------------------------
+
+import time
+import math
+
+import numpy as np
+
+import targeting_tools as tt
+
+# ------------------------------
+# Frame_Angles.pairs + Target_Tracker test
+# ------------------------------
+
+# Simulated stereo targets (no cameras): objects move in 3D in front
+# of two cameras, each frame gives their pixel locations in both
+# cameras (pixel noise, missed detections, false targets, random order).
+# Compares, per frame:
+#   scalar: angles_from_center + location for every left/right pair (math)
+#   pairs:  Frame_Angles.pairs (all pairs in one numpy call + pairing)
+# and the location error of:
+#   list:   average of the last 3 locations (one target, like triangulation.py was)
+#   kalman: Target_Tracker tracks (all targets)
+
+# usage:
+# python3 x_tracking_test.py
+
+pixel_width,pixel_height = 640,480
+angle_width,angle_height = 78,64
+separation = 6 # camera separation (units)
+frame_rate = 30
+seconds = 10
+pixel_noise = 1.0
+miss_rate = 0.05 # detection misses per target per camera
+clutter = 1 # false targets per camera per frame (mean)
+
+# ------------------------------
+# Simulation
+# ------------------------------
+
+def paths(objects,frames,rng):
+
+    # smooth 3D paths in front of the cameras (frames,objects,3)
+    t = np.arange(frames)[:,None]/frame_rate
+    center = rng.uniform((-20,-10,40),(20,10,80),(objects,3))
+    radius = rng.uniform(5,15,(objects,3))
+    speed = rng.uniform(0.2,0.6,(objects,3))
+    phase = rng.uniform(0,2*math.pi,(objects,3))
+    return center[None] + radius[None]*np.sin(2*math.pi*speed[None]*t[...,None]+phase[None])
+
+def project(angler,points,camera_x):
+
+    # pixels from top left for camera at camera_x on the baseline
+    x = points[:,0]-camera_x
+    z = points[:,2]
+    xangle = np.arctan2(x,z)
+    yangle = np.arctan2(points[:,1],np.hypot(x,z))
+    px = angler.x_origin + angler.x_adjacent*np.tan(xangle)
+    py = angler.y_origin - angler.y_adjacent*np.tan(yangle)
+    return px,py
+
+def detections(angler,points,camera_x,rng):
+
+    px,py = project(angler,points,camera_x)
+    px = px + rng.normal(0,pixel_noise,len(px))
+    py = py + rng.normal(0,pixel_noise,len(py))
+    size = 3 + 30/points[:,2] # percent of frame (closer is bigger)
+    targets = [(x,y,s) for x,y,s in zip(px,py,size) if rng.random() > miss_rate]
+    for n in range(rng.poisson(clutter)):
+        targets.append((rng.uniform(0,pixel_width),rng.uniform(0,pixel_height),rng.uniform(1,8)))
+    rng.shuffle(targets)
+    return targets
+
+# ------------------------------
+# Run
+# ------------------------------
+
+def scalar_locations(angler,targets1,targets2):
+
+    # the scalar functions for every pair (no pairing)
+    locations = []
+    for x1,y1,s1 in targets1:
+        for x2,y2,s2 in targets2:
+            lcamera = angler.angles_from_center(x1,y1,top_left=True,degrees=True)
+            rcamera = angler.angles_from_center(x2,y2,top_left=True,degrees=True)
+            try:
+                locations.append(angler.location(separation,lcamera,rcamera,center=True,degrees=True))
+            except ZeroDivisionError:
+                pass
+    return locations
+
+def run(objects,rng):
+
+    angler = tt.Frame_Angles(pixel_width,pixel_height,angle_width,angle_height)
+    angler.build_frame()
+    tracker = tt.Target_Tracker()
+    tracker.frame_rate = frame_rate
+    tracker.process_noise = 300 # fast turns (up to ~200 units/second**2)
+    tracker.measure_noise = (1,1,3) # 1 pixel is ~1.5 units of Z at 60 units
+
+    frames = frame_rate*seconds
+    truth = paths(objects,frames,rng)
+    frame_data = [(detections(angler,truth[f],-separation/2,rng),detections(angler,truth[f],separation/2,rng)) for f in range(frames)]
+
+    # scalar locations (timing only)
+    t1 = time.perf_counter()
+    for targets1,targets2 in frame_data:
+        scalar_locations(angler,targets1,targets2)
+    scalar_ms = 1000*(time.perf_counter()-t1)/frames
+
+    # pairs and tracking
+    pair_seconds,track_seconds = 0,0
+    list_errors,kalman_errors,pair_errors = [],[],[]
+    queue = []
+    for f,(targets1,targets2) in enumerate(frame_data):
+
+        t1 = time.perf_counter()
+        pairs = angler.pairs(separation,targets1,targets2,center=True)
+        t2 = time.perf_counter()
+        tracks = tracker.update([p[:3] for p in pairs],t=f/frame_rate)
+        t3 = time.perf_counter()
+        pair_seconds += t2-t1
+        track_seconds += t3-t2
+
+        # nearest object to a location
+        def error(location):
+            return np.min(np.linalg.norm(truth[f]-np.array(location[:3]),axis=1))
+
+        # raw pairs
+        pair_errors += [error(p) for p in pairs]
+
+        # list average (first pair only)
+        if pairs:
+            queue = (queue+[pairs[0][:3]])[-3:]
+            if len(queue) == 3:
+                list_errors.append(error(np.mean(queue,axis=0)))
+        else:
+            queue = []
+
+        # kalman
+        kalman_errors += [error(track[1:4]) for track in tracks]
+
+    return {'objects':objects,
+            'scalar ms':scalar_ms,
+            'pairs ms':1000*pair_seconds/frames,
+            'track ms':1000*track_seconds/frames,
+            'tracks':len(tracks),
+            'ids':tracker.next_id-1,
+            'pair err':np.median(pair_errors),
+            'list err':np.median(list_errors) if list_errors else 0,
+            'kalman err':np.median(kalman_errors) if kalman_errors else 0,
+            }
+
+def main():
+
+    print('{} SECONDS AT {} FPS, median location error in units (separation {})'.format(seconds,frame_rate,separation))
+    for objects in (1,4,16):
+        r = run(objects,np.random.default_rng(objects))
+        print('  '+' '.join('{}: {:.2f}'.format(k.upper(),v) if type(v) == float or isinstance(v,np.floating) else '{}: {}'.format(k.upper(),v) for k,v in r.items()))
+
+# ------------------------------
+# Testing
+# ------------------------------
+
+if __name__ == '__main__':
+    main()
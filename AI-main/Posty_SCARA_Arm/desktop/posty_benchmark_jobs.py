@@ -0,0 +1,209 @@
+import os,sys,time,math,json,io,contextlib,tempfile,argparse
+
+import posty_desktop_a4988 as postyapp
+from posty_lib import byte_server
+
+#-----------------------------------------
+# job benchmark: full desktop stack against a simulated device
+#-----------------------------------------
+
+# posty_testing.py needs a real arm. This runs a fixed set of jobs
+# through POSTY (planning, steps, bytes, socket) to a headless
+# byte_server.Byte_Server on the loopback and reports per job:
+# CPU  = planning cpu seconds (this thread only, not the simulator)
+# BYTES = bytes received by the device
+# CALLS = socket send + recv calls made by POSTY (syscalls)
+# SIM  = simulated job time on the device (seconds)
+
+# usage:
+# python3 posty_benchmark_jobs.py
+# python3 posty_benchmark_jobs.py --arrays --framing --json now.json
+# python3 posty_benchmark_jobs.py --json now.json --baseline before.json
+# python3 posty_benchmark_jobs.py --realtime 20 --buffer 5744 # paced device
+# add your own files with --gcode file.gcode
+
+parser = argparse.ArgumentParser(description='Posty job benchmark (no device needed)')
+parser.add_argument('--arrays',action='store_true',help='POSTY.xyz_arrays = True')
+parser.add_argument('--framing',action='store_true',help='POSTY.framing = True')
+parser.add_argument('--realtime',type=float,default=0,help='pace the device (1 = device speed, 0 = off)')
+parser.add_argument('--buffer',type=int,default=None,help='device socket receive buffer bytes')
+parser.add_argument('--read',type=int,default=1024,help='device read size (client_read)')
+parser.add_argument('--sps',type=int,default=400,help='device default state changes per second')
+parser.add_argument('--max-sps',type=int,default=None,help='fastest device step rate')
+parser.add_argument('--gcode',action='append',default=[],help='extra g-code file job')
+parser.add_argument('--json',default=None,help='write results to this file')
+parser.add_argument('--baseline',default=None,help='compare with a results file')
+parser.add_argument('--threshold',type=float,default=10,help='percent change shown as a regression')
+args = parser.parse_args()
+
+#-----------------------------------------
+# corpus
+#-----------------------------------------
+
+def make_gcode(file,strokes=20):
+
+    # stars and circles (same shapes as posty_motion_test.py)
+    with open(file,'w') as f:
+        f.write('%\nG21\nG90\n')
+        for s in range(strokes):
+            cx,cy = (s%5)*12,(s//5)*12
+            f.write(f'G0 Z1\nG0 X{cx+5:.3f} Y{cy:.3f}\nG1 Z-1\n')
+            if s%2:
+                for p in range(1,6):
+                    a = p*4*math.pi/5
+                    f.write(f'G1 X{cx+5*math.cos(a):.3f} Y{cy+5*math.sin(a):.3f}\n')
+            else:
+                for p in range(1,73):
+                    a = p*2*math.pi/72
+                    f.write(f'G1 X{cx+5*math.cos(a):.3f} Y{cy+5*math.sin(a):.3f}\n')
+        f.write('G0 Z1\nM2\n%\n')
+
+gcode_file = os.path.join(tempfile.gettempdir(),'posty_benchmark_jobs.gcode')
+make_gcode(gcode_file)
+
+addresses = [('Resident {}\n{} Main Street\nSpringfield, ST {:05d}'.format(n,100+n,10000+n),0.5,-0.5-1.25*n) for n in range(1)]
+
+def job_testpattern(posty):
+    posty.testpattern(3,-2,size=2)
+
+def job_write(posty):
+    posty.write('hayride',x=3,y=-2,height=3/8,align='c',valign='m')
+
+def job_write_many(posty):
+    posty.write_many(addresses,height=0.125)
+
+def job_gcode(posty,file=gcode_file):
+    posty.moveto(3,-2)
+    posty.setdrawspeed()
+    posty.gcode(file,width=4,align='c',valign='m')
+
+def job_gcode_travel(posty,file=gcode_file):
+    posty.moveto(3,-2)
+    posty.setdrawspeed()
+    posty.gcode(file,width=4,align='c',valign='m',optimize=True)
+
+def job_gcode_async(posty,file=gcode_file):
+    posty.moveto(3,-2)
+    posty.setdrawspeed()
+    posty.gcode_async(file,width=4,align='c',valign='m')
+
+jobs = [('testpattern',job_testpattern),
+        ('write',job_write),
+        ('write_many',job_write_many),
+        ('gcode',job_gcode),
+        ('gcode travel',job_gcode_travel),
+        ('gcode_async',job_gcode_async),
+        ]
+for file in args.gcode:
+    jobs.append((os.path.basename(file),lambda posty,file=file: job_gcode(posty,file)))
+
+#-----------------------------------------
+# simulated device
+#-----------------------------------------
+
+server = byte_server.Byte_Server()
+server.realtime = args.realtime
+server.recv_buffer = args.buffer
+server.client_read = args.read
+server.default_sps = {1:args.sps,2:args.sps,3:args.sps}
+server.max_sps = args.max_sps
+server.client_timeout = 60
+server.start()
+
+#-----------------------------------------
+# run
+#-----------------------------------------
+
+postyapp.POSTY.xyz_arrays = args.arrays
+postyapp.POSTY.framing = args.framing
+
+def run(name,job):
+
+    # posty at the index point (like posty_testing.py, without input)
+    posty = postyapp.POSTY()
+    posty.hold_do = False
+    posty.bc_show = False
+    posty.socket.server_ip = server.server_host
+    posty.socket.server_port = server.server_port
+    posty.socket.sends = 0
+    posty.socket.recvs = 0
+    index_steps,true_index_point = posty.scara.translate(*posty.index_point)
+    posty.xyz.setxyz(*true_index_point)
+    posty.s1,posty.s2,posty.s3 = index_steps
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        posty.connect()
+        posty.setnormalspeed()
+        posty.emoh()
+
+        # job only
+        c1,t1 = time.thread_time(),time.perf_counter()
+        job(posty)
+        if posty.framing:
+            posty.socket.frame_flush()
+        c2,t2 = time.thread_time(),time.perf_counter()
+
+        posty.home()
+        posty.sendEOD()
+        posty.waitEOD(timeout=max(60,3600/max(args.realtime,1)),fail=True)
+        posty.disconnect()
+
+    # device finished (it closes after EOD)
+    while server.client_seconds == 0:
+        time.sleep(0.01)
+
+    return {'cpu':c2-c1,
+            'seconds':t2-t1,
+            'bytes':server.bytes_in,
+            'calls':posty.socket.sends + posty.socket.recvs,
+            'steps':server.sp,
+            'sim':server.seconds(),
+            }
+
+print('SETUP: arrays={} framing={} realtime={} buffer={} read={} sps={} max_sps={}'.format(
+    args.arrays,args.framing,args.realtime,args.buffer,args.read,args.sps,args.max_sps))
+
+results = {}
+for name,job in jobs:
+    server.client_seconds = 0
+    results[name] = r = run(name,job)
+    print('{:<16} CPU: {:>7.3f}s BYTES: {:>8} CALLS: {:>7} STEPS: {:>8} SIM: {:>8.1f}s'.format(
+        name,r['cpu'],r['bytes'],r['calls'],r['steps'],r['sim']))
+
+server.stop()
+os.remove(gcode_file)
+
+#-----------------------------------------
+# save and compare
+#-----------------------------------------
+
+if args.json:
+    with open(args.json,'w') as f:
+        json.dump({'setup':vars(args),'jobs':results},f,indent=1)
+    print('SAVED:',args.json)
+
+if args.baseline:
+    with open(args.baseline) as f:
+        baseline = json.load(f)['jobs']
+    regressions = 0
+    print('CHANGE FROM:',args.baseline)
+    for name,r in results.items():
+        if name not in baseline:
+            continue
+        changes = []
+        for key in ('cpu','bytes','calls','sim'):
+            before,after = baseline[name][key],r[key]
+            percent = 100*(after-before)/before if before else 0
+            flag = ''
+            if percent > args.threshold:
+                flag = '!'
+                regressions += 1
+            changes.append('{}: {:>+7.1f}%{:<1}'.format(key.upper(),percent,flag))
+        print('{:<16}'.format(name),' '.join(changes))
+    print('REGRESSIONS:',regressions)
+    if regressions:
+        sys.exit(1)
+
+#-----------------------------------------
+# end
+#-----------------------------------------
@@ -0,0 +1,94 @@
+import os,sys,time,io,contextlib
+
+from posty_lib import xyz,xyz_array,xyz_writer
+
+#-----------------------------------------
+# text jobs: XYZWriter.write per line vs layout_many with cached glyphs
+#-----------------------------------------
+
+# usage:
+# python3 posty_benchmark_text.py [cards]
+
+cards = 20
+if len(sys.argv) > 1:
+    cards = int(sys.argv[1])
+
+# one address block per card
+addresses = [('Resident {}\n{} Main Street\nSpringfield, ST {:05d}'.format(n,100+n,10000+n),0.5,-0.5) for n in range(cards)]
+
+#-----------------------------------------
+# setup
+#-----------------------------------------
+
+def make_writer(planner_class=xyz_array.XYZArray):
+    planner = planner_class()
+    planner.linear_precision = 0.005
+    planner.minx,planner.maxx = -10,10
+    planner.miny,planner.maxy = -10,10
+    planner.minz,planner.maxz = 0,15
+    planner.setxyz(0.5,-0.5,15)
+    writer = xyz_writer.XYZWriter(planner)
+    writer.upis = 15
+    writer.downis = 0
+    return writer
+
+#-----------------------------------------
+# run
+#-----------------------------------------
+
+print('CARDS:',cards)
+
+# write() for each card (silenced, it prints every line)
+writer = make_writer()
+t1 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    points = 0
+    for text,x,y in addresses:
+        for point in writer.write(text,x,y,height=0.125):
+            points += 1
+t2 = time.perf_counter()
+write_seconds = t2-t1
+print('{:<24} POINTS: {:>9} SECONDS: {:>7.3f}'.format('write',points,write_seconds))
+
+# layout_many() for each card as arrays (glyphs compiled on the first card)
+writer = make_writer()
+t1 = time.perf_counter()
+points = 0
+for item in addresses:
+    for array in writer.draw_arrays(writer.layout_many([item],height=0.125)):
+        points += len(array)
+t2 = time.perf_counter()
+print('{:<24} POINTS: {:>9} SECONDS: {:>7.3f}'.format('layout_many+draw_arrays',points,t2-t1))
+print('GLYPHS CACHED:',sum(len(glyphs) for glyphs in writer.glyph_cache.values()))
+print('SPEEDUP: {:.2f}x'.format(write_seconds/(t2-t1)))
+
+# plain XYZ (no array planner): write() vs layout_many()+draw() point by point
+# (first 2 cards, both print pen moves so they are silenced)
+writer = make_writer(xyz.XYZ)
+t1 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    points = sum(1 for item in addresses[:2] for point in writer.write(*item,height=0.125))
+t2 = time.perf_counter()
+write_seconds = t2-t1
+print('{:<24} POINTS: {:>9} SECONDS: {:>7.3f}'.format('write (XYZ)',points,write_seconds))
+writer = make_writer(xyz.XYZ)
+t1 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    points = sum(1 for item in addresses[:2] for point in writer.draw(writer.layout_many([item],height=0.125)))
+t2 = time.perf_counter()
+print('{:<24} POINTS: {:>9} SECONDS: {:>7.3f}'.format('layout_many+draw (XYZ)',points,t2-t1))
+print('SPEEDUP: {:.2f}x'.format(write_seconds/(t2-t1)))
+# draw() must hand XYZ python floats (numpy scalars make every later step slow)
+if type(writer.xyz.currentx) is not float or type(writer.xyz.currenty) is not float:
+    raise SystemExit('XYZ LOCATION IS NOT FLOAT: {} {}'.format(type(writer.xyz.currentx),type(writer.xyz.currenty)))
+
+# pen-up travel for one card (text order vs ordered)
+writer = make_writer()
+unordered = writer.layout_many(addresses[:1],height=0.125,order=False)
+ordered = writer.order_strokes(unordered)
+print('PEN-UP TRAVEL PER CARD: {:.2f} --> {:.2f} ({} --> {} strokes)'.format(
+    writer.travel(unordered),writer.travel(ordered),len(unordered),len(ordered)))
+
+#-----------------------------------------
+# end
+#-----------------------------------------
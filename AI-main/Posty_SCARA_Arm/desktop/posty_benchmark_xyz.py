@@ -0,0 +1,92 @@
+import os,sys,time,math,tempfile
+
+from posty_lib import xyz,xyz_array,xyz_gcoder
+
+#-----------------------------------------
+# points per second: xyz.XYZ vs xyz_array.XYZArray
+#-----------------------------------------
+
+# usage:
+# python3 posty_benchmark_xyz.py [file.gcode] [linear_precision]
+# without a file, a large synthetic g-code file is generated
+
+linear_precision = 0.005
+if len(sys.argv) > 2:
+    linear_precision = float(sys.argv[2])
+
+#-----------------------------------------
+# g-code file
+#-----------------------------------------
+
+def make_gcode(file,strokes=2000,points=50):
+
+    # spiral of strokes, each stroke a polyline (like traced vector art)
+    with open(file,'w') as f:
+        f.write('%\nG21\nG90\n')
+        for s in range(strokes):
+            a = s*0.7
+            r = 1 + s*0.01
+            x,y = r*math.cos(a),r*math.sin(a)
+            f.write(f'G0 Z1\nG0 X{x:.3f} Y{y:.3f}\nG1 Z-1\n')
+            for p in range(points):
+                x += 0.2*math.cos(a+p*0.3)
+                y += 0.2*math.sin(a+p*0.3)
+                f.write(f'G1 X{x:.3f} Y{y:.3f}\n')
+        f.write('G0 Z1\nM2\n%\n')
+
+if len(sys.argv) > 1:
+    file = sys.argv[1]
+    made = False
+else:
+    file = os.path.join(tempfile.gettempdir(),'posty_benchmark_xyz.gcode')
+    make_gcode(file)
+    made = True
+
+#-----------------------------------------
+# run
+#-----------------------------------------
+
+def run(planner):
+
+    planner.linear_precision = linear_precision
+    planner.minx,planner.maxx = -1000,1000
+    planner.miny,planner.maxy = -1000,1000
+    planner.minz,planner.maxz = -1000,1000
+
+    gcoder = xyz_gcoder.XYZGcoder(planner)
+    gcoder.upis = 1
+    gcoder.downis = 0
+
+    # silence UP/DOWN notices
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull,'w')
+
+    points = 0
+    t1 = time.perf_counter()
+    try:
+        for point in gcoder.run_file(file,width=5,height=0,align='c',valign='m'):
+            points += 1
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    t2 = time.perf_counter()
+
+    return points,t2-t1
+
+print('FILE:',file,'({} bytes)'.format(os.path.getsize(file)))
+print('LINEAR PRECISION:',linear_precision)
+
+results = {}
+for name,planner in (('xyz.XYZ',xyz.XYZ()),('xyz_array.XYZArray',xyz_array.XYZArray())):
+    points,seconds = run(planner)
+    results[name] = points/seconds
+    print('{:<20} POINTS: {:>10} SECONDS: {:>8.3f} POINTS/SEC: {:>12.0f}'.format(name,points,seconds,points/seconds))
+
+print('SPEEDUP: {:.2f}x'.format(results['xyz_array.XYZArray']/results['xyz.XYZ']))
+
+if made:
+    os.remove(file)
+
+#-----------------------------------------
+# end
+#-----------------------------------------
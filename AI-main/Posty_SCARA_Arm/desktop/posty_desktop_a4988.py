@@ -2,11 +2,13 @@
 # general imports
 #-----------------------------------------
 
-import time
+import time,math
+
+import numpy as np
 
 from pynput.keyboard import Key, Listener
 
-from posty_lib import xyz,xyz_writer,xyz_gcoder,stepper,byte_socket
+from posty_lib import xyz,xyz_array,xyz_writer,xyz_gcoder,xyz_pipeline,xyz_program,xyz_motion,xyz_travel,stepper,byte_socket
 
 #-----------------------------------------
 # define posty class
@@ -25,6 +27,10 @@ class POSTY:
     # linear precision for plotting lines/arcs
     linear_precision = 0.005
 
+    # plan lines/arcs as whole numpy arrays (xyz_array.XYZArray)
+    # same points as the per-step xyz.XYZ generator, much less cpu
+    xyz_arrays = False
+
     # up-down values
     upis   = 15 # absolute Z location for up
     downis =  0 # absolute Z location for down
@@ -60,6 +66,13 @@ class POSTY:
     gcoder_align = 'l'
     gcoder_valign = 't'
 
+    # reorder strokes for short pen-up travel in gcode() and write() (see xyz_travel.py)
+    travel_optimize = False
+
+    # compile gcode_async runs to program files (see xyz_program.py)
+    program_cache = False
+    program_cache_dir = 'posty_programs'
+
     #-----------------------
     # scara convertor
     #-----------------------
@@ -110,6 +123,10 @@ class POSTY:
     server_ip = '192.168.254.81'
     server_port = 10240
 
+    # send command bytes in acknowledged frames (see byte_socket.py)
+    # the device must run a posty_esp32 with frame support
+    framing = False
+
     #-----------------------
     # other variables
     #-----------------------
@@ -146,16 +163,29 @@ class POSTY:
     motor_waits_write   = (motor_xy_wait*3.0,motor_xy_wait*3.0,motor_z_wait)
     motor_waits_current = motor_waits_normal
 
+    # look-ahead velocity planning for gcode_async (see xyz_motion.py)
+    # blocks get their own xy waits, from motor_waits_maximum up
+    motion_planning = False
+    motion_speed = 3.0 # units per second
+    motion_accel = 50.0 # units per second per second
+    motion_junction = 0.01 # junction deviation in units
+
     #-----------------------------------------
     # init function
     #-----------------------------------------
 
     def __init__(self):
 
+        # own hold list (several POSTY objects can run in one process)
+        self.hold = []
+
         #-----------------------
         # xyz engine
         #-----------------------
-        self.xyz = xyz.XYZ()
+        if self.xyz_arrays:
+            self.xyz = xyz_array.XYZArray()
+        else:
+            self.xyz = xyz.XYZ()
         self.xyz.linear_precision = self.linear_precision
         X,Y,Z = self.index_point
         self.xyz.maxx = X + 0.01
@@ -177,6 +207,14 @@ class POSTY:
         self.writer.setnormalspeed = self.setnormalspeed
         self.writer.send = self.holdsend
 
+
+        #-----------------------
+        # pen-up travel optimizer
+        #-----------------------
+        self.travel = xyz_travel.TravelOptimizer()
+        self.travel.travel_speed,self.travel.lift_seconds = self.travel_estimates()
+        self.writer.optimizer = self.travel
+
         #-----------------------
         # xyz gcode wrapper
         #-----------------------
@@ -208,6 +246,7 @@ class POSTY:
         self.socket = byte_socket.Byte_Socket()
         self.socket.server_ip = self.server_ip
         self.socket.server_port = self.server_port
+        self.socket.framing = self.framing
         # create socket function shortcuts
         # only ones likely to be used by parent scripts
         self.connect = self.socket.connect
@@ -217,10 +256,42 @@ class POSTY:
         self.waitEOD = self.socket.waitEOD
         self.flush = self.socket.flush
 
+        #-----------------------
+        # asyncio gcode pipeline
+        #-----------------------
+        self.pipeline = xyz_pipeline.XYZPipeline(self.gcoder,self.scara,self.socket)
+        self.pipeline.upis = self.upis
+        self.pipeline.downis = self.downis
+        self.pipeline.waits_normal = self.motor_waits_normal
+        self.pipeline.waits_draw = self.motor_waits_draw
+        self.pipeline.motors = self.motors
+        if self.motion_planning:
+            self.pipeline.motion = xyz_motion.MotionPlanner()
+            self.pipeline.motion.speed = self.motion_speed
+            self.pipeline.motion.accel = self.motion_accel
+            self.pipeline.motion.junction = self.motion_junction
+            self.pipeline.motion.min_wait = min(self.motor_waits_maximum[:2])
+
+        #-----------------------
+        # compiled gcode programs
+        #-----------------------
+        self.programs = xyz_program.XYZProgramCache(self.pipeline)
+        self.programs.cache_dir = self.program_cache_dir
+
     #-----------------------------------------
     # sugar functions 
     #-----------------------------------------
 
+    def travel_estimates(self):
+
+        # rough pen-up speed (units/second) and pen up+down time (seconds)
+        # one unit at the pen turns an arm about 180/(pi*alen) degrees
+        # motors 1 and 2 step one after the other
+        steps = self.scara_spad1*180/(math.pi*self.scara_alen1)
+        speed = 1000000/(steps*(self.motor_waits_normal[0]+self.motor_waits_normal[1]))
+        lift = 2*abs(self.upis-self.downis)*self.scara_spudz*self.motor_waits_normal[2]/1000000
+        return speed,lift
+
     def setmaxspeed(self):
         print('SET MAX SPEED:',self.motor_waits_maximum)
         self.motor_waits_current = self.motor_waits_maximum
@@ -442,6 +513,7 @@ class POSTY:
             self.hold = []
         else:
             self.socket.sendints([11]) # keep socket open
+        self.socket.frame_flush()
         self.hold_11_time = time.time()
 
     #-----------------------------------------
@@ -570,73 +642,216 @@ class POSTY:
         # current xyz location
         truexyz = self.xyz.getxyz()
 
+        # plan and translate the whole segment at once
+        if self.xyz_arrays:
+            truexyz = self.xyz_steps_send_many(self.xyz.moveto_array(x,y,z)) or truexyz
+
         # iterate through track points
-        for X,Y,Z in self.xyz.moveto(x,y,z):
-            truexyz = self.xyz_steps_send(X,Y,Z)
+        else:
+            for X,Y,Z in self.xyz.moveto(x,y,z):
+                truexyz = self.xyz_steps_send(X,Y,Z)
 
         # reset xyz to true values
         self.xyz.setxyz(*truexyz)
+
+        # send any collected frame bytes
+        self.socket.frame_flush()
         
     def move(self,x=0,y=0,z=0):
 
         # current xyz location
         truexyz = self.xyz.getxyz()
 
+        # plan and translate the whole segment at once
+        if self.xyz_arrays:
+            truexyz = self.xyz_steps_send_many(self.xyz.move_array(x,y,z)) or truexyz
+
         # iterate through track points
-        for X,Y,Z in self.xyz.move(x,y,z):
-            truexyz = self.xyz_steps_send(X,Y,Z)
+        else:
+            for X,Y,Z in self.xyz.move(x,y,z):
+                truexyz = self.xyz_steps_send(X,Y,Z)
 
         # reset xyz to true values
         self.xyz.setxyz(*truexyz)
+
+        # send any collected frame bytes
+        self.socket.frame_flush()
         
     def arcto(self,x=None,y=None,z=None,cx=None,cy=None,r=None,D=None,R=1,T=0):
 
         # current xyz location
         truexyz = self.xyz.getxyz()
 
+        # plan and translate the whole segment at once
+        if self.xyz_arrays:
+            truexyz = self.xyz_steps_send_many(self.xyz.arcto_array(x,y,z,cx,cy,r,D,R,T)) or truexyz
+
         # iterate through track points
-        for X,Y,Z in self.xyz.arcto(x,y,z,cx,cy,r,D,R,T):
-            truexyz = self.xyz_steps_send(X,Y,Z)
+        else:
+            for X,Y,Z in self.xyz.arcto(x,y,z,cx,cy,r,D,R,T):
+                truexyz = self.xyz_steps_send(X,Y,Z)
 
         # reset xyz to true values
         self.xyz.setxyz(*truexyz)
+
+        # send any collected frame bytes
+        self.socket.frame_flush()
         
     def arc(self,x=0,y=0,z=0,cx=0,cy=0,r=None,D=None,R=1,T=0):
 
         # current xyz location
         truexyz = self.xyz.getxyz()
 
+        # plan and translate the whole segment at once
+        if self.xyz_arrays:
+            truexyz = self.xyz_steps_send_many(self.xyz.arc_array(x,y,z,cx,cy,r,D,R,T)) or truexyz
+
         # iterate through track points
-        for X,Y,Z in self.xyz.arc(x,y,z,cx,cy,r,D,R,T):
-            truexyz = self.xyz_steps_send(X,Y,Z)
+        else:
+            for X,Y,Z in self.xyz.arc(x,y,z,cx,cy,r,D,R,T):
+                truexyz = self.xyz_steps_send(X,Y,Z)
 
         # reset xyz to true values
         self.xyz.setxyz(*truexyz)
+
+        # send any collected frame bytes
+        self.socket.frame_flush()
         
-    def write(self,text,x=None,y=None,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None,rotate=0):
+    def write(self,text,x=None,y=None,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None,rotate=0,optimize=None):
 
         # current xyz location
         truexyz = self.xyz.getxyz()
 
+        # track points (optimize = strokes in short pen-up travel order)
+        if optimize == None:
+            optimize = self.travel_optimize
+        if optimize:
+            strokes = self.writer.layout(text,x,y,height,maxwidth,font,csep,lsep,align,valign,rotate)
+            points = self.writer.draw(self.travel.optimize(strokes,truexyz))
+            if self.bc_show:
+                self.travel.report()
+        else:
+            points = self.writer.write(text,x,y,height,maxwidth,font,csep,lsep,align,valign,rotate)
+
         # iterate through track points
-        for X,Y,Z in self.writer.write(text,x,y,height,maxwidth,font,csep,lsep,align,valign,rotate):
+        for X,Y,Z in points:
             truexyz = self.xyz_steps_send(X,Y,Z)
 
         # reset xyz to true values
         self.xyz.setxyz(*truexyz)
+
+        # send any collected frame bytes
+        self.socket.frame_flush()
         
-    def gcode(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0):
+    def write_many(self,items,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None,rotate=0,order=True):
+
+        # write many (text,x,y) items from cached glyphs as one path
+        # strokes are ordered for short pen-up travel (order=False keeps text order)
+        strokes = self.writer.layout_many(items,height,maxwidth,font,csep,lsep,align,valign,rotate,order)
+        if order and self.bc_show:
+            self.travel.report()
 
         # current xyz location
         truexyz = self.xyz.getxyz()
 
+        # iterate through track points (or whole arrays)
+        if self.xyz_arrays:
+            for points in self.writer.draw_arrays(strokes):
+                truexyz = self.xyz_steps_send_many(points) or truexyz
+        else:
+            for X,Y,Z in self.writer.draw(strokes):
+                truexyz = self.xyz_steps_send(X,Y,Z)
+
+        # reset xyz to true values
+        self.xyz.setxyz(*truexyz)
+
+        # send any collected frame bytes
+        self.socket.frame_flush()
+
+    def gcode(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0,optimize=None):
+
+        # current xyz location
+        truexyz = self.xyz.getxyz()
+
+        # track points (optimize = strokes in short pen-up travel order)
+        if optimize == None:
+            optimize = self.travel_optimize
+        if optimize:
+            strokes = self.gcoder.strokes_file(file,width,height,align,valign,origin_bottom_left,use_start_code,rotate)
+            points = self.gcoder.draw(self.travel.optimize(strokes,truexyz))
+            if self.bc_show:
+                self.travel.report()
+        else:
+            points = self.gcoder.run_file(file,width,height,align,valign,origin_bottom_left,use_start_code,rotate)
+
         # iterate through track points
-        for X,Y,Z in self.gcoder.run_file(file,width,height,align,valign,origin_bottom_left,use_start_code,rotate):
+        for X,Y,Z in points:
             truexyz = self.xyz_steps_send(X,Y,Z)
 
         # reset xyz to true values
         self.xyz.setxyz(*truexyz)
 
+        # send any collected frame bytes
+        self.socket.frame_flush()
+
+    def gcode_async(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0,cache=None):
+
+        # same as gcode(), but parse, interpolate, translate, encode, and
+        # transmit run as asyncio tasks with bounded queues between them
+
+        # with cache (default program_cache) the run is compiled to a program
+        # file, and a repeat run (same file, arguments, and start) only sends it
+        if cache == None:
+            cache = self.program_cache
+
+        # send anything held or collected first
+        if self.hold:
+            self.holdsend()
+        self.socket.frame_flush()
+
+        # start from current step location
+        self.pipeline.setspeed = self.gcoder.setspeed
+        self.pipeline.steps = (self.s1,self.s2,self.s3)
+        self.pipeline.waits_current = self.motor_waits_current
+        counts = (self.pipeline.xc,self.pipeline.pc,self.pipeline.bc,self.pipeline.sc)
+
+        # run
+        hits = self.programs.hits
+        if cache:
+            truexyz = self.programs.run_gcode(file,width,height,align,valign,origin_bottom_left,use_start_code,rotate)
+        else:
+            truexyz = self.pipeline.run_gcode(file,width,height,align,valign,origin_bottom_left,use_start_code,rotate)
+
+        # update step location and counts
+        self.s1,self.s2,self.s3 = self.pipeline.steps
+        self.xc += self.pipeline.xc - counts[0]
+        self.pc += self.pipeline.pc - counts[1]
+        self.bc += self.pipeline.bc - counts[2]
+        self.sc += self.pipeline.sc - counts[3]
+        if self.pipeline.waits_current:
+            self.motor_waits_current = self.pipeline.waits_current
+
+        # reset xyz to true values
+        self.xyz.setxyz(*truexyz)
+
+        # stage counts
+        if self.bc_show:
+            if self.programs.hits > hits:
+                print('PROGRAM SENT:',file)
+            else:
+                self.pipeline.report()
+                if self.pipeline.motion:
+                    self.pipeline.motion.report()
+
+    def gcode_compile(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0):
+
+        # compile a program for gcode_async(cache=True) without sending it
+        # programs start from a location, so compile from where the job will start
+        self.pipeline.setspeed = self.gcoder.setspeed
+        self.pipeline.steps = (self.s1,self.s2,self.s3)
+        self.pipeline.waits_current = self.motor_waits_current
+        return self.programs.compile_gcode(file,width,height,align,valign,origin_bottom_left,use_start_code,rotate)
+
     def xyz_steps_send(self,x,y,z):
 
         # count xyz points
@@ -677,6 +892,59 @@ class POSTY:
             self.s2 = s2
             self.s3 = s3
 
+        # keep socket open, notify
+        self.xyz_steps_check()
+
+        # return actual location
+        #print('    END:',[round(x,3),round(y,3),round(z,3)])
+        return x,y,z
+
+    def xyz_steps_send_many(self,points):
+
+        # same as xyz_steps_send() for an Nx3 array of points
+        # returns the actual location of the last point (None if no points)
+
+        if not len(points):
+            return None
+
+        # count xyz points
+        self.xc += len(points)
+
+        # convert points to motor 1,2,3 step values
+        steps,true = self.scara.translate_many(points)
+
+        # motor step limits
+        steps = np.clip(steps,
+                        [self.motors[m][1] for m in (1,2,3)],
+                        [self.motors[m][2] for m in (1,2,3)])
+
+        # position changes
+        diffs = np.diff(steps,axis=0,prepend=[(self.s1,self.s2,self.s3)])
+        diffs = diffs[np.any(diffs,axis=1)]
+
+        # make changes
+        for d1,d2,d3 in diffs.tolist():
+            self.pc += 1
+            if d1:
+                self.motor_steps_send(1,d1)
+            if d2:
+                self.motor_steps_send(2,d2)
+            if d3:
+                self.motor_steps_send(3,d3)
+            self.sc += d1 + d2 + d3
+            self.xyz_steps_check()
+
+        # reset step counts
+        self.s1,self.s2,self.s3 = steps[-1].tolist()
+
+        # keep socket open, notify
+        self.xyz_steps_check()
+
+        # return actual location
+        return tuple(true[-1].tolist())
+
+    def xyz_steps_check(self):
+
         # keep socket open
         if self.hold_do and self.hold_11_time + self.hold_11_time_renew - 0.5 <= time.time():
             self.socket.sendints([11]) # keep socket open
@@ -687,10 +955,6 @@ class POSTY:
             print('COUNTS:',self.xc,self.pc,self.bc,self.sc)
             self.bc_last += self.bc_every
 
-        # return actual location
-        #print('    END:',[round(x,3),round(y,3),round(z,3)])
-        return x,y,z
-
     def motor_steps_send(self,motor,steps):
 
         # limit motors
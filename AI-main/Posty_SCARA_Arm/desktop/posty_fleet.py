@@ -0,0 +1,570 @@
+#-----------------------------------------
+# posty fleet: one job queue, many arms
+#-----------------------------------------
+
+# POSTY drives one arm over one blocking socket. Here jobs (gcode,
+# text, postcards) are compiled to command bytes once and dispatched
+# to several arms, each with its own asyncio connection:
+
+# 1. compile: a POSTY with hold_do collects the bytes of index --> emoh
+#    --> job --> home, so every job starts and ends at the index point
+#    and can go to any arm with the same setup
+# 2. send: the bytes go out as acknowledged frames (blocks) with a
+#    window, like Byte_Socket.framing (the device needs frame support)
+# 3. heartbeat: an idle arm gets [11] every heartbeat seconds
+#    (POSTY.hold_11_time_renew), so the device doesn't time out
+# 4. retry: on a disconnect or ack timeout the arm reconnects and
+#    resumes from the first block not acknowledged, after setting the
+#    motor waits that were in effect there (the device resets them)
+
+# A block that was running when the link dropped is sent again, so a
+# few of its steps may run twice. Keep block_size small on bad links.
+# A job that fails before any block is acknowledged goes back to the
+# queue for another arm, otherwise it is marked failed.
+
+# how to:
+# fleet = PostyFleet([('arm1','192.168.254.81',10240),('arm2','192.168.254.82',10240)])
+# fleet.add(postcard_job('Lawson Lindsey\n...'))
+# fleet.add(gcode_job('project_kevin/kevin_v1.gcode',height=5.3,align='c',valign='m'))
+# fleet.add(text_job('hayride',x=3,y=-2,height=3/8,align='c',valign='m'))
+# asyncio.run(fleet.run())
+# fleet.report()
+
+#-----------------------------------------
+# general imports
+#-----------------------------------------
+
+import sys,time,math,asyncio,threading,collections
+
+import posty_desktop_a4988 as postyapp
+
+from posty_lib import byte_socket
+
+#-----------------------------------------
+# quiet compile threads
+#-----------------------------------------
+
+class ThreadStdout:
+
+    # POSTY prints every move, this drops prints from the compile threads
+    # (PostyFleet.quiet) and passes the rest
+
+    def __init__(self,stdout):
+        self.stdout = stdout
+        self.quiet = set() # thread ids
+
+    def write(self,text):
+        if threading.get_ident() in self.quiet:
+            return len(text)
+        return self.stdout.write(text)
+
+    def __getattr__(self,name):
+        return getattr(self.stdout,name)
+
+#-----------------------------------------
+# jobs
+#-----------------------------------------
+
+class PostyJob:
+
+    # draw(posty) makes the marks, options are POSTY attributes set first
+    # (like paper_origin and paper_end)
+
+    def __init__(self,name,draw,options=None):
+
+        self.name = name
+        self.draw = draw
+        self.options = options or {}
+
+        # compiled
+        self.stream = None
+        self.blocks = None # [(ints,waits before)]
+        self.sent = 0 # blocks sent
+        self.acked = 0 # blocks acknowledged
+        self.compile_seconds = 0
+
+        # result
+        self.status = 'queued' # compiled, running, done, failed
+        self.arm = None
+        self.attempts = 0
+        self.started = None
+        self.finished = None
+        self.error = None
+
+    def compile(self,posty_class=postyapp.POSTY):
+
+        t1 = time.perf_counter()
+
+        # posty at the index point, everything goes to posty.hold
+        posty = posty_class()
+        posty.hold_do = True
+        posty.hold_11_time_renew = math.inf # no [11] while compiling
+        posty.bc_show = False
+        posty.writer.send = lambda: None # not holdsend(), the hold is the job
+        for key,value in self.options.items():
+            setattr(posty,key,value)
+        index_steps,true_index_point = posty.scara.translate(*posty.index_point)
+        posty.xyz.setxyz(*true_index_point)
+        posty.s1,posty.s2,posty.s3 = index_steps
+
+        # job
+        posty.setnormalspeed()
+        posty.emoh()
+        self.draw(posty)
+        posty.home()
+
+        self.stream = posty.hold
+        self.compile_seconds = time.perf_counter() - t1
+        self.status = 'compiled'
+
+        return self.stream
+
+    def split(self,size,socket=None):
+
+        # blocks of whole commands, each with the motor waits in effect
+        # before it ({motor:us}, from commands 22 and 26)
+        socket = socket or byte_socket.Byte_Socket()
+        lengths = socket.command_lengths
+        self.blocks = []
+        waits = {}
+        index = 0
+        while index < len(self.stream):
+            end = index + socket.frame_split(self.stream[index:index+size+16],size)
+            ints = self.stream[index:end]
+            self.blocks.append((ints,dict(waits)))
+
+            # waits after this block
+            i = 0
+            while i < len(ints):
+                cmd = ints[i]
+                if cmd == 22 and i+3 < len(ints):
+                    waits[ints[i+1]] = ints[i+2]*256+ints[i+3]
+                elif cmd == 26 and i+2 < len(ints):
+                    waits[1] = waits[2] = ints[i+1]*256+ints[i+2]
+                i += lengths.get(cmd,1) if cmd < 32 else 1
+            index = end
+
+        return self.blocks
+
+# job makers
+
+def gcode_job(file,width=None,height=None,align='c',valign='m',origin_bottom_left=True,use_start_code=True,rotate=0,x=None,y=None,name=None):
+    def draw(posty):
+        if x != None or y != None:
+            posty.up()
+            posty.moveto(x,y)
+        posty.setdrawspeed()
+        posty.gcode(file,width,height,align,valign,origin_bottom_left,use_start_code,rotate)
+        posty.up()
+        posty.setnormalspeed()
+    return PostyJob(name or file,draw)
+
+def text_job(text,x=None,y=None,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None,rotate=0,name=None):
+    def draw(posty):
+        posty.write(text,x,y,height,maxwidth,font,csep,lsep,align,valign,rotate)
+    return PostyJob(name or text.split('\n')[0],draw)
+
+def postcard_job(address,return_address='Posty Robot\n793 Coile Rd\nComer GA 30629',image=None,name=None):
+
+    # same layout as posty_postcard.py (5.5 x 3.5 card)
+    def draw(posty):
+        if return_address:
+            posty.write(return_address,x=0.1,y=-0.1,height=3/16,maxwidth=5.5,csep=1.6,lsep=4,align='l',valign='t',rotate=0)
+        if address:
+            address_lines = '\n'.join(line.strip() for line in address.strip().split('\n'))
+            posty.write(address_lines,x=2.5,y=-1.6875,height=3/16,maxwidth=5.5,csep=1.6,lsep=4,align='l',valign='t',rotate=0)
+        if image:
+            posty.up()
+            posty.moveto(2.75,-0.02)
+            posty.gcode(image,height=1.75,width=0,align='c',valign='t',origin_bottom_left=False,use_start_code=True,rotate=0)
+            posty.up()
+
+    return PostyJob(name or address.strip().split('\n')[0],draw,{'paper_origin':(0,0),'paper_end':(5.5,-3.5)})
+
+#-----------------------------------------
+# arm connection
+#-----------------------------------------
+
+class PostyArm:
+
+    # connection
+    connect_timeout = 10 # seconds per try
+    retries = 5 # reconnects per job
+    retry_wait = 2 # seconds between reconnects
+    heartbeat = postyapp.POSTY.hold_11_time_renew/2 # seconds idle before [11] (device times out at 10)
+
+    # frames
+    block_size = 1024 # command bytes per block (frame)
+    window = 8 # blocks sent but not acknowledged
+    ack_timeout = 60 # seconds without any byte back (the arm may be busy stepping)
+
+    def __init__(self,name,host,port=10240):
+
+        self.name = name
+        self.host = host
+        self.port = port
+
+        # connection
+        self.reader = None
+        self.writer = None
+        self.receiver = None
+        self.acks = None
+        self.fresh = False # device waits are at their defaults
+        self.last_send = 0
+        self.online = True
+        self.codec = byte_socket.Byte_Socket() # frame encoding only
+
+        # metrics
+        self.started = time.time()
+        self.busy_seconds = 0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.heartbeats = 0
+        self.blocks_sent = 0
+        self.blocks_resent = 0
+        self.bytes_sent = 0
+
+    # ----------------------------------------------
+    # connection
+    # ----------------------------------------------
+
+    async def connect(self):
+
+        await self.close()
+        self.reader,self.writer = await asyncio.wait_for(asyncio.open_connection(self.host,self.port),self.connect_timeout)
+        self.acks = asyncio.Queue()
+        self.receiver = asyncio.create_task(self.receive())
+        self.fresh = True
+        self.connects += 1
+
+        # motors on
+        await self.send([14])
+
+    async def close(self,eod=False):
+
+        if self.writer:
+
+            # end of data, the device closes after it
+            if eod:
+                try:
+                    await self.send([2])
+                    await asyncio.wait_for(self.receiver,self.ack_timeout)
+                except (OSError,asyncio.TimeoutError):
+                    pass
+
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+
+        if self.receiver:
+            self.receiver.cancel()
+            try:
+                await self.receiver
+            except (asyncio.CancelledError,OSError):
+                pass
+
+        self.reader,self.writer,self.receiver = None,None,None
+
+    async def receive(self):
+
+        # acks to the ack queue, None on any other byte (still alive)
+        # and on end of connection
+        try:
+            while 1:
+                data = await self.reader.read(1024)
+                if not data:
+                    break
+                for i in data:
+                    if i >= 128:
+                        self.acks.put_nowait(i-128)
+                    else:
+                        self.acks.put_nowait(None)
+                    if i in (2,12):
+                        return
+        finally:
+            self.acks.put_nowait(False)
+
+    async def send(self,ints):
+        self.writer.write(bytes(ints))
+        await self.writer.drain()
+        self.bytes_sent += len(ints)
+        self.last_send = time.time()
+
+    async def idle(self):
+
+        # heartbeat if nothing was sent for a while
+        if self.writer and time.time() - self.last_send >= self.heartbeat:
+            try:
+                await self.send([11])
+                self.heartbeats += 1
+            except OSError:
+                await self.close()
+
+    # ----------------------------------------------
+    # jobs
+    # ----------------------------------------------
+
+    async def run_job(self,job):
+
+        # send all blocks, reconnect and resume on errors
+        # returns the number of blocks acknowledged (all if done)
+        job.arm = self.name
+        job.status = 'running'
+        job.started = time.time()
+        if job.blocks == None:
+            job.split(self.block_size,self.codec)
+        done = 0
+        tries = 0
+        try:
+            while done < len(job.blocks):
+                try:
+                    if not self.writer:
+                        await self.connect()
+                    done = await self.send_blocks(job,done)
+                    job.acked = done
+                except (OSError,asyncio.TimeoutError) as e:
+                    done = job.acked
+                    self.blocks_resent += job.sent - job.acked
+                    job.error = repr(e)
+                    await self.close()
+                    tries += 1
+                    if tries > self.retries:
+                        raise
+                    self.reconnects += 1
+                    print('ARM {}: RETRY {} JOB {} AT BLOCK {}/{} ({})'.format(self.name,tries,job.name,done,len(job.blocks),job.error))
+                    await asyncio.sleep(self.retry_wait)
+        finally:
+            self.busy_seconds += time.time() - job.started
+            job.attempts += 1
+
+        job.status = 'done'
+        job.finished = time.time()
+        job.error = None
+        self.jobs_done += 1
+        return done
+
+    async def send_blocks(self,job,first):
+
+        # frames from block first, returns blocks acknowledged
+        blocks = job.blocks
+        unacked = collections.deque() # (seq,block)
+        done = first
+        index = first
+        while index < len(blocks) or unacked:
+
+            # fill the window
+            while index < len(blocks) and len(unacked) < self.window:
+                ints,waits = blocks[index]
+
+                # new connection mid-job: put the waits back first
+                if self.fresh and index == first and first > 0:
+                    prefix = []
+                    for motor,wait in sorted(waits.items()):
+                        prefix += [22,motor] + self.codec.int22intlistbe(wait)
+                    ints = prefix + ints
+                self.fresh = False
+
+                seq,frame = self.codec.frame_build(ints)
+                await self.send(frame)
+                unacked.append((seq,index))
+                self.blocks_sent += 1
+                index += 1
+                job.sent = index
+
+            # wait for an ack (any byte back renews the timeout)
+            seq = await asyncio.wait_for(self.acks.get(),self.ack_timeout)
+            if seq is False:
+                raise ConnectionError('Connection closed.')
+            if seq is None:
+                continue
+
+            # acks come in order
+            while unacked:
+                s,block = unacked.popleft()
+                if s == seq:
+                    done = job.acked = block + 1
+                    break
+
+        return done
+
+    # ----------------------------------------------
+    # metrics
+    # ----------------------------------------------
+
+    def utilization(self,now=None):
+        elapsed = (now or time.time()) - self.started
+        return self.busy_seconds/elapsed if elapsed > 0 else 0
+
+    def jobs_per_hour(self,now=None):
+        elapsed = (now or time.time()) - self.started
+        return self.jobs_done*3600/elapsed if elapsed > 0 else 0
+
+#-----------------------------------------
+# fleet
+#-----------------------------------------
+
+class PostyFleet:
+
+    posty_class = postyapp.POSTY # setup of all arms
+    compile_ahead = 1 # compiled jobs waiting per arm
+    quiet = True # no POSTY prints while compiling
+
+    def __init__(self,arms):
+
+        # arms = [PostyArm or (name,host,port)]
+        self.arms = [arm if isinstance(arm,PostyArm) else PostyArm(*arm) for arm in arms]
+
+        # queues
+        self.queue = collections.deque() # not compiled
+        self.ready = collections.deque() # compiled
+        self.compile_event = None # asyncio.Event, queue or ready changed
+        self.changed = None # asyncio.Condition, ready or job status changed
+        self.jobs = []
+        self.started = None
+        self.finished = None
+
+    def add(self,job):
+        self.jobs.append(job)
+        self.queue.append(job)
+        if self.compile_event:
+            self.compile_event.set()
+        return job
+
+    def remaining(self):
+        return [job for job in self.jobs if job.status not in ('done','failed')]
+
+    async def notify(self):
+        async with self.changed:
+            self.changed.notify_all()
+
+    # ----------------------------------------------
+    # run
+    # ----------------------------------------------
+
+    async def run(self,forever=False):
+
+        # until all jobs are done or failed (or all arms are offline)
+        # forever=True keeps the arms connected for jobs added later
+        self.compile_event = asyncio.Event()
+        self.changed = asyncio.Condition()
+        self.started = time.time()
+        for arm in self.arms:
+            arm.started = self.started
+        stdout = sys.stdout
+        if self.quiet:
+            sys.stdout = ThreadStdout(stdout)
+        compiler = asyncio.create_task(self.compiler())
+        try:
+            await asyncio.gather(*[self.worker(arm,forever) for arm in self.arms])
+        finally:
+            compiler.cancel()
+            try:
+                await compiler
+            except asyncio.CancelledError:
+                pass
+            sys.stdout = stdout
+            self.finished = time.time()
+
+        # jobs no arm could take
+        for job in self.remaining():
+            job.status = 'failed'
+            job.error = job.error or 'No arm online.'
+
+    async def compiler(self):
+
+        # compile ahead in a thread, so acks and heartbeats keep going
+        loop = asyncio.get_running_loop()
+        while 1:
+            if self.queue and len(self.ready) < self.compile_ahead*len(self.arms):
+                job = self.queue.popleft()
+                try:
+                    await loop.run_in_executor(None,self.compile,job)
+                    self.ready.append(job)
+                except Exception as e:
+                    job.status = 'failed'
+                    job.error = repr(e)
+                    print('JOB {} COMPILE ERROR: {}'.format(job.name,job.error))
+                await self.notify()
+            else:
+                self.compile_event.clear()
+                await self.compile_event.wait()
+
+    def compile(self,job):
+        if isinstance(sys.stdout,ThreadStdout):
+            sys.stdout.quiet.add(threading.get_ident())
+        try:
+            return job.compile(self.posty_class)
+        finally:
+            if isinstance(sys.stdout,ThreadStdout):
+                sys.stdout.quiet.discard(threading.get_ident())
+
+    async def next_job(self,arm,forever):
+
+        # a compiled job, heartbeats while waiting, None when finished
+        while 1:
+            if self.ready:
+                self.compile_event.set()
+                return self.ready.popleft()
+            if not forever and not self.remaining():
+                return None
+            try:
+                async with self.changed:
+                    await asyncio.wait_for(self.changed.wait(),max(0.1,arm.last_send+arm.heartbeat-time.time()))
+            except asyncio.TimeoutError:
+                pass
+            await arm.idle()
+
+    async def worker(self,arm,forever):
+
+        while 1:
+            job = await self.next_job(arm,forever)
+            if job == None:
+                break
+            try:
+                await arm.run_job(job)
+                print('ARM {}: DONE {} ({:.1f}s)'.format(arm.name,job.name,job.finished-job.started))
+
+            # arm is down
+            except (OSError,asyncio.TimeoutError):
+                arm.online = False
+                arm.jobs_failed += 1
+                print('ARM {}: OFFLINE ({})'.format(arm.name,job.error))
+
+                # nothing drawn yet: another arm can take it
+                if not job.acked:
+                    job.status = 'compiled'
+                    self.ready.appendleft(job)
+                else:
+                    job.status = 'failed'
+                    job.finished = time.time()
+                await self.notify()
+                break
+            await self.notify()
+
+        await arm.close(eod=arm.online)
+
+    # ----------------------------------------------
+    # metrics
+    # ----------------------------------------------
+
+    def report(self):
+
+        now = self.finished or time.time()
+        hours = (now - self.started)/3600 if self.started else 0
+        for arm in self.arms:
+            print('ARM {:<8} JOBS: {:>4} FAILED: {:>3} UTIL: {:>5.1f}% JOBS/HR: {:>7.1f} RECONNECTS: {:>3} RESENT: {:>4} HEARTBEATS: {:>4} BYTES: {:>9}'.format(
+                arm.name,arm.jobs_done,arm.jobs_failed,100*arm.utilization(now),arm.jobs_per_hour(now),
+                arm.reconnects,arm.blocks_resent,arm.heartbeats,arm.bytes_sent))
+        done = sum(1 for job in self.jobs if job.status == 'done')
+        failed = sum(1 for job in self.jobs if job.status == 'failed')
+        compiled = sum(job.compile_seconds for job in self.jobs)
+        print('FLEET: JOBS: {} DONE: {} FAILED: {} HOURS: {:.3f} JOBS/HR: {:.1f} COMPILE: {:.1f}s'.format(
+            len(self.jobs),done,failed,hours,done/hours if hours else 0,compiled))
+
+#-----------------------------------------
+# end
+#-----------------------------------------
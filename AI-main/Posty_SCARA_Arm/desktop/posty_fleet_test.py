@@ -0,0 +1,113 @@
+import os,sys,time,math,asyncio,tempfile
+
+from posty_lib import byte_server
+
+import posty_fleet
+
+#-----------------------------------------
+# fleet scheduler against simulated arms
+#-----------------------------------------
+
+# usage:
+# python3 posty_fleet_test.py [arms] [jobs]
+# each arm is a byte_server.Byte_Server paced to its simulated clock,
+# the first one drops the connection once in the middle of a job
+
+arms = 3
+jobs = 9
+if len(sys.argv) > 1:
+    arms = int(sys.argv[1])
+if len(sys.argv) > 2:
+    jobs = int(sys.argv[2])
+
+realtime = 20 # simulated arms run this many times faster
+
+#-----------------------------------------
+# simulated arms
+#-----------------------------------------
+
+class FlakyServer(byte_server.Byte_Server):
+
+    # drops the client at frame drop_at (once), keeps the step location
+    # across connections like a real arm
+    drop_at = None
+    location = None
+
+    def reset(self):
+        if self.location == None:
+            self.location = {1:0,2:0,3:0}
+        else:
+            for motor,steps in self.steps.items():
+                self.location[motor] += steps
+        super().reset()
+
+    def process(self,client_socket,buffer,index):
+        if self.drop_at != None and self.fc >= self.drop_at and index < len(buffer) and buffer[index] == 23:
+            self.drop_at = None
+            client_socket.close()
+            raise OSError('Dropped by test.')
+        return super().process(client_socket,buffer,index)
+
+    def final(self):
+        if self.location == None:
+            return dict(self.steps)
+        return {motor:self.location[motor]+self.steps[motor] for motor in self.steps}
+
+servers = []
+for n in range(arms):
+    server = FlakyServer()
+    server.realtime = realtime
+    if n == 0:
+        server.drop_at = 5
+    server.start()
+    servers.append(server)
+
+#-----------------------------------------
+# jobs
+#-----------------------------------------
+
+def make_gcode(file,strokes=6):
+    with open(file,'w') as f:
+        f.write('%\nG21\nG90\n')
+        for s in range(strokes):
+            cx,cy = (s%3)*12,(s//3)*12
+            f.write(f'G0 Z1\nG0 X{cx+5:.3f} Y{cy:.3f}\nG1 Z-1\n')
+            for p in range(1,37):
+                a = p*2*math.pi/36
+                f.write(f'G1 X{cx+5*math.cos(a):.3f} Y{cy+5*math.sin(a):.3f}\n')
+        f.write('G0 Z1\nM2\n%\n')
+
+gcode_file = os.path.join(tempfile.gettempdir(),'posty_fleet_test.gcode')
+make_gcode(gcode_file)
+
+posty_fleet.postyapp.POSTY.xyz_arrays = True # faster compile
+fleet = posty_fleet.PostyFleet([('arm{}'.format(n+1),server.server_host,server.server_port) for n,server in enumerate(servers)])
+for n in range(jobs):
+    if n%3 == 0:
+        fleet.add(posty_fleet.postcard_job('Resident {}\n{} Main Street\nSpringfield, ST {:05d}'.format(n,100+n,10000+n)))
+    elif n%3 == 1:
+        fleet.add(posty_fleet.text_job('hayride {}'.format(n),x=3,y=-2,height=3/8,align='c',valign='m'))
+    else:
+        fleet.add(posty_fleet.gcode_job(gcode_file,width=3,x=3,y=-2,name='circles {}'.format(n)))
+for arm in fleet.arms:
+    arm.retry_wait = 0.2
+
+#-----------------------------------------
+# run
+#-----------------------------------------
+
+t1 = time.time()
+asyncio.run(fleet.run())
+print('SECONDS: {:.1f}'.format(time.time()-t1))
+fleet.report()
+
+# jobs start and end at the index point, so every arm is back at 0 steps
+for arm,server in zip(fleet.arms,servers):
+    print('ARM {:<8} END STEPS: {} SIM JOB TIME: {:.1f}s'.format(arm.name,server.final(),server.seconds()))
+    server.stop()
+
+os.remove(gcode_file)
+
+#-----------------------------------------
+# end
+#-----------------------------------------
@@ -0,0 +1,372 @@
+# Posty Project: byte_server.py
+# Copyright (c) 2019 Clayton Darwin claytondarwin@gmail.com
+
+# notify
+print('LOAD: byte_server.py')
+
+#-----------------------------------------------
+# local loopback server for the posty byte syntax
+#-----------------------------------------------
+
+# This runs the same command decoding as posty_esp32_a4899.py,
+# but on the desktop and without motors. It only counts.
+# Use it to test Byte_Socket and POSTY without a device.
+
+# Step timing is simulated like the device does it (per motor waits,
+# one motor byte after the other), so clock is the job time in us
+# the arm would need. simulate(ints) runs a byte list without a socket.
+
+# As a headless device: set realtime to pace replies and reads to the
+# simulated clock (1 = device speed, 10 = ten times faster). Like the
+# device, nothing is read while steps run, so the client waits on a full
+# socket (client_read = device buffer, recv_buffer = socket buffer).
+
+# how to:
+# server = Byte_Server()
+# server.start() # background thread, sets server.server_port if 0
+# ... connect a Byte_Socket to (server.server_host,server.server_port) ...
+# server.stop()
+# server.realtime = 1 # before start(), for device pacing
+# seconds = Byte_Server().simulate(ints) # offline job time
+
+# ----------------------------------------------
+# imports
+# ----------------------------------------------
+
+# standard library imports
+import time,traceback,socket,select,threading
+
+# ----------------------------------------------
+# threaded loopback server
+# ----------------------------------------------
+
+class Byte_Server:
+
+    # user defined variables
+    server_host = '127.0.0.1'
+    server_port = 0 # 0 = any free port
+    client_timeout = 10 # seconds after last data received
+    client_read = 1024 # max bytes per socket read (device buffer)
+    recv_buffer = None # socket receive buffer bytes (None = os default)
+    show = False # print commands
+
+    # device speed
+    default_sps = {1:400,2:400,3:400} # state changes per second on connect
+    max_sps = None # fastest the device can step (None = no limit)
+    realtime = 0 # pace to the simulated clock (0 = off, 1 = device speed)
+
+    # process variables
+    server_socket = None
+    thread = None
+    running = False
+
+    # counts (reset for each client)
+    steps = {1:0,2:0,3:0} # absolute step location
+    sp = 0 # steps processed
+    sc = 0 # motor bytes (states) processed
+    cc = 0 # other commands processed
+    fc = 0 # frames processed
+    reads = 0 # socket read calls
+    bytes_in = 0
+    bytes_out = 0
+    client_seconds = 0
+
+    # motor wait times in us (set by command 22 or 26)
+    motor_waits = {1:2500,2:2500,3:2500}
+
+    # simulated device time in us
+    clock = 0
+    started = 0 # wall time at reset (for realtime)
+    idle_us = 0 # time spent waiting for data (for realtime)
+    motor_last = {1:-10**9,2:-10**9,3:-10**9} # clock at last step per motor
+    step_us = 4 # step pin high + low
+    direction_us = 1 # direction pin setup
+
+    # ----------------------------------------------
+    # functions
+    # ----------------------------------------------
+
+    def start(self):
+
+        # open server socket
+        self.server_socket = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+        if self.recv_buffer:
+            self.server_socket.setsockopt(socket.SOL_SOCKET,socket.SO_RCVBUF,self.recv_buffer)
+        self.server_socket.bind((self.server_host,self.server_port))
+        self.server_socket.listen(1)
+        self.server_port = self.server_socket.getsockname()[1]
+
+        # serve in background
+        self.running = True
+        self.thread = threading.Thread(target=self.serve,daemon=True)
+        self.thread.start()
+
+        return self.server_port
+
+    def stop(self):
+
+        self.running = False
+        try:
+            self.server_socket.close()
+        except:
+            pass
+        if self.thread:
+            self.thread.join(2)
+        self.thread = None
+
+    def serve(self):
+
+        while self.running:
+
+            # accept a request
+            try:
+                rlist,wlist,xlist = select.select([self.server_socket],[],[],0.1)
+                if not rlist:
+                    continue
+                client_socket,client_address = self.server_socket.accept()
+            except OSError:
+                break
+
+            # one client at a time (like the device)
+            try:
+                self.client(client_socket)
+            except OSError:
+                print(traceback.format_exc())
+                print('Client socket error.')
+            client_socket.close()
+
+    def reset(self):
+        self.steps = {1:0,2:0,3:0}
+        self.motor_waits = {m:int(1000000/sps) for m,sps in self.default_sps.items()}
+        self.sp,self.sc,self.cc,self.fc = 0,0,0,0
+        self.reads,self.bytes_in,self.bytes_out = 0,0,0
+        self.clock = 0
+        self.motor_last = {1:-10**9,2:-10**9,3:-10**9}
+        self.started = time.time()
+        self.idle_us = 0
+
+    def pace(self):
+
+        # realtime: wait until wall time catches up with the simulated clock
+        if self.realtime:
+            wait = self.started + (self.clock+self.idle_us)/1000000/self.realtime - time.time()
+            if wait > 0:
+                time.sleep(wait)
+
+    def wake(self):
+
+        # realtime: time waiting for data is not job time,
+        # and the device can't catch up on it later
+        if self.realtime:
+            behind = (time.time()-self.started)*self.realtime*1000000 - self.clock - self.idle_us
+            self.idle_us += max(0,behind)
+
+    def send(self,client_socket,ints):
+        if client_socket:
+            self.pace()
+            client_socket.sendall(bytes(ints))
+        self.bytes_out += len(ints)
+
+    def seconds(self):
+        return self.clock/1000000
+
+    def simulate(self,ints):
+
+        # run command bytes without a socket, returns simulated seconds
+        self.reset()
+        buffer = bytearray(ints)
+        self.bytes_in = len(buffer)
+        index,eod = self.process(None,buffer,0)
+        return self.seconds()
+
+    def motor_steps(self,motor,direction,steps):
+
+        # track absolute location
+        if direction:
+            self.steps[motor] -= steps
+        else:
+            self.steps[motor] += steps
+
+        # device timing: wait from the last step of this motor, then step
+        # (a motor idle for over 10 seconds steps at once)
+        wait = self.motor_waits[motor]
+        if self.max_sps:
+            wait = max(wait,1000000/self.max_sps-self.step_us)
+        self.clock += self.direction_us
+        last = self.motor_last[motor]
+        if self.clock - last > 10000000:
+            last = self.clock - wait - 1
+        start = max(self.clock,last+wait)
+        self.clock = start + self.step_us + (steps-1)*(wait+self.step_us)
+        self.motor_last[motor] = self.clock
+
+        # steps processed
+        return steps
+
+    def client(self,client_socket):
+
+        # start variables
+        self.reset()
+        t1 = time.time()
+        client_socket.settimeout(0.01)
+        timeout = time.time() + self.client_timeout
+        buffer = bytearray()
+        index = 0
+        eod = False
+
+        # loop
+        while not eod:
+
+            # read data
+            try:
+                data = client_socket.recv(self.client_read)
+                self.reads += 1
+                if not data:
+                    break
+                if index >= len(buffer):
+                    self.wake()
+                buffer += data
+                self.bytes_in += len(data)
+                timeout = time.time() + self.client_timeout
+            except socket.timeout:
+                if time.time() >= timeout:
+                    if self.show:
+                        print('  SEND TMO 12 (no data for {} seconds)'.format(self.client_timeout))
+                    self.send(client_socket,[12])
+                    break
+
+            # process data (steps run before the next read)
+            index,eod = self.process(client_socket,buffer,index)
+            self.pace()
+            if index > 4096:
+                del buffer[:index]
+                index = 0
+
+        # send EOD to client = 2
+        if eod:
+            self.send(client_socket,[2])
+
+        # notify
+        self.client_seconds = time.time()-t1
+        if self.show:
+            print('CLIENT CLOSED - IN:{} OUT:{} READS:{} FRM:{} STS:{}/{} SEC:{}'.format(self.bytes_in,self.bytes_out,self.reads,self.fc,self.sc,self.sp,round(self.client_seconds,2)))
+
+    def process(self,client_socket,buffer,index):
+
+        # run all complete commands from index
+        # returns (new index, end of data)
+
+        while index < len(buffer):
+
+            # command byte
+            cmd = buffer[index]
+
+            # motor commands
+            if cmd >= 32:
+                motor       = (cmd & 224) >> 5
+                direction   = (cmd & 16 ) >> 4
+                extra_steps =  cmd & 15
+                if motor in (1,2,3):
+                    self.sc += 1
+                    self.sp += self.motor_steps(motor,direction,extra_steps+1)
+                index += 1
+
+            # frame, replaced by payload + [25,seq]
+            elif cmd == 23:
+                if len(buffer) < index+4:
+                    break
+                length = buffer[index+2]*256+buffer[index+3]
+                if len(buffer) < index+length+5:
+                    break
+                seq = buffer[index+1]
+                payload = buffer[index+4:index+4+length]
+                if sum(payload) & 255 == buffer[index+4+length]:
+                    buffer[index:index+5+length] = payload + bytes([25,seq])
+                else:
+                    print('  RECV FRM 23 CHECKSUM ERROR',seq)
+                    del buffer[index:index+5+length]
+                self.fc += 1
+
+            # run of one motor byte
+            elif cmd == 24:
+                if len(buffer) < index+3:
+                    break
+                count,b = buffer[index+1],buffer[index+2]
+                motor       = (b & 224) >> 5
+                direction   = (b & 16 ) >> 4
+                extra_steps =  b & 15
+                if motor in (1,2,3):
+                    self.sc += count
+                    self.sp += self.motor_steps(motor,direction,count*(extra_steps+1))
+                index += 3
+
+            # ack request
+            elif cmd == 25:
+                if len(buffer) < index+2:
+                    break
+                self.send(client_socket,[128+(buffer[index+1]&127)])
+                index += 2
+                self.cc += 1
+
+            # block wait for motors 1 and 2
+            elif cmd == 26:
+                if len(buffer) < index+3:
+                    break
+                value = buffer[index+1]*256+buffer[index+2]
+                self.motor_waits[1] = value
+                self.motor_waits[2] = value
+                index += 3
+                self.cc += 1
+
+            # motor wait time
+            elif cmd == 22:
+                if len(buffer) < index+4:
+                    break
+                motor,upper,lower = buffer[index+1:index+4]
+                if motor in (1,2,3):
+                    self.motor_waits[motor] = upper*256+lower
+                index += 4
+                self.cc += 1
+
+            # key
+            elif cmd == 21:
+                if len(buffer) < index+9:
+                    break
+                index += 9
+                self.cc += 1
+
+            # waits
+            elif cmd in (28,29):
+                if len(buffer) < index+2:
+                    break
+                value = buffer[index+1]
+                self.clock += min(10000000,(value >> 3)*10**(value & 7))
+                index += 2
+                self.cc += 1
+
+            # ready for data
+            elif cmd == 1:
+                self.send(client_socket,[1])
+                index += 1
+                self.cc += 1
+
+            # end of data, timeout
+            elif cmd in (2,12):
+                index += 1
+                self.cc += 1
+                return index,True
+
+            # working, disable, enable, nop
+            else:
+                index += 1
+                self.cc += 1
+
+            if self.show and cmd < 32:
+                print('  RECV:',cmd)
+
+        return index,False
+
+# ----------------------------------------------
+# end
+# ----------------------------------------------
@@ -51,6 +51,10 @@ print('LOAD: byte_socket.py')
 # 00010100 = 20 = nop - start of multi-byte commands
 # 00010101 = 21 = user api key bytes are next 8 bytes 
 # 00010110 = 22 = motor wait time in milliseconds to follow, next 3 bytes [motor,value,value] values Big Endian
+# 00010111 = 23 = frame, [23,seq,length,length,payload...,checksum] (see BUILD frame)
+# 00011000 = 24 = run, [24,count,byte] = motor byte repeated count times
+# 00011001 = 25 = ack request, [25,seq], server replies 128+seq when reached
+# 00011010 = 26 = block wait, [26,value,value] = step wait in us for motors 1 and 2 (see BUILD block wait)
 
 # 00011100 = 28 = wait-at-least (from last wait-at-least), one extra byte required
 # 00011101 = 29 = wait-for (from this byte being received), one extra byte required
@@ -70,6 +74,24 @@ print('LOAD: byte_socket.py')
 # the key sequence is [22] + [motor] + [byte1,byte2]
 # the 2-byte value is Big Endian, value = 256*byte1+byte2
 
+# BUILD frame:
+
+# a frame carries many command bytes in one send
+# the sequence is [23,seq,length1,length2] + payload + [checksum]
+# seq is 0-127, length is the payload length (Big Endian, max 65535)
+# checksum is sum(payload) & 255
+# the payload is normal command bytes, plus runs [24,count,byte]
+# the server runs the payload, then replies with one ack byte = 128+seq
+# replies from the server are otherwise < 128
+
+# BUILD block wait:
+
+# a motion planner sets the xy step rate for each block of motor bytes
+# the sequence is [26,byte1,byte2], value = 256*byte1+byte2 (Big Endian)
+# value is the wait time in us between state changes for motors 1 and 2
+# it is the same as [22,1,byte1,byte2] + [22,2,byte1,byte2], but shorter
+# the wait stays until the next 22 or 26 command
+
 # BUILD wait:
 
 # a wait value is a single byte
@@ -109,11 +131,35 @@ class Byte_Socket:
     # process variables
     socket = None
     socket_buffer = []
+    sends = 0 # socket send calls (syscalls)
+    recvs = 0 # socket recv calls (syscalls)
+
+    # framed sending (requires posty_esp32 with frame support)
+    # when on, sendints() collects bytes and sends them as frames
+    framing = False
+    frame_size = 1024 # max command bytes before a frame is sent
+    frame_window = 8 # max frames sent but not acknowledged
+    frame_timeout = 10 # seconds without acks or working codes
+    frame_seq = 0
+    frame_buffer = []
+    frame_unacked = []
+    frames = 0 # frames sent
 
     # codes
     rfd = 1 # read for data
     eod = 2 # end of data
     wfd = 11 # wait for data (working)
+    frm = 23 # frame
+    run = 24 # run of one motor byte
+    ack = 25 # ack request
+    blk = 26 # block wait
+
+    # commands that need an answer or change state now
+    # these are never held back in the frame buffer
+    frame_now = (1,2,12,13,14)
+
+    # command lengths (all others are 1 byte)
+    command_lengths = {21:9,22:4,24:3,25:2,26:3,28:2,29:2}
     
     # ----------------------------------------------
     # sugar
@@ -160,6 +206,8 @@ class Byte_Socket:
 
             # clear data
             self.socket_buffer = []
+            self.frame_buffer = []
+            self.frame_unacked = []
 
             # close open socket
             self.disconnect()
@@ -202,6 +250,7 @@ class Byte_Socket:
 
             # attempt to inform server
             try:
+                self.frame_flush()
                 self.socket.sendall(bytes([self.eod,10]))
                 time.sleep(0.5) # wait a bit for send to happen
             except:
@@ -229,6 +278,14 @@ class Byte_Socket:
         if type(ints) == int:
             ints = [ints]
 
+        # collect and send as frames
+        if self.framing:
+            self.frame_buffer += ints
+            if len(self.frame_buffer) >= self.frame_size or (ints and ints[0] in self.frame_now):
+                if not self.frame_flush(timeout,fail):
+                    return False
+            return len(ints)
+
         # send single bytes
         # if it fails you can resend
         # otherwise you don't know which byte failed
@@ -244,6 +301,7 @@ class Byte_Socket:
                 # this catches blocking errors
                 # keeps trying until timeout
                 try:
+                    self.sends += 1
                     self.socket.sendall(bytes([i]))
                     sent = True
                     break
@@ -297,14 +355,161 @@ class Byte_Socket:
 ##        else:
 ##            return False     
 
+    def sendbuffer(self,data,timeout=10,fail=True,wait=0.01):
+
+        # socket must be open
+        if not self.socket:
+            raise IOError('Socket is not open.')
+
+        # send a whole buffer with as few send calls as possible
+        # partial sends are continued, so no bytes are lost or repeated
+        # timeout is time without progress (a large buffer can take a while)
+        data = memoryview(bytes(data))
+        stop_at = time.time() + timeout
+        while data:
+
+            # timeout
+            if time.time() >= stop_at:
+                if fail:
+                    raise IOError('Timeout on sendbuffer.')
+                else:
+                    return False
+
+            # send what the socket will take
+            try:
+                self.sends += 1
+                data = data[self.socket.send(data):]
+                stop_at = time.time() + timeout
+
+            # wait until writable
+            except BlockingIOError:
+                select.select([],[self.socket],[],wait)
+
+        # success
+        return True
+
+    # ----------------------------------------------
+    # frames
+    # ----------------------------------------------
+
+    def frame_encode(self,ints):
+
+        # replace repeated motor bytes with runs [24,count,byte]
+        # only whole commands are looked at (not command data bytes)
+        encoded = []
+        index,length = 0,len(ints)
+        while index < length:
+            i = ints[index]
+
+            # motor byte, count repeats
+            if i >= 32:
+                count = 1
+                while index+count < length and count < 255 and ints[index+count] == i:
+                    count += 1
+                if count > 2:
+                    encoded += [self.run,count,i]
+                else:
+                    encoded += [i]*count
+                index += count
+
+            # command, copy with its data bytes
+            else:
+                size = self.command_lengths.get(i,1)
+                encoded += ints[index:index+size]
+                index += size
+
+        return encoded
+
+    def frame_flush(self,timeout=10,fail=True):
+
+        # send all collected bytes as frames
+        while self.frame_buffer:
+
+            # frame payload
+            index = self.frame_split(self.frame_buffer,self.frame_size)
+            ints = self.frame_buffer[:index]
+            self.frame_buffer = self.frame_buffer[index:]
+
+            # wait for window
+            if not self.frame_wait(self.frame_window-1,fail):
+                return False
+
+            # send frame
+            seq,frame = self.frame_build(ints)
+            if not self.sendbuffer(frame,timeout,fail):
+                return False
+            self.frame_unacked.append(seq)
+
+        # success
+        return True
+
+    def frame_split(self,ints,size):
+
+        # index near size that doesn't split a command from its data bytes
+        index = 0
+        while index < min(size,len(ints)):
+            index += self.command_lengths.get(ints[index],1)
+        return index
+
+    def frame_build(self,ints):
+
+        # next sequence number and the frame bytes for command ints
+        payload = self.frame_encode(ints)
+        seq = self.frame_seq
+        frame = [self.frm,seq] + list(len(payload).to_bytes(2,'big')) + payload + [sum(payload) & 255]
+        self.frame_seq = (seq + 1) & 127
+        self.frames += 1
+        return seq,frame
+
+    def frame_wait(self,window=0,fail=True):
+
+        # wait until no more than window frames are not acknowledged
+        stop_at = time.time() + self.frame_timeout
+        while len(self.frame_unacked) > window:
+
+            # timeout
+            if time.time() >= stop_at:
+                if fail:
+                    raise IOError('Timeout on frame ack.')
+                else:
+                    return False
+
+            # read acks
+            self.get()
+
+            # still working watchdog timer
+            if self.wfd in self.socket_buffer:
+                self.socket_buffer = [i for i in self.socket_buffer if i != self.wfd]
+                stop_at = time.time() + self.frame_timeout
+
+        # success
+        return True
+
+    def frame_acked(self,seq):
+
+        # acks come in order, so all earlier frames are done too
+        if seq in self.frame_unacked:
+            self.frame_unacked = self.frame_unacked[self.frame_unacked.index(seq)+1:]
+
     def get(self,n=1024):
 
         # check availability and read
         rlist,wlist,xlist = select.select([self.socket],[],[],0.01)
         if rlist:
             bts = self.socket.recv(n)
+            self.recvs += 1
             if bts:
-                self.socket_buffer += list(bts)
+
+                # separate frame acks
+                if self.framing:
+                    for i in bts:
+                        if i >= 128:
+                            self.frame_acked(i-128)
+                        else:
+                            self.socket_buffer.append(i)
+
+                else:
+                    self.socket_buffer += list(bts)
 
     def getint(self,force=False):
 
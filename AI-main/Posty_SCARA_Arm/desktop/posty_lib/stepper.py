@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from . import math2
 
 class LINEAR:
@@ -227,6 +228,123 @@ class SCARA:
         # done
         return (arm1steps,arm2steps,zsteps),(xtrue,ytrue,ztrue)
 
+    # --- translate many (numpy) ---
+
+    # same as translate() for an Nx3 array of points, in order
+    # returns (steps),(location) as Nx3 int and float arrays
+    # A1 180 crossover is tracked across the batch (and from batch to batch)
+
+    def translate_many(self,points):
+
+        points = np.asarray(points,dtype=float).reshape(-1,3)
+        if not len(points):
+            return np.zeros((0,3),dtype=np.int64),np.zeros((0,3))
+
+        # Z is linear
+        zsteps = np.rint(points[:,2]*self.spudz).astype(np.int64)
+        ztrue = zsteps/self.spudz
+
+        # absolute angles
+        A1,A2 = self.angles_many(points[:,0]-self.co2aox,points[:,1]-self.co2aoy)
+
+        # handle A1 180 crossover
+        # only changes at sign changes of A1, so work run by run
+        sign = np.sign(A1)
+        starts = np.flatnonzero(np.concatenate(([True],sign[1:] != sign[:-1])))
+        ends = np.append(starts[1:],len(A1))
+        lastA1 = self.lastA1
+        for start,end in zip(starts.tolist(),ends.tolist()):
+            if sign[start] < 0 and lastA1 >= self.check_crossover_at:
+                A1[start:end] += 360 # whole run stays crossed
+            elif sign[start] > 0 and lastA1 <= -self.check_crossover_at:
+                A1[start] = 360 - A1[start] # first point only, see translate()
+            lastA1 = A1[end-1]
+        self.lastA1 = float(lastA1)
+
+        # make A2 relative to A1
+        A2 = A1-A2
+        A2 = np.where(A2 > 180,180 - A2,np.where(A2 < -180,360 - (180 - A2),A2))
+
+        # change angles to offset from zero angles
+        A1 -= self.zangle1
+        A2 -= self.zangle2
+
+        # calculate absolute steps to angles
+        arm1steps = np.rint(A1*self.spad1).astype(np.int64)
+        arm2steps = np.rint(A2*self.spad2).astype(np.int64)
+
+        # ---- now work backwards to get true location ----
+
+        # calculate true angles based on steps, add the zangles back
+        A1 = arm1steps/self.spad1 + self.zangle1
+        A2 = arm2steps/self.spad2 + self.zangle2
+
+        # make A2 NOT relative to A1
+        A2 = (A1 + A2) - 180
+
+        # calculate true XY of arm2 end point (math2.polar)
+        A1 = np.radians(self.max180_many(A1))
+        A2 = np.radians(self.max180_many(A2))
+        endx = np.cos(A1)*self.alen1 + np.cos(A2)*self.alen2
+        endy = np.sin(A1)*self.alen1 + np.sin(A2)*self.alen2
+
+        # remove offsets
+        steps = np.column_stack((arm1steps,arm2steps,zsteps))
+        true = np.column_stack((endx + self.co2aox,endy + self.co2aoy,ztrue))
+
+        # done
+        return steps,true
+
+    def max180_many(self,degrees):
+        degrees = np.mod(degrees,360)
+        return np.where(degrees > 180,degrees - 360,degrees)
+
+    # absolute arm angles (before crossover) for X,Y relative to the arm origin
+    def angles_many(self,X,Y):
+
+        X = np.array(X,dtype=float)
+        Y = np.array(Y,dtype=float)
+
+        # fix reach (can't be more than combined arm lenghts)
+        # shorten both axes proportionally until it works
+        H = np.hypot(X,Y)
+        over = H > self.alen1 + self.alen2
+        while over.any():
+            X[over] *= 0.99
+            Y[over] *= 0.99
+            H = np.hypot(X,Y)
+            over = H > self.alen1 + self.alen2
+
+        # get midpoint (math2.circle_intersects with circle 1 at origin)
+        R1 = np.full(len(X),float(self.alen1))
+        R2 = np.full(len(X),float(self.alen2))
+        A = np.arctan2(Y,X)
+        D = np.round(H,math2.round_to_places)
+        R = np.round(R1+R2,math2.round_to_places)
+        if not D.all():
+            raise ValueError('Same point error.')
+        over = D > R
+        while over.any():
+            R1[over] /= 0.9999
+            R2[over] /= 0.9999
+            R[over] = R1[over] + R2[over]
+            over = D > R
+        same = np.round(R,math2.round_to_places) == np.round(D,math2.round_to_places)
+        x = np.where(same,R1,(D**2 + R1**2 - R2**2) / (2*D))
+        y = np.where(same,0.0,np.sqrt(np.maximum(R1**2 - x**2,0.0)))
+        if self.midpoint_index:
+            y = -y
+        r = np.hypot(x,y)
+        a = np.arctan2(y,x) + A
+        MX = r*np.cos(a)
+        MY = r*np.sin(a)
+
+        # get angles in DEGREES (see translate())
+        A1 = np.degrees(np.arctan2(MY,MX))
+        A2 = np.degrees(np.arctan2(Y-MY,X-MX))
+
+        return A1,A2
+
 class STATES:
 
     # This tracks the "location" of motors as steps.
@@ -184,6 +184,66 @@ class XYZ:
     def arc(self,x=0,y=0,z=0,cx=0,cy=0,r=None,D=None,R=1,T=0):
         'x,y,z,centerx,centery,radius,Degrees,Rotation,Turns'
 
+        # center, radius, start angle, signed degrees
+        Cx,Cy,r,A1,degrees = self.arc_setup(x,y,cx,cy,r,R,T)
+        
+        # length of arc
+        L = math.pi*r*degrees/180
+        #print('L:',L)
+
+        # target end point
+        targetx = x + self.currentx
+        targety = y + self.currenty
+        targetz = z + self.currentz
+        #print('target:',(targetx,targety,targetz))
+        
+        # steps required
+        steps = int(abs(L)/self.linear_precision) + 1 # +1 for better than linear precision
+        #print('steps:',steps)
+
+        # can't be 0
+        if steps:
+
+            # change per step
+            changea = degrees/steps # angle
+            changez = z/steps # helix
+
+            for nada in range(steps):
+                A1 += changea
+                self.currentx,self.currenty = math2.polar(A1,r)
+                self.currentx += Cx
+                self.currenty += Cy
+                self.currentz += changez
+
+                #current_rounded_xyz = self.current_rounded()
+                #if current_rounded_xyz != self.last_rounded_xyz:
+                #    self.last_rounded_xyz = current_rounded_xyz
+                #    yield current_rounded_xyz
+
+                current_rounded_limited_xyz = self.current_rounded_limited()
+                if current_rounded_limited_xyz != self.last_rounded_limited_xyz:
+                    self.last_rounded_limited_xyz = current_rounded_limited_xyz
+                    yield current_rounded_limited_xyz
+
+            # for security and rounding errors
+            self.currentx,self.currenty,self.currentz = targetx,targety,targetz
+
+            #current_rounded_xyz = self.current_rounded()
+            #if current_rounded_xyz != self.last_rounded_xyz:
+            #    print('SECURITY: xyz.arc final call for precision')
+            #    self.last_rounded_xyz = current_rounded_xyz
+            #    yield current_rounded_xyz
+
+            current_rounded_limited_xyz = self.current_rounded_limited()
+            if current_rounded_limited_xyz != self.last_rounded_limited_xyz:
+                print('SECURITY: xyz.arc final call for precision')
+                self.last_rounded_limited_xyz = current_rounded_limited_xyz
+                yield current_rounded_limited_xyz
+
+    # arc center, radius, start angle, and signed degrees (with turns)
+    # relative to current location, shared by arc iterators and planners
+    def arc_setup(self,x=0,y=0,cx=0,cy=0,r=None,R=1,T=0):
+
         # no x and y == full circle + turns
         if (not x) and (not y):
 
@@ -270,59 +330,9 @@ class XYZ:
         #print('R:',R)
         #print('T:',int(T))
         #print('degrees_2:',degrees)
-        
-        # length of arc
-        L = math.pi*r*degrees/180
-        #print('L:',L)
 
-        # target end point
-        targetx = x + self.currentx
-        targety = y + self.currenty
-        targetz = z + self.currentz
-        #print('target:',(targetx,targety,targetz))
-        
-        # steps required
-        steps = int(abs(L)/self.linear_precision) + 1 # +1 for better than linear precision
-        #print('steps:',steps)
-
-        # can't be 0
-        if steps:
+        return Cx,Cy,r,A1,degrees
 
-            # change per step
-            changea = degrees/steps # angle
-            changez = z/steps # helix
-
-            for nada in range(steps):
-                A1 += changea
-                self.currentx,self.currenty = math2.polar(A1,r)
-                self.currentx += Cx
-                self.currenty += Cy
-                self.currentz += changez
-
-                #current_rounded_xyz = self.current_rounded()
-                #if current_rounded_xyz != self.last_rounded_xyz:
-                #    self.last_rounded_xyz = current_rounded_xyz
-                #    yield current_rounded_xyz
-
-                current_rounded_limited_xyz = self.current_rounded_limited()
-                if current_rounded_limited_xyz != self.last_rounded_limited_xyz:
-                    self.last_rounded_limited_xyz = current_rounded_limited_xyz
-                    yield current_rounded_limited_xyz
-
-            # for security and rounding errors
-            self.currentx,self.currenty,self.currentz = targetx,targety,targetz
-
-            #current_rounded_xyz = self.current_rounded()
-            #if current_rounded_xyz != self.last_rounded_xyz:
-            #    print('SECURITY: xyz.arc final call for precision')
-            #    self.last_rounded_xyz = current_rounded_xyz
-            #    yield current_rounded_xyz
-
-            current_rounded_limited_xyz = self.current_rounded_limited()
-            if current_rounded_limited_xyz != self.last_rounded_limited_xyz:
-                print('SECURITY: xyz.arc final call for precision')
-                self.last_rounded_limited_xyz = current_rounded_limited_xyz
-                yield current_rounded_limited_xyz
         
 
 
@@ -0,0 +1,166 @@
+import math
+import numpy as np
+from . import xyz
+
+class XYZArray(xyz.XYZ):
+
+    # This class plans the same paths as XYZ, but builds whole segments at once.
+    # Each segment (line, arc, helix) is a contiguous Nx3 float array of points
+    # that are already limited, rounded, and de-duplicated.
+
+    # The iterator functions (move, arc, and everything built on them) are kept.
+    # They yield tuples from the planned arrays, so existing callers keep working.
+
+    # how to:
+    # planner = XYZArray()
+    # points = planner.moveto_array(x,y,z) # Nx3 array, or
+    # for x,y,z in planner.moveto(x,y,z):  # same points as tuples
+
+    # --- array functions ---
+
+    # limit, round, and remove repeated points
+    # the first point is checked against the last point yielded
+    def finalize(self,points):
+
+        # limit
+        lower = (self.minx,self.miny,self.minz)
+        upper = (self.maxx,self.maxy,self.maxz)
+        points = np.clip(points,lower,upper)
+
+        # round
+        points = np.round(points,self.round_precision)
+
+        # changed from previous point
+        previous = np.empty_like(points)
+        previous[0] = self.last_rounded_limited_xyz
+        previous[1:] = points[:-1]
+        points = points[np.any(points != previous,axis=1)]
+
+        # update last point
+        if len(points):
+            self.last_rounded_limited_xyz = tuple(points[-1].tolist())
+
+        return np.ascontiguousarray(points)
+
+    # yield points from an array as tuples
+    def iterpoints(self,points):
+        yield from map(tuple,points.tolist())
+
+    # coordinated linear movement to an absolute point
+    def moveto_array(self,x=None,y=None,z=None):
+
+        if x == None:
+            x = self.currentx
+        if y == None:
+            y = self.currenty
+        if z == None:
+            z = self.currentz
+
+        return self.move_array(x-self.currentx,
+                               y-self.currenty,
+                               z-self.currentz,
+                               )
+
+    # coordinated linear movement relative to current location
+    def move_array(self,x=0,y=0,z=0):
+
+        # start and target end coordinates
+        start = np.array((self.currentx,self.currenty,self.currentz))
+        target = start + (x,y,z)
+
+        # steps required
+        changemax = max(abs(x),abs(y),abs(z))
+        steps = int(changemax/self.linear_precision) + 1 # +1 for better than linear precision
+
+        # all steps at once
+        fractions = np.arange(1,steps+1)/steps
+        points = start + np.outer(fractions,(x,y,z))
+
+        # for security and rounding errors
+        points[-1] = target
+        self.currentx,self.currenty,self.currentz = target.tolist()
+
+        return self.finalize(points)
+
+    # linear movement through absolute vertices (Nx2 xy, or Nx3 xyz)
+    # same points as moveto() to each vertex in turn
+    def polyline_array(self,vertices):
+
+        vertices = np.asarray(vertices,dtype=float)
+        if vertices.shape[1] == 2:
+            vertices = np.column_stack((vertices,np.full(len(vertices),self.currentz)))
+
+        # start and change of each segment
+        starts = np.vstack(((self.currentx,self.currenty,self.currentz),vertices[:-1]))
+        changes = vertices - starts
+
+        # steps required per segment
+        steps = (np.abs(changes).max(axis=1)/self.linear_precision).astype(int) + 1
+
+        # all steps at once
+        ends = np.cumsum(steps)
+        segment = np.repeat(np.arange(len(steps)),steps)
+        fractions = (np.arange(ends[-1]) - np.repeat(ends-steps,steps) + 1)/steps[segment]
+        points = starts[segment] + changes[segment]*fractions[:,None]
+
+        # for security and rounding errors
+        points[ends-1] = vertices
+        self.currentx,self.currenty,self.currentz = vertices[-1].tolist()
+
+        return self.finalize(points)
+
+    # 2D arc move with helix for z
+    def arcto_array(self,x=None,y=None,z=None,cx=None,cy=None,r=None,D=None,R=1,T=0):
+
+        if x == None:
+            x = self.currentx
+        if y == None:
+            y = self.currenty
+        if z == None:
+            z = self.currentz
+
+        if cx == None:
+            cx = self.currentx
+        if cy == None:
+            cy = self.currenty
+
+        return self.arc_array(x-self.currentx,y-self.currenty,z-self.currentz,cx-self.currentx,cy-self.currenty,r,D,R,T)
+
+    # 2D arc move with helix for z relative to current location
+    def arc_array(self,x=0,y=0,z=0,cx=0,cy=0,r=None,D=None,R=1,T=0):
+
+        # center, radius, start angle, signed degrees
+        Cx,Cy,r,A1,degrees = self.arc_setup(x,y,cx,cy,r,R,T)
+
+        # length of arc
+        L = math.pi*r*degrees/180
+
+        # target end point
+        target = (x + self.currentx,y + self.currenty,z + self.currentz)
+
+        # steps required
+        steps = int(abs(L)/self.linear_precision) + 1 # +1 for better than linear precision
+
+        # all angles at once
+        fractions = np.arange(1,steps+1)/steps
+        radians = np.radians(A1 + degrees*fractions)
+        points = np.empty((steps,3))
+        points[:,0] = Cx + r*np.cos(radians)
+        points[:,1] = Cy + r*np.sin(radians)
+        points[:,2] = self.currentz + z*fractions # helix
+
+        # for security and rounding errors
+        points[-1] = target
+        self.currentx,self.currenty,self.currentz = target
+
+        return self.finalize(points)
+
+    # --- movement functions (iterators) ---
+
+    # replaces XYZ.move (used by moveto and polar)
+    def move(self,x=0,y=0,z=0):
+        yield from self.iterpoints(self.move_array(x,y,z))
+
+    # replaces XYZ.arc (used by arcto)
+    def arc(self,x=0,y=0,z=0,cx=0,cy=0,r=None,D=None,R=1,T=0):
+        yield from self.iterpoints(self.arc_array(x,y,z,cx,cy,r,D,R,T))
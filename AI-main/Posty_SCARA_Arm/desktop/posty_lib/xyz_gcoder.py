@@ -1,5 +1,6 @@
 
 import re
+import numpy as np
 
 class XYZGcoder:
 
@@ -52,10 +53,29 @@ class XYZGcoder:
     # run a file
     def run_file(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0):
 
-        # current position
-        xroot,yroot,zroot = self.xyz.getxyz()
-
         # first read
+        scan = self.scan_file(file)
+
+        # scale and alignment from current position
+        layout = self.layout(scan,width,height,align,valign,origin_bottom_left,rotate)
+
+        # second read
+        for word in self.read_file(file,scan['startcount'],layout['yshift']):
+
+            # any z is an up/down
+            if word[0] == 'down':
+                yield from self.down()
+            elif word[0] == 'up':
+                yield from self.up()
+
+            # movement
+            else:
+                x,y = self.place(layout,word[1],word[2])
+                yield from self.xyz.moveto(x,y,z=None)
+
+    # first read: bounds and code discovery
+    def scan_file(self,file):
+
         ended = False
         with open(file) as f:
             linecount = 0
@@ -106,6 +126,20 @@ class XYZGcoder:
                     break
             f.close()
 
+        return {'linecount':linecount,'startcount':startcount,'codes':codes,
+                'xmin':xmin,'xmax':xmax,
+                'ymin':ymin,'ymax':ymax,
+                'zmin':zmin,'zmax':zmax}
+
+    # scaling and alignment of a scanned file from the current position
+    def layout(self,scan,width=None,height=None,align=None,valign=None,origin_bottom_left=True,rotate=0):
+
+        # current position
+        xroot,yroot,zroot = self.xyz.getxyz()
+
+        xmin,xmax = scan['xmin'],scan['xmax']
+        ymin,ymax = scan['ymin'],scan['ymax']
+
         # invert y values
         yshift = 0
         if not origin_bottom_left:
@@ -115,7 +149,6 @@ class XYZGcoder:
         # spans (dimensions of drawing)
         xspan = xmax-xmin
         yspan = ymax-ymin
-        zspan = zmax-zmin
 
         # scaling
         xscale = None
@@ -131,7 +164,6 @@ class XYZGcoder:
                 xscale = 1
         if not yscale:
             yscale = xscale
-        zscale = (xscale+yscale)/2
 
         # adjust alignment (x axis)
         # 'c' = start point is center of image
@@ -159,26 +191,15 @@ class XYZGcoder:
         xroot2 -= xscale*xmin
         yroot2 -= yscale*ymin
 
-##        # show values
-##        print()
-##        print('LINES: ',linecount)
-##        print('START/ENDS:',startcount)
-##
-##        print()
-##        print('X RANGE:',[xmin,xmax,xspan])
-##        print('Y RANGE:',[ymin,ymax,yspan],'OBL:',origin_bottom_left)
-##        print('Z RANGE:',[zmin,zmax,zspan])
-##
-##        print()
-##        print('X SCALE:',xscale)
-##        print('Y SCALE:',zscale)
-##        print('Z SCALE:',zscale)
-##
-##        print()
-##        print('X ROOT:',[xroot,xroot2])
-##        print('Y ROOT:',[yroot,yroot2])
+        return {'xroot':xroot,'yroot':yroot,
+                'xroot2':xroot2,'yroot2':yroot2,
+                'xscale':xscale,'yscale':yscale,
+                'yshift':yshift,'rotate':rotate}
+
+    # second read: yields ('up',), ('down',), or ('move',x,y) in file units
+    # x or y is None when not given on the line
+    def read_file(self,file,startcount=0,yshift=0):
 
-        # second read
         started = False
         if startcount < 2:
             started = True
@@ -231,31 +252,13 @@ class XYZGcoder:
                     # any z is an up/down
                     if z != None:
                         if z < 0:
-                            yield from self.down()
+                            yield ('down',)
                         else:
-                            yield from self.up()
+                            yield ('up',)
 
-                    # yield movement
+                    # movement
                     elif x != None or y != None:
-
-                        # fill in values
-                        if x == None:
-                            x = self.xyz.currentx
-                        if y == None:
-                            y = self.xyz.currenty
-
-                        # scale
-                        x = xroot2 + x*xscale
-                        y = yroot2 + y*yscale
-
-                        # rotate point around root
-                        # do this before sending to xyz
-                        # so that it won't be trimmed on the wrong axis 
-                        if rotate:
-                            x,y = self.xyz.math2.rotate_on_point(xroot,yroot,x,y,rotate,radians=False)
-
-                        # movement
-                        yield from self.xyz.moveto(x,y,z=None)
+                        yield ('move',x,y)
 
                 # code ended
                 if ended:
@@ -264,30 +267,67 @@ class XYZGcoder:
             # close file
             f.close()
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    # file units to an absolute xy point
+    # call when the move is made (missing values come from the current position)
+    def place(self,layout,x,y,current=None):
+
+        # fill in values
+        if current == None:
+            current = (self.xyz.currentx,self.xyz.currenty)
+        if x == None:
+            x = current[0]
+        if y == None:
+            y = current[1]
+
+        # scale
+        x = layout['xroot2'] + x*layout['xscale']
+        y = layout['yroot2'] + y*layout['yscale']
+
+        # rotate point around root
+        # do this before sending to xyz
+        # so that it won't be trimmed on the wrong axis 
+        if layout['rotate']:
+            x,y = self.xyz.math2.rotate_on_point(layout['xroot'],layout['yroot'],x,y,layout['rotate'],radians=False)
+
+        return x,y
+
+    # pen-down strokes of a file as absolute xy polylines (Nx2 arrays)
+    # same points as run_file(), without the pen-up moves between strokes
+    def strokes_file(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0):
+
+        scan = self.scan_file(file)
+        layout = self.layout(scan,width,height,align,valign,origin_bottom_left,rotate)
+
+        strokes = []
+        stroke = None
+        current = (self.xyz.currentx,self.xyz.currenty)
+        for word in self.read_file(file,scan['startcount'],layout['yshift']):
+            if word[0] == 'down':
+                if stroke == None:
+                    stroke = [current]
+            elif word[0] == 'up':
+                if stroke and len(stroke) > 1:
+                    strokes.append(np.array(stroke))
+                stroke = None
+            else:
+                current = self.place(layout,word[1],word[2],current)
+                if stroke != None:
+                    stroke.append(current)
+        if stroke and len(stroke) > 1:
+            strokes.append(np.array(stroke))
+
+        return strokes
+
+    # xyz points for strokes (pen up between strokes)
+    def draw(self,strokes):
+
+        yield from self.up()
+        for stroke in strokes:
+            yield from self.xyz.moveto(*stroke[0].tolist())
+            yield from self.down()
+            if hasattr(self.xyz,'polyline_array'):
+                yield from self.xyz.iterpoints(self.xyz.polyline_array(stroke[1:]))
+            else:
+                for x,y in stroke[1:].tolist():
+                    yield from self.xyz.moveto(x,y)
+            yield from self.up()
@@ -0,0 +1,225 @@
+# Posty Project: xyz_motion.py
+
+#-----------------------------------------------
+# look-ahead velocity planning
+#-----------------------------------------------
+
+# With fixed motor waits every segment runs at one rate, so the speed
+# has to be low enough for the sharpest corner in the drawing.
+# This planner looks ahead over the step blocks (one block per position
+# change) and gives each block its own xy step wait:
+
+# 1. junction speeds from the angle between blocks (junction deviation)
+# 2. backward pass: slow down in time for junctions and the end
+# 3. forward pass: speed up no faster than accel
+# 4. block time from a trapezoid (accelerate, cruise, decelerate)
+# 5. block wait = block time / xy steps in the block (the device runs
+#    motor 1 steps then motor 2 steps, so xy steps add up)
+
+# Waits are sent as [26,value,value] (see byte_socket.py) only when they
+# change by more than tolerance. Speeds are in xyz units per second.
+
+# Blocks are held until the distance after them is long enough to stop
+# from full speed, so their speed can't change anymore (streaming).
+# Blocks with z steps (pen up/down) are planned as full stops.
+
+# how to:
+# planner = MotionPlanner()
+# planner.start(x,y,z) # true location before the first block
+# diffs,waits = planner.add(diffs,points) # step changes Nx3, true location after each
+# diffs,waits = planner.flush() # all held blocks, ends at speed 0
+# waits[i] is the wait in us to send before block i (0 = no change)
+
+# ----------------------------------------------
+# imports
+# ----------------------------------------------
+
+# standard library imports
+import math
+
+# other imports
+import numpy as np
+
+# ----------------------------------------------
+# planner
+# ----------------------------------------------
+
+class MotionPlanner:
+
+    # limits (xyz units)
+    speed = 3.0 # max speed per second
+    accel = 50.0 # acceleration per second per second
+    junction = 0.01 # junction deviation (bigger = faster corners)
+
+    # step waits in us
+    min_wait = 280 # fastest xy step rate (POSTY.motor_waits_maximum)
+    max_wait = 65535 # slowest (2 byte value)
+    tolerance = 0.1 # send a new wait if it changes by more than this
+
+    def __init__(self):
+
+        # last finished block
+        self.location = (0.0,0.0,0.0)
+        self.velocity = 0.0
+        self.wait = None
+
+        # held blocks
+        self.diffs = np.zeros((0,3),dtype=np.int64)
+        self.points = np.zeros((0,3))
+
+        # counts
+        self.blocks = 0
+        self.seconds = 0.0 # planned time of xy blocks
+        self.waits_sent = 0
+
+    def start(self,x,y,z,wait=None):
+
+        # new location (at rest), wait is the current device xy wait if known
+        self.location = (x,y,z)
+        self.velocity = 0.0
+        self.wait = wait
+        self.diffs = np.zeros((0,3),dtype=np.int64)
+        self.points = np.zeros((0,3))
+
+    # ----------------------------------------------
+    # blocks in, planned blocks out
+    # ----------------------------------------------
+
+    def add(self,diffs,points):
+
+        # z blocks are stops: plan all before them, pass them as they are
+        parts_d,parts_w = [],[]
+        z = np.flatnonzero(diffs[:,2])
+        first = 0
+        for i in z.tolist():
+            d,w = self.hold(diffs[first:i],points[first:i],final=True)
+            parts_d += [d,diffs[i:i+1]]
+            parts_w += [w,np.zeros(1,dtype=np.int64)]
+            self.location = tuple(points[i].tolist())
+            self.velocity = 0.0
+            first = i+1
+        d,w = self.hold(diffs[first:],points[first:],final=False)
+        parts_d.append(d)
+        parts_w.append(w)
+
+        return np.concatenate(parts_d),np.concatenate(parts_w)
+
+    def flush(self):
+        return self.hold(self.diffs[:0],self.points[:0],final=True)
+
+    def hold(self,diffs,points,final=False):
+
+        # add to held blocks, plan, return the blocks that are done
+        self.diffs = np.concatenate((self.diffs,diffs))
+        self.points = np.concatenate((self.points,points))
+        if not len(self.diffs):
+            return self.diffs.copy(),np.zeros(0,dtype=np.int64)
+
+        # block lengths and xy steps
+        start = np.vstack(([self.location],self.points[:-1]))
+        vectors = (self.points - start)[:,:2]
+        lengths = np.maximum(np.hypot(vectors[:,0],vectors[:,1]),1e-9)
+        steps = np.abs(self.diffs[:,0]) + np.abs(self.diffs[:,1])
+
+        # plan
+        vmax,ends = self.plan(vectors,lengths,steps)
+
+        # blocks that can't change: enough distance after them to stop
+        if final:
+            count = len(self.diffs)
+        else:
+            after = lengths.sum() - np.cumsum(lengths)
+            count = int(np.count_nonzero(after >= self.speed**2/(2*self.accel)))
+            if not count:
+                return self.diffs[:0].copy(),np.zeros(0,dtype=np.int64)
+
+        # block times and waits
+        entries = np.concatenate(([self.velocity],ends[:count-1]))
+        times = self.times(entries,ends[:count],vmax[:count],lengths[:count])
+        waits = np.clip(np.round(times*1000000/np.maximum(steps[:count],1)),self.min_wait,self.max_wait).astype(np.int64)
+        self.seconds += float(times.sum())
+        waits = self.changes(waits)
+
+        # keep the rest
+        done = self.diffs[:count]
+        self.location = tuple(self.points[count-1].tolist())
+        self.velocity = float(ends[count-1])
+        self.diffs = self.diffs[count:]
+        self.points = self.points[count:]
+        self.blocks += count
+
+        return done,waits
+
+    # ----------------------------------------------
+    # planning
+    # ----------------------------------------------
+
+    def plan(self,vectors,lengths,steps):
+
+        # max speed per block (speed limit and fastest step rate)
+        vmax = np.minimum(self.speed,lengths*1000000/(np.maximum(steps,1)*self.min_wait))
+
+        # junction speeds (grbl style junction deviation)
+        # junctions[i] is the max speed between block i and i+1
+        units = vectors/lengths[:,None]
+        cos = -np.sum(units[:-1]*units[1:],axis=1) # 1 = reverse, -1 = straight
+        cos = np.clip(cos,-1,1)
+        sin = np.sqrt(np.maximum(0.5*(1-cos),0)) # sin of half angle
+        with np.errstate(divide='ignore'):
+            junctions = np.sqrt(self.accel*self.junction*sin/np.maximum(1-sin,1e-12))
+        junctions = np.minimum(junctions,np.minimum(vmax[:-1],vmax[1:]))
+        junctions[cos > 0.999999] = 0
+
+        # end speeds, last block ends at 0 (unless more blocks come)
+        ends = np.append(junctions,0.0).tolist()
+        twoa = 2*self.accel
+        lengths_list = lengths.tolist()
+
+        # backward pass
+        for i in range(len(ends)-2,-1,-1):
+            ends[i] = min(ends[i],math.sqrt(ends[i+1]**2 + twoa*lengths_list[i+1]))
+
+        # forward pass
+        v = self.velocity
+        for i in range(len(ends)):
+            ends[i] = min(ends[i],math.sqrt(v**2 + twoa*lengths_list[i]))
+            v = ends[i]
+
+        return vmax,np.array(ends)
+
+    def times(self,entries,ends,vmax,lengths):
+
+        # trapezoid time for each block
+        a = self.accel
+        vmax = np.maximum(vmax,np.maximum(entries,ends))
+        up = (vmax**2 - entries**2)/(2*a)
+        down = (vmax**2 - ends**2)/(2*a)
+        cruise = lengths - up - down
+
+        # no room to cruise: triangle with a lower peak
+        peak = np.sqrt(np.maximum((2*a*lengths + entries**2 + ends**2)/2,0))
+        peak = np.where(cruise >= 0,vmax,peak)
+        times = (peak-entries)/a + (peak-ends)/a + np.maximum(cruise,0)/np.maximum(peak,1e-9)
+
+        # tiny blocks at speed
+        return np.maximum(times,0)
+
+    def changes(self,waits):
+
+        # 0 where the device wait is close enough
+        out = np.zeros(len(waits),dtype=np.int64)
+        current = self.wait
+        for i,wait in enumerate(waits.tolist()):
+            if current is None or abs(wait-current) > current*self.tolerance:
+                out[i] = wait
+                current = wait
+                self.waits_sent += 1
+        self.wait = current
+        return out
+
+    def report(self):
+        print('MOTION: BLOCKS: {} PLANNED SEC: {:.2f} WAITS SENT: {}'.format(self.blocks,self.seconds,self.waits_sent))
+
+# ----------------------------------------------
+# end
+# ----------------------------------------------
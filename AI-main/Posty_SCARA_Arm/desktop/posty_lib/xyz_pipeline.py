@@ -0,0 +1,483 @@
+# Posty Project: xyz_pipeline.py
+
+#-----------------------------------------------
+# asyncio g-code pipeline
+#-----------------------------------------------
+
+# The synchronous chain (XYZGcoder.run_file --> XYZ --> POSTY.xyz_steps_send
+# --> Byte_Socket) stops planning whenever the socket blocks.
+# Here each step is a separate asyncio task with a bounded queue in front:
+
+# parse --> interpolate --> translate --> encode --> transmit
+
+# parse       = XYZGcoder.read_file words
+# interpolate = XYZ/XYZArray points (pen up/down adds motor wait commands)
+# translate   = SCARA.translate_many steps (limited, only position changes)
+# encode      = command bytes (frames if socket.framing)
+# transmit    = sends on the already open Byte_Socket socket
+
+# Planning runs ahead of the arm until the queues are full,
+# so memory stays bounded at about queue_size batches per stage.
+
+# how to:
+# pipeline = XYZPipeline(gcoder,scara,socket)
+# pipeline.motors = {motor:[rotation,minsteps,maxsteps]} # as in POSTY
+# pipeline.steps = (s1,s2,s3) # current absolute steps
+# truexyz = pipeline.run_gcode(file,...) # same arguments as XYZGcoder.run_file
+# pipeline.report()
+
+# pipeline.record = True keeps the words and the command bytes (before framing)
+# in recorded_words and recorded_bytes, for compiled programs (see xyz_program.py)
+# pipeline.offline = True runs without a socket (nothing is sent)
+# pipeline.motion = MotionPlanner() adds per block xy waits (see xyz_motion.py)
+
+# ----------------------------------------------
+# imports
+# ----------------------------------------------
+
+# standard library imports
+import time,asyncio
+
+# other imports
+import numpy as np
+
+# ----------------------------------------------
+# stage counters
+# ----------------------------------------------
+
+class PipelineStage:
+
+    # items are batches, units are what the stage works on
+    # seconds is busy time (not time spent waiting on queues)
+
+    def __init__(self,name,units,maxsize=0):
+        self.name = name
+        self.unit_name = units
+        self.queue = asyncio.Queue(maxsize)
+        self.items = 0
+        self.units = 0
+        self.seconds = 0.0
+        self.depth_max = 0
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def rate(self):
+        if self.seconds:
+            return self.units/self.seconds
+        return 0
+
+    async def put(self,item):
+        await self.queue.put(item)
+        self.depth_max = max(self.depth_max,self.queue.qsize())
+
+    def stats(self):
+        return {'items':self.items,
+                'units':self.units,
+                'unit':self.unit_name,
+                'seconds':self.seconds,
+                'rate':self.rate(),
+                'depth':self.depth(),
+                'depth_max':self.depth_max}
+
+# ----------------------------------------------
+# pipeline
+# ----------------------------------------------
+
+class XYZPipeline:
+
+    # queue sizes in batches (one queue in front of each stage after parse)
+    queue_size = 8
+
+    # batch sizes
+    word_batch = 256 # g-code words per parse batch
+    byte_batch = 4096 # bytes per transmit batch (when not framing)
+
+    # pen up/down and speeds (like XYZGcoder, set by the user)
+    upis = 1
+    downis = 1
+    setspeed = True
+    waits_normal = None # (us,us,us) motor waits sent after up
+    waits_draw = None # (us,us,us) motor waits sent after down
+    waits_current = None
+
+    # motor setup
+    # {motor:[rotation=+1|-1,minsteps,maxsteps]}
+    motors = {1:[1,-15000,15000],
+              2:[1,-15000,15000],
+              3:[1,  -500,  500]}
+
+    # print a report every show_every seconds while running (0 = no)
+    show_every = 0
+
+    # keep words and command bytes, run without a socket
+    record = False
+    offline = False
+
+    # look-ahead velocity planner (None = fixed waits)
+    motion = None
+
+    def __init__(self,gcoder,scara,socket):
+
+        self.gcoder = gcoder
+        self.xyz = gcoder.xyz
+        self.scara = scara
+        self.socket = socket
+
+        # absolute steps and true location after the last point
+        self.steps = (0,0,0)
+        self.truexyz = None
+
+        # counts (like POSTY xc,pc,bc,sc)
+        self.xc = 0
+        self.pc = 0
+        self.bc = 0
+        self.sc = 0
+
+        # stages
+        self.stages = []
+        self.sends = 0
+        self.acked = None
+
+        # last run
+        self.scan = None
+        self.layout = None
+        self.recorded_words = []
+        self.recorded_bytes = bytearray()
+
+    # ----------------------------------------------
+    # run
+    # ----------------------------------------------
+
+    def run_gcode(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0):
+        return asyncio.run(self.gcode(file,width,height,align,valign,origin_bottom_left,use_start_code,rotate))
+
+    async def gcode(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0):
+
+        # socket must be open
+        if not self.offline and not self.socket.socket:
+            raise IOError('Socket is not open.')
+
+        # first read and layout (from current position)
+        scan = self.gcoder.scan_file(file)
+        layout = self.gcoder.layout(scan,width,height,align,valign,origin_bottom_left,rotate)
+        words = self.gcoder.read_file(file,scan['startcount'],layout['yshift'])
+        self.scan,self.layout = scan,layout
+        self.recorded_words = []
+        self.recorded_bytes = bytearray()
+
+        # stages
+        self.truexyz = self.xyz.getxyz()
+        self.stages = [PipelineStage('parse','words'),
+                       PipelineStage('interpolate','points',self.queue_size),
+                       PipelineStage('translate','points',self.queue_size),
+                       PipelineStage('encode','bytes',self.queue_size),
+                       PipelineStage('transmit','bytes',self.queue_size),
+                       ]
+        parse,interpolate,translate,encode,transmit = self.stages
+        self.acked = asyncio.Event()
+        if self.motion:
+            self.motion.start(*self.truexyz)
+
+        # run
+        receiver = None
+        if not self.offline:
+            receiver = asyncio.create_task(self.receive())
+        monitor = None
+        if self.show_every:
+            monitor = asyncio.create_task(self.monitor())
+        tasks = [asyncio.create_task(self.parse(words,parse,interpolate)),
+                 asyncio.create_task(self.interpolate(layout,interpolate,translate)),
+                 asyncio.create_task(self.translate(translate,encode)),
+                 asyncio.create_task(self.encode(encode,transmit)),
+                 asyncio.create_task(self.transmit(transmit)),
+                 ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            if receiver:
+                receiver.cancel()
+            if monitor:
+                monitor.cancel()
+
+        # done
+        return self.truexyz
+
+    # ----------------------------------------------
+    # stages
+    # ----------------------------------------------
+
+    async def parse(self,words,stage,output):
+
+        batch = []
+        t1 = time.perf_counter()
+        for word in words:
+            batch.append(word)
+            if self.record:
+                self.recorded_words.append(word)
+            if len(batch) >= self.word_batch:
+                stage.items += 1
+                stage.units += len(batch)
+                stage.seconds += time.perf_counter() - t1
+                await output.put(batch)
+                await asyncio.sleep(0) # let the other stages run
+                batch = []
+                t1 = time.perf_counter()
+        stage.items += 1
+        stage.units += len(batch)
+        stage.seconds += time.perf_counter() - t1
+        await output.put(batch)
+        await output.put(None)
+
+    async def interpolate(self,layout,stage,output):
+
+        while 1:
+            batch = await stage.queue.get()
+            if batch is None:
+                await output.put(None)
+                break
+
+            # parts are point arrays or command lists, in order
+            t1 = time.perf_counter()
+            parts = []
+            for word in batch:
+
+                # any z is an up/down
+                if word[0] in ('up','down'):
+                    if word[0] == 'up':
+                        self.parts_add(parts,self.points(z=self.upis))
+                        waits = self.waits_normal
+                    else:
+                        self.parts_add(parts,self.points(z=self.downis))
+                        waits = self.waits_draw
+                    if self.setspeed and waits:
+                        parts.append(self.wait_commands(waits))
+                        self.waits_current = waits
+
+                # movement
+                else:
+                    x,y = self.gcoder.place(layout,word[1],word[2])
+                    self.parts_add(parts,self.points(x,y))
+
+            stage.items += 1
+            stage.units += sum(len(part) for part in parts if type(part) != list)
+            stage.seconds += time.perf_counter() - t1
+            await output.put(parts)
+
+    async def translate(self,stage,output):
+
+        while 1:
+            parts = await stage.queue.get()
+            if parts is None:
+                await output.put(None)
+                break
+
+            # point arrays become step change arrays
+            t1 = time.perf_counter()
+            changes = []
+            for part in parts:
+                if type(part) == list:
+                    changes.append(part)
+                    continue
+                stage.units += len(part)
+                self.xc += len(part)
+                steps,true = self.scara.translate_many(part)
+                steps = np.clip(steps,
+                                [self.motors[m][1] for m in (1,2,3)],
+                                [self.motors[m][2] for m in (1,2,3)])
+                diffs = np.diff(steps,axis=0,prepend=[self.steps])
+                keep = np.any(diffs,axis=1)
+                if self.motion:
+                    changes.append((diffs[keep],true[keep]))
+                else:
+                    changes.append(diffs[keep])
+                self.steps = tuple(steps[-1].tolist())
+                self.truexyz = tuple(true[-1].tolist())
+
+            stage.items += 1
+            stage.seconds += time.perf_counter() - t1
+            await output.put(changes)
+
+    async def encode(self,stage,output):
+
+        pending = []
+        while 1:
+            changes = await stage.queue.get()
+            if changes is not None:
+                t1 = time.perf_counter()
+                for change in changes:
+                    if type(change) == list:
+                        if self.motion:
+                            pending += self.step_commands(*self.motion.flush())
+                            self.motion.wait = None # commands may set waits
+                        pending += change
+                    elif self.motion:
+                        pending += self.step_commands(*self.motion.add(*change))
+                    else:
+                        pending += self.step_commands(change)
+                stage.items += 1
+                stage.seconds += time.perf_counter() - t1
+
+            # planned blocks held back, then the normal waits
+            elif self.motion:
+                pending += self.step_commands(*self.motion.flush())
+                if self.waits_current:
+                    pending += self.wait_commands(self.waits_current)
+
+            # send full batches (all at the end)
+            while pending and (changes is None or len(pending) >= self.batch_size()):
+                t1 = time.perf_counter()
+                if self.framing():
+                    index = self.socket.frame_split(pending,self.socket.frame_size)
+                else:
+                    index = min(len(pending),self.byte_batch)
+                if self.record:
+                    self.recorded_bytes += bytes(pending[:index])
+                if self.framing():
+                    seq,data = self.socket.frame_build(pending[:index])
+                else:
+                    seq,data = None,pending[:index]
+                pending = pending[index:]
+                data = bytes(data)
+                stage.units += len(data)
+                stage.seconds += time.perf_counter() - t1
+                await output.put((seq,data))
+
+            if changes is None:
+                await output.put(None)
+                break
+
+    async def transmit(self,stage):
+
+        loop = asyncio.get_running_loop()
+        while 1:
+            item = await stage.queue.get()
+            if item is None:
+                break
+            seq,data = item
+
+            # nothing to send to
+            if self.offline:
+                stage.items += 1
+                continue
+
+            # wait for frame window
+            if seq is not None:
+                while len(self.socket.frame_unacked) >= self.socket.frame_window:
+                    self.acked.clear()
+                    try:
+                        await asyncio.wait_for(self.acked.wait(),self.socket.frame_timeout)
+                    except asyncio.TimeoutError:
+                        raise IOError('Timeout on frame ack.')
+                self.socket.frame_unacked.append(seq)
+
+            # send (waits while the socket is full)
+            t1 = time.perf_counter()
+            await loop.sock_sendall(self.socket.socket,data)
+            self.sends += 1
+            self.socket.sends += 1
+            stage.items += 1
+            stage.units += len(data)
+            stage.seconds += time.perf_counter() - t1
+
+    async def receive(self):
+
+        # acks go to the socket frame window, everything else to the socket buffer
+        loop = asyncio.get_running_loop()
+        while 1:
+            data = await loop.sock_recv(self.socket.socket,1024)
+            self.socket.recvs += 1
+            if not data:
+                break
+            for i in data:
+                if i >= 128 and self.socket.framing:
+                    self.socket.frame_acked(i-128)
+                else:
+                    self.socket.socket_buffer.append(i)
+            # acks or still working (renews ack timeout)
+            self.acked.set()
+
+    async def monitor(self):
+        while 1:
+            await asyncio.sleep(self.show_every)
+            self.report()
+
+    # ----------------------------------------------
+    # helpers
+    # ----------------------------------------------
+
+    def framing(self):
+        return self.socket.framing and not self.offline
+
+    def batch_size(self):
+        if self.framing():
+            return self.socket.frame_size
+        return self.byte_batch
+
+    def points(self,x=None,y=None,z=None):
+        if hasattr(self.xyz,'moveto_array'):
+            return self.xyz.moveto_array(x,y,z)
+        return np.array(list(self.xyz.moveto(x,y,z)),dtype=float).reshape(-1,3)
+
+    def parts_add(self,parts,points):
+
+        # join point arrays that follow each other (one translate per run)
+        if not len(points):
+            return
+        if parts and type(parts[-1]) != list:
+            parts[-1] = np.concatenate((parts[-1],points))
+        else:
+            parts.append(points)
+
+    def wait_commands(self,waits):
+
+        # same as POSTY.setmotorwaitus
+        ints = []
+        for x in range(len(waits)):
+            ints += [22,x+1] + self.socket.int22intlistbe(waits[x])
+        return ints
+
+    def step_commands(self,diffs,waits=None):
+
+        # same as POSTY.motor_steps_send for each row of step changes
+        # waits (from a motion planner) are sent before their row if not 0
+        if waits is not None:
+            waits = waits.tolist()
+        ints = []
+        for i,row in enumerate(diffs.tolist()):
+            if waits and waits[i]:
+                ints += [26] + self.socket.int22intlistbe(waits[i])
+            self.pc += 1
+            for motor in (1,2,3):
+                steps = row[motor-1]
+                if not steps:
+                    continue
+                self.sc += steps
+                steps *= self.motors[motor][0]
+                rotation = 0
+                if steps < 0:
+                    rotation = 1
+                steps = abs(steps)
+                while steps:
+                    block = min(16,steps)
+                    ints.append((motor << 5) + (rotation << 4) + block - 1)
+                    self.bc += 1
+                    steps -= block
+        return ints
+
+    def stats(self):
+        return {stage.name:stage.stats() for stage in self.stages}
+
+    def report(self):
+        print('PIPELINE:')
+        for stage in self.stages:
+            print('    {:<12} ITEMS: {:>6} {:>7}: {:>10} SEC: {:>8.3f} RATE: {:>11.0f}/s QUEUE: {}/{}'.format(
+                stage.name,stage.items,stage.unit_name.upper(),stage.units,stage.seconds,stage.rate(),stage.depth(),stage.depth_max))
+
+# ----------------------------------------------
+# end
+# ----------------------------------------------
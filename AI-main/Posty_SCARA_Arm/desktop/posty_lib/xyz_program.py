@@ -0,0 +1,349 @@
+# Posty Project: xyz_program.py
+
+#-----------------------------------------------
+# compiled g-code programs
+#-----------------------------------------------
+
+# XYZGcoder.run_file reads a file twice (bounds, then words) and every
+# point is interpolated and translated again on each run. A compiled
+# program keeps the result of one XYZPipeline run on disk:
+
+# header = scan bounds, layout, start and end state (json)
+# words  = Nx3 float64 [code,x,y], code 0=move 1=up 2=down, x|y NaN if not given
+# stream = command bytes as sent to the device (before framing)
+
+# Programs are keyed on the file hash plus everything that changes steps:
+# run_file arguments (scale, rotation, alignment), start location,
+# xyz limits and precision, scara and motor setup, pen up/down and speeds.
+# A repeat job maps the program file and sends the stream as it is.
+
+# how to:
+# programs = XYZProgramCache(pipeline) # an XYZPipeline
+# truexyz = programs.run_gcode(file,...) # same arguments as XYZGcoder.run_file
+# first run compiles (and sends), later runs only send
+# programs.compile_gcode(file,...) # compile only, nothing is sent
+
+# ----------------------------------------------
+# imports
+# ----------------------------------------------
+
+# standard library imports
+import os,json,mmap,struct,hashlib
+
+# other imports
+import numpy as np
+
+# ----------------------------------------------
+# program file
+# ----------------------------------------------
+
+# [magic 8 bytes][version uint32][header length uint32][header json][words][stream]
+magic = b'POSTYPGM'
+version = 1
+prefix = struct.Struct('<8sII')
+
+# word codes
+word_codes = {'move':0,'up':1,'down':2}
+word_names = {0:'move',1:'up',2:'down'}
+
+class XYZProgram:
+
+    # a memory mapped program file (read only)
+    # words and stream are views of the map, close() when done
+
+    def __init__(self,file):
+
+        self.file = file
+        self.fileobj = open(file,'rb')
+        try:
+            self.map = mmap.mmap(self.fileobj.fileno(),0,access=mmap.ACCESS_READ)
+        except ValueError:
+            self.fileobj.close()
+            raise ValueError('Empty program file: {}'.format(file))
+
+        # header
+        try:
+            name,v,size = prefix.unpack_from(self.map,0)
+            if name != magic or v != version:
+                raise ValueError('Not a version {} program file: {}'.format(version,file))
+            self.header = json.loads(self.map[prefix.size:prefix.size+size].decode())
+            h = self.header
+            if h['stream_offset'] + h['stream_length'] > len(self.map):
+                raise ValueError('Short program file: {}'.format(file))
+        except (ValueError,KeyError,struct.error):
+            self.map.close()
+            self.fileobj.close()
+            raise
+
+        # views
+        self.words = np.frombuffer(self.map,dtype='<f8',count=h['words']*3,offset=h['words_offset']).reshape(-1,3)
+        self.stream = memoryview(self.map)[h['stream_offset']:h['stream_offset']+h['stream_length']]
+
+    def iterwords(self):
+
+        # same words as XYZGcoder.read_file
+        for code,x,y in self.words.tolist():
+            name = word_names[int(code)]
+            if name == 'move':
+                if x != x:
+                    x = None
+                if y != y:
+                    y = None
+                yield (name,x,y)
+            else:
+                yield (name,)
+
+    def close(self):
+        self.words = None
+        if self.stream is not None:
+            self.stream.release()
+            self.stream = None
+        self.map.close()
+        self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+# ----------------------------------------------
+# program cache
+# ----------------------------------------------
+
+class XYZProgramCache:
+
+    # program files folder
+    cache_dir = 'posty_programs'
+
+    # command bytes per send when replaying
+    send_size = 1024
+
+    def __init__(self,pipeline):
+
+        self.pipeline = pipeline
+        self.gcoder = pipeline.gcoder
+        self.xyz = pipeline.xyz
+        self.scara = pipeline.scara
+        self.socket = pipeline.socket
+
+        # counts
+        self.hits = 0
+        self.misses = 0
+
+    # ----------------------------------------------
+    # keys
+    # ----------------------------------------------
+
+    def file_hash(self,file):
+
+        h = hashlib.sha1()
+        with open(file,'rb') as f:
+            for block in iter(lambda: f.read(1 << 20),b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def key(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0):
+
+        # everything the step stream depends on
+        p,x,s = self.pipeline,self.xyz,self.scara
+        setup = {'version':version,
+                 'file':self.file_hash(file),
+                 'args':[width,height,align,valign,origin_bottom_left,use_start_code,rotate],
+                 'gcodes':self.gcoder.gcodes,
+                 'xyz':[x.getxyz(),x.last_rounded_limited_xyz,x.linear_precision,x.round_precision,
+                        x.minx,x.maxx,x.miny,x.maxy,x.minz,x.maxz],
+                 'scara':[s.spudz,s.co2aox,s.co2aoy,s.spad1,s.spad2,s.alen1,s.alen2,
+                          s.right_handed,s.reaching_up,s.midpoint_index,s.round_precision,
+                          s.lastA1,s.check_crossover_at],
+                 'pipeline':[p.steps,p.upis,p.downis,p.setspeed,p.waits_normal,p.waits_draw,
+                             sorted(p.motors.items())],
+                 'motion':None,
+                 }
+        if p.motion:
+            m = p.motion
+            setup['motion'] = [p.waits_current,m.speed,m.accel,m.junction,m.min_wait,m.max_wait,m.tolerance]
+        return hashlib.sha1(json.dumps(setup,sort_keys=True,default=str).encode()).hexdigest()
+
+    def path(self,key):
+        return os.path.join(self.cache_dir,key+'.pgm')
+
+    # ----------------------------------------------
+    # files
+    # ----------------------------------------------
+
+    def load(self,key):
+
+        # None if not compiled (or not readable)
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return XYZProgram(path)
+        except (ValueError,OSError) as e:
+            print('PROGRAM ERROR:',e)
+            return None
+
+    def save(self,key,header,words,stream):
+
+        # words to an array
+        array = np.full((len(words),3),np.nan,dtype='<f8')
+        for i,word in enumerate(words):
+            array[i,0] = word_codes[word[0]]
+            if word[0] == 'move':
+                if word[1] is not None:
+                    array[i,1] = word[1]
+                if word[2] is not None:
+                    array[i,2] = word[2]
+
+        # offsets (header is padded so words are 8 byte aligned)
+        header = dict(header)
+        header['words'] = len(words)
+        header['words_offset'] = 0
+        header['stream_offset'] = 0
+        header['stream_length'] = len(stream)
+        data = json.dumps(header).encode()
+        size = len(data) + 64 # room for the offsets
+        size += -(prefix.size+size) % 8
+        header['words_offset'] = prefix.size + size
+        header['stream_offset'] = header['words_offset'] + array.nbytes
+        data = json.dumps(header).encode().ljust(size)
+
+        # write then rename (never a partial program)
+        os.makedirs(self.cache_dir,exist_ok=True)
+        path = self.path(key)
+        temp = path + '.tmp'
+        with open(temp,'wb') as f:
+            f.write(prefix.pack(magic,version,size))
+            f.write(data)
+            f.write(array.tobytes())
+            f.write(stream)
+        os.replace(temp,path)
+
+        return path
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pgm'):
+                    os.remove(os.path.join(self.cache_dir,name))
+
+    # ----------------------------------------------
+    # state
+    # ----------------------------------------------
+
+    def state(self):
+
+        # pipeline, xyz, and scara values a program changes
+        p,x = self.pipeline,self.xyz
+        return {'steps':list(p.steps),
+                'truexyz':list(p.truexyz) if p.truexyz else None,
+                'xyz':list(x.getxyz()),
+                'last_rounded_limited_xyz':list(x.last_rounded_limited_xyz),
+                'lastA1':self.scara.lastA1,
+                'waits_current':p.waits_current,
+                'counts':[p.xc,p.pc,p.bc,p.sc],
+                }
+
+    def set_state(self,state,counts=None):
+
+        p,x = self.pipeline,self.xyz
+        p.steps = tuple(state['steps'])
+        p.truexyz = tuple(state['truexyz']) if state['truexyz'] else None
+        x.setxyz(*state['xyz'])
+        x.last_rounded_limited_xyz = tuple(state['last_rounded_limited_xyz'])
+        self.scara.lastA1 = state['lastA1']
+        p.waits_current = state['waits_current']
+
+        # add counts of a replay
+        if counts:
+            p.xc += counts[0]
+            p.pc += counts[1]
+            p.bc += counts[2]
+            p.sc += counts[3]
+
+    # ----------------------------------------------
+    # compile and run
+    # ----------------------------------------------
+
+    def compile_gcode(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0,send=False):
+
+        # run the pipeline once and save the result
+        # when not sending, the start state is put back afterwards
+        args = (width,height,align,valign,origin_bottom_left,use_start_code,rotate)
+        key = self.key(file,*args)
+        start = self.state()
+
+        p = self.pipeline
+        record,offline = p.record,p.offline
+        p.record,p.offline = True,not send
+        try:
+            truexyz = p.run_gcode(file,*args)
+        finally:
+            p.record,p.offline = record,offline
+        end = self.state()
+
+        # header
+        scan = dict(p.scan)
+        scan['codes'] = sorted(scan['codes'])
+        counts = [b-a for a,b in zip(start['counts'],end['counts'])]
+        header = {'source':os.path.abspath(file),
+                  'key':key,
+                  'scan':scan,
+                  'layout':p.layout,
+                  'end':end,
+                  'counts':counts,
+                  }
+        self.save(key,header,p.recorded_words,p.recorded_bytes)
+        p.recorded_words = []
+        p.recorded_bytes = bytearray()
+        self.misses += 1
+
+        if not send:
+            self.set_state(start)
+
+        return truexyz
+
+    def run_gcode(self,file,width=None,height=None,align=None,valign=None,origin_bottom_left=True,use_start_code=True,rotate=0):
+
+        # replay a compiled program, or compile while sending
+        args = (width,height,align,valign,origin_bottom_left,use_start_code,rotate)
+        program = self.load(self.key(file,*args))
+        if program is None:
+            return self.compile_gcode(file,*args,send=True)
+
+        with program:
+            self.send(program)
+            self.set_state(program.header['end'],program.header['counts'])
+        self.hits += 1
+
+        return self.pipeline.truexyz
+
+    def send(self,program):
+
+        # socket must be open
+        if not self.socket.socket:
+            raise IOError('Socket is not open.')
+
+        stream = program.stream
+        index,length = 0,len(stream)
+        while index < length:
+
+            # frames need whole commands
+            if self.socket.framing:
+                ints = list(stream[index:index+self.send_size+16])
+                end = self.socket.frame_split(ints,self.send_size)
+                self.socket.frame_buffer += ints[:end]
+                self.socket.frame_flush()
+
+            # bytes as they are
+            else:
+                end = min(self.send_size,length-index)
+                self.socket.sendbuffer(stream[index:index+end])
+
+            index += end
+            self.pipeline.sends += 1
+
+# ----------------------------------------------
+# end
+# ----------------------------------------------
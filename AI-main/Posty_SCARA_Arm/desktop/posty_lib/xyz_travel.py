@@ -0,0 +1,308 @@
+# Posty Project: xyz_travel.py
+
+#-----------------------------------------------
+# pen-up travel optimizer
+#-----------------------------------------------
+
+# G-code files and text are drawn in the order they are given, so the arm
+# often crosses the whole card between strokes (pen-down polylines).
+# This reorders and reverses strokes to cut the pen-up travel:
+
+# 1. nearest neighbour: from the current location, go to the closest free
+#    stroke end (start or end, an end means the stroke is drawn reversed)
+# 2. 2-opt: reverse runs of strokes where that shortens the travel,
+#    only trying the closest few stroke ends (neighbour lists)
+# 3. join: strokes that end where the next one starts need no pen lift
+
+# Stroke ends are kept in a grid (spatial index), so tens of thousands
+# of strokes stay fast. Travel time saved is an estimate from travel_speed
+# and lift_seconds (set them for your arm, see POSTY.travel_estimates).
+
+# how to:
+# optimizer = TravelOptimizer()
+# strokes = optimizer.optimize(strokes,start=(x,y)) # list of Nx2 arrays
+# optimizer.report()
+
+# ----------------------------------------------
+# imports
+# ----------------------------------------------
+
+# standard library imports
+import math,time
+
+# other imports
+import numpy as np
+
+# ----------------------------------------------
+# spatial index
+# ----------------------------------------------
+
+class GridIndex:
+
+    # uniform grid of points, about per_cell points in each cell
+
+    def __init__(self,points,per_cell=2):
+
+        self.points = np.asarray(points,dtype=float).reshape(-1,2)
+        self.alive = np.ones(len(self.points),dtype=bool)
+
+        # cell size from the point density
+        lo = self.points.min(axis=0) if len(self.points) else np.zeros(2)
+        hi = self.points.max(axis=0) if len(self.points) else np.ones(2)
+        span = np.maximum(hi-lo,1e-9)
+        self.size = max(math.sqrt(span[0]*span[1]*per_cell/max(len(self.points),1)),span.max()/4096,1e-9)
+        self.lo = lo
+        self.extent = int(max(span)/self.size) + 2
+
+        # cells
+        self.cells = {}
+        keys = np.floor((self.points-lo)/self.size).astype(np.int64)
+        for i,key in enumerate(map(tuple,keys.tolist())):
+            self.cells.setdefault(key,[]).append(i)
+
+    def cell(self,x,y):
+        return int(math.floor((x-self.lo[0])/self.size)),int(math.floor((y-self.lo[1])/self.size))
+
+    def remove(self,i):
+        self.alive[i] = False
+
+    def nearest(self,x,y):
+
+        # closest alive point, ring by ring (None if there are none)
+        cx,cy = self.cell(x,y)
+        best,best_d = None,math.inf
+        for r in range(self.extent + abs(cx) + abs(cy) + 1):
+
+            # cells at chebyshev distance r
+            for key in self.ring(cx,cy,r):
+                ids = self.cells.get(key)
+                if not ids:
+                    continue
+                ids = [i for i in ids if self.alive[i]]
+                if not ids:
+                    del self.cells[key]
+                    continue
+                self.cells[key] = ids
+                for i in ids:
+                    px,py = self.points[i]
+                    d = (px-x)**2 + (py-y)**2
+                    if d < best_d:
+                        best,best_d = i,d
+
+            # nothing closer can be further out
+            if best is not None and math.sqrt(best_d) <= r*self.size:
+                break
+            if not self.cells:
+                break
+
+        return best
+
+    def ring(self,cx,cy,r):
+        if r == 0:
+            return [(cx,cy)]
+        keys = [(cx+i,cy-r) for i in range(-r,r+1)] + [(cx+i,cy+r) for i in range(-r,r+1)]
+        keys += [(cx-r,cy+i) for i in range(-r+1,r)] + [(cx+r,cy+i) for i in range(-r+1,r)]
+        return keys
+
+    def neighbours(self,k):
+
+        # k closest points for every point from the 3x3 cells around it
+        # (-1 where there are fewer), the point itself is left out
+        n = len(self.points)
+        out = np.full((n,k),-1,dtype=np.int64)
+        for key,ids in self.cells.items():
+            cx,cy = key
+            near = []
+            for dx in (-1,0,1):
+                for dy in (-1,0,1):
+                    near += self.cells.get((cx+dx,cy+dy),[])
+            near = np.array(near)
+            ids = np.array(ids)
+            d = ((self.points[ids][:,None,:]-self.points[near][None,:,:])**2).sum(axis=2)
+            d[ids[:,None] == near[None,:]] = np.inf
+            order = np.argsort(d,axis=1)[:,:k]
+            found = np.take_along_axis(d,order,axis=1) < np.inf
+            out[ids,:order.shape[1]] = np.where(found,near[order],-1)
+        return out
+
+# ----------------------------------------------
+# optimizer
+# ----------------------------------------------
+
+class TravelOptimizer:
+
+    # 2-opt settings
+    two_opt = True
+    neighbours = 8 # stroke ends tried per stroke end
+    max_passes = 8
+    max_seconds = 5 # time limit for 2-opt
+
+    # strokes closer than this are joined (no pen lift)
+    join_distance = 1e-6
+
+    # estimates for the time saved
+    travel_speed = 1.0 # pen-up units per second
+    lift_seconds = 0.0 # seconds per pen up + down
+
+    def __init__(self):
+
+        # last run
+        self.strokes = 0
+        self.travel_before = 0
+        self.travel_after = 0
+        self.lifts_before = 0
+        self.lifts_after = 0
+        self.seconds = 0
+
+    # ----------------------------------------------
+    # optimize
+    # ----------------------------------------------
+
+    def optimize(self,strokes,start=(0,0)):
+
+        t1 = time.perf_counter()
+        strokes = [np.asarray(stroke,dtype=float)[:,:2] for stroke in strokes if len(stroke)]
+        self.strokes = len(strokes)
+        self.travel_before = self.travel(strokes,start)
+        self.lifts_before = len(strokes)
+        if not strokes:
+            self.travel_after,self.lifts_after,self.seconds = 0,0,0
+            return []
+
+        # ends: 2*i = start of stroke i, 2*i+1 = end of stroke i
+        ends = np.empty((2*len(strokes),2))
+        ends[0::2] = [stroke[0] for stroke in strokes]
+        ends[1::2] = [stroke[-1] for stroke in strokes]
+        index = GridIndex(ends)
+
+        # order and reversed flags
+        order,flip = self.nearest(index,start)
+        if self.two_opt and len(strokes) > 2:
+            order,flip = self.improve(ends,order,flip)
+
+        # build and join
+        ordered = []
+        for i,f in zip(order.tolist(),flip.tolist()):
+            stroke = strokes[i][::-1] if f else strokes[i]
+            if ordered and np.hypot(*(ordered[-1][-1]-stroke[0])) <= self.join_distance:
+                ordered[-1] = np.concatenate((ordered[-1],stroke[1:]))
+            else:
+                ordered.append(stroke)
+
+        # given order was already better
+        travel = self.travel(ordered,start)
+        if travel > self.travel_before:
+            ordered,travel = strokes,self.travel_before
+
+        self.travel_after = travel
+        self.lifts_after = len(ordered)
+        self.seconds = time.perf_counter() - t1
+
+        return ordered
+
+    def nearest(self,index,start):
+
+        # greedy tour over the stroke ends
+        n = len(index.points)//2
+        order = np.empty(n,dtype=np.int64)
+        flip = np.zeros(n,dtype=bool)
+        x,y = start[:2]
+        for p in range(n):
+            i = index.nearest(x,y)
+            stroke,end = divmod(i,2)
+            index.remove(2*stroke)
+            index.remove(2*stroke+1)
+            order[p] = stroke
+            flip[p] = bool(end)
+            x,y = index.points[2*stroke+1-end]
+        return order,flip
+
+    def improve(self,ends,order,flip):
+
+        # 2-opt on an open path of reversible strokes (the start stays first)
+        # reversing positions i..j swaps the ends of every stroke in it
+        # old: exit(i-1)->entry(i) + exit(j)->entry(j+1)
+        # new: exit(i-1)->exit(j)  + entry(i)->entry(j+1)
+        n = len(order)
+        near = GridIndex(ends).neighbours(self.neighbours).tolist()
+        ends = [tuple(end) for end in ends.tolist()]
+        order,flip = order.tolist(),flip.tolist()
+        position = [0]*n
+        for p,stroke in enumerate(order):
+            position[stroke] = p
+        stop_at = time.perf_counter() + self.max_seconds
+        hypot = math.hypot
+
+        # stroke end ids at a position
+        def entry(p):
+            return 2*order[p]+flip[p]
+
+        def exit(p):
+            return 2*order[p]+1-flip[p]
+
+        for passes in range(self.max_passes):
+            improved = False
+            for i in range(1,n):
+                ax,ay = ends[exit(i-1)]
+                ex,ey = ends[entry(i)]
+                old1 = hypot(ax-ex,ay-ey)
+
+                # candidates: strokes with an end close to exit(i-1)
+                for q in near[exit(i-1)]:
+                    if q < 0:
+                        continue
+                    j = position[q >> 1]
+
+                    # q must be the exit of position j (it becomes the new entry)
+                    if j <= i or q != exit(j):
+                        continue
+                    qx,qy = ends[q]
+                    old = old1
+                    new = hypot(ax-qx,ay-qy)
+                    if j+1 < n:
+                        nx,ny = ends[entry(j+1)]
+                        old += hypot(qx-nx,qy-ny)
+                        new += hypot(ex-nx,ey-ny)
+                    if new < old - 1e-12:
+                        order[i:j+1] = order[i:j+1][::-1]
+                        flip[i:j+1] = [1-f for f in flip[i:j+1][::-1]]
+                        for p in range(i,j+1):
+                            position[order[p]] = p
+                        improved = True
+                        ex,ey = ends[entry(i)]
+                        old1 = hypot(ax-ex,ay-ey)
+
+                if time.perf_counter() >= stop_at:
+                    break
+            if not improved or time.perf_counter() >= stop_at:
+                break
+
+        return np.array(order,dtype=np.int64),np.array(flip,dtype=bool)
+
+    # ----------------------------------------------
+    # measures
+    # ----------------------------------------------
+
+    def travel(self,strokes,start=(0,0)):
+
+        # pen-up distance from start through all strokes in order
+        if not len(strokes):
+            return 0
+        entries = np.array([stroke[0][:2] for stroke in strokes])
+        exits = np.vstack(([start[:2]],[stroke[-1][:2] for stroke in strokes[:-1]]))
+        return float(np.hypot(*(entries-exits).T).sum())
+
+    def saved(self):
+
+        # estimated seconds saved by the last optimize()
+        seconds = (self.travel_before-self.travel_after)/self.travel_speed
+        seconds += (self.lifts_before-self.lifts_after)*self.lift_seconds
+        return seconds
+
+    def report(self):
+        print('TRAVEL: STROKES: {} PEN-UP: {:.2f} --> {:.2f} LIFTS: {} --> {} SAVED: {:.1f}s ({:.2f}s to plan)'.format(
+            self.strokes,self.travel_before,self.travel_after,self.lifts_before,self.lifts_after,self.saved(),self.seconds))
+
+# ----------------------------------------------
+# end
+# ----------------------------------------------
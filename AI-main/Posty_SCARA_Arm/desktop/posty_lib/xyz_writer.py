@@ -1,3 +1,6 @@
+import math
+import numpy as np
+from . import xyz_array,xyz_travel
 
 class XYZWriter:
 
@@ -61,9 +64,8 @@ class XYZWriter:
     def send(self):
         pass
 
-    def write(self,text,x=None,y=None,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None,rotate=0):
-
-        print('INPUT:',[text,x,y])
+    # fill in missing write() values from the writer defaults
+    def write_setup(self,x=None,y=None,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None):
 
         # set x,y
         if x == None or type(x) not in (int,float):
@@ -111,6 +113,15 @@ class XYZWriter:
             else:
                 valign = 't'
 
+        return x,y,height,maxwidth,font,csep,lsep,align,valign
+
+    def write(self,text,x=None,y=None,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None,rotate=0):
+
+        print('INPUT:',[text,x,y])
+
+        # defaults for missing values
+        x,y,height,maxwidth,font,csep,lsep,align,valign = self.write_setup(x,y,height,maxwidth,font,csep,lsep,align,valign)
+
         # scale values
         fheight = self.fonts[font]['height']
         fwidth  = self.fonts[font]['width']
@@ -242,6 +253,195 @@ class XYZWriter:
             # call send function
             self.send()
 
+    # ------------------------------------------
+    # Glyph cache and batch layout
+    # ------------------------------------------
+
+    # Glyphs are compiled once per (font,height,rotate) into pen-down
+    # polylines (Nx2 arrays, relative to the glyph start) and an advance
+    # (glyph start to glyph end). Arcs are interpolated at the xyz
+    # linear_precision, so that is part of the cache key too.
+
+    # layout_many() places many texts (lines or addresses) from the cache
+    # and returns one list of strokes in absolute xy, ordered so the pen-up
+    # travel between strokes is short. draw() yields the xyz points.
+
+    # how to:
+    # strokes = writer.layout_many([(text,x,y),(text,x,y),...],height=0.25)
+    # for x,y,z in writer.draw(strokes):
+
+    glyph_cache = None
+    optimizer = None # xyz_travel.TravelOptimizer
+
+    # compiled glyph (strokes,advance)
+    def glyph(self,font,c,height,rotate=0):
+
+        if self.glyph_cache is None:
+            self.glyph_cache = {}
+        key = (font,height,rotate,self.xyz.linear_precision)
+        glyphs = self.glyph_cache.get(key)
+        if glyphs is None:
+            glyphs = self.glyph_cache[key] = {}
+        if c not in glyphs:
+            glyphs[c] = self.glyph_compile(font,c,height,rotate)
+        return glyphs[c]
+
+    def glyph_compile(self,font,c,height,rotate=0):
+
+        # same moves as write(), on a scratch planner from 0,0
+        scale = height/self.fonts[font]['height']
+        planner = xyz_array.XYZArray()
+        planner.linear_precision = self.xyz.linear_precision
+        planner.round_precision = 9
+        planner.minx = planner.miny = planner.minz = -1000000
+        planner.maxx = planner.maxy = planner.maxz = 1000000
+        planner.setxyz(0,0,0)
+
+        strokes = []
+        stroke = None
+        for cx,cy,cz,cr in self.fonts[font]['chars'][c]:
+
+            # up ends a stroke, down starts one
+            if cz > 0:
+                if stroke and len(stroke) > 1:
+                    strokes.append(np.array(stroke))
+                stroke = None
+            elif cz < 0 and stroke is None:
+                stroke = [(planner.currentx,planner.currenty)]
+
+            # movement
+            if cx or cy:
+                cx *= scale
+                cy *= scale
+                if rotate:
+                    cx,cy = self.xyz.math2.rotate_on_origin(cx,cy,rotate,radians=False)
+                if cr:
+                    planner.last_rounded_limited_xyz = (math.nan,math.nan,math.nan)
+                    points = planner.arc_array(cx,cy,0,r=abs(cr)*scale,R=cr)[:,:2].tolist()
+                else:
+                    planner.setxyz(planner.currentx+cx,planner.currenty+cy,0)
+                    points = [(planner.currentx,planner.currenty)]
+                if stroke is not None:
+                    stroke += points
+
+        if stroke and len(stroke) > 1:
+            strokes.append(np.array(stroke))
+
+        return strokes,(planner.currentx,planner.currenty)
+
+    # strokes of one text (same placement as write())
+    def layout(self,text,x=None,y=None,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None,rotate=0):
+
+        x,y,height,maxwidth,font,csep,lsep,align,valign = self.write_setup(x,y,height,maxwidth,font,csep,lsep,align,valign)
+
+        # scale values
+        fheight = self.fonts[font]['height']
+        fwidth  = self.fonts[font]['width']
+        scale = height/fheight
+        sheight = fheight*scale
+        swidth = fwidth*scale
+        csepwidth = csep*scale
+        lsepheight = lsep*scale
+        maxchars = int((maxwidth+csepwidth)//(swidth+csepwidth))
+        sep = (csepwidth,0)
+        if rotate:
+            sep = self.xyz.math2.rotate_on_origin(csepwidth,0,rotate,radians=False)
+
+        strokes = []
+        lines = 0
+        for line in text.split('\n'):
+
+            # translate
+            line = ''.join([self.fonts[font]['trans'].get(c,' ') for c in line])
+            if not (line and line.strip()):
+                continue
+            if maxwidth:
+                line = line[:maxchars]
+
+            # line start (bottom left of first character)
+            truelen = len(line)*(swidth+csepwidth) - csepwidth
+            Y = {'b':y,'m':y-sheight/2,'t':y-sheight}[valign]
+            Y -= (sheight+lsepheight)*lines
+            X = {'l':x,'c':x-truelen/2,'r':x-truelen}[align]
+            if rotate:
+                X,Y = self.xyz.math2.rotate_on_point(x,y,X,Y,rotate,radians=False)
+            lines += 1
+
+            # glyphs
+            for c in line:
+                glyph,advance = self.glyph(font,c,height,rotate)
+                for stroke in glyph:
+                    strokes.append(stroke + (X,Y))
+                X += advance[0] + sep[0]
+                Y += advance[1] + sep[1]
+
+        return strokes
+
+    # strokes of many texts, items are (text,x,y)
+    def layout_many(self,items,height=None,maxwidth=None,font=None,csep=None,lsep=None,align=None,valign=None,rotate=0,order=True):
+
+        strokes = []
+        for text,x,y in items:
+            strokes += self.layout(text,x,y,height,maxwidth,font,csep,lsep,align,valign,rotate)
+        if order:
+            strokes = self.order_strokes(strokes)
+        return strokes
+
+    # short pen-up travel order (see xyz_travel.py), joined when they touch
+    def order_strokes(self,strokes,start=None):
+
+        if start is None:
+            start = (self.xyz.currentx,self.xyz.currenty)
+        if self.optimizer is None:
+            self.optimizer = xyz_travel.TravelOptimizer()
+        return self.optimizer.optimize(strokes,start)
+
+    # pen-up travel distance of strokes in order
+    def travel(self,strokes,start=None):
+        if start is None:
+            start = (self.xyz.currentx,self.xyz.currenty)
+        x,y = start
+        distance = 0
+        for stroke in strokes:
+            distance += math.hypot(stroke[0][0]-x,stroke[0][1]-y)
+            x,y = stroke[-1]
+        return distance
+
+    # xyz points for strokes (pen up between strokes)
+    def draw(self,strokes):
+
+        # array planner: whole strokes at once
+        if hasattr(self.xyz,'polyline_array'):
+            for points in self.draw_arrays(strokes):
+                yield from self.xyz.iterpoints(points)
+            return
+
+        yield from self.up()
+        self.setwritespeed()
+        for stroke in strokes:
+            yield from self.xyz.moveto(*stroke[0].tolist())
+            yield from self.down()
+            for x,y in stroke[1:].tolist():
+                yield from self.xyz.moveto(x,y)
+            yield from self.up()
+            self.send()
+        self.setnormalspeed()
+        self.send()
+
+    # same as draw() as Nx3 point arrays (needs an xyz_array.XYZArray)
+    def draw_arrays(self,strokes):
+
+        yield self.xyz.moveto_array(z=self.upis)
+        self.setwritespeed()
+        for stroke in strokes:
+            yield self.xyz.moveto_array(*stroke[0])
+            yield self.xyz.moveto_array(z=self.downis)
+            yield self.xyz.polyline_array(stroke[1:])
+            yield self.xyz.moveto_array(z=self.upis)
+            self.send()
+        self.setnormalspeed()
+        self.send()
+
     # ------------------------------------------
     # Fonts
     # ------------------------------------------
@@ -0,0 +1,116 @@
+import sys,time,math
+
+from posty_lib import xyz_array,stepper,byte_socket,byte_server
+
+#-----------------------------------------
+# loopback throughput: one byte per send vs frames
+#-----------------------------------------
+
+# usage:
+# python3 posty_loopback_test.py [points]
+
+points = 20000
+if len(sys.argv) > 1:
+    points = int(sys.argv[1])
+
+#-----------------------------------------
+# step stream (same bytes as POSTY.motor_steps_send)
+#-----------------------------------------
+
+def motor_bytes(motor,steps):
+    rotation = 0
+    if steps < 0:
+        rotation = 1
+    steps = abs(steps)
+    ints = []
+    while steps:
+        block = min(16,steps)
+        ints.append((motor << 5) + (rotation << 4) + block - 1)
+        steps -= block
+    return ints
+
+def make_stream(points):
+
+    # scara setup from posty_desktop_a4988.POSTY
+    scara = stepper.SCARA()
+    scara.spudz = 8
+    scara.spad1 = scara.spad2 = (400/360) * 8 * (79.4/15)
+    scara.alen1 = scara.alen2 = 4.0
+    scara.co2aox,scara.co2aoy = 2.975,1.25
+    scara.right_handed = False
+    scara.reaching_up = False
+    scara.set_zero_angles()
+
+    # spiral with pen lifts
+    planner = xyz_array.XYZArray()
+    planner.linear_precision = 0.005
+    planner.minx,planner.maxx = 0,6
+    planner.miny,planner.maxy = -4,0
+    planner.minz,planner.maxz = 0,15
+    path = []
+    n = 0
+    while n < points:
+        a = n*0.001
+        x,y = 3 + 1.5*math.cos(a)*(1+a%1),-2 + 1.5*math.sin(a)*(1+a%1)
+        segment = planner.moveto_array(x,y,(n//5000)%2*15)
+        path.append(segment)
+        n += max(1,len(segment))
+
+    # steps to bytes
+    ints = []
+    s1,s2,s3 = 0,0,0
+    for segment in path:
+        steps,true = scara.translate_many(segment)
+        for t1,t2,t3 in steps.tolist():
+            for motor,d in ((1,t1-s1),(2,t2-s2),(3,t3-s3)):
+                if d:
+                    ints += motor_bytes(motor,d)
+            s1,s2,s3 = t1,t2,t3
+    return ints
+
+#-----------------------------------------
+# run
+#-----------------------------------------
+
+def run(server,ints,framing):
+
+    client = byte_socket.Byte_Socket()
+    client.server_ip = server.server_host
+    client.server_port = server.server_port
+    client.framing = framing
+    client.connect()
+
+    t1 = time.perf_counter()
+    for i in ints:
+        client.sendints([i])
+    client.sendEOD()
+    client.waitEOD(timeout=60,fail=True)
+    t2 = time.perf_counter()
+
+    sends = client.sends
+    client.socket.close()
+    client.socket = None
+
+    return server.sp,t2-t1,sends,server.bytes_in,server.reads
+
+print('BUILDING STREAM:',points,'points')
+ints = make_stream(points)
+print('STREAM BYTES:',len(ints))
+
+server = byte_server.Byte_Server()
+server.start()
+
+results = {}
+for name,framing in (('one byte per send',False),('frames',True)):
+    steps,seconds,sends,bytes_in,reads = run(server,ints,framing)
+    time.sleep(0.2)
+    results[name] = steps/seconds
+    print('{:<18} STEPS: {:>9} SECONDS: {:>7.3f} STEPS/SEC: {:>11.0f} SENDS: {:>7} BYTES: {:>7} READS: {:>6}'.format(name,steps,seconds,steps/seconds,sends,bytes_in,reads))
+
+server.stop()
+
+print('SPEEDUP: {:.1f}x'.format(results['frames']/results['one byte per send']))
+
+#-----------------------------------------
+# end
+#-----------------------------------------
@@ -0,0 +1,129 @@
+import os,sys,time,math,tempfile
+
+from posty_lib import xyz_array,xyz_gcoder,xyz_pipeline,xyz_motion,stepper,byte_socket,byte_server
+
+#-----------------------------------------
+# simulated job time: fixed motor waits vs look-ahead planning
+#-----------------------------------------
+
+# usage:
+# python3 posty_motion_test.py [file.gcode]
+# without a file, a synthetic g-code file is generated
+# nothing is sent, the step stream is timed by byte_server.Byte_Server.simulate()
+
+#-----------------------------------------
+# setup (same values as posty_desktop_a4988.POSTY)
+#-----------------------------------------
+
+motor_xy_wait = 400
+motor_z_wait = 800
+waits_normal  = (motor_xy_wait    ,motor_xy_wait    ,motor_z_wait)
+waits_maximum = (motor_xy_wait*0.7,motor_xy_wait*0.7,motor_z_wait)
+waits_draw    = (motor_xy_wait*3.0,motor_xy_wait*3.0,motor_z_wait)
+
+motors = {1:[1,-15000,15000],
+          2:[1,-15000,15000],
+          3:[1,  -500,  500]}
+
+start = (3,-2,15) # center of card, pen up
+
+#-----------------------------------------
+# g-code file
+#-----------------------------------------
+
+def make_gcode(file,strokes=60):
+
+    # stars and circles (sharp corners and smooth curves)
+    with open(file,'w') as f:
+        f.write('%\nG21\nG90\n')
+        for s in range(strokes):
+            cx,cy = (s%10)*12,(s//10)*12
+            f.write(f'G0 Z1\nG0 X{cx+5:.3f} Y{cy:.3f}\nG1 Z-1\n')
+            if s%2:
+                for p in range(1,6):
+                    a = p*4*math.pi/5
+                    f.write(f'G1 X{cx+5*math.cos(a):.3f} Y{cy+5*math.sin(a):.3f}\n')
+            else:
+                for p in range(1,73):
+                    a = p*2*math.pi/72
+                    f.write(f'G1 X{cx+5*math.cos(a):.3f} Y{cy+5*math.sin(a):.3f}\n')
+        f.write('G0 Z1\nM2\n%\n')
+
+if len(sys.argv) > 1:
+    file = sys.argv[1]
+    made = False
+else:
+    file = os.path.join(tempfile.gettempdir(),'posty_motion_test.gcode')
+    make_gcode(file)
+    made = True
+
+#-----------------------------------------
+# compile a job to bytes (offline pipeline)
+#-----------------------------------------
+
+def compile_job(motion):
+
+    scara = stepper.SCARA()
+    scara.spudz = 8
+    scara.spad1 = scara.spad2 = (400/360) * 8 * (79.4/15)
+    scara.alen1 = scara.alen2 = 4.0
+    scara.co2aox,scara.co2aoy = 2.975,1.25
+    scara.right_handed = False
+    scara.reaching_up = False
+    scara.set_zero_angles()
+
+    planner = xyz_array.XYZArray()
+    planner.linear_precision = 0.005
+    planner.minx,planner.maxx = 0,6
+    planner.miny,planner.maxy = -4,0
+    planner.minz,planner.maxz = 0,15
+    steps,true = scara.translate(*start)
+    planner.setxyz(*true)
+
+    gcoder = xyz_gcoder.XYZGcoder(planner)
+    pipeline = xyz_pipeline.XYZPipeline(gcoder,scara,byte_socket.Byte_Socket())
+    pipeline.upis,pipeline.downis = 15,0
+    pipeline.waits_normal = waits_normal
+    pipeline.waits_draw = waits_draw
+    pipeline.waits_current = waits_normal
+    pipeline.motors = motors
+    pipeline.steps = steps
+    pipeline.motion = motion
+    pipeline.offline = True
+    pipeline.record = True
+
+    t1 = time.process_time()
+    pipeline.run_gcode(file,width=4,height=0,align='c',valign='m')
+    t2 = time.process_time()
+
+    # device starts at normal waits
+    ints = pipeline.wait_commands(waits_normal) + list(pipeline.recorded_bytes)
+
+    return ints,t2-t1,pipeline
+
+def run(name,motion):
+    ints,cpu,pipeline = compile_job(motion)
+    server = byte_server.Byte_Server()
+    seconds = server.simulate(ints)
+    print('{:<18} BYTES: {:>8} STEPS: {:>9} PLAN CPU: {:>6.2f}s JOB TIME: {:>8.1f}s'.format(name,len(ints),server.sp,cpu,seconds))
+    if motion:
+        motion.report()
+    return seconds,server.steps
+
+print('FILE:',file,'({} bytes)'.format(os.path.getsize(file)))
+
+motion = xyz_motion.MotionPlanner()
+motion.min_wait = min(waits_maximum[:2])
+
+fixed,fixed_steps = run('fixed waits',None)
+planned,planned_steps = run('motion planning',motion)
+
+print('SAME END STEPS:',fixed_steps == planned_steps)
+print('JOB TIME: {:.1f}s --> {:.1f}s ({:.2f}x)'.format(fixed,planned,fixed/planned))
+
+if made:
+    os.remove(file)
+
+#-----------------------------------------
+# end
+#-----------------------------------------
@@ -0,0 +1,86 @@
+import os,sys,random,tempfile,io,contextlib
+
+from posty_lib import xyz,xyz_array,xyz_gcoder,xyz_travel
+
+#-----------------------------------------
+# pen-up travel: file order vs TravelOptimizer
+#-----------------------------------------
+
+# usage:
+# python3 posty_travel_test.py [file.gcode]
+# without a file, a synthetic g-code file is generated (strokes in random order)
+# nothing is sent, only the stroke order is measured
+
+# estimates (see POSTY.travel_estimates)
+travel_speed = 1.85 # pen-up units per second
+lift_seconds = 0.19 # seconds per pen up + down
+
+start = (3,-2) # center of card
+
+#-----------------------------------------
+# g-code file
+#-----------------------------------------
+
+def make_gcode(file,strokes=5000):
+
+    # short hatch strokes on a grid, shuffled
+    cells = [(x,y) for x in range(100) for y in range(50)][:strokes]
+    random.seed(1)
+    random.shuffle(cells)
+    with open(file,'w') as f:
+        f.write('%\nG21\nG90\n')
+        for x,y in cells:
+            f.write(f'G0 Z1\nG0 X{x*2:.3f} Y{y*2:.3f}\nG1 Z-1\nG1 X{x*2+1:.3f} Y{y*2+1:.3f}\n')
+        f.write('G0 Z1\nM2\n%\n')
+
+if len(sys.argv) > 1:
+    file = sys.argv[1]
+    made = False
+else:
+    file = os.path.join(tempfile.gettempdir(),'posty_travel_test.gcode')
+    make_gcode(file)
+    made = True
+
+#-----------------------------------------
+# run
+#-----------------------------------------
+
+planner = xyz_array.XYZArray()
+planner.minx,planner.maxx = 0,6
+planner.miny,planner.maxy = -4,0
+planner.minz,planner.maxz = 0,15
+planner.setxyz(*start,15)
+
+gcoder = xyz_gcoder.XYZGcoder(planner)
+strokes = gcoder.strokes_file(file,width=4,height=0,align='c',valign='m')
+
+optimizer = xyz_travel.TravelOptimizer()
+optimizer.travel_speed = travel_speed
+optimizer.lift_seconds = lift_seconds
+ordered = optimizer.optimize(strokes,start)
+
+print('FILE:',file,'({} bytes)'.format(os.path.getsize(file)))
+optimizer.report()
+print('PEN-UP TRAVEL: {:.1f}% of file order'.format(100*optimizer.travel_after/max(optimizer.travel_before,1e-9)))
+
+# draw() must leave python floats in the planner (numpy scalars make every later step slow)
+for planner_class in (xyz.XYZ,xyz_array.XYZArray):
+    planner = planner_class()
+    planner.minx,planner.maxx = 0,6
+    planner.miny,planner.maxy = -4,0
+    planner.minz,planner.maxz = 0,15
+    planner.setxyz(*start,15)
+    gcoder.xyz = planner
+    with contextlib.redirect_stdout(io.StringIO()):
+        for point in gcoder.draw(ordered[:100]):
+            pass
+    if type(planner.currentx) is not float or type(planner.currenty) is not float:
+        raise SystemExit('{} LOCATION IS NOT FLOAT: {} {}'.format(planner_class.__name__,type(planner.currentx),type(planner.currenty)))
+print('DRAW LOCATION TYPES: float')
+
+if made:
+    os.remove(file)
+
+#-----------------------------------------
+# end
+#-----------------------------------------
@@ -62,6 +62,10 @@ dhcp_hostname = 'posty'
 # 00010100 = 20 = nop - start of multi-byte commands
 # 00010101 = 21 = user api key bytes are next 8 bytes 
 # 00010110 = 22 = motor wait time in milliseconds to follow, next 3 bytes [motor,value,value] values Big Endian
+# 00010111 = 23 = frame, [23,seq,length,length,payload...,checksum] (see BUILD frame)
+# 00011000 = 24 = run, [24,count,byte] = motor byte repeated count times
+# 00011001 = 25 = ack request, [25,seq], server replies 128+seq when reached
+# 00011010 = 26 = block wait, [26,value,value] = step wait in us for motors 1 and 2 (see BUILD block wait)
 
 # 00011100 = 28 = wait-at-least (from last wait-at-least), one extra byte required
 # 00011101 = 29 = wait-for (from this byte being received), one extra byte required
@@ -81,6 +85,24 @@ dhcp_hostname = 'posty'
 # the key sequence is [22] + [motor] + [byte1,byte2]
 # the 2-byte value is Big Endian, value = 256*byte1+byte2
 
+# BUILD frame:
+
+# a frame carries many command bytes in one send
+# the sequence is [23,seq,length1,length2] + payload + [checksum]
+# seq is 0-127, length is the payload length (Big Endian, max 65535)
+# checksum is sum(payload) & 255
+# the payload is normal command bytes, plus runs [24,count,byte]
+# the server runs the payload, then replies with one ack byte = 128+seq
+# replies from the server are otherwise < 128
+
+# BUILD block wait:
+
+# a motion planner sets the xy step rate for each block of motor bytes
+# the sequence is [26,byte1,byte2], value = 256*byte1+byte2 (Big Endian)
+# value is the wait time in us between state changes for motors 1 and 2
+# it is the same as [22,1,byte1,byte2] + [22,2,byte1,byte2], but shorter
+# the wait stays until the next 22 or 26 command
+
 # BUILD wait:
 
 # a wait value is a single byte
@@ -198,6 +220,7 @@ class Posty:
     server_host = '0.0.0.0'
     server_port = 10240
     client_timeout = 10 # seconds after last data received
+    client_read = 1024 # max bytes per socket read (a frame may take several)
     
     # client auth variables
     auth_key = False
@@ -285,6 +308,45 @@ class Posty:
         self._motor_waits['check'] = time.time()
         self._motor_waits['checkus'] = time.ticks_us()
 
+    def motor_steps(self,motor,direction,steps):
+
+        # output pins
+        dirpin,steppin,enapin = self._motor_pins[motor]
+
+        # set direction
+        dirpin.value(direction)
+        time.sleep_us(1) # requires 200 ns
+
+        # wait setup
+        stepwaitus = self._motor_waits[motor]['stepwaitus']
+        if time.time()-self._motor_waits[motor]['last'] > 10:
+            self._motor_waits[motor]['lastus'] = time.ticks_us() - stepwaitus -1
+
+        # steps
+        lastus = self._motor_waits[motor]['lastus']
+        for x in range(steps):
+
+            # wait
+            while time.ticks_diff(time.ticks_us(),lastus) < stepwaitus:
+                #print('wait')
+                pass
+
+            # step                                                
+            steppin.value(1)
+            time.sleep_us(2) # requires 1 us
+            steppin.value(0)
+            time.sleep_us(2) # requires 1 us
+            
+            # reset local wait
+            lastus = time.ticks_us()
+
+        # full reset wait
+        self._motor_waits[motor]['lastus'] = time.ticks_us()
+        self._motor_waits[motor]['last'] = time.time()
+
+        # steps processed
+        return steps
+
     def auth_set(self):
 
         rips = False
@@ -388,7 +450,7 @@ class Posty:
 
                             # read data (non-blocking, so it may be empty)
                             # move to line buffer (get out of socket buffer)
-                            data = client_socket.read(256)
+                            data = client_socket.read(self.client_read)
                             if data:
                                 byte_buffer += list(data)
                                 new_bytes = len(data)
@@ -434,49 +496,67 @@ class Posty:
 
                                         # known motor
                                         if motor in (1,2,3):
-
                                             #print('  RECV STEP:',[motor,direction,extra_steps])
+                                            sp += self.motor_steps(motor,direction,extra_steps+1)
 
-                                            # output pins
-                                            dirpin,steppin,enapin = self._motor_pins[motor]
-
-                                            # set direction
-                                            dirpin.value(direction)
-                                            time.sleep_us(1) # requires 200 ns
-
-                                            # wait setup
-                                            stepwaitus = self._motor_waits[motor]['stepwaitus']
-                                            if time.time()-self._motor_waits[motor]['last'] > 10:
-                                                self._motor_waits[motor]['lastus'] = time.ticks_us() - stepwaitus -1
-
-                                            # steps
-                                            lastus = self._motor_waits[motor]['lastus']
-                                            for x in range(extra_steps+1):
-
-                                                # wait
-                                                while time.ticks_diff(time.ticks_us(),lastus) < stepwaitus:
-                                                    #print('wait')
-                                                    pass
+                                        # unknown motor
+                                        else:
+                                            print('UNKNOWN MOTOR:',motor)
 
-                                                # step                                                
-                                                steppin.value(1)
-                                                time.sleep_us(2) # requires 1 us
-                                                steppin.value(0)
-                                                time.sleep_us(2) # requires 1 us
-                                                sp += 1
-                                                
-                                                # reset local wait
-                                                lastus = time.ticks_us()
+                                    # special commands
 
-                                            # full reset wait
-                                            self._motor_waits[motor]['lastus'] = time.ticks_us()
-                                            self._motor_waits[motor]['last'] = time.time()
+                                    # client sends frame
+                                    # [23,seq,length,length,payload...,checksum]
+                                    # the frame is replaced by its payload + [25,seq]
+                                    elif cmd == 23:
+                                        if len(byte_buffer) < 4:
+                                            time.sleep_ms(10)
+                                            break
+                                        length = byte_buffer[2]*256+byte_buffer[3]
+                                        if len(byte_buffer) < length+5:
+                                            time.sleep_ms(10)
+                                            break
+                                        seq = byte_buffer[1]
+                                        payload = byte_buffer[4:4+length]
+                                        if sum(payload) & 255 == byte_buffer[4+length]:
+                                            byte_buffer = payload + [25,seq] + byte_buffer[5+length:]
+                                        else:
+                                            print('  RECV FRM 23 CHECKSUM ERROR',seq)
+                                            byte_buffer = byte_buffer[5+length:]
+                                        cc += 1
+                                        cp += 1
 
-                                        # unknown motor
+                                    # client sends run of one motor byte
+                                    # [24,count,byte]
+                                    elif cmd == 24:
+                                        if len(byte_buffer) < 3:
+                                            time.sleep_ms(10)
+                                            break
+                                        count,b = byte_buffer[1],byte_buffer[2]
+                                        motor       = (b & 224) >> 5
+                                        direction   = (b & 16 ) >> 4
+                                        extra_steps =  b & 15
+                                        if motor in (1,2,3):
+                                            sc += count
+                                            sp += self.motor_steps(motor,direction,count*(extra_steps+1))
                                         else:
                                             print('UNKNOWN MOTOR:',motor)
+                                        for x in range(3):
+                                            byte_buffer.pop(0)
+                                        cc += 1
+                                        cp += 1
 
-                                    # special commands
+                                    # client sends ack request (end of each frame)
+                                    # [25,seq]
+                                    elif cmd == 25:
+                                        if len(byte_buffer) < 2:
+                                            time.sleep_ms(10)
+                                            break
+                                        bytes_out += client_socket.write(bytes([128+(byte_buffer[1]&127)]))
+                                        for x in range(2):
+                                            byte_buffer.pop(0)
+                                        cc += 1
+                                        cp += 1
 
                                     # client sends wait-at-least pause
                                     # [28,value]
@@ -626,6 +706,20 @@ class Posty:
                                             cc += 1
                                             cp += 1
 
+                                    # client sends block wait for motors 1 and 2 in us
+                                    # [26,value,value] # Big Endian
+                                    elif cmd == 26:
+                                        if len(byte_buffer) < 3:
+                                            time.sleep_ms(10)
+                                            break
+                                        value = byte_buffer[1]*256+byte_buffer[2]
+                                        self._motor_waits[1]['stepwaitus'] = value
+                                        self._motor_waits[2]['stepwaitus'] = value
+                                        for x in range(3):
+                                            byte_buffer.pop(0)
+                                        cc += 1
+                                        cp += 1
+
                                     # unknown, just keep going
                                     else:
                                         print('  NOP:',byte_buffer.pop(0))                                        
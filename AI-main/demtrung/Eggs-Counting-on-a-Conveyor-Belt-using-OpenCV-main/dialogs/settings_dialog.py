@@ -1,12 +1,23 @@
 from PyQt5.QtWidgets import QWidget, QSlider, QLabel, QApplication, QVBoxLayout, QLineEdit, QHBoxLayout, QGroupBox, \
     QFormLayout
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap, QIntValidator
 
 import sys
+from collections import namedtuple
+
+# Immutable snapshot of the detection settings, sent to the processing thread
+# only when the user edits a value (empty line edits are read as 0 here, once)
+DetectionParams = namedtuple('DetectionParams', 'borderSize radiusMin radiusMax areaMin areaMax')
+
+
+def toInt(text):
+    return int(text) if text not in ('', '-') else 0
 
 class Settings(QWidget):
 
+    paramsChanged = pyqtSignal(object)  # DetectionParams
+
     def __init__(self):
 
         super().__init__()
@@ -15,6 +26,11 @@ class Settings(QWidget):
 
         self.initUI()
 
+        # push a new snapshot on every edit
+        self.sldBorderSize.valueChanged[int].connect(self.emitParams)
+        for lineEdit in (self.leRadiusMin, self.leRadiusMax, self.leAreaMin, self.leAreaMax):
+            lineEdit.textChanged[str].connect(self.emitParams)
+
 
     def initUI(self):
 
@@ -191,4 +207,12 @@ class Settings(QWidget):
         return (self.leAreaMin.text(), self.leAreaMax.text())
 
     def getBorderSizeValue(self):
-        return self.sldBorderSize.value()
\ No newline at end of file
+        return self.sldBorderSize.value()
+
+    def params(self):
+        return DetectionParams(self.sldBorderSize.value(),
+                               toInt(self.leRadiusMin.text()), toInt(self.leRadiusMax.text()),
+                               toInt(self.leAreaMin.text()), toInt(self.leAreaMax.text()))
+
+    def emitParams(self, *args):
+        self.paramsChanged.emit(self.params())
@@ -0,0 +1,391 @@
+import sys
+import time
+import queue
+import threading
+import numpy as np
+import cv2
+
+# Counting engine for egg_detection_main.py
+#
+# EggDetector   : the distance transform / template matching detection of the main loop,
+#                 with the template (kernel2 / distTempl) cached per borderSize
+# CentroidTracker: keeps an ID per egg between frames (nearest assignment, grid spatial index)
+# EggCounter    : detector + tracker + counting lines, each track is counted once
+#                 when it crosses the middle line, per conveyor lane
+# CounterWorker : capture and counting on their own threads (off the Qt thread), settings
+#                 arrive as snapshots through setParams only when the user edits them
+
+GAP = 10
+
+
+def makeTemplate(borderSize, gap=GAP):
+    kernel2 = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * (borderSize - gap) + 1, 2 * (borderSize - gap) + 1))
+    kernel2 = cv2.copyMakeBorder(kernel2, gap, gap, gap, gap,
+                                 cv2.BORDER_CONSTANT | cv2.BORDER_ISOLATED, 0)
+    return cv2.distanceTransform(kernel2, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+
+
+def toInt(value, default=0):
+    # values from the settings line edits can be ''
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class EggDetector:
+
+    def __init__(self):
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.templates = {}  # borderSize -> distTempl
+        self.setParams(40, (10, 30), (370, 1100))
+
+    def setParams(self, borderSize, radius, area):
+        # cheap to call every frame, the template is only built for a new borderSize
+        self.borderSize = toInt(borderSize, 40)
+        self.radiusMin, self.radiusMax = toInt(radius[0]), toInt(radius[1])
+        self.areaMin, self.areaMax = toInt(area[0]), toInt(area[1])
+        if self.borderSize not in self.templates:
+            self.templates[self.borderSize] = makeTemplate(self.borderSize)
+        self.distTempl = self.templates[self.borderSize]
+
+    def detect(self, frame40):
+        # eggs in the frame: list of (x, y, area, ellipse)
+        hsv = cv2.cvtColor(frame40, cv2.COLOR_BGR2HSV)
+        th, bw = cv2.threshold(hsv[:, :, 2], 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        morph = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, self.kernel)
+        dist = cv2.distanceTransform(morph, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+
+        borderSize = self.borderSize
+        self.distborder = cv2.copyMakeBorder(dist, borderSize, borderSize, borderSize, borderSize,
+                                             cv2.BORDER_CONSTANT | cv2.BORDER_ISOLATED, 0)
+        nxcor = cv2.matchTemplate(self.distborder, self.distTempl, cv2.TM_CCOEFF_NORMED)
+
+        mn, mx, _, _ = cv2.minMaxLoc(nxcor)
+        th, self.peaks = cv2.threshold(nxcor, mx * 0.5, 255, cv2.THRESH_BINARY)
+        peaks8u = cv2.convertScaleAbs(self.peaks)
+        contours, hierarchy = cv2.findContours(peaks8u, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+
+        eggs = []
+        for contour in contours:
+            if len(contour) < 5:
+                continue
+            (x, y), radius = cv2.minEnclosingCircle(contour)
+            if not (self.radiusMin <= int(radius) <= self.radiusMax):
+                continue
+            area = cv2.contourArea(contour)
+            if not (self.areaMin <= area <= self.areaMax):
+                continue
+            ellipse = cv2.fitEllipse(contour)
+            eggs.append((ellipse[0][0], ellipse[0][1], area, ellipse))
+        return eggs
+
+
+class CentroidTracker:
+
+    def __init__(self, maxDistance=40, maxMissed=5):
+        self.maxDistance = maxDistance  # max move (pixels) between two frames
+        self.maxMissed = maxMissed      # frames without a match before a track is removed
+        self.nextId = 1
+        self.tracks = {}  # id -> {'x', 'y', 'vx', 'vy', 'missed', 'age', 'counted'}
+
+    def update(self, points):
+        # points: list of (x, y), returns {id: track} (tracks matched or created this frame)
+
+        # spatial index: grid cells of maxDistance, a point only looks at its 3x3 cells
+        cell = self.maxDistance
+        grid = {}
+        for n, (x, y) in enumerate(points):
+            grid.setdefault((int(x // cell), int(y // cell)), []).append(n)
+
+        # candidate pairs (predicted track position to point)
+        pairs = []
+        maxDistance2 = self.maxDistance ** 2
+        for trackId, t in self.tracks.items():
+            px, py = t['x'] + t['vx'], t['y'] + t['vy']
+            cx, cy = int(px // cell), int(py // cell)
+            for gx in (cx - 1, cx, cx + 1):
+                for gy in (cy - 1, cy, cy + 1):
+                    for n in grid.get((gx, gy), ()):
+                        d2 = (points[n][0] - px) ** 2 + (points[n][1] - py) ** 2
+                        if d2 <= maxDistance2:
+                            pairs.append((d2, trackId, n))
+
+        # nearest assignment: closest pairs first, each track and point used once
+        pairs.sort()
+        usedTracks, usedPoints = set(), set()
+        matched = {}
+        for d2, trackId, n in pairs:
+            if trackId in usedTracks or n in usedPoints:
+                continue
+            usedTracks.add(trackId)
+            usedPoints.add(n)
+            t = self.tracks[trackId]
+            x, y = points[n]
+            t['vx'], t['vy'] = x - t['x'], y - t['y']
+            t['px'], t['py'] = t['x'], t['y']
+            t['x'], t['y'] = x, y
+            t['missed'] = 0
+            t['age'] += 1
+            matched[trackId] = t
+
+        # tracks not seen
+        for trackId in list(self.tracks):
+            if trackId not in usedTracks:
+                self.tracks[trackId]['missed'] += 1
+                if self.tracks[trackId]['missed'] > self.maxMissed:
+                    del self.tracks[trackId]
+
+        # new tracks
+        for n, (x, y) in enumerate(points):
+            if n not in usedPoints:
+                t = {'x': x, 'y': y, 'px': x, 'py': y, 'vx': 0, 'vy': 0, 'missed': 0, 'age': 1, 'counted': False}
+                self.tracks[self.nextId] = t
+                matched[self.nextId] = t
+                self.nextId += 1
+
+        return matched
+
+
+class EggCounter:
+
+    def __init__(self, lanes=1, direction='down', maxDistance=40, maxMissed=5):
+        self.detector = EggDetector()
+        self.tracker = CentroidTracker(maxDistance, maxMissed)
+        self.lanes = lanes          # number of lanes (equal widths) or list of (x1, x2) per lane
+        self.direction = direction  # 'down', 'up' or 'both'
+        self.laneCounts = []
+        self.count = 0
+
+        # statistics
+        self.frames = 0
+        self.detectTime = 0.0
+        self.trackTime = 0.0
+        self.started = None
+
+    def setParams(self, borderSize, radius, area):
+        self.detector.setParams(borderSize, radius, area)
+
+    def laneRanges(self, width):
+        if isinstance(self.lanes, int):
+            step = width / self.lanes
+            return [(int(n * step), int((n + 1) * step)) for n in range(self.lanes)]
+        return list(self.lanes)
+
+    def laneOf(self, x, ranges):
+        for n, (x1, x2) in enumerate(ranges):
+            if x1 <= x < x2:
+                return n
+        return None
+
+    def crossed(self, y0, y1, lineY):
+        down = y0 < lineY <= y1
+        up = y0 > lineY >= y1
+        return down if self.direction == 'down' else up if self.direction == 'up' else down or up
+
+    def process(self, frame40, lineY=None):
+        # detect, track and count one frame; returns (eggs, tracks matched this frame)
+        if self.started is None:
+            self.started = time.perf_counter()
+        height, width = frame40.shape[:2]
+        lineY = height // 2 if lineY is None else lineY
+        ranges = self.laneRanges(width)
+        if len(self.laneCounts) != len(ranges):
+            self.laneCounts = [0] * len(ranges)
+
+        t1 = time.perf_counter()
+        eggs = self.detector.detect(frame40)
+        t2 = time.perf_counter()
+        tracks = self.tracker.update([(x, y) for x, y, area, ellipse in eggs])
+
+        # line crossing, once per track
+        for trackId, t in tracks.items():
+            if not t['counted'] and t['age'] > 1 and self.crossed(t['py'], t['y'], lineY):
+                lane = self.laneOf(t['x'], ranges)
+                if lane is not None:
+                    t['counted'] = True
+                    t['lane'] = lane
+                    self.laneCounts[lane] += 1
+                    self.count += 1
+        t3 = time.perf_counter()
+
+        self.frames += 1
+        self.detectTime += t2 - t1
+        self.trackTime += t3 - t2
+        return eggs, tracks
+
+    def report(self):
+        seconds = max(1e-9, time.perf_counter() - self.started)
+        frames = max(1, self.frames)
+        print('Frames: {} ({:.1f} FPS)'.format(self.frames, self.frames / seconds))
+        print('Per frame: detect {:.2f} ms, track+count {:.3f} ms'.format(
+            1000 * self.detectTime / frames, 1000 * self.trackTime / frames))
+        print('Eggs counted: {} ({:.2f} per second), per lane: {}'.format(
+            self.count, self.count / seconds, self.laneCounts))
+
+
+def drawCounter(frame40, counter, eggs, tracks, lineY=None):
+    height, width = frame40.shape[:2]
+    lineY = height // 2 if lineY is None else lineY
+    cv2.line(frame40, (0, lineY), (width, lineY), (0, 255, 0), 6)
+    for x1, x2 in counter.laneRanges(width)[1:]:
+        cv2.line(frame40, (x1, 0), (x1, height), (0, 255, 255), 1)
+    for x, y, area, ellipse in eggs:
+        cv2.ellipse(frame40, ellipse, (255, 0, 0), 2)
+    for trackId, t in tracks.items():
+        cv2.putText(frame40, str(trackId), (int(t['x']), int(t['y'])), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5, (0, 0, 255) if t['counted'] else (0, 0, 0), 1, cv2.LINE_AA)
+    cv2.putText(frame40, "Eggs Counted: {} {}".format(counter.count, counter.laneCounts), (8, 40),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (250, 0, 255), 2)
+
+
+class CounterWorker:
+
+    def __init__(self, source, counter, params=None, drop=None, percent=40, draw=None, queueSize=4):
+        self.source = source
+        self.counter = counter
+        self.params = params        # latest settings snapshot (replaced, never modified)
+        self.applied = None         # snapshot the counter is using
+        self.drop = isinstance(source, int) if drop is None else drop  # camera: drop old frames
+        self.percent = percent      # rescale like reScaleFrame
+        self.draw = draw            # draw(frame40, counter, eggs, tracks) on the worker thread
+        self.frames = queue.Queue(queueSize)
+        self.results = queue.Queue(1)
+        self.running = False
+        self.finished = False
+        self.dropped = 0
+        self.threads = []
+
+    def setParams(self, params):
+        # called from the Qt thread (paramsChanged signal), only swaps the reference
+        self.params = params
+
+    def start(self):
+        self.capture = cv2.VideoCapture(self.source)
+        self.running = True
+        for target in (self.captureLoop, self.processLoop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.capture.release()
+
+    def put(self, q, item, drop):
+        # drop: replace the oldest item when full, else wait for room
+        while self.running:
+            try:
+                if drop:
+                    q.put_nowait(item)
+                else:
+                    q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if drop:
+                    try:
+                        q.get_nowait()
+                        if q is self.frames:
+                            self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def captureLoop(self):
+        while self.running:
+            grabbed, frame = self.capture.read()
+            if not grabbed:
+                break
+            self.put(self.frames, frame, self.drop)
+        self.put(self.frames, None, False)
+
+    def processLoop(self):
+        while self.running:
+            try:
+                frame = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if frame is None:
+                break
+
+            params = self.params
+            if params is not None and params is not self.applied:
+                self.counter.setParams(params.borderSize, (params.radiusMin, params.radiusMax),
+                                       (params.areaMin, params.areaMax))
+                self.applied = params
+
+            frame40 = cv2.resize(frame, (frame.shape[1] * self.percent // 100, frame.shape[0] * self.percent // 100),
+                                 interpolation=cv2.INTER_AREA)
+            eggs, tracks = self.counter.process(frame40)
+            if self.draw is not None:
+                self.draw(frame40, self.counter, eggs, tracks)
+            detector = self.counter.detector
+            # the display only needs the newest result
+            self.put(self.results, (frame40, detector.peaks, detector.distborder, detector.distTempl), True)
+        self.finished = True
+
+    def latest(self):
+        # newest (frame40, peaks, distborder, distTempl) or None
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+
+# ---------- benchmark (headless, no Qt) ----------
+
+def makeVideo(path, lanes=3, frames=300, width=800, height=1000, seed=1):
+    # dark belt, white eggs moving down in lanes; returns the number of eggs
+    # that cross the middle line (frames are rescaled to 40% by the counter, like the main loop)
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+    laneWidth = width // lanes
+    eggs = []  # (lane, start frame, speed, x jitter)
+    for lane in range(lanes):
+        f = int(rng.integers(0, 20))
+        while f < frames:
+            eggs.append((lane, f, float(rng.uniform(9, 13)), float(rng.uniform(-15, 15))))
+            f += int(rng.integers(18, 30))
+    crossing = 0
+    for n in range(frames):
+        frame = np.full((height, width, 3), 40, np.uint8)
+        for lane, start, speed, jitter in eggs:
+            y = -60 + (n - start) * speed
+            if -60 <= y <= height + 60:
+                x = int(lane * laneWidth + laneWidth / 2 + jitter)
+                cv2.ellipse(frame, (x, int(y)), (38, 50), 0, 0, 360, (225, 235, 245), -1)
+        writer.write(frame)
+    writer.release()
+    for lane, start, speed, jitter in eggs:
+        # middle line at 0.5 * height (in the full frame)
+        yLast = -60 + (frames - 1 - start) * speed
+        yFirst = -60 + max(0, -start) * speed
+        if yFirst < height / 2 <= yLast:
+            crossing += 1
+    return crossing
+
+
+if __name__ == '__main__':
+    # python egg_counter.py [video] [lanes]
+    path = sys.argv[1] if len(sys.argv) > 1 else '2.mp4'
+    lanes = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print('No video {}, making a test video with 3 lanes'.format(path))
+        import os
+        import tempfile
+        path = os.path.join(tempfile.gettempdir(), 'egg_counter.avi')
+        print('Eggs crossing the line: {}'.format(makeVideo(path)))
+        lanes = 3
+        cap = cv2.VideoCapture(path)
+
+    counter = EggCounter(lanes)
+    while True:
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        frame40 = cv2.resize(frame, None, fx=0.4, fy=0.4, interpolation=cv2.INTER_AREA)
+        counter.process(frame40)
+    cap.release()
+    counter.report()
@@ -0,0 +1,368 @@
+# ------- Khai báo thư viện -------
+import sys
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+# Bộ đếm phương tiện cho nhandienotov6.py
+#   - tách nền bằng MOG2 (hoặc KNN, hoặc hiệu hai khung hình như bản cũ)
+#   - mỗi xe là một track (id, vị trí, vết đi) và bị xóa khi mất dấu max_misses khung hình,
+#     nên bộ nhớ và thời gian mỗi khung hình không tăng theo độ dài video
+#   - đếm khi đoạn đường đi của track cắt một vạch đếm (CountLine), mỗi track một lần mỗi vạch,
+#     tách theo hướng; hoặc khi track đi vào một vùng đa giác (CountZone)
+#   - scale (thu nhỏ khung hình trước khi xử lý) và skip (xử lý 1 trong skip khung hình) để chạy nhanh hơn
+
+
+# ------- Vạch đếm và vùng đếm -------
+class CountLine:
+
+    def __init__(self, name, p1, p2, directions=("xuong", "len")):
+        # p1, p2: hai đầu vạch (tọa độ khung hình gốc)
+        # directions: tên hai hướng (từ bên trái sang bên phải của vectơ p1 -> p2, và ngược lại;
+        # vạch nằm ngang vẽ từ trái sang phải thì bên trái là phía trên)
+        self.name = name
+        self.p1 = np.array(p1, float)
+        self.p2 = np.array(p2, float)
+        self.directions = directions
+        self.counts = {d: 0 for d in directions}
+
+    def side(self, p):
+        # > 0: bên phải của p1 -> p2 (trục y hướng xuống), < 0: bên trái
+        d = self.p2 - self.p1
+        return d[0] * (p[1] - self.p1[1]) - d[1] * (p[0] - self.p1[0])
+
+    def crossing(self, a, b):
+        # hướng nếu đoạn a -> b cắt vạch, không thì None
+        # điểm nằm đúng trên vạch tính là bên phải (không đếm hai lần, không bỏ sót)
+        s1, s2 = self.side(a), self.side(b)
+        if (s1 < 0) == (s2 < 0):
+            return None
+        # p1, p2 phải nằm hai bên đường thẳng qua a, b (giao điểm nằm trong đoạn p1 p2)
+        d = np.asarray(b, float) - np.asarray(a, float)
+        t1 = d[0] * (self.p1[1] - a[1]) - d[1] * (self.p1[0] - a[0])
+        t2 = d[0] * (self.p2[1] - a[1]) - d[1] * (self.p2[0] - a[0])
+        if (t1 > 0) == (t2 > 0) and t1 != 0 and t2 != 0:
+            return None
+        return self.directions[0] if s1 < 0 else self.directions[1]
+
+    def draw(self, frame):
+        cv2.line(frame, tuple(int(v) for v in self.p1), tuple(int(v) for v in self.p2), (0, 255, 0), 3)
+        text = " ".join(f"{d}:{n}" for d, n in self.counts.items())
+        cv2.putText(frame, f"{self.name} {text}", (int(self.p1[0]), int(self.p1[1]) - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+
+class CountZone:
+
+    def __init__(self, name, points):
+        # points: các đỉnh đa giác (tọa độ khung hình gốc)
+        self.name = name
+        self.points = np.array(points, np.float32).reshape(-1, 1, 2)
+        self.count = 0          # số xe đã đi vào vùng
+        self.inside = 0         # số xe đang ở trong vùng
+
+    def contains(self, p):
+        return cv2.pointPolygonTest(self.points, (float(p[0]), float(p[1])), False) >= 0
+
+    def draw(self, frame):
+        cv2.polylines(frame, [self.points.astype(np.int32)], True, (255, 127, 0), 2)
+        x, y = self.points[0, 0]
+        cv2.putText(frame, f"{self.name}: {self.count} ({self.inside})", (int(x), int(y) - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 127, 0), 2)
+
+
+# ------- Track -------
+class Track:
+
+    def __init__(self, track_id, center, box, trail=20):
+        self.id = track_id
+        self.center = center            # tâm (khung hình gốc)
+        self.previous = center          # tâm ở lần xử lý trước
+        self.box = box                  # (x, y, w, h)
+        self.velocity = (0.0, 0.0)
+        self.misses = 0
+        self.age = 1
+        self.counted = set()            # tên các vạch / vùng đã đếm track này
+        self.trail = deque([center], maxlen=trail)  # vết đi để vẽ (giới hạn độ dài)
+
+    def predict(self):
+        return (self.center[0] + self.velocity[0], self.center[1] + self.velocity[1])
+
+    def update(self, center, box):
+        self.previous = self.center
+        self.velocity = (center[0] - self.center[0], center[1] - self.center[1])
+        self.center = center
+        self.box = box
+        self.misses = 0
+        self.age += 1
+        self.trail.append(center)
+
+
+# ------- Bộ đếm -------
+class VehicleCounter:
+
+    def __init__(self, lines=(), zones=(), scale=0.5, skip=1, subtractor="mog2",
+                 min_width=40, min_height=40, max_distance=80, max_misses=5):
+        self.lines = list(lines)
+        self.zones = list(zones)
+        self.scale = scale              # thu nhỏ khung hình trước khi tách nền (1 = giữ nguyên)
+        self.skip = skip                # chỉ xử lý 1 trong skip khung hình
+        self.min_width = min_width      # kích thước xe tối thiểu (khung hình gốc)
+        self.min_height = min_height
+        self.max_distance = max_distance  # quãng đường tối đa giữa hai lần xử lý (khung hình gốc)
+        self.max_misses = max_misses    # số lần xử lý mất dấu trước khi xóa track
+
+        self.subtractor_name = subtractor
+        if subtractor == "mog2":
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=25, detectShadows=False)
+        elif subtractor == "knn":
+            self.subtractor = cv2.createBackgroundSubtractorKNN(detectShadows=False)
+        else:
+            self.subtractor = None      # "diff": hiệu hai khung hình liên tiếp (như nhandienotov6.py)
+        self.previous_gray = None
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+        self.tracks = {}
+        self.next_id = 1
+        self.frame_number = 0
+        self.mask = None
+
+        # thống kê
+        self.processed = 0
+        self.times = []                 # ms mỗi khung hình đã xử lý
+
+    # ---------- tách nền ----------
+    def foreground(self, small):
+        if self.subtractor is not None:
+            mask = self.subtractor.apply(small)
+        else:
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            if self.previous_gray is None:
+                self.previous_gray = gray
+            mask = cv2.absdiff(self.previous_gray, gray)
+            self.previous_gray = gray
+        mask = cv2.GaussianBlur(mask, (5, 5), 0)
+        mask = cv2.threshold(mask, 20 if self.subtractor is None else 127, 255, cv2.THRESH_BINARY)[1]
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel, iterations=2)
+        return cv2.dilate(mask, self.kernel)
+
+    def detect(self, frame):
+        # xe trong khung hình: danh sách (tâm, (x, y, w, h)) theo tọa độ khung hình gốc
+        if self.scale != 1:
+            small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = frame
+        self.mask = self.foreground(small)
+        contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        vehicles = []
+        for c in contours:
+            x, y, w, h = (int(v / self.scale) for v in cv2.boundingRect(c))
+            if w >= self.min_width and h >= self.min_height:
+                vehicles.append(((x + w / 2, y + h / 2), (x, y, w, h)))
+        return vehicles
+
+    # ---------- theo dõi ----------
+    def associate(self, vehicles):
+        # gán xe cho track gần vị trí dự đoán nhất (cặp gần nhất trước)
+        ids = list(self.tracks)
+        matched_tracks, matched_vehicles = set(), set()
+        if ids and vehicles:
+            predicted = np.array([self.tracks[i].predict() for i in ids])
+            centers = np.array([c for c, box in vehicles])
+            distances = np.linalg.norm(predicted[:, None, :] - centers[None, :, :], axis=2)
+            for flat in np.argsort(distances, axis=None):
+                t, v = divmod(int(flat), len(vehicles))
+                if distances[t, v] > self.max_distance:
+                    break
+                if t in matched_tracks or v in matched_vehicles:
+                    continue
+                matched_tracks.add(t)
+                matched_vehicles.add(v)
+                self.tracks[ids[t]].update(*vehicles[v])
+
+        for t, track_id in enumerate(ids):
+            if t not in matched_tracks:
+                track = self.tracks[track_id]
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    del self.tracks[track_id]
+
+        for v, (center, box) in enumerate(vehicles):
+            if v not in matched_vehicles:
+                self.tracks[self.next_id] = Track(self.next_id, center, box)
+                self.next_id += 1
+
+    def count(self):
+        # mỗi track đếm một lần cho mỗi vạch / vùng
+        for zone in self.zones:
+            zone.inside = 0
+        for track in self.tracks.values():
+            if track.misses or track.age < 2:
+                continue
+            for line in self.lines:
+                if line.name in track.counted:
+                    continue
+                direction = line.crossing(track.previous, track.center)
+                if direction is not None:
+                    line.counts[direction] += 1
+                    track.counted.add(line.name)
+            for zone in self.zones:
+                if zone.contains(track.center):
+                    zone.inside += 1
+                    if zone.name not in track.counted:
+                        zone.count += 1
+                        track.counted.add(zone.name)
+
+    def process(self, frame):
+        # True nếu khung hình này được xử lý (theo skip)
+        self.frame_number += 1
+        if (self.frame_number - 1) % self.skip:
+            return False
+        t1 = time.perf_counter()
+        self.associate(self.detect(frame))
+        self.count()
+        self.times.append(1000 * (time.perf_counter() - t1))
+        self.processed += 1
+        return True
+
+    @property
+    def total(self):
+        return sum(sum(line.counts.values()) for line in self.lines)
+
+    def draw(self, frame):
+        for line in self.lines:
+            line.draw(frame)
+        for zone in self.zones:
+            zone.draw(frame)
+        for track in self.tracks.values():
+            if track.misses:
+                continue
+            x, y, w, h = track.box
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+            cv2.circle(frame, (int(track.center[0]), int(track.center[1])), 4, (0, 255, 0), -1)
+            cv2.putText(frame, str(track.id), (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+
+    def report(self):
+        times = np.array(self.times or [0])
+        tenth = max(1, len(times) // 10)
+        print(f"Khung hình: {self.frame_number}, đã xử lý: {self.processed} "
+              f"(scale {self.scale}, skip {self.skip}, {self.subtractor_name})")
+        print(f"ms/khung hình: trung bình {times.mean():.2f}, p95 {np.percentile(times, 95):.2f}, "
+              f"10% đầu {times[:tenth].mean():.2f}, 10% cuối {times[-tenth:].mean():.2f}")
+        print(f"Track đang giữ: {len(self.tracks)}, tổng số track: {self.next_id - 1}")
+        for line in self.lines:
+            print(f"Vạch {line.name}: {line.counts}")
+        for zone in self.zones:
+            print(f"Vùng {zone.name}: {zone.count}")
+
+
+# ------- Thử tốc độ trên video dài -------
+def make_video(path, minutes=3, fps=30, width=1280, height=720, seed=1):
+    # đường hai chiều nhìn từ trên: làn trái xe đi xuống, làn phải xe đi lên.
+    # Trả về số xe cắt vạch y = 600 theo mỗi hướng.
+    rng = np.random.default_rng(seed)
+    frames = minutes * 60 * fps
+    road = np.full((height, width, 3), 90, np.uint8)
+    road[:, 180:1100] = 60
+    cv2.line(road, (640, 0), (640, height), (200, 200, 200), 4)
+    cars = []  # (frame bắt đầu, x, vận tốc, w, h, màu)
+    for lane_x, direction in ((300, 1), (480, 1), (800, -1), (980, -1)):
+        f = int(rng.integers(0, 60))
+        while f < frames:
+            w, h = int(rng.integers(70, 110)), int(rng.integers(110, 170))
+            speed = float(rng.uniform(8, 14)) * direction
+            # xe có hoa văn (kính, nóc...) để hiệu hai khung hình của bản cũ cũng thấy cả xe
+            color = np.array(rng.integers(120, 255, 3), np.int16)
+            car = np.clip(color + rng.integers(-60, 60, (h // 8, w // 8, 1)), 0, 255).astype(np.uint8)
+            car = cv2.resize(car, (w, h), interpolation=cv2.INTER_NEAREST)
+            cars.append((f, lane_x, speed, w, h, car))
+            f += int(rng.integers(45, 120))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    for n in range(frames):
+        frame = road.copy()
+        for start, x, speed, w, h, car in cars:
+            y = (-h if speed > 0 else height + h) + (n - start) * speed
+            top = int(y - h / 2)
+            if -h < top < height:
+                rows = slice(max(0, top), min(height, top + h))
+                frame[rows, x - w // 2:x - w // 2 + w] = car[rows.start - top:rows.stop - top]
+        writer.write(frame)
+    writer.release()
+
+    counts = {"xuong": 0, "len": 0}
+    for start, x, speed, w, h, car in cars:
+        y0 = (-h if speed > 0 else height + h) + max(0, -start) * speed
+        y1 = (-h if speed > 0 else height + h) + (frames - 1 - start) * speed
+        if min(y0, y1) < 600 <= max(y0, y1):
+            counts["xuong" if speed > 0 else "len"] += 1
+    return counts
+
+
+def legacy(path):
+    # vòng lặp của nhandienotov6.py (không hiển thị): danh sách detect toàn cục
+    cap = cv2.VideoCapture(path)
+    ret, frame1 = cap.read()
+    ret, frame2 = cap.read()
+    detect, counter, times = [], 0, []
+    while ret:
+        t1 = time.perf_counter()
+        d = cv2.absdiff(frame1, frame2)
+        grey = cv2.cvtColor(d, cv2.COLOR_BGR2GRAY)
+        blur = cv2.GaussianBlur(grey, (5, 5), 3)
+        ret, mask = cv2.threshold(blur, 20, 255, cv2.THRESH_BINARY)
+        dilated = cv2.dilate(mask, np.ones((3, 3)))
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2))
+        closing = cv2.morphologyEx(dilated, cv2.MORPH_CLOSE, kernel)
+        # bản gốc ghi đè ret bằng hierarchy (khung hình không có chuyển động sẽ dừng vòng lặp),
+        # ở đây bỏ lỗi đó để chạy hết video
+        contorno, hierarchy = cv2.findContours(closing, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        for c in contorno:
+            (x, y, w, h) = cv2.boundingRect(c)
+            if w < 40 or h < 40:
+                continue
+            detect.append((x + int(w / 2), y + int(h / 2)))
+            for (x, y) in detect:
+                if 600 - 15 < y < 600 + 15:
+                    counter += 1
+                    detect.remove((x, y))
+        times.append(1000 * (time.perf_counter() - t1))
+        frame1 = frame2
+        ret, frame2 = cap.read()
+    cap.release()
+    times = np.array(times)
+    tenth = max(1, len(times) // 10)
+    print(f"Bản cũ (nhandienotov6.py): đếm {counter}, danh sách detect còn {len(detect)} tâm")
+    print(f"ms/khung hình: trung bình {times.mean():.2f}, 10% đầu {times[:tenth].mean():.2f}, "
+          f"10% cuối {times[-tenth:].mean():.2f}")
+
+
+def benchmark(path, scale=0.5, skip=1, subtractor="mog2"):
+    counter = VehicleCounter([CountLine("A", (180, 600), (1100, 600))], scale=scale, skip=skip, subtractor=subtractor)
+    cap = cv2.VideoCapture(path)
+    t1 = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        counter.process(frame)
+    seconds = time.perf_counter() - t1
+    cap.release()
+    print(f"Cả vòng lặp (cả đọc video): {counter.frame_number / seconds:.1f} khung hình/s")
+    counter.report()
+
+
+if __name__ == '__main__':
+    # python vehicle_counter.py [video] [scale] [skip]
+    # không có video thì tạo video 3 phút (đường hai chiều, vạch đếm y = 600)
+    path = sys.argv[1] if len(sys.argv) > 1 else "video.mp4"
+    if not cv2.VideoCapture(path).isOpened():
+        import os
+        import tempfile
+        path = os.path.join(tempfile.gettempdir(), "vehicle_counter.avi")
+        print(f"Tạo video thử: {path}")
+        print(f"Số xe cắt vạch thật: {make_video(path)}")
+    scale = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    skip = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    legacy(path)
+    benchmark(path, scale, skip)
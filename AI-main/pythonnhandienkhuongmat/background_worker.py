@@ -0,0 +1,42 @@
+import time
+import threading
+import numpy as np
+
+'''
+Phần chung cho các lớp xử lý bằng luồng nền (ví dụ FaceStream trong face_stream.py):
+chạy các luồng, ghi thời gian chạy và độ trễ, in độ trễ trong report().
+'''
+
+
+class BackgroundWorker:
+
+    def __init__(self):
+        self.running = False
+        self.threads = []
+        self.latencies = []             # giây, mỗi kết quả một giá trị
+        self.started = None
+        self.stopped = None
+
+    def start_threads(self, *targets):
+        self.running = True
+        self.started = time.perf_counter()
+        self.stopped = None
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop_threads(self, timeout=None):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+        self.stopped = time.perf_counter()
+
+    def elapsed(self):
+        # số giây từ start đến stop (hoặc đến bây giờ nếu chưa stop)
+        return max(1e-9, (self.stopped or time.perf_counter()) - self.started)
+
+    def report_latency(self):
+        latencies = np.array(self.latencies or [0]) * 1000
+        print(f"Độ trễ (ms): trung bình {latencies.mean():.1f}, p95 {np.percentile(latencies, 95):.1f}")
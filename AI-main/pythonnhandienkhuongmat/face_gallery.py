@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+'''
+Kho khuôn mặt (gallery): mã hóa khuôn mặt của ảnh mẫu chỉ tính một lần và lưu lại.
+    encodings.f32: ma trận float32 (số dòng x 128) mở bằng np.memmap, không đọc hết vào RAM.
+    people.jsonl: mỗi dòng là một thao tác {"op": "add"/"remove", ...}, chỉ ghi thêm,
+        nên enrol/remove không phải ghi lại toàn bộ kho.
+Tìm kiếm: khoảng cách Euclid (giống face_recognition.face_distance) từ mọi khuôn mặt cần tìm
+tới mọi người trong kho bằng một phép nhân ma trận, lấy k người gần nhất bằng np.argpartition.
+
+Cách dùng:
+    gallery = FaceGallery("gallery")
+    gallery.enrol_image("Khiem", "pic/hinhkhiem/a.jpg", info="nam")   # bỏ qua nếu ảnh đã có trong kho
+    gallery.enrol_folder("pic/hinhkhiem", "Khiem")
+    results = gallery.search(face_encodings, k=1, tolerance=0.6)     # [[(name, distance, info), ...], ...]
+    gallery.remove("Khiem")
+'''
+
+ENCODING_SIZE = 128  # face_recognition trả về vectơ 128 chiều
+IMAGE_TYPES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FaceGallery:
+
+    def __init__(self, folder="gallery", capacity=1024):
+        self.folder = folder
+        self.matrix_path = os.path.join(folder, "encodings.f32")
+        self.log_path = os.path.join(folder, "people.jsonl")
+        os.makedirs(folder, exist_ok=True)
+
+        # thông tin từng dòng của ma trận
+        self.names = []     # tên người
+        self.infos = []     # thông tin thêm (giới tính, ...)
+        self.sources = []   # ảnh gốc (đường dẫn, thời gian sửa) để không mã hóa lại
+        self.active = np.zeros(0, bool)  # False = đã xóa
+
+        self.load_log()
+        self.source_rows = {}
+        for n, source in enumerate(self.sources):
+            if source:
+                self.source_rows.setdefault(tuple(source), []).append(n)
+        self.open_matrix(max(capacity, len(self.names)))
+
+        # bình phương độ dài từng dòng (dùng cho khoảng cách), tính một lần khi mở kho
+        self.norms = np.einsum('ij,ij->i', self.matrix[:self.count], self.matrix[:self.count])
+
+    # ---------- lưu trữ ----------
+
+    def load_log(self):
+        # đọc lại các thao tác đã ghi (add/remove) theo thứ tự
+        if not os.path.isfile(self.log_path):
+            return
+        active = []
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                if item["op"] == "add":
+                    self.names.append(item["name"])
+                    self.infos.append(item.get("info"))
+                    self.sources.append(item.get("source"))
+                    active.append(True)
+                elif item["op"] == "remove":
+                    active[item["row"]] = False
+        self.active = np.array(active, bool)
+
+    def write_log(self, items):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    def open_matrix(self, capacity):
+        # tạo hoặc nới rộng tệp ma trận (các dòng cũ giữ nguyên trên đĩa)
+        size = capacity * ENCODING_SIZE * 4
+        if not os.path.isfile(self.matrix_path) or os.path.getsize(self.matrix_path) < size:
+            with open(self.matrix_path, "ab") as f:
+                f.truncate(size)
+        self.capacity = os.path.getsize(self.matrix_path) // (ENCODING_SIZE * 4)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, ENCODING_SIZE))
+
+    @property
+    def count(self):
+        return len(self.names)
+
+    def __len__(self):
+        # số người (dòng) còn trong kho
+        return int(self.active.sum())
+
+    # ---------- thêm / xóa ----------
+
+    def enrol(self, names, encodings, infos=None, sources=None):
+        # thêm nhiều mã hóa một lần (không tính lại các dòng cũ)
+        encodings = np.asarray(encodings, np.float32).reshape(-1, ENCODING_SIZE)
+        if isinstance(names, str):
+            names = [names] * len(encodings)
+        infos = infos if infos is not None else [None] * len(encodings)
+        sources = sources if sources is not None else [None] * len(encodings)
+
+        # tăng gấp đôi dung lượng khi đầy
+        start = self.count
+        if start + len(encodings) > self.capacity:
+            self.matrix.flush()
+            del self.matrix
+            self.open_matrix(max(2 * self.capacity, start + len(encodings)))
+
+        self.matrix[start:start + len(encodings)] = encodings
+        self.matrix.flush()
+        self.norms = np.concatenate((self.norms, np.einsum('ij,ij->i', encodings, encodings)))
+        self.active = np.concatenate((self.active, np.ones(len(encodings), bool)))
+        self.names += list(names)
+        self.infos += list(infos)
+        self.sources += list(sources)
+        for n, source in enumerate(sources, start):
+            if source:
+                self.source_rows.setdefault(tuple(source), []).append(n)
+
+        self.write_log({"op": "add", "row": start + n, "name": name, "info": info, "source": source}
+                       for n, (name, info, source) in enumerate(zip(names, infos, sources)))
+        return list(range(start, start + len(encodings)))
+
+    def has_source(self, source):
+        # ảnh này đã được mã hóa (và chưa bị xóa)?
+        for row in self.source_rows.get(tuple(source), []):
+            if self.active[row]:
+                return True
+        return False
+
+    def enrol_image(self, name, image_path, info=None):
+        # mã hóa ảnh mẫu chỉ một lần: ảnh (đường dẫn + thời gian sửa) đã có thì bỏ qua
+        import face_recognition as fr
+
+        source = [os.path.abspath(image_path), os.path.getmtime(image_path)]
+        if self.has_source(source):
+            return []
+        encodings = fr.face_encodings(fr.load_image_file(image_path))
+        if not encodings:
+            print(f"Không tìm thấy khuôn mặt: {image_path}")
+            return []
+        return self.enrol(name, encodings[:1], [info], [source])  # chỉ lấy khuôn mặt đầu tiên
+
+    def enrol_folder(self, folder, name=None, info=None):
+        # mọi ảnh trong thư mục; name = None thì tên người là tên tệp (vd pic/joey.jpg -> joey)
+        rows = []
+        for file in sorted(os.listdir(folder)):
+            if file.lower().endswith(IMAGE_TYPES):
+                person = name or os.path.splitext(file)[0]
+                rows += self.enrol_image(person, os.path.join(folder, file), info)
+        return rows
+
+    def remove(self, name=None, rows=None):
+        # xóa theo tên (mọi ảnh của người đó) hoặc theo số dòng, chỉ đánh dấu chứ không dời ma trận
+        if rows is None:
+            rows = [n for n, person in enumerate(self.names) if person == name and self.active[n]]
+        rows = [n for n in rows if self.active[n]]
+        self.active[rows] = False
+        self.write_log({"op": "remove", "row": n} for n in rows)
+        return rows
+
+    # ---------- tìm kiếm ----------
+
+    def distances(self, encodings, block=65536):
+        # khoảng cách từ mỗi khuôn mặt (Q x 128) tới mọi dòng của kho (Q x count)
+        # |q - g|^2 = |q|^2 + |g|^2 - 2 q.g, tính theo từng khối dòng để giới hạn bộ nhớ
+        queries = np.asarray(encodings, np.float32).reshape(-1, ENCODING_SIZE)
+        qnorms = np.einsum('ij,ij->i', queries, queries)
+        result = np.empty((len(queries), self.count), np.float32)
+        for start in range(0, self.count, block):
+            stop = min(start + block, self.count)
+            d2 = qnorms[:, None] + self.norms[None, start:stop] - 2 * (queries @ self.matrix[start:stop].T)
+            result[:, start:stop] = np.sqrt(np.maximum(d2, 0))
+        result[:, ~self.active] = np.inf
+        return result
+
+    def search(self, encodings, k=1, tolerance=0.6):
+        # k người gần nhất cho mỗi khuôn mặt, chỉ giữ khoảng cách <= tolerance
+        # kết quả: [[(name, distance, info), ...], ...] theo thứ tự gần -> xa
+        distances = self.distances(encodings)
+        if not self.count:
+            return [[] for _ in range(len(distances))]
+        k = min(k, self.count)
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        results = []
+        for row, columns in zip(distances, nearest):
+            columns = columns[np.argsort(row[columns])]
+            results.append([(self.names[c], float(row[c]), self.infos[c]) for c in columns if row[c] <= tolerance])
+        return results
+
+    def match(self, encoding, tolerance=0.6, unknown="Unknown"):
+        # tên người gần nhất cho một khuôn mặt (unknown nếu không ai đủ gần)
+        found = self.search([encoding], 1, tolerance)[0]
+        return found[0][0] if found else unknown
+
+
+# ---------- thử tốc độ (không cần face_recognition) ----------
+
+def benchmark(people=50000, queries=10):
+    # so sánh: vòng lặp kiểu compare_faces (mỗi người một phép tính) và search của kho
+    import tempfile
+    import shutil
+
+    folder = tempfile.mkdtemp()
+    rng = np.random.default_rng(1)
+    encodings = rng.normal(0, 0.1, (people, ENCODING_SIZE)).astype(np.float32)
+    probe = encodings[rng.integers(0, people, queries)] + rng.normal(0, 0.01, (queries, ENCODING_SIZE)).astype(np.float32)
+
+    t1 = time.perf_counter()
+    gallery = FaceGallery(folder)
+    gallery.enrol([f"nguoi{n}" for n in range(people)], encodings)
+    t2 = time.perf_counter()
+    gallery = FaceGallery(folder)  # mở lại từ đĩa (không mã hóa lại)
+    t3 = time.perf_counter()
+
+    known = list(encodings)
+    names_loop = []
+    t4 = time.perf_counter()
+    for q in probe:
+        matches = [np.linalg.norm(e - q) <= 0.6 for e in known]
+        names_loop.append(next((f"nguoi{n}" for n, m in enumerate(matches) if m), "Unknown"))
+    t5 = time.perf_counter()
+    results = gallery.search(probe, k=5)
+    t6 = time.perf_counter()
+
+    same = sum(1 for r in results if r and r[0][0] in names_loop)
+    print(f"{people} người, {queries} khuôn mặt cần tìm")
+    print(f"  enrol: {t2 - t1:.2f}s, mở lại kho: {t3 - t2:.3f}s")
+    print(f"  vòng lặp compare_faces: {1000 * (t5 - t4) / queries:.1f} ms/khuôn mặt")
+    print(f"  search (top 5): {1000 * (t6 - t5) / queries:.2f} ms/khuôn mặt, khớp {same}/{queries}")
+    shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    # python face_gallery.py enrol <thư mục ảnh> [tên]   (tên = tên tệp nếu bỏ trống)
+    # python face_gallery.py remove <tên>
+    # python face_gallery.py list
+    # python face_gallery.py benchmark [số người]
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "benchmark":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 50000)
+    else:
+        gallery = FaceGallery("gallery")
+        if command == "enrol":
+            rows = gallery.enrol_folder(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+            print(f"Đã thêm {len(rows)} ảnh")
+        elif command == "remove":
+            print(f"Đã xóa {len(gallery.remove(sys.argv[2]))} ảnh")
+        people = sorted(set(name for name, active in zip(gallery.names, gallery.active) if active))
+        print(f"Kho có {len(gallery)} ảnh của {len(people)} người: {', '.join(people)}")
@@ -0,0 +1,372 @@
+import time
+import queue
+import threading
+import numpy as np
+import cv2
+from background_worker import BackgroundWorker
+
+'''
+Nhận diện khuôn mặt theo thời gian thực (camera hoặc video).
+face_locations (HOG) và face_encodings (dlib) là hai bước tốn thời gian nhất, nên:
+    - chỉ tìm khuôn mặt (detect) mỗi detect_every khung hình, trên ảnh thu nhỏ (scale)
+    - giữa hai lần detect, mỗi khuôn mặt được theo dõi (track) bằng cv2.matchTemplate quanh vị trí cũ
+    - chỉ mã hóa (encode) lại khi track mới xuất hiện hoặc độ tin cậy (confidence) giảm dưới reencode_below
+Ba luồng chạy song song, nối với nhau bằng hàng đợi có giới hạn (queue.Queue(maxsize)):
+    capture (đọc camera) -> detect/track -> encode (mã hóa + tìm trong FaceGallery)
+Khi hàng đợi đầy thì bỏ khung hình cũ nhất (camera không bị chậm lại theo bước sau).
+
+Cách dùng:
+    stream = FaceStream(0, gallery)          # 0 = webcam, hoặc đường dẫn video
+    stream.start()
+    while True:
+        frame, faces, latency = stream.read()   # faces: [(top, right, bottom, left, name, distance), ...]
+        ...
+    stream.stop()
+    stream.report()
+'''
+
+
+def face_recognition_detector(rgb):
+    # vị trí khuôn mặt (top, right, bottom, left) trên ảnh RGB (HOG của face_recognition)
+    import face_recognition as fr
+    return fr.face_locations(rgb)
+
+
+def face_recognition_encoder(rgb, locations):
+    # mã hóa 128 chiều cho các vị trí khuôn mặt trên ảnh RGB gốc
+    import face_recognition as fr
+    return fr.face_encodings(rgb, locations)
+
+
+def put_latest(q, item):
+    # đưa vào hàng đợi, nếu đầy thì bỏ phần tử cũ nhất; trả về số phần tử bị bỏ
+    dropped = 0
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+class FaceTrack:
+    # một khuôn mặt đang được theo dõi (tọa độ trên ảnh gốc)
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box              # (top, right, bottom, left)
+        self.template = None        # ảnh xám nhỏ của khuôn mặt (để matchTemplate)
+        self.name = None            # None = chưa mã hóa xong
+        self.distance = None
+        self.confidence = 0.0       # 1.0 ngay sau khi mã hóa, giảm dần theo thời gian
+        self.encoding = False       # đang chờ / đang mã hóa
+        self.misses = 0
+
+
+class FaceStream(BackgroundWorker):
+
+    detect_every = 5        # detect mỗi N khung hình
+    scale = 0.25            # detect trên ảnh thu nhỏ (0.25 = 1/4 chiều rộng và chiều cao)
+    tolerance = 0.6         # khoảng cách tối đa để nhận là cùng một người
+    unknown = "Unknown"
+    confidence_decay = 0.98     # mỗi khung hình confidence *= decay * điểm track
+    reencode_below = 0.5        # mã hóa lại khi confidence < giá trị này
+    track_min_score = 0.5       # điểm matchTemplate thấp hơn = mất dấu
+    track_max_misses = 2        # số lần detect không thấy trước khi xóa track
+    match_iou = 0.3             # IoU tối thiểu để gán khuôn mặt mới detect vào track cũ
+    queue_size = 2              # kích thước các hàng đợi
+
+    def __init__(self, source=0, gallery=None, detector=face_recognition_detector, encoder=face_recognition_encoder):
+        super().__init__()
+        self.source = source
+        self.gallery = gallery
+        self.detector = detector
+        self.encoder = encoder
+
+        self.detect_queue = queue.Queue(self.queue_size)
+        self.encode_queue = queue.Queue(self.queue_size * 4)
+        self.output_queue = queue.Queue(self.queue_size)
+
+        self.tracks = []
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+        # thống kê
+        self.frames = 0
+        self.dropped = 0
+        self.detects = 0
+        self.encodes = 0
+        self.recognized = 0         # số lần mã hóa ra một người trong kho
+        self.shown = 0              # số khung hình đã trả ra
+        self.faces_shown = 0        # số khuôn mặt có tên trên các khung hình đã trả ra
+
+    # ---------- các luồng ----------
+
+    def start(self):
+        self.capture = cv2.VideoCapture(self.source)
+        self.start_threads(self.capture_loop, self.detect_loop, self.encode_loop)
+
+    def stop(self):
+        self.stop_threads(timeout=2)
+        self.capture.release()
+
+    def capture_loop(self):
+        # đọc camera, đánh số và ghi thời điểm đọc của từng khung hình
+        seq = 0
+        while self.running:
+            ok, frame = self.capture.read()
+            if not ok:
+                break
+            seq += 1
+            self.dropped += put_latest(self.detect_queue, (seq, time.perf_counter(), frame))
+        put_latest(self.detect_queue, None)  # hết video
+
+    def detect_loop(self):
+        while self.running:
+            item = self.detect_queue.get()
+            if item is None:
+                break
+            seq, captured, frame = item
+            self.frames += 1
+
+            small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+            with self.lock:
+                if (self.frames - 1) % self.detect_every == 0:
+                    self.detect(small, gray)
+                else:
+                    self.track(gray)
+
+                # khuôn mặt cần mã hóa (mới hoặc độ tin cậy thấp)
+                for t in self.tracks:
+                    if not t.encoding and t.confidence < self.reencode_below:
+                        try:
+                            self.encode_queue.put_nowait((t, frame, t.box))
+                            t.encoding = True
+                        except queue.Full:
+                            break
+
+                faces = [t.box + (t.name or self.unknown, t.distance) for t in self.tracks]
+            put_latest(self.output_queue, (frame, faces, captured))
+        self.running = False
+        put_latest(self.output_queue, None)
+
+    def encode_loop(self):
+        while self.running or not self.encode_queue.empty():
+            try:
+                t, frame, box = self.encode_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            encodings = self.encoder(rgb, [box])
+            self.encodes += 1
+            name, distance = self.unknown, None
+            if len(encodings) and self.gallery is not None:
+                found = self.gallery.search(encodings[:1], k=1, tolerance=self.tolerance)[0]
+                if found:
+                    name, distance = found[0][0], found[0][1]
+                    self.recognized += 1
+            with self.lock:
+                t.name, t.distance = name, distance
+                t.confidence = 1.0
+                t.encoding = False
+
+    # ---------- detect / track ----------
+
+    def detect(self, small, gray):
+        self.detects += 1
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        boxes = [tuple(int(v / self.scale) for v in box) for box in self.detector(rgb)]
+
+        # gán khuôn mặt vào track cũ theo IoU lớn nhất
+        pairs = sorted(((iou(t.box, b), n, m) for n, t in enumerate(self.tracks) for m, b in enumerate(boxes)), reverse=True)
+        used_tracks, used_boxes = set(), set()
+        for score, n, m in pairs:
+            if score < self.match_iou or n in used_tracks or m in used_boxes:
+                continue
+            used_tracks.add(n)
+            used_boxes.add(m)
+            self.tracks[n].box = boxes[m]
+            self.tracks[n].misses = 0
+            self.tracks[n].confidence *= self.confidence_decay
+
+        # track không còn thấy
+        for n, t in enumerate(self.tracks):
+            if n not in used_tracks:
+                t.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.track_max_misses]
+
+        # khuôn mặt mới
+        for m, box in enumerate(boxes):
+            if m not in used_boxes:
+                self.tracks.append(FaceTrack(self.next_id, box))
+                self.next_id += 1
+
+        for t in self.tracks:
+            t.template = self.crop(gray, t.box)
+
+    def track(self, gray):
+        # tìm lại mỗi khuôn mặt quanh vị trí cũ (trên ảnh xám thu nhỏ)
+        keep = []
+        for t in self.tracks:
+            top, right, bottom, left = (int(v * self.scale) for v in t.box)
+            h, w = bottom - top, right - left
+            if t.template is None or h < 4 or w < 4:
+                keep.append(t)
+                continue
+            y1, x1 = max(0, top - h // 2), max(0, left - w // 2)
+            window = gray[y1:bottom + h // 2, x1:right + w // 2]
+            if window.shape[0] < t.template.shape[0] or window.shape[1] < t.template.shape[1]:
+                continue
+            result = cv2.matchTemplate(window, t.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            if score < self.track_min_score:
+                continue  # mất dấu, detect lần sau sẽ tìm lại
+            top, left = y1 + y, x1 + x
+            t.box = tuple(int(v / self.scale) for v in (top, left + w, top + h, left))
+            t.confidence *= self.confidence_decay * score
+            keep.append(t)
+        self.tracks = keep
+
+    def crop(self, gray, box):
+        top, right, bottom, left = (int(v * self.scale) for v in box)
+        top, left = max(0, top), max(0, left)
+        patch = gray[top:bottom, left:right]
+        return patch.copy() if patch.size else None
+
+    # ---------- kết quả ----------
+
+    def read(self, timeout=1.0):
+        # khung hình mới nhất đã xử lý: (frame, faces, độ trễ giây) hoặc None khi hết
+        try:
+            item = self.output_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None, [], None
+        if item is None:
+            return None, None, None
+        frame, faces, captured = item
+        latency = time.perf_counter() - captured
+        self.latencies.append(latency)
+        self.shown += 1
+        self.faces_shown += sum(1 for f in faces if f[4] != self.unknown)
+        return frame, faces, latency
+
+    def report(self):
+        seconds = self.elapsed()
+        print(f"Khung hình: {self.frames} ({self.frames / seconds:.1f}/s), bỏ qua: {self.dropped}")
+        print(f"Detect: {self.detects}, encode: {self.encodes}, nhận ra: {self.recognized}")
+        print(f"Khuôn mặt có tên / giây: {self.faces_shown / seconds:.1f}")
+        self.report_latency()
+
+
+def draw_faces(frame, faces):
+    for top, right, bottom, left, name, distance in faces:
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+        cv2.rectangle(frame, (left, bottom - 20), (right, bottom), (0, 0, 255), cv2.FILLED)
+        cv2.putText(frame, name, (left + 6, bottom - 6), cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1)
+
+
+def iou(a, b):
+    # IoU của hai hộp (top, right, bottom, left)
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - inter
+    return inter / area if area > 0 else 0.0
+
+
+# ---------- thử tốc độ (không cần face_recognition) ----------
+
+def benchmark(people=3, seconds=6, fps=30, width=1280, height=720):
+    # video giả: mỗi "khuôn mặt" là một ô màu có hoa văn di chuyển chậm.
+    # detector / encoder giả có thời gian chạy giống face_recognition (HOG tỉ lệ với số điểm ảnh,
+    # dlib khoảng 15 ms mỗi khuôn mặt), để so sánh:
+    #   mỗi khung hình: detect trên ảnh gốc + encode mọi khuôn mặt (như các script nhandienbangcamvsclick*)
+    #   FaceStream: detect ảnh 1/4 mỗi 5 khung hình, chỉ encode track mới / độ tin cậy thấp
+    import os
+    import tempfile
+    from face_gallery import FaceGallery
+
+    rng = np.random.default_rng(1)
+    colors = [tuple(int(c) for c in rng.integers(80, 256, 3)) for _ in range(people)]
+    pattern = rng.integers(0, 60, (120, 120, 1), dtype=np.uint8)
+    path = os.path.join(tempfile.gettempdir(), "face_stream_benchmark.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    truth = []
+    for n in range(seconds * fps):
+        frame = np.full((height, width, 3), 30, np.uint8)
+        boxes = []
+        for p, color in enumerate(colors):
+            x = int(100 + p * 380 + 60 * np.sin(n / 20 + p))
+            y = int(250 + 40 * np.cos(n / 25 + p))
+            frame[y:y + 120, x:x + 120] = np.array(color, np.uint8) - pattern
+            boxes.append((y, x + 120, y + 120, x))
+        truth.append(boxes)
+        writer.write(frame)
+    writer.release()
+
+    def detector(rgb):
+        time.sleep(rgb.shape[0] * rgb.shape[1] * 60e-9)  # ~55 ms cho 1280x720
+        mask = cv2.inRange(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY), 60, 255)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = [cv2.boundingRect(c) for c in contours]
+        return [(y, x + w, y + h, x) for x, y, w, h in boxes if w * h > 16]
+
+    def encoder(rgb, locations):
+        time.sleep(0.015 * len(locations))
+        encodings = []
+        for top, right, bottom, left in locations:
+            patch = rgb[max(0, top):bottom, max(0, left):right].reshape(-1, 3)
+            color = np.percentile(patch, 90, axis=0) / 255.0
+            encodings.append(np.tile(color, 43)[:128])
+        return encodings
+
+    folder = tempfile.mkdtemp()
+    gallery = FaceGallery(folder)
+    gallery.enrol([f"nguoi{p}" for p in range(people)],
+                  [np.tile(np.array(color[::-1]) / 255.0, 43)[:128] for color in colors])
+
+    # mỗi khung hình (kiểu cũ, không có luồng)
+    capture = cv2.VideoCapture(path)
+    named, latencies = 0, []
+    t1 = time.perf_counter()
+    while True:
+        captured = time.perf_counter()
+        ok, frame = capture.read()
+        if not ok:
+            break
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        locations = detector(rgb)
+        found = gallery.search(encoder(rgb, locations), k=1, tolerance=0.6) if locations else []
+        named += sum(1 for f in found if f)
+        latencies.append(time.perf_counter() - captured)
+    seconds_old = time.perf_counter() - t1
+    capture.release()
+    latencies = np.array(latencies) * 1000
+    print(f"Mỗi khung hình: {len(latencies) / seconds_old:.1f} khung hình/s, "
+          f"khuôn mặt có tên / giây: {named / seconds_old:.1f}, "
+          f"độ trễ trung bình {latencies.mean():.1f} ms, p95 {np.percentile(latencies, 95):.1f} ms")
+
+    # FaceStream
+    stream = FaceStream(path, gallery, detector, encoder)
+    stream.start()
+    while True:
+        frame, faces, latency = stream.read()
+        if faces is None:
+            break
+    stream.stop()
+    print("FaceStream:")
+    stream.report()
+
+    import shutil
+    shutil.rmtree(folder)
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    benchmark()
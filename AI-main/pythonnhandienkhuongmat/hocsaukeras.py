@@ -1,54 +1,41 @@
-from keras.models import load_model
 import cv2
 import numpy as np
+from keras_stream import KerasStream, load_model, load_labels
 
 # Disable scientific notation for clarity
 np.set_printoptions(suppress=True)
 
 # Load the model
-model = load_model("hocsau/keras_Model.h5", compile=False)
+model = load_model("hocsau/keras_Model.h5")
 
-# Load the labels
-class_names = open("hocsau/labels.txt", "r").readlines()
+# Load the labels ("0 Class 1" -> "Class 1")
+class_names = load_labels("hocsau/labels.txt")
 
 # CAMERA can be 0 or 1 based on default camera of your computer
-camera = cv2.VideoCapture(0)
+# Camera được đọc trên một luồng riêng, mô hình chạy theo lô nhỏ trên luồng khác (keras_stream.py)
+stream = KerasStream(0, model, class_names)
+stream.start()
 
 show_class_message = True  # Biến để quyết định hiển thị thông báo lớp
 
-# ... (các phần mã khác)
+while stream.running:
+    # Kết quả mới nhất (đã làm mượt): (seq, tên lớp, độ tin cậy, độ trễ)
+    result = stream.read()
+    if result is None or stream.last_image is None:
+        continue
+    seq, class_name, confidence_score, latency = result
 
-while True:
-    # Grab the webcamera's image.
-    ret, image = camera.read()
-
-    # Resize the raw image into (224-height,224-width) pixels
-    image = cv2.resize(image, (224, 224), interpolation=cv2.INTER_AREA)
-
-    # Show the image in a window
-    cv2.imshow("Webcam Image", image)
-
-    # Make the image a numpy array and reshape it to the models input shape.
-    image_for_prediction = np.asarray(image, dtype=np.float32).reshape(1, 224, 224, 3)
-
-    # Normalize the image array
-    image_for_prediction = (image_for_prediction / 127.5) - 1
-
-    # Predicts the model
-    prediction = model.predict(image_for_prediction)
-    index = np.argmax(prediction)
-    class_name = class_names[index]
-    confidence_score = prediction[0][index]
-
-    print("Class:", class_name[2:], end="")
+    print("Class:", class_name, end=" ")
     print("Confidence Score:", str(np.round(confidence_score * 100))[:-2], "%")
 
     # Check if the class is not 1 or 2
-    if class_name not in ["Class 1", "Class 2"]:
+    if show_class_message and class_name not in ["Class 1", "Class 2"]:
         print("Không nhận diện được chủ thể.")
 
     # Display the image with text
-    cv2.putText(image, class_name[2:], (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    image = stream.last_image.copy()
+    cv2.putText(image, class_name, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    cv2.imshow("Webcam Image", image)
 
     # Listen to the keyboard for presses.
     keyboard_input = cv2.waitKey(1)
@@ -57,5 +44,6 @@ while True:
     if keyboard_input == 27:
         break
 
-camera.release()
+stream.stop()
+stream.report()
 cv2.destroyAllWindows()
@@ -0,0 +1,221 @@
+import sys
+import time
+import queue
+import numpy as np
+import cv2
+from background_worker import BackgroundWorker
+
+'''
+Chạy mô hình phân loại Keras (Teachable Machine, hocsau/keras_model.h5) trên camera hoặc video.
+hocsaukeras.py cũ: mỗi khung hình tạo mảng float32 mới, chuẩn hóa, rồi gọi model.predict
+(chậm vì mỗi lần predict phải dựng lại vòng lặp dữ liệu) và camera phải chờ predict xong.
+KerasStream:
+    - luồng capture đọc camera và resize thẳng vào một ô của vòng đệm uint8 có sẵn (không tạo mảng mới)
+    - luồng predict gom các khung hình đang chờ thành lô nhỏ (tối đa max_batch), chuẩn hóa vào
+      một mảng float32 dùng lại, gọi model(batch, training=False) thay cho model.predict
+    - xác suất được làm mượt (trung bình trượt hàm mũ, smoothing) để kết quả không nhảy liên tục
+    - drop=True (camera): khi predict chậm thì bỏ khung hình cũ nhất; drop=False (video): xử lý hết
+
+Cách dùng:
+    stream = KerasStream(0, load_model("hocsau/keras_model.h5"), load_labels("hocsau/labels.txt"))
+    stream.start()
+    while stream.running:
+        result = stream.read()      # (seq, tên lớp, độ tin cậy đã làm mượt, độ trễ giây) hoặc None
+    stream.stop()
+    stream.report()
+'''
+
+
+def load_model(path="hocsau/keras_model.h5"):
+    from keras.models import load_model as keras_load_model
+    return keras_load_model(path, compile=False)
+
+
+def load_labels(path="hocsau/labels.txt"):
+    # dòng "0 Class 1" -> "Class 1"
+    with open(path, "r") as f:
+        return [line.strip().split(" ", 1)[-1] for line in f if line.strip()]
+
+
+class KerasStream(BackgroundWorker):
+
+    size = (224, 224)       # kích thước đầu vào của mô hình
+    max_batch = 8           # số khung hình tối đa mỗi lần gọi mô hình
+    ring_size = 16          # số ô của vòng đệm (khung hình đã resize đang chờ predict)
+    smoothing = 0.6         # 0 = không làm mượt, càng gần 1 càng mượt (chậm đổi lớp)
+
+    def __init__(self, source=0, model=None, labels=None, drop=True):
+        super().__init__()
+        self.source = source
+        self.model = model
+        self.labels = labels or []
+        self.drop = drop
+
+        self.results = queue.Queue(256)
+        self.last_image = None          # khung hình 224x224 mới nhất (để hiển thị)
+        self.last_result = None
+        self.probabilities = None       # xác suất đã làm mượt
+
+        # thống kê
+        self.frames = 0
+        self.dropped = 0
+        self.predicted = 0
+        self.calls = 0
+
+    # ---------- các luồng ----------
+
+    def start(self):
+        # vòng đệm uint8 (capture ghi vào) và lô float32 (predict đọc), cấp phát một lần
+        width, height = self.size
+        self.ring = np.zeros((self.ring_size, height, width, 3), np.uint8)
+        self.batch = np.zeros((self.max_batch, height, width, 3), np.float32)
+        self.free = queue.Queue()       # ô trống
+        self.ready = queue.Queue()      # ô đã có khung hình: (ô, seq, thời điểm đọc)
+        for slot in range(self.ring_size):
+            self.free.put(slot)
+
+        self.capture = cv2.VideoCapture(self.source)
+        self.capture_done = False
+        self.start_threads(self.capture_loop, self.predict_loop)
+
+    def stop(self):
+        self.stop_threads(timeout=5)
+        self.capture.release()
+
+    def take_slot(self):
+        # ô trống tiếp theo; camera không chờ predict: lấy lại ô cũ nhất đang chờ
+        while self.running:
+            try:
+                return self.free.get_nowait() if self.drop else self.free.get(timeout=0.1)
+            except queue.Empty:
+                pass
+            if self.drop:
+                try:
+                    slot, seq, captured = self.ready.get_nowait()
+                    self.dropped += 1
+                    return slot
+                except queue.Empty:
+                    time.sleep(0.001)  # mọi ô đang được predict dùng
+        return None
+
+    def capture_loop(self):
+        frame = None
+        seq = 0
+        while self.running:
+            grabbed, frame = self.capture.read(image=frame)  # dùng lại mảng của khung hình trước
+            if not grabbed:
+                break
+            captured = time.perf_counter()
+            slot = self.take_slot()
+            if slot is None:
+                break
+            cv2.resize(frame, self.size, dst=self.ring[slot], interpolation=cv2.INTER_AREA)
+            seq += 1
+            self.frames += 1
+            self.ready.put((slot, seq, captured))
+        self.capture_done = True
+
+    def predict_loop(self):
+        while self.running:
+            try:
+                items = [self.ready.get(timeout=0.1)]
+            except queue.Empty:
+                if self.capture_done:
+                    break
+                continue
+            while len(items) < self.max_batch:
+                try:
+                    items.append(self.ready.get_nowait())
+                except queue.Empty:
+                    break
+
+            # chuẩn hóa vào lô có sẵn: x / 127.5 - 1 (giống hocsaukeras.py)
+            n = len(items)
+            for i, (slot, seq, captured) in enumerate(items):
+                np.multiply(self.ring[slot], 1 / 127.5, out=self.batch[i], casting="unsafe")
+            np.subtract(self.batch[:n], 1, out=self.batch[:n])
+            self.last_image = self.ring[items[-1][0]].copy()
+            for slot, seq, captured in items:
+                self.free.put(slot)
+
+            prediction = self.predict(self.batch[:n])
+            self.calls += 1
+            done = time.perf_counter()
+            for (slot, seq, captured), probabilities in zip(items, prediction):
+                self.emit(seq, probabilities, done - captured)
+        self.running = False
+
+    def predict(self, batch):
+        # gọi mô hình trực tiếp (không qua model.predict), trả mảng numpy (n, số lớp)
+        prediction = self.model(batch, training=False)
+        return np.asarray(prediction.numpy() if hasattr(prediction, "numpy") else prediction)
+
+    def emit(self, seq, probabilities, latency):
+        # làm mượt xác suất rồi đưa (seq, lớp, độ tin cậy, độ trễ) ra hàng đợi kết quả
+        if self.probabilities is None:
+            self.probabilities = probabilities.astype(np.float64)
+        else:
+            self.probabilities = self.smoothing * self.probabilities + (1 - self.smoothing) * probabilities
+        index = int(np.argmax(self.probabilities))
+        name = self.labels[index] if index < len(self.labels) else str(index)
+        self.last_result = (seq, name, float(self.probabilities[index]), latency)
+        self.predicted += 1
+        self.latencies.append(latency)
+        try:
+            self.results.put_nowait(self.last_result)
+        except queue.Full:
+            pass  # không ai đọc kết quả thì bỏ qua
+
+    # ---------- kết quả ----------
+
+    def read(self, timeout=0.1):
+        # kết quả tiếp theo (seq, tên lớp, độ tin cậy, độ trễ) hoặc None
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def report(self):
+        print(f"Khung hình: {self.frames}, đã phân loại: {self.predicted} ({self.predicted / self.elapsed():.1f} FPS), "
+              f"bỏ qua: {self.dropped}, số lần gọi mô hình: {self.calls} "
+              f"(trung bình {self.predicted / max(1, self.calls):.1f} khung hình/lần)")
+        self.report_latency()
+
+
+# ---------- thử tốc độ bằng tệp video ----------
+
+def benchmark(video, model, labels=None, limit=300):
+    # 1. cách cũ (hocsaukeras.py): đọc, resize, mảng mới, model.predict từng khung hình
+    camera = cv2.VideoCapture(video)
+    count = 0
+    t1 = time.perf_counter()
+    while count < limit:
+        ret, image = camera.read()
+        if not ret:
+            break
+        image = cv2.resize(image, (224, 224), interpolation=cv2.INTER_AREA)
+        image_for_prediction = np.asarray(image, dtype=np.float32).reshape(1, 224, 224, 3)
+        image_for_prediction = (image_for_prediction / 127.5) - 1
+        model.predict(image_for_prediction, verbose=0)
+        count += 1
+    seconds = time.perf_counter() - t1
+    camera.release()
+    print(f"model.predict từng khung hình: {count} khung hình, {count / seconds:.1f} FPS")
+
+    # 2. KerasStream (không bỏ khung hình, để so sánh cùng số khung hình)
+    for max_batch in (1, 4, 8):
+        stream = KerasStream(video, model, labels, drop=False)
+        stream.max_batch = max_batch
+        stream.start()
+        while stream.running and stream.predicted < limit:
+            stream.read()
+        stream.stop()
+        print(f"KerasStream max_batch {max_batch}:")
+        stream.report()
+
+
+if __name__ == '__main__':
+    # python keras_stream.py <tệp video> [keras_model.h5] [labels.txt]
+    model = load_model(sys.argv[2] if len(sys.argv) > 2 else "hocsau/keras_model.h5")
+    labels = load_labels(sys.argv[3] if len(sys.argv) > 3 else "hocsau/labels.txt")
+    benchmark(sys.argv[1], model, labels)
@@ -1,8 +1,8 @@
 import face_recognition as fr
 import cv2
-import numpy as np
-import os
 from collections import defaultdict
+from face_gallery import FaceGallery
+from yolo_engine import YoloEngine
 '''
     face_recognition: Đây là một thư viện để nhận dạng khuôn mặt. 
 Nó cung cấp các chức năng nhận diện khuôn mặt và mã hóa khuôn mặt.
@@ -35,22 +35,12 @@ people_data = [
 #Danh sách này chứa từ điển,
 # mỗi từ điển đại diện cho một người với tên của họ và đường dẫn đến tệp hình ảnh của họ.
 
-#Khởi tạo danh sách để lưu trữ các tên đã biết và mã hóa khuôn mặt tương ứng của chúng:
-known_names = []
-known_name_encodings = []
-
+# Kho khuôn mặt (face_gallery.py): ảnh mẫu chỉ được mã hóa lần chạy đầu tiên,
+# các lần sau đọc lại mã hóa đã lưu trong thư mục gallery
+gallery = FaceGallery("gallery")
 for person in people_data:
-    name = person["name"]
-    encoding = fr.face_encodings(fr.load_image_file(person["image_path"]))[0]
-    known_name_encodings.append(encoding)
-    #Dòng này thêm mã hóa khuôn mặt của người đó vào danh sách known_name_encodings.
-    known_names.append(name)
-    #Dòng này thêm tên của người đó vào danh sách known_names.
-'''
-Vòng lặp này lặp lại trên mỗi người trong .people_data
-Đối với mỗi người, nó tải hình ảnh của họ, 
-tính toán mã hóa khuôn mặt và thêm tên và mã hóa vào danh sách tương ứng.
-'''
+    gallery.enrol_image(person["name"], person["image_path"])
+    #Ảnh đã có trong kho (cùng đường dẫn và thời gian sửa) thì bỏ qua, không tính lại fr.face_encodings.
 
 # Tải ảnh test
 test_image_path = "pic/nguoivsdongvat/tranning/0051.jpg"
@@ -74,28 +64,19 @@ detected_faces = []
 # Tạo một từ điển để lưu trữ các đối tượng theo class
 detected_objects_by_class = defaultdict(list)
 
-for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-    matches = fr.compare_faces(known_name_encodings, face_encoding, tolerance=THRESHOLD)
-    #Dòng này so sánh mã hóa khuôn mặt của khuôn mặt hiện tại (face_encoding) với danh sách các mã hóa khuôn mặt đã biết (known_name_encodings).
-    #fr.compare_faces trả về một danh sách các giá trị True hoặc False tương ứng với việc so sánh khuôn mặt hiện tại với các khuôn mặt đã biết.
-    #tolerance=THRESHOLD cho phép bạn chỉ định một ngưỡng (threshold) cho phép sai số trong việc so sánh khuôn mặt.
-    name = "nguoi khac"
-    for i, match in enumerate(matches):
-        if match:
-            name = known_names[i]
-            break
+# Tìm người gần nhất cho mọi khuôn mặt cùng lúc (một phép tính ma trận thay cho compare_faces + vòng lặp)
+matches = gallery.search(face_encodings, k=1, tolerance=THRESHOLD)
+#Mỗi phần tử là danh sách [(tên, khoảng cách, thông tin)] của người gần nhất, rỗng nếu không ai có khoảng cách <= THRESHOLD.
+for (top, right, bottom, left), match in zip(face_locations, matches):
+    name = match[0][0] if match else "nguoi khac"
     detected_names.append(name)
     draw_name_frame(frame, top, right, bottom, left, name)
     detected_faces.append((top, right, bottom, left))  # Lưu tọa độ khuôn mặt
 
 # Opencv DNN
-net = cv2.dnn.readNet("dnn_model/yolov4-tiny.weights", "dnn_model/yolov4-tiny.cfg")
-#đọc mô hình YOLO đã được huấn luyện
-model = cv2.dnn_DetectionModel(net)
-#tạo ra một thể hiện của lớp, Lớp này cung cấp giao diện lập trình ứng dụng (API) để thực hiện nhận diện đối tượng sử dụng các mô hình đã được huấn luyện
-model.setInputParams(size=(320, 320), scale=1/300)
-#Phương thức này được sử dụng để thiết lập các tham số đầu vào cho mô hình
-#size=(604, 604): Kích thước của hình ảnh đầu
+engine = YoloEngine("dnn_model/yolov4-tiny.weights", "dnn_model/yolov4-tiny.cfg", size=(320, 320), scale=1/300, swap_rb=False)
+#đọc mô hình YOLO một lần (yolo_engine.py), dùng lại được cho nhiều ảnh: engine.detect_batch([anh1, anh2, ...])
+#size=(320, 320): Kích thước của hình ảnh đầu vào mạng
 #scale=1/300: Các giá trị pixel của hình ảnh được chia cho 300. Đây là một thực hành phổ biến để chuẩn hóa giá trị pixel trước khi đưa vào mô hình học sâu
 
 # Load danh sách các loại đối tượng
@@ -129,57 +110,17 @@ gray_frame = cv2.equalizeHist(gray_frame)#Cân bằng histogram:cải thiện đ
 gray_frame = cv2.cvtColor(gray_frame, cv2.COLOR_GRAY2BGR)
 # Object Detection
 #(class_ids, scores, bboxes) = model.detect(gray_frame, confThreshold=0.2, nmsThreshold=0.6)
-# Áp dụng Non-Maximum Suppression để thực hiện quá trình loại bỏ các hộp giới hạn trùng lặp
-def non_max_suppression(boxes, scores, threshold):
-    #boxes: Mảng chứa các thông tin về hộp giới hạn (bounding boxes). Mỗi hàng của mảng là một hộp giới hạn,
-    # với cột đầu tiên và thứ hai là tọa độ x, y của góc trái trên cùng của hộp, cột thứ ba và thứ tư là chiều rộng và chiều cao của hộp.
-    #scores: Mảng chứa các điểm số tương ứng với các hộp giới hạn.
-    #threshold: Ngưỡng (threshold) để quyết định liệu hai hộp giới hạn có bị loại bỏ hay không. Nếu chỉ số IoU (Intersection over Union) lớn hơn ngưỡng này, một trong hai sẽ bị loại bỏ.
-    # Get coordinates of bounding boxes
-    x1 = boxes[:, 0]
-    y1 = boxes[:, 1]
-    x2 = boxes[:, 0] + boxes[:, 2]
-    y2 = boxes[:, 1] + boxes[:, 3]
-
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
-
-    keep = []
-
-    while order.size > 0:
-        i = order[0]
-        keep.append(i)
-
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
-
-        w = np.maximum(0.0, xx2 - xx1 + 1)
-        h = np.maximum(0.0, yy2 - yy1 + 1)
-
-        intersection = w * h
-
-        iou = intersection / (areas[i] + areas[order[1:]] - intersection)
-
-        inds = np.where(iou <= threshold)[0]
-        order = order[inds + 1]
-
-    return keep
 combined_frame = cv2.addWeighted(gray_frame, 0.5, blurred_frame, 0.5,   0)
 #combined_frame1 = 0.5 * combined_frame + 0.5 * brightened_frame
 
-# Sử dụng NMS trên kết quả object detection
-
-class_ids, scores, bboxes = model.detect( combined_frame , confThreshold=0.2, nmsThreshold=0.6)
+# Object detection, NMS theo từng lớp đã làm trong engine (không cần non_max_suppression viết tay)
 
-# Chọn ra các bounding box sau khi áp dụng NMS
-keep = non_max_suppression(bboxes, scores, threshold=0.6)
+class_ids, scores, bboxes = engine.detect(combined_frame, conf_threshold=0.2, nms_threshold=0.6)
 
 # Hiển thị kết quả
 # Hiển thị kết quả
 '''
-for idx in keep:
+for idx in range(len(bboxes)):
     (x, y, w, h) = bboxes[idx]
     class_name = classes[class_ids[idx]]
     confidence = scores[idx]
@@ -189,7 +130,7 @@ for idx in keep:
 '''
 
 # Hiển thị kết quả
-for idx in keep:
+for idx in range(len(bboxes)):
     (x, y, w, h) = bboxes[idx]
     class_name = classes[class_ids[idx]]
     confidence = scores[idx]
@@ -230,15 +171,12 @@ else:
             print("Object detected for the first time")
 
 
-    # Chọn ra các bounding box sau khi áp dụng NMS
-    # keep = non_max_suppression(bboxes, scores, threshold=0.6)
-
     # Hiển thị kết quả
-    detected_objects = len(keep)
+    detected_objects = len(bboxes)
     print(f"Total detected objects: {detected_objects}")
 
     # Hiển thị kết quả
-    for idx in keep:
+    for idx in range(len(bboxes)):
         (x, y, w, h) = bboxes[idx]
         class_name = classes[class_ids[idx]]
 
@@ -0,0 +1,41 @@
+import cv2
+from face_gallery import FaceGallery
+from face_stream import FaceStream, draw_faces
+'''
+    Nhận diện khuôn mặt qua camera bằng FaceStream (face_stream.py):
+không chạy face_locations / face_encodings trên mọi khung hình 1920x1080 như nhandienbangcamvsclick*,
+mà detect trên ảnh thu nhỏ mỗi vài khung hình, theo dõi khuôn mặt ở giữa,
+và chỉ mã hóa lại khi có khuôn mặt mới hoặc độ tin cậy giảm.
+    Nhấn q để thoát, khi thoát sẽ in số khuôn mặt nhận ra mỗi giây và độ trễ.
+'''
+# Người cần nhận diện (ảnh mẫu chỉ mã hóa lần chạy đầu, xem face_gallery.py)
+people_data = [
+    {"name": "Khiem", "image_path": "pic/hinhkhiem/z4700043387622_da39bf2c4f39c337a5bb0061d643a6f4.jpg"},
+    {"name": "Hoang", "image_path": "pic/hinhhoang/z4694981970053_60b82639be2acda236a5afaf6397b3ff.jpg"},
+]
+gallery = FaceGallery("gallery")
+for person in people_data:
+    gallery.enrol_image(person["name"], person["image_path"])
+
+stream = FaceStream(0, gallery)  # 0 = webcam
+stream.detect_every = 5   # detect mỗi 5 khung hình
+stream.scale = 0.25       # detect trên ảnh 1/4
+stream.tolerance = 0.4    # ngưỡng giống THRESHOLD của nhandienbangcamvsclickv4
+stream.start()
+
+while True:
+    frame, faces, latency = stream.read()
+    if faces is None:  # camera đã tắt
+        break
+    if frame is None:  # chưa có khung hình mới
+        continue
+    frame = frame.copy()  # khung hình gốc có thể đang được luồng encode dùng
+    draw_faces(frame, faces)
+    cv2.putText(frame, f"{latency * 1000:.0f} ms", (10, 30), cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
+    cv2.imshow("Nhan dien khuon mat", frame)
+    if cv2.waitKey(1) & 0xFF == ord('q'):
+        break
+
+stream.stop()
+cv2.destroyAllWindows()
+stream.report()
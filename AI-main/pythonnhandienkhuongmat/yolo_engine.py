@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+import cv2
+from background_worker import BackgroundWorker
+
+'''
+Nhận diện vật thể YOLO (yolov4-tiny trong dnn_model) dùng chung cho nhiều ảnh / nhiều luồng.
+Các script nhandienbangcamvsclick* tạo cv2.dnn.readNet + dnn_DetectionModel trong mỗi script,
+gọi model.detect từng ảnh một rồi chạy thêm non_max_suppression viết bằng vòng lặp Python.
+YoloEngine:
+    - đọc mạng một lần (readNet), ghép nhiều ảnh thành một blob (blobFromImages) cho một lần net.forward
+    - giải mã đầu ra của cả lô bằng numpy (không lặp từng hộp)
+    - NMS theo từng lớp (class-aware) bằng cv2.dnn.NMSBoxesBatched (hoặc NMSBoxes với hộp dời theo lớp)
+    - kết quả giống model.detect: (class_ids, scores, boxes) với boxes là (x, y, w, h) trên ảnh gốc
+YoloService: hàng đợi dùng chung cho nhiều luồng gửi ảnh (producer). Một luồng làm việc gom ảnh
+thành lô (tối đa max_batch ảnh hoặc chờ tối đa max_wait giây) rồi trả kết quả qua Future.
+
+Cách dùng:
+    engine = YoloEngine()                                  # dnn_model/yolov4-tiny.weights, .cfg, classes.txt
+    class_ids, scores, boxes = engine.detect(frame)        # một ảnh
+    results = engine.detect_batch([frame1, frame2, ...])   # nhiều ảnh, một lần forward mỗi lô
+    service = YoloService(engine, max_batch=8)
+    service.start()
+    class_ids, scores, boxes = service.submit(frame).result()   # gọi được từ nhiều luồng
+    service.stop()
+    service.report()
+'''
+
+
+def load_classes(path):
+    with open(path, "r") as file_object:
+        return [line.strip() for line in file_object if line.strip()]
+
+
+class YoloEngine:
+
+    def __init__(self, weights="dnn_model/yolov4-tiny.weights", config="dnn_model/yolov4-tiny.cfg",
+                 classes="dnn_model/classes.txt", size=(320, 320), scale=1 / 255, swap_rb=True,
+                 conf_threshold=0.2, nms_threshold=0.6, batch_size=16, net=None):
+        # net: mạng đã đọc sẵn (bỏ qua weights, config)
+        self.net = net if net is not None else cv2.dnn.readNet(weights, config)
+        self.output_names = self.net.getUnconnectedOutLayersNames()
+        self.classes = load_classes(classes) if classes and os.path.isfile(classes) else []
+        self.size = size                    # kích thước đầu vào của mạng (rộng, cao)
+        self.scale = scale                  # nhân giá trị điểm ảnh (giống setInputParams)
+        self.swap_rb = swap_rb              # BGR -> RGB
+        self.conf_threshold = conf_threshold
+        self.nms_threshold = nms_threshold
+        self.batch_size = batch_size        # số ảnh tối đa mỗi lần forward
+        self.lock = threading.Lock()        # một net không chạy forward song song
+
+    def forward(self, images):
+        # một lần forward cho cả lô: mảng (số ảnh, số hộp, 5 + số lớp)
+        blob = cv2.dnn.blobFromImages(images, self.scale, self.size, swapRB=self.swap_rb, crop=False)
+        with self.lock:
+            self.net.setInput(blob)
+            outputs = self.net.forward(self.output_names)
+        # mỗi lớp yolo trả (N * hộp, C) hoặc (N, hộp, C), gộp thành (N, tổng số hộp, C)
+        return np.concatenate([o.reshape(len(images), -1, o.shape[-1]) for o in outputs], axis=1)
+
+    def decode(self, detections, shape, conf_threshold=None, nms_threshold=None):
+        # giải mã một ảnh: hàng [cx, cy, w, h, objectness, điểm từng lớp] (tỉ lệ 0..1)
+        conf_threshold = self.conf_threshold if conf_threshold is None else conf_threshold
+        nms_threshold = self.nms_threshold if nms_threshold is None else nms_threshold
+
+        scores = detections[:, 5:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= conf_threshold
+        if not keep.any():
+            return np.zeros(0, np.int32), np.zeros(0, np.float32), np.zeros((0, 4), np.int32)
+        detections, class_ids, confidences = detections[keep], class_ids[keep], confidences[keep]
+
+        # (cx, cy, w, h) tỉ lệ -> (x, y, w, h) điểm ảnh trên ảnh gốc
+        height, width = shape[:2]
+        w = detections[:, 2] * width
+        h = detections[:, 3] * height
+        boxes = np.stack((detections[:, 0] * width - w / 2, detections[:, 1] * height - h / 2, w, h), axis=1)
+
+        # NMS riêng cho từng lớp
+        indices = nms_boxes(boxes, confidences, class_ids, conf_threshold, nms_threshold)
+        return (class_ids[indices].astype(np.int32), confidences[indices].astype(np.float32),
+                np.round(boxes[indices]).astype(np.int32))
+
+    def detect_batch(self, images, conf_threshold=None, nms_threshold=None):
+        # danh sách ảnh -> danh sách (class_ids, scores, boxes), forward theo lô batch_size ảnh
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            chunk = images[start:start + self.batch_size]
+            detections = self.forward(chunk)
+            results += [self.decode(d, image.shape, conf_threshold, nms_threshold)
+                        for d, image in zip(detections, chunk)]
+        return results
+
+    def detect(self, image, conf_threshold=None, nms_threshold=None):
+        # giống model.detect(image, confThreshold, nmsThreshold)
+        return self.detect_batch([image], conf_threshold, nms_threshold)[0]
+
+    def class_name(self, class_id):
+        return self.classes[class_id] if class_id < len(self.classes) else str(class_id)
+
+
+def nms_boxes(boxes, scores, class_ids, conf_threshold, nms_threshold):
+    # chỉ số các hộp giữ lại sau NMS theo lớp (hộp khác lớp không loại nhau)
+    if hasattr(cv2.dnn, "NMSBoxesBatched"):
+        indices = cv2.dnn.NMSBoxesBatched(boxes.tolist(), scores.tolist(), class_ids.tolist(),
+                                          conf_threshold, nms_threshold)
+    else:
+        # OpenCV cũ: dời hộp của mỗi lớp ra xa nhau rồi chạy NMSBoxes một lần
+        offset = class_ids[:, None] * (boxes[:, :2].max() + boxes[:, 2:].max() + 1)
+        shifted = np.concatenate((boxes[:, :2] + offset, boxes[:, 2:]), axis=1)
+        indices = cv2.dnn.NMSBoxes(shifted.tolist(), scores.tolist(), conf_threshold, nms_threshold)
+    return np.array(indices, np.int32).reshape(-1)
+
+
+class YoloService(BackgroundWorker):
+
+    def __init__(self, engine, max_batch=8, max_wait=0.005, queue_size=64):
+        super().__init__()
+        self.engine = engine
+        self.max_batch = max_batch          # số ảnh tối đa mỗi lô
+        self.max_wait = max_wait            # thời gian chờ tối đa để gom thêm ảnh vào lô (giây)
+        self.requests = queue.Queue(queue_size)  # đầy thì submit phải chờ
+
+        # thống kê
+        self.images = 0
+        self.batches = 0
+
+    def start(self):
+        self.start_threads(self.loop)
+
+    def stop(self):
+        self.stop_threads()
+
+    def submit(self, image):
+        # gửi một ảnh, trả về Future; future.result() = (class_ids, scores, boxes)
+        future = Future()
+        self.requests.put((image, future, time.perf_counter()))
+        return future
+
+    def detect(self, image):
+        return self.submit(image).result()
+
+    def loop(self):
+        while self.running or not self.requests.empty():
+            try:
+                batch = [self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            # gom thêm ảnh đến khi đủ lô hoặc hết thời gian chờ
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.requests.get(timeout=max(0.0, deadline - time.perf_counter())))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.engine.detect_batch([image for image, future, submitted in batch])
+            except Exception as error:
+                for image, future, submitted in batch:
+                    future.set_exception(error)
+                continue
+            done = time.perf_counter()
+            for (image, future, submitted), result in zip(batch, results):
+                self.latencies.append(done - submitted)
+                future.set_result(result)
+            self.images += len(batch)
+            self.batches += 1
+
+    def report(self):
+        print(f"Ảnh: {self.images} ({self.images / self.elapsed():.1f}/s), lô: {self.batches} "
+              f"(trung bình {self.images / max(1, self.batches):.1f} ảnh/lô)")
+        self.report_latency()
+
+
+# ---------- thử tốc độ ----------
+
+def benchmark(engine, images, batch_sizes=(1, 2, 4, 8, 16), producers=4, repeat=3):
+    # 1. model.detect từng ảnh (cách cũ, nếu dùng được dnn_DetectionModel với mạng này)
+    try:
+        model = cv2.dnn_DetectionModel(engine.net)
+        model.setInputParams(size=engine.size, scale=engine.scale, swapRB=engine.swap_rb)
+        t1 = time.perf_counter()
+        for _ in range(repeat):
+            for image in images:
+                model.detect(image, confThreshold=engine.conf_threshold, nmsThreshold=engine.nms_threshold)
+        seconds = time.perf_counter() - t1
+        print(f"model.detect từng ảnh: {repeat * len(images) / seconds:.1f} ảnh/s, "
+              f"{1000 * seconds / (repeat * len(images)):.1f} ms/ảnh")
+    except cv2.error:
+        print("model.detect: không dùng được với mạng này")
+
+    # 2. YoloEngine theo lô
+    for batch_size in batch_sizes:
+        engine.batch_size = batch_size
+        latencies = []
+        t1 = time.perf_counter()
+        for _ in range(repeat):
+            for start in range(0, len(images), batch_size):
+                t2 = time.perf_counter()
+                engine.detect_batch(images[start:start + batch_size])
+                latencies.append(time.perf_counter() - t2)
+        seconds = time.perf_counter() - t1
+        latencies = np.array(latencies) * 1000
+        print(f"lô {batch_size:>2}: {repeat * len(images) / seconds:.1f} ảnh/s, "
+              f"độ trễ mỗi lô {latencies.mean():.1f} ms (p95 {np.percentile(latencies, 95):.1f})")
+
+    # 3. YoloService với nhiều luồng gửi ảnh
+    for max_batch in batch_sizes:
+        engine.batch_size = max_batch
+        service = YoloService(engine, max_batch=max_batch)
+        service.start()
+
+        def produce(part):
+            for image in part:
+                service.submit(image).result()
+
+        threads = [threading.Thread(target=produce, args=(images[n::producers] * repeat,)) for n in range(producers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        service.stop()
+        print(f"YoloService max_batch {max_batch}, {producers} luồng gửi:")
+        service.report()
+
+
+if __name__ == '__main__':
+    # python yolo_engine.py [thư mục ảnh]   (mặc định: pic, gồm cả thư mục con)
+    folder = sys.argv[1] if len(sys.argv) > 1 else "pic"
+    files = sorted(os.path.join(root, f) for root, dirs, names in os.walk(folder) for f in names
+                   if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')))
+    images = [cv2.imread(f) for f in files[:64]]
+    images = [image for image in images if image is not None]
+    print(f"{len(images)} ảnh từ {folder}")
+    benchmark(YoloEngine(), images)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3.10
+"""
+Đặc trưng landmark bàn tay cho nhandiensobangtay.py
+
+- landmarks_array: kết quả MediaPipe (multi_hand_landmarks) của mọi bàn tay -> mảng (n_tay, 21, 3) trong một bước
+- features: "raw" (n_tay, 63) như mô hình cũ, hoặc "relative" (n_tay, 60) lấy cổ tay làm gốc
+  và chia cho độ dài cổ tay -> khớp ngón giữa, nên không phụ thuộc vị trí / khoảng cách tay tới camera
+- HandClassifier: scaler + mô hình, dự đoán mọi bàn tay bằng MỘT lần predict_proba
+- StreamRecorder / load_stream: ghi lại và đọc lại luồng landmark (.npz) để đo tốc độ
+
+Đo tốc độ:  python hand_features.py [stream.npz] [model.pkl scaler.pkl]
+"""
+import sys
+import copy
+import time
+import pickle
+import numpy as np
+
+NUM_LANDMARKS = 21
+WRIST = 0
+MIDDLE_MCP = 9
+FEATURE_SIZES = {"raw": NUM_LANDMARKS * 3, "relative": (NUM_LANDMARKS - 1) * 3}
+
+
+def landmarks_array(multi_hand_landmarks):
+    """Chuyển landmark của tất cả bàn tay thành mảng (n_tay, 21, 3)"""
+    hands = multi_hand_landmarks or []
+    values = (v for hand in hands for p in hand.landmark for v in (p.x, p.y, p.z))
+    flat = np.fromiter(values, dtype=np.float64, count=len(hands) * NUM_LANDMARKS * 3)
+    return flat.reshape(len(hands), NUM_LANDMARKS, 3)
+
+
+def relative_features(landmarks):
+    """Tọa độ so với cổ tay, chia cho độ dài cổ tay -> khớp ngón giữa (bỏ điểm cổ tay luôn bằng 0)"""
+    rel = landmarks[:, 1:] - landmarks[:, WRIST:WRIST + 1]
+    size = np.linalg.norm(rel[:, MIDDLE_MCP - 1, :2], axis=1)
+    rel /= np.maximum(size, 1e-6)[:, None, None]
+    return rel.reshape(len(landmarks), FEATURE_SIZES["relative"])
+
+
+def features(landmarks, mode="relative"):
+    """Mảng (n_tay, 21, 3) -> ma trận đặc trưng (n_tay, FEATURE_SIZES[mode])"""
+    landmarks = np.asarray(landmarks, dtype=np.float64).reshape(-1, NUM_LANDMARKS, 3)
+    if mode == "raw":
+        return landmarks.reshape(len(landmarks), FEATURE_SIZES["raw"])
+    if mode == "relative":
+        return relative_features(landmarks)
+    raise ValueError(f"Không có loại đặc trưng: {mode}")
+
+
+def mode_for(n_features):
+    """Loại đặc trưng mà scaler / mô hình đã được huấn luyện (63 -> raw, 60 -> relative)"""
+    for mode, size in FEATURE_SIZES.items():
+        if size == n_features:
+            return mode
+    raise ValueError(f"Mô hình nhận {n_features} đặc trưng, không khớp loại nào")
+
+
+class HandClassifier:
+    """Scaler + mô hình sklearn, nhận diện mọi bàn tay trong khung hình cùng lúc"""
+
+    def __init__(self, model, scaler):
+        self.model = model
+        self.scaler = scaler
+        self.mode = mode_for(scaler.n_features_in_)
+        # Với 1-2 mẫu mỗi khung hình, chia việc cho nhiều luồng (n_jobs=-1) chậm hơn chạy một luồng.
+        # Bản sao nông (dùng chung các cây) để không đổi cấu hình mô hình mà ứng dụng lưu lại
+        self.predictor = model
+        if getattr(model, "n_jobs", 1) != 1:
+            self.predictor = copy.copy(model)
+            self.predictor.n_jobs = 1
+
+    def predict_features(self, X):
+        """Ma trận đặc trưng -> (nhãn, độ tin cậy) cho từng hàng, một lần predict_proba"""
+        if len(X) == 0:
+            return []
+        proba = self.predictor.predict_proba(self.scaler.transform(X))
+        best = proba.argmax(axis=1)
+        return [(self.model.classes_[i], float(proba[k, i])) for k, i in enumerate(best)]
+
+    def predict(self, multi_hand_landmarks):
+        """Kết quả MediaPipe -> [(nhãn, độ tin cậy)] theo thứ tự bàn tay"""
+        return self.predict_features(features(landmarks_array(multi_hand_landmarks), self.mode))
+
+
+# ---------- Ghi / đọc luồng landmark ----------
+class StreamRecorder:
+    """Ghi landmark của từng khung hình (tối đa max_hands tay) để đo tốc độ lại sau này"""
+
+    def __init__(self, max_hands=2):
+        self.max_hands = max_hands
+        self.frames = []
+        self.counts = []
+
+    def append(self, multi_hand_landmarks):
+        landmarks = landmarks_array(multi_hand_landmarks)[:self.max_hands]
+        frame = np.zeros((self.max_hands, NUM_LANDMARKS, 3), dtype=np.float32)
+        frame[:len(landmarks)] = landmarks
+        self.frames.append(frame)
+        self.counts.append(len(landmarks))
+
+    def save(self, path):
+        np.savez_compressed(path, landmarks=np.array(self.frames, dtype=np.float32).reshape(-1, self.max_hands, NUM_LANDMARKS, 3),
+                            counts=np.array(self.counts, dtype=np.int32))
+        print(f"Đã lưu {len(self.frames)} khung hình landmark vào {path}")
+
+
+def load_stream(path):
+    """Đọc file .npz -> (landmarks (n_khung, max_hands, 21, 3), counts (n_khung,))"""
+    data = np.load(path)
+    return data["landmarks"], data["counts"]
+
+
+def synthetic_stream(scaler, frames=2000, seed=0):
+    """Luồng giả quanh phân bố dữ liệu huấn luyện của scaler 63 đặc trưng (khi chưa có file ghi)"""
+    rng = np.random.default_rng(seed)
+    mean = scaler.mean_.reshape(NUM_LANDMARKS, 3)
+    scale = scaler.scale_.reshape(NUM_LANDMARKS, 3)
+    landmarks = mean + rng.normal(0, 0.7, (frames, 2, NUM_LANDMARKS, 3)) * scale
+    landmarks[..., :2] += rng.uniform(-0.03, 0.03, (frames, 2, 1, 2))
+    counts = rng.choice([0, 1, 2], size=frames, p=[0.1, 0.5, 0.4])
+    return landmarks.astype(np.float32), counts
+
+
+class _Point:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+class _Hand:
+    __slots__ = ("landmark",)
+
+    def __init__(self, points):
+        self.landmark = [_Point(*map(float, p)) for p in points]
+
+
+def as_mediapipe(landmarks, counts):
+    """Luồng mảng -> danh sách multi_hand_landmarks như MediaPipe trả về (protobuf nếu có mediapipe)"""
+    try:
+        from mediapipe.framework.formats import landmark_pb2
+
+        def hand(points):
+            return landmark_pb2.NormalizedLandmarkList(
+                landmark=[landmark_pb2.NormalizedLandmark(x=x, y=y, z=z) for x, y, z in points.tolist()])
+    except ImportError:
+        hand = _Hand
+    return [[hand(landmarks[f, h]) for h in range(counts[f])] or None for f in range(len(counts))]
+
+
+# ---------- Đo tốc độ ----------
+def legacy_predict(model, scaler, multi_hand_landmarks):
+    """Cách cũ trong process_video: extend từng landmark, transform + predict + predict_proba cho từng tay"""
+    results = []
+    for hand_landmarks in multi_hand_landmarks or []:
+        hand_data = []
+        for landmark in hand_landmarks.landmark:
+            hand_data.extend([landmark.x, landmark.y, landmark.z])
+        hand_data_scaled = scaler.transform([hand_data])
+        prediction = model.predict(hand_data_scaled)
+        proba = model.predict_proba(hand_data_scaled)[0]
+        results.append((prediction[0], float(proba[prediction[0]])))
+    return results
+
+
+def benchmark(stream=None, model_path="models/hand_sign_model.pkl", scaler_path="models/hand_sign_scaler.pkl"):
+    import warnings
+    warnings.filterwarnings("ignore")  # mô hình lưu bằng phiên bản sklearn khác
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    with open(scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+
+    if stream:
+        landmarks, counts = load_stream(stream)
+        print(f"Luồng ghi: {stream}")
+    else:
+        landmarks, counts = synthetic_stream(scaler)
+        print("Luồng giả (chưa có file ghi, xem --record trong nhandiensobangtay.py)")
+    frames = as_mediapipe(landmarks, counts)
+    print(f"{len(frames)} khung hình, {int(counts.sum())} bàn tay, mô hình {len(model.estimators_)} cây, "
+          f"{model.n_features_in_} đặc trưng")
+
+    # Cách cũ, với n_jobs=-1 như mô hình huấn luyện trong ứng dụng và với n_jobs=1
+    legacy = {}
+    for n_jobs in (-1, 1):
+        legacy_model = copy.copy(model)
+        legacy_model.n_jobs = n_jobs
+        t1 = time.perf_counter()
+        legacy[n_jobs] = [legacy_predict(legacy_model, scaler, hands) for hands in frames]
+        seconds = time.perf_counter() - t1
+        print(f"Cũ (n_jobs={n_jobs:>2}): {len(frames) / seconds:8.1f} khung hình/s, {1000 * seconds / len(frames):.2f} ms/khung")
+
+    classifier = HandClassifier(model, scaler)
+    t1 = time.perf_counter()
+    batched = [classifier.predict(hands) for hands in frames]
+    seconds = time.perf_counter() - t1
+    print(f"Mới (một predict_proba): {len(frames) / seconds:8.1f} khung hình/s, {1000 * seconds / len(frames):.2f} ms/khung")
+
+    same = sum(a == b for a, b in zip(legacy[1], batched))
+    print(f"Kết quả giống cách cũ: {same}/{len(frames)} khung hình")
+
+    t1 = time.perf_counter()
+    for hands in frames:
+        features(landmarks_array(hands), "relative")
+    seconds = time.perf_counter() - t1
+    print(f"Trích đặc trưng relative ({FEATURE_SIZES['relative']}): {1e6 * seconds / len(frames):.1f} µs/khung")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    stream = args.pop(0) if args and args[0].endswith(".npz") else None
+    benchmark(stream, *args)
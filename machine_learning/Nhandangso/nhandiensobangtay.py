@@ -14,10 +14,11 @@ import os
 import queue
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
+from hand_features import HandClassifier, StreamRecorder, FEATURE_SIZES, features
 
 
 class HandSignRecognitionApp:
-    def __init__(self, root):
+    def __init__(self, root, record_path=None):
         # Thiết lập giao diện chính
         self.root = root
         self.root.title("Nhận Diện Số Bằng Tay")
@@ -39,8 +40,17 @@ class HandSignRecognitionApp:
         self.collected_samples = 0
         self.training_data = []
         self.training_labels = []
+        self.training_groups = []  # mẫu gốc của từng hàng, để mẫu tăng cường không lọt sang tập test
         self.model = None
         self.scaler = None
+        self.classifier = None  # scaler + mô hình, nhận diện mọi bàn tay cùng lúc (hand_features.py)
+        # Mô hình đặc trưng relative (60) lưu file riêng; hand_sign_model.pkl / hand_sign_scaler.pkl
+        # (63 đặc trưng raw) dùng chung với nhandienbantaydetinhtoan.py nên không ghi đè
+        self.model_path = "models/hand_sign_relative_model.pkl"
+        self.scaler_path = "models/hand_sign_relative_scaler.pkl"
+        self.raw_model_path = "models/hand_sign_model.pkl"
+        self.raw_scaler_path = "models/hand_sign_scaler.pkl"
+        self.loaded_paths = None
         self.labels = {
             0: "0", 1: "1", 2: "2", 3: "3", 4: "4",
             5: "5", 6: "6", 7: "7", 8: "8", 9: "9"
@@ -64,6 +74,9 @@ class HandSignRecognitionApp:
         self.sample_feedback_end_time = 0
         self.sample_interval = 200  # milliseconds giữa các mẫu
         self.data_augmentation = True  # Bật tính năng tăng cường dữ liệu
+        # Ghi luồng landmark ra file .npz để đo tốc độ (python hand_features.py file.npz)
+        self.record_path = record_path
+        self.recorder = StreamRecorder() if record_path else None
         
         # Thiết lập MediaPipe
         self.mp_hands = mp.solutions.hands
@@ -84,6 +97,7 @@ class HandSignRecognitionApp:
         # Khởi tạo dữ liệu huấn luyện
         self.training_data = []
         self.training_labels = []
+        self.training_groups = []  # mẫu gốc của từng hàng, để mẫu tăng cường không lọt sang tập test
 
         # Tạo cấu trúc thư mục
         os.makedirs("models", exist_ok=True)
@@ -222,11 +236,14 @@ class HandSignRecognitionApp:
     def load_model(self):
         """Tải mô hình đã huấn luyện nếu có"""
         try:
-            model_path = "models/hand_sign_model.pkl"
-            scaler_path = "models/hand_sign_scaler.pkl"
+            model_path, scaler_path = self.model_path, self.scaler_path
+            # Chưa huấn luyện mô hình relative thì dùng mô hình raw cũ
+            if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
+                model_path, scaler_path = self.raw_model_path, self.raw_scaler_path
 
             # Nếu file mô hình đã tồn tại, thử tải lên
             if os.path.exists(model_path) and os.path.exists(scaler_path):
+                self.loaded_paths = (model_path, scaler_path)
                 try:
                     with open(model_path, 'rb') as f:
                         self.model = pickle.load(f)
@@ -234,6 +251,7 @@ class HandSignRecognitionApp:
                     with open(scaler_path, 'rb') as f:
                         self.scaler = pickle.load(f)
 
+                    self.classifier = HandClassifier(self.model, self.scaler)
                     print("Đã tải mô hình thành công")
                     self.set_status("Đã tải mô hình thành công")
                     return True
@@ -264,11 +282,12 @@ class HandSignRecognitionApp:
     def save_model(self):
         """Lưu mô hình đã huấn luyện"""
         try:
-            with open("models/hand_sign_model.pkl", 'wb') as f:
+            with open(self.model_path, 'wb') as f:
                 pickle.dump(self.model, f)
 
-            with open("models/hand_sign_scaler.pkl", 'wb') as f:
+            with open(self.scaler_path, 'wb') as f:
                 pickle.dump(self.scaler, f)
+            self.loaded_paths = (self.model_path, self.scaler_path)
 
             print("Đã lưu mô hình thành công")
             self.set_status("Đã lưu mô hình thành công")
@@ -334,27 +353,30 @@ class HandSignRecognitionApp:
             landmarks_list.extend([landmark.x, landmark.y, landmark.z])
 
         # Thêm vào dữ liệu huấn luyện
+        group = self.training_groups[-1] + 1 if self.training_groups else 0
         self.training_data.append(landmarks_list)
         self.training_labels.append(self.current_sample_class)
+        self.training_groups.append(group)
         
         # Nếu bật tính năng tăng cường dữ liệu, tạo thêm các biến thể
+        # (không co giãn / dịch chuyển: đặc trưng relative đã bỏ qua vị trí và kích thước bàn tay)
         if self.data_augmentation:
-            # 1. Thêm nhiễu nhẹ vào tọa độ x, y
-            noise_sample = landmarks_list.copy()
-            for i in range(0, len(noise_sample), 3):  # Chỉ thêm nhiễu vào x và y, không thêm vào z
-                noise_sample[i] += np.random.normal(0, 0.005)  # Nhiễu cho x
-                noise_sample[i+1] += np.random.normal(0, 0.005)  # Nhiễu cho y
-            self.training_data.append(noise_sample)
-            self.training_labels.append(self.current_sample_class)
+            points = np.array(landmarks_list).reshape(-1, 3)
+
+            # 1. Thêm nhiễu nhẹ vào tọa độ x, y của từng khớp, không thêm vào z
+            noise_sample = points.copy()
+            noise_sample[:, :2] += np.random.normal(0, 0.005, (len(points), 2))
             
-            # 2. Thêm mẫu với tỷ lệ co giãn nhẹ
-            scale_sample = landmarks_list.copy()
-            scale_factor = np.random.uniform(0.98, 1.02)  # Co giãn 2%
-            for i in range(0, len(scale_sample), 3):
-                scale_sample[i] *= scale_factor  # Co giãn x
-                scale_sample[i+1] *= scale_factor  # Co giãn y
-            self.training_data.append(scale_sample)
-            self.training_labels.append(self.current_sample_class)
+            # 2. Xoay nhẹ quanh cổ tay (±10 độ) trong mặt phẳng ảnh
+            angle = np.radians(np.random.uniform(-10, 10))
+            rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+            rotate_sample = points.copy()
+            rotate_sample[:, :2] = (points[:, :2] - points[0, :2]) @ rotation.T + points[0, :2]
+
+            for sample in (noise_sample, rotate_sample):
+                self.training_data.append(sample.ravel().tolist())
+                self.training_labels.append(self.current_sample_class)
+                self.training_groups.append(group)
 
         # Cập nhật số lượng mẫu đã thu thập
         self.collected_samples += 1
@@ -380,8 +402,8 @@ class HandSignRecognitionApp:
             # Thông báo bắt đầu huấn luyện
             self.set_status("Đang huấn luyện mô hình...")
 
-            # Chuẩn hóa dữ liệu
-            X = np.array(self.training_data)
+            # Đặc trưng lấy cổ tay làm gốc, không phụ thuộc vị trí / kích thước bàn tay trong khung hình
+            X = features(np.array(self.training_data), "relative")
             y = np.array(self.training_labels)
 
             # Sử dụng StandardScaler để chuẩn hóa dữ liệu
@@ -391,9 +413,13 @@ class HandSignRecognitionApp:
             # Sử dụng RandomForestClassifier với thông số tối ưu
             from sklearn.model_selection import train_test_split
             
-            # Chia dữ liệu thành tập train và test
-            X_train, X_test, y_train, y_test = train_test_split(
-                X_scaled, y, test_size=0.2, random_state=42, stratify=y)
+            # Chia dữ liệu thành tập train và test theo mẫu gốc: mẫu tăng cường đi cùng mẫu gốc của nó
+            groups = np.array(self.training_groups)
+            first_rows = np.unique(groups, return_index=True)[1]
+            train_groups, _ = train_test_split(
+                groups[first_rows], test_size=0.2, random_state=42, stratify=y[first_rows])
+            is_train = np.isin(groups, train_groups)
+            X_train, X_test, y_train, y_test = X_scaled[is_train], X_scaled[~is_train], y[is_train], y[~is_train]
             
             # Huấn luyện mô hình với thông số tối ưu
             self.model = RandomForestClassifier(
@@ -410,6 +436,7 @@ class HandSignRecognitionApp:
             
             # Đánh giá độ chính xác trên tập test
             test_accuracy = self.model.score(X_test, y_test) * 100
+            self.classifier = HandClassifier(self.model, self.scaler)
             
             # Lưu mô hình
             self.save_model()
@@ -420,17 +447,6 @@ class HandSignRecognitionApp:
         except Exception as e:
             self.set_status(f"Lỗi khi huấn luyện mô hình: {e}")
 
-    def extract_hand_features(self, hand_landmarks):
-        """
-        Trích xuất đặc trưng từ landmark của bàn tay
-        """
-        # Chuyển đổi landmarks thành vector
-        landmarks_list = []
-        for landmark in hand_landmarks.landmark:
-            landmarks_list.extend([landmark.x, landmark.y, landmark.z])
-        
-        return landmarks_list
-
     def process_video(self):
         """
         Xử lý video từ camera và thực hiện nhận diện
@@ -460,10 +476,9 @@ class HandSignRecognitionApp:
         if self.model is not None:
             try:
                 # Kiểm tra mô hình bằng cách tạo dữ liệu giả và thử dự đoán
-                dummy_data = np.random.rand(1, 63) # Giả sử 21 landmarks, mỗi landmark có x,y,z
-                if self.scaler is not None:
-                    dummy_data_scaled = self.scaler.transform(dummy_data)
-                    self.model.predict(dummy_data_scaled)
+                if self.classifier is not None:
+                    dummy_data = np.random.rand(1, FEATURE_SIZES[self.classifier.mode])
+                    self.classifier.predict_features(dummy_data)
                 else:
                     model_valid = False
             except Exception as e:
@@ -471,12 +486,12 @@ class HandSignRecognitionApp:
                 print("Đặt mô hình về None để tránh lỗi khi xử lý video")
                 self.model = None
                 self.scaler = None
+                self.classifier = None
                 model_valid = False
                 
                 # Xóa các file mô hình cũ
                 try:
-                    model_path = "models/hand_sign_model.pkl"
-                    scaler_path = "models/hand_sign_scaler.pkl"
+                    model_path, scaler_path = self.loaded_paths
                     if os.path.exists(model_path):
                         os.remove(model_path)
                     if os.path.exists(scaler_path):
@@ -550,6 +565,8 @@ class HandSignRecognitionApp:
                     
                     # Xử lý khung hình với MediaPipe 
                     results = self.hands.process(rgb_frame)
+                    if self.recorder is not None:
+                        self.recorder.append(results.multi_hand_landmarks)
                     
                     # Reset kết quả khi không có tay nào được phát hiện
                     if not results.multi_hand_landmarks:
@@ -578,6 +595,23 @@ class HandSignRecognitionApp:
                             self.current_label2 = ""
                             self.confidence2 = 0.0
                         
+                        # Nhận diện tất cả bàn tay cùng lúc: một ma trận đặc trưng, một lần predict_proba
+                        if self.is_detecting and self.classifier is not None and not self.collect_data_mode:
+                            try:
+                                predictions = self.classifier.predict(results.multi_hand_landmarks)
+                                self.current_label = f"{self.labels[predictions[0][0]]}"
+                                self.confidence = predictions[0][1]
+                                if len(predictions) > 1:
+                                    self.current_label2 = f"{self.labels[predictions[1][0]]}"
+                                    self.confidence2 = predictions[1][1]
+                            except Exception as e:
+                                print(f"Lỗi khi dự đoán: {e}")
+                                # Đặt giá trị mặc định nếu có lỗi
+                                self.current_label = "Lỗi nhận diện"
+                                self.confidence = 0.0
+                                self.current_label2 = ""
+                                self.confidence2 = 0.0
+                        
                         # Vẽ tất cả các bàn tay phát hiện được
                         for hand_idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
                             # Xác định loại tay (trái/phải) nếu có
@@ -602,42 +636,8 @@ class HandSignRecognitionApp:
                             cv2.putText(frame, hand_label, (hand_center_x - 50, hand_center_y - 50), 
                                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
                             
-                            # Nếu đang trong chế độ nhận diện và có mô hình đã được huấn luyện
-                            if self.is_detecting and self.model is not None and not self.collect_data_mode:
-                                # Trích xuất và xử lý đặc trưng
-                                hand_data = self.extract_hand_features(hand_landmarks)
-                                
-                                # Chuẩn hóa dữ liệu
-                                if self.scaler is not None:
-                                    try:
-                                        hand_data_scaled = self.scaler.transform([hand_data])
-                                        
-                                        # Dự đoán
-                                        prediction = self.model.predict(hand_data_scaled)
-                                        proba = self.model.predict_proba(hand_data_scaled)[0]
-                                        
-                                        # Kiểm tra dự đoán và xác suất hợp lệ
-                                        if len(proba) > prediction[0]:
-                                            confidence = proba[prediction[0]]
-                                            
-                                            # Cập nhật kết quả dựa vào tay thứ nhất hoặc thứ hai
-                                            if hand_idx == 0:
-                                                self.current_label = f"{self.labels[prediction[0]]}"
-                                                self.confidence = confidence
-                                            elif hand_idx == 1:
-                                                self.current_label2 = f"{self.labels[prediction[0]]}"
-                                                self.confidence2 = confidence
-                                    except Exception as e:
-                                        print(f"Lỗi khi dự đoán: {e}")
-                                        # Đặt giá trị mặc định nếu có lỗi
-                                        if hand_idx == 0:
-                                            self.current_label = "Lỗi nhận diện"
-                                            self.confidence = 0.0
-                                        elif hand_idx == 1:
-                                            self.current_label2 = ""
-                                            self.confidence2 = 0.0
                             # Nếu đang trong chế độ thu thập dữ liệu
-                            elif self.collect_data_mode and self.current_sample_class is not None:
+                            if self.collect_data_mode and self.current_sample_class is not None:
                                 if self.collected_samples < self.data_collection_target:
                                     # Chỉ thu thập dữ liệu từ tay đầu tiên được phát hiện
                                     if hand_idx == 0:
@@ -834,6 +834,8 @@ class HandSignRecognitionApp:
         if self.cap.isOpened():
             self.cap.release()
         self.hands.close()
+        if self.recorder is not None:
+            self.recorder.save(self.record_path)
         self.root.destroy()
 
 
@@ -850,8 +852,11 @@ def main():
     style.configure("TLabelframe", background="#f0f0f0")
     style.configure("TLabelframe.Label", font=("Arial", 12, "bold"))
 
-    # Khởi tạo ứng dụng
-    app = HandSignRecognitionApp(root)
+    # Khởi tạo ứng dụng, --record file.npz để ghi lại luồng landmark
+    record_path = None
+    if "--record" in sys.argv[1:-1]:
+        record_path = sys.argv[sys.argv.index("--record") + 1]
+    app = HandSignRecognitionApp(root, record_path)
 
     # Chạy vòng lặp chính
     root.mainloop()